@@ -53,9 +53,12 @@ from _drgn import (
     Platform,
     PlatformFlags,
     PrimitiveType,
+    ProcessMemoryBackend,
     Program,
     ProgramFlags,
     Qualifiers,
+    SearchKind,
+    Snapshot,
     StackFrame,
     StackTrace,
     Symbol,
@@ -95,9 +98,12 @@ __all__ = [
     'Platform',
     'PlatformFlags'
     'PrimitiveType',
+    'ProcessMemoryBackend',
     'Program',
     'ProgramFlags',
     'Qualifiers',
+    'SearchKind',
+    'Snapshot',
     'StackFrame',
     'StackTrace',
     'Symbol',
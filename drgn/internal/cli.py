@@ -67,6 +67,18 @@ def main() -> None:
     symbol_group.add_argument(
         '--no-default-symbols', dest='default_symbols', action='store_false',
         help="don't load any debugging symbols that were not explicitly added with -s")
+    symbol_group.add_argument(
+        '--index-cache', metavar='DIR', type=str,
+        default=os.path.join(
+            os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+            'drgn'),
+        help='cache the index of debugging symbols in the given directory (default: %(default)s)')
+    symbol_group.add_argument(
+        '--no-index-cache', dest='index_cache', action='store_const',
+        const=None, help="don't cache the index of debugging symbols")
+    symbol_group.add_argument(
+        '--lazy-modules', action='store_true',
+        help='only index the debugging symbols of kernel modules when they are needed')
 
     parser.add_argument(
         '-q', '--quiet', action='store_true',
@@ -85,6 +97,14 @@ def main() -> None:
         prog.set_pid(args.pid or os.getpid())
     else:
         prog.set_kernel()
+    if args.index_cache is not None:
+        try:
+            os.makedirs(args.index_cache, exist_ok=True)
+        except OSError:
+            pass
+        prog.set_debug_info_cache(args.index_cache)
+    if args.lazy_modules:
+        prog.set_lazy_module_indexing(True)
     if args.default_symbols:
         try:
             prog.load_default_debug_info()
@@ -0,0 +1,219 @@
+# Copyright 2019 - Omar Sandoval
+# SPDX-License-Identifier: GPL-3.0+
+
+"""
+Reference remote memory server
+
+This serves the memory of an ELF core dump over a Unix socket with the protocol
+used by Program.set_remote(). Run it with:
+
+    python3 -m drgn.internal.memory_server CORE SOCKET
+
+It only uses the standard library, so it can also be copied to and run on a
+machine without drgn.
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import socketserver
+import struct
+from typing import NamedTuple, Optional
+
+
+_MAGIC = b'DRGNMEM\0'
+_VERSION = 1
+_HELLO = struct.Struct('<8s5I')
+_REQUEST = struct.Struct('<QII')
+_RESPONSE = struct.Struct('<II')
+_MAX_REQUEST_SIZE = 64 * 1024
+_REQUEST_PHYSICAL = 0x1
+_FLAG_IS_LIVE = 0x1
+_STATUS_OK = 0
+_STATUS_FAULT = 1
+
+# Values of drgn.Architecture and drgn.PlatformFlags.
+_ARCH_UNKNOWN = 0
+_ARCH_X86_64 = 1
+_PLATFORM_IS_64_BIT = 1 << 0
+_PLATFORM_IS_LITTLE_ENDIAN = 1 << 1
+
+_ET_CORE = 4
+_EM_X86_64 = 62
+_PT_LOAD = 1
+_PT_NOTE = 4
+
+
+class _Segment(NamedTuple):
+    address: int
+    size: int
+    offset: int
+    file_size: int
+
+
+class CoreDump:
+    """Memory of an ELF core dump."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:4] != b'\x7fELF':
+            raise ValueError('not an ELF file')
+        is_64_bit = self._map[4] == 2
+        is_little_endian = self._map[5] == 1
+        endian = '<' if is_little_endian else '>'
+        if is_64_bit:
+            ehdr_struct = struct.Struct(endian + '16xHHIQQQIHHHHHH')
+            phdr_struct = struct.Struct(endian + 'IIQQQQQQ')
+        else:
+            ehdr_struct = struct.Struct(endian + '16xHHIIIIIHHHHHH')
+            phdr_struct = struct.Struct(endian + '8I')
+        (e_type, e_machine, _, _, e_phoff, _, _, _, e_phentsize,
+         e_phnum, _, _, _) = ehdr_struct.unpack_from(self._map)
+        if e_type != _ET_CORE:
+            raise ValueError('not an ELF core file')
+
+        self.arch = _ARCH_X86_64 if e_machine == _EM_X86_64 else _ARCH_UNKNOWN
+        self.platform_flags = (
+            (_PLATFORM_IS_64_BIT if is_64_bit else 0) |
+            (_PLATFORM_IS_LITTLE_ENDIAN if is_little_endian else 0))
+        self.vmcoreinfo = b''
+
+        no_address = (1 << (64 if is_64_bit else 32)) - 1
+        phdrs = []
+        for i in range(e_phnum):
+            fields = phdr_struct.unpack_from(self._map,
+                                             e_phoff + i * e_phentsize)
+            if is_64_bit:
+                p_type, _, offset, vaddr, paddr, filesz, memsz, _ = fields
+            else:
+                p_type, offset, vaddr, paddr, filesz, memsz, _, _ = fields
+            if p_type == _PT_LOAD:
+                phdrs.append((offset, vaddr, paddr, filesz, memsz))
+            elif p_type == _PT_NOTE:
+                self._parse_notes(offset, filesz, endian)
+
+        # Like libdrgn, only use physical addresses if any of them are valid.
+        have_paddr = any(phdr[2] for phdr in phdrs)
+        virtual_segments = []
+        physical_segments = []
+        for offset, vaddr, paddr, filesz, memsz in phdrs:
+            if vaddr != no_address:
+                virtual_segments.append(_Segment(vaddr, memsz, offset, filesz))
+            if have_paddr and paddr != no_address:
+                physical_segments.append(
+                    _Segment(paddr, memsz, offset, filesz))
+        virtual_segments.sort()
+        physical_segments.sort()
+        self._segments = (virtual_segments, physical_segments)
+        self._addresses = ([s.address for s in virtual_segments],
+                           [s.address for s in physical_segments])
+
+    def _parse_notes(self, offset: int, size: int, endian: str) -> None:
+        end = offset + size
+        while offset + 12 <= end:
+            namesz, descsz, _ = struct.unpack_from(endian + '3I', self._map,
+                                                   offset)
+            offset += 12
+            name = self._map[offset:offset + namesz].rstrip(b'\0')
+            offset += (namesz + 3) & ~3
+            if name == b'VMCOREINFO':
+                self.vmcoreinfo = self._map[offset:offset + descsz]
+            offset += (descsz + 3) & ~3
+
+    def _find_segment(self, address: int,
+                      physical: bool) -> Optional[_Segment]:
+        i = bisect.bisect_right(self._addresses[physical], address)
+        if i:
+            segment = self._segments[physical][i - 1]
+            if address < segment.address + segment.size:
+                return segment
+        return None
+
+    def read(self, address: int, size: int,
+             physical: bool) -> Optional[bytes]:
+        """
+        Read memory from the core dump, or return None if any of it is not in
+        the core dump.
+        """
+        buf = bytearray()
+        while size:
+            segment = self._find_segment(address, physical)
+            if segment is None:
+                return None
+            segment_offset = address - segment.address
+            n = min(size, segment.size - segment_offset)
+            file_n = max(min(n, segment.file_size - segment_offset), 0)
+            start = segment.offset + segment_offset
+            buf += self._map[start:start + file_n]
+            buf += bytes(n - file_n)
+            address += n
+            size -= n
+        return bytes(buf)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        core = self.server.core  # type: ignore
+        self.request.sendall(_HELLO.pack(_MAGIC, _VERSION, core.arch,
+                                         core.platform_flags,
+                                         self.server.flags,  # type: ignore
+                                         len(core.vmcoreinfo)) +
+                             core.vmcoreinfo)
+        with self.request.makefile('rb') as f:
+            while True:
+                request = f.read(_REQUEST.size)
+                if len(request) < _REQUEST.size:
+                    return
+                address, size, flags = _REQUEST.unpack(request)
+                if size > _MAX_REQUEST_SIZE:
+                    return
+                data = None
+                if address + size <= 1 << 64:
+                    data = core.read(address, size,
+                                     bool(flags & _REQUEST_PHYSICAL))
+                if data is None:
+                    self.request.sendall(_RESPONSE.pack(_STATUS_FAULT, 0))
+                else:
+                    self.request.sendall(_RESPONSE.pack(_STATUS_OK, size) +
+                                         data)
+
+
+class MemoryServer(socketserver.ThreadingUnixStreamServer):
+    """Server for the memory of a core dump on a Unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, core: CoreDump,
+                 live: bool = False) -> None:
+        super().__init__(socket_path, _Handler)
+        self.core = core
+        self.flags = _FLAG_IS_LIVE if live else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog='python3 -m drgn.internal.memory_server',
+        description='serve the memory of a core dump over a Unix socket')
+    parser.add_argument('core', help='ELF core dump')
+    parser.add_argument('socket', help='path of the Unix socket to create')
+    parser.add_argument(
+        '--live', action='store_true',
+        help='report the program as running, so that its memory is not '
+        'cached (e.g., for a core dump which is being updated in place)')
+    args = parser.parse_args()
+
+    core = CoreDump(args.core)
+    with MemoryServer(args.socket, core, args.live) as server:
+        try:
+            print(f'listening on {args.socket}', flush=True)
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ import keyword
 import readline
 from typing import Any, Dict, List, Optional
 
+from drgn import Program, SearchKind
+
 
 _EXPR_RE = re.compile(r"""
 (
@@ -29,6 +31,9 @@ _EXPR_RE = re.compile(r"""
 \.(\w*)                              # Attribute to complete
 """, re.VERBOSE)
 
+# prog['name, where prog is a Program.
+_SUBSCRIPT_RE = re.compile(r"""(\w+)\[(['"])(\w*)""")
+
 
 class Completer:
     """
@@ -53,7 +58,10 @@ class Completer:
                 return None
 
         if state == 0:
-            if '.' in text:
+            m = _SUBSCRIPT_RE.fullmatch(text)
+            if m:
+                self._matches = self._subscript_matches(*m.group(1, 2, 3))
+            elif '.' in text:
                 self._matches = self._expr_matches(text)
             else:
                 self._matches = self._global_matches(text)
@@ -97,6 +105,19 @@ class Completer:
                 matches.add(match)
         return sorted(matches)
 
+    def _subscript_matches(self, var: str, quote: str,
+                           prefix: str) -> List[str]:
+        prog = self._namespace.get(var)
+        if not isinstance(prog, Program):
+            return []
+        try:
+            names = prog.search(prefix + '*',
+                                SearchKind.CONSTANT | SearchKind.FUNCTION |
+                                SearchKind.VARIABLE)
+        except Exception:
+            return []
+        return [f'{var}[{quote}{name}{quote}]' for name in names]
+
     def _global_matches(self, text: str) -> List[str]:
         matches = set()
         for word in keyword.kwlist:
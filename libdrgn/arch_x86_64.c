@@ -1,8 +1,12 @@
 // Copyright 2019 - Omar Sandoval
 // SPDX-License-Identifier: GPL-3.0+
 
+#include <endian.h>
+#include <inttypes.h>
+
 #include "internal.h"
 #include "platform.h"
+#include "program.h"
 
 static inline struct drgn_error *read_register(struct drgn_object *reg_obj,
 					       struct drgn_object *frame_obj,
@@ -101,10 +105,77 @@ out:
 	return err;
 }
 
+#define PAGE_PRESENT UINT64_C(0x1)
+#define PAGE_PSE UINT64_C(0x80)
+/* Bits 12-51 of a page table entry are the physical address. */
+#define PAGE_ADDRESS_MASK UINT64_C(0xffffffffff000)
+
+static struct drgn_error *pgtable_walk_x86_64(struct drgn_program *prog,
+					      uint64_t pgd, uint64_t address,
+					      uint64_t *phys_ret,
+					      uint64_t *page_size_ret)
+{
+	struct drgn_error *err;
+	int levels, level, va_bits;
+	uint64_t table;
+
+	/*
+	 * Each level translates 9 bits of the address on top of the 12 bit page
+	 * offset, so 4-level paging uses 48-bit addresses and 5-level paging
+	 * uses 57-bit addresses.
+	 */
+	if ((prog->flags & DRGN_PROGRAM_IS_LINUX_KERNEL) &&
+	    prog->vmcoreinfo.pgtable_l5_enabled)
+		levels = 5;
+	else
+		levels = 4;
+	va_bits = 12 + 9 * levels;
+	/* The unused upper bits must be copies of the highest used bit. */
+	if ((uint64_t)((int64_t)(address << (64 - va_bits)) >>
+		       (64 - va_bits)) != address) {
+		return drgn_error_format(DRGN_ERROR_FAULT,
+					 "virtual address 0x%" PRIx64 " is not canonical",
+					 address);
+	}
+
+	/* The low bits of CR3 are flags, not part of the address. */
+	table = pgd & PAGE_ADDRESS_MASK;
+	for (level = levels; level > 0; level--) {
+		int shift = 12 + 9 * (level - 1);
+		uint64_t index = (address >> shift) & 0x1ff;
+		uint64_t entry;
+
+		err = drgn_program_read_memory(prog, &entry, table + 8 * index,
+					       sizeof(entry), true);
+		if (err)
+			return err;
+		entry = le64toh(entry);
+		if (!(entry & PAGE_PRESENT)) {
+			return drgn_error_format(DRGN_ERROR_FAULT,
+						 "virtual address 0x%" PRIx64 " is not mapped",
+						 address);
+		}
+		/* PDPT and PD entries may map 1 GB and 2 MB pages. */
+		if (level == 1 ||
+		    ((level == 2 || level == 3) && (entry & PAGE_PSE))) {
+			uint64_t page_size = UINT64_C(1) << shift;
+
+			*phys_ret = ((entry & PAGE_ADDRESS_MASK &
+				      ~(page_size - 1)) |
+				     (address & (page_size - 1)));
+			*page_size_ret = page_size;
+			return NULL;
+		}
+		table = entry & PAGE_ADDRESS_MASK;
+	}
+	DRGN_UNREACHABLE();
+}
+
 const struct drgn_architecture_info arch_info_x86_64 = {
 	.name = "x86-64",
 	.arch = DRGN_ARCH_X86_64,
 	.default_flags = (DRGN_PLATFORM_IS_64_BIT |
 			  DRGN_PLATFORM_IS_LITTLE_ENDIAN),
 	.linux_kernel_set_initial_registers = linux_kernel_set_initial_registers_x86_64,
+	.pgtable_walk = pgtable_walk_x86_64,
 };
@@ -60,8 +60,10 @@ PyObject *Architecture_class;
 PyObject *FindObjectFlags_class;
 PyObject *PrimitiveType_class;
 PyObject *PlatformFlags_class;
+PyObject *ProcessMemoryBackend_class;
 PyObject *ProgramFlags_class;
 PyObject *Qualifiers_class;
+PyObject *SearchKind_class;
 PyObject *TypeKind_class;
 """)
     gen_constant_class(drgn_h, output_file, 'Architecture', 'Enum',
@@ -72,10 +74,14 @@ PyObject *TypeKind_class;
                        r'DRGN_(C)_TYPE_([a-zA-Z0-9_]+)')
     gen_constant_class(drgn_h, output_file, 'PlatformFlags', 'Flag',
                        r'DRGN_PLATFORM_([a-zA-Z0-9_]+)(?<!DRGN_PLATFORM_DEFAULT_FLAGS)')
+    gen_constant_class(drgn_h, output_file, 'ProcessMemoryBackend', 'Enum',
+                       r'DRGN_PROCESS_MEMORY_([a-zA-Z0-9_]+)')
     gen_constant_class(drgn_h, output_file, 'ProgramFlags', 'Flag',
                        r'DRGN_PROGRAM_([a-zA-Z0-9_]+)(?<!DRGN_PROGRAM_ENDIAN)')
     gen_constant_class(drgn_h, output_file, 'Qualifiers', 'Flag',
                        r'DRGN_QUALIFIER_([a-zA-Z0-9_]+)')
+    gen_constant_class(drgn_h, output_file, 'SearchKind', 'Flag',
+                       r'DRGN_SEARCH_([a-zA-Z0-9_]+)')
     gen_constant_class(drgn_h, output_file, 'TypeKind', 'Enum',
                        r'DRGN_TYPE_([a-zA-Z0-9_]+)')
     output_file.write("""
@@ -92,8 +98,10 @@ int add_module_constants(PyObject *m)
 	    add_FindObjectFlags(m, enum_module) == -1 ||
 	    add_PrimitiveType(m, enum_module) == -1 ||
 	    add_PlatformFlags(m, enum_module) == -1 ||
+	    add_ProcessMemoryBackend(m, enum_module) == -1 ||
 	    add_ProgramFlags(m, enum_module) == -1 ||
 	    add_Qualifiers(m, enum_module) == -1 ||
+	    add_SearchKind(m, enum_module) == -1 ||
 	    add_TypeKind(m, enum_module) == -1)
 		ret = -1;
 	else
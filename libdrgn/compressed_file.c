@@ -0,0 +1,1267 @@
+// Copyright 2019 - Omar Sandoval
+// SPDX-License-Identifier: GPL-3.0+
+
+#include <errno.h>
+#include <fcntl.h>
+#include <lzma.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/stat.h>
+#include <zlib.h>
+#ifdef WITH_ZSTD
+#include <zstd.h>
+#endif
+
+#include "internal.h"
+#include "compressed_file.h"
+#include "vector.h"
+
+#define INPUT_BUFFER_SIZE (64 * 1024)
+#define GZIP_WINDOW_SIZE 32768
+/* Access point flag for the start of a gzip member. */
+#define GZIP_MEMBER_START UINT32_C(0x80000000)
+
+enum drgn_compression_format {
+	DRGN_COMPRESSION_GZIP = 1,
+	DRGN_COMPRESSION_XZ,
+	DRGN_COMPRESSION_ZSTD,
+};
+
+struct drgn_compressed_access_point {
+	uint64_t uncompressed_offset;
+	uint64_t compressed_offset;
+	/*
+	 * For gzip, GZIP_MEMBER_START or the number of bits (0-7) of the byte
+	 * before compressed_offset that belong to the next deflate block. For
+	 * xz, the check type of the stream. Unused for zstd.
+	 */
+	uint32_t flags;
+	/* For gzip checkpoints, the previous 32 KiB of uncompressed data. */
+	unsigned char *window;
+};
+
+DEFINE_VECTOR(access_point_vector, struct drgn_compressed_access_point)
+
+struct drgn_compressed_chunk {
+	/* Index of the chunk in the file, or UINT64_MAX if unused. */
+	uint64_t index;
+	/* Value of drgn_compressed_file::clock when this was last used. */
+	uint64_t last_used;
+	size_t size;
+	char *data;
+};
+
+struct drgn_compressed_file {
+	int fd;
+	enum drgn_compression_format format;
+	/* Size of the uncompressed data. */
+	uint64_t size;
+	struct drgn_compressed_access_point *points;
+	size_t num_points;
+
+	struct drgn_compressed_chunk chunks[DRGN_COMPRESSED_FILE_MAX_CHUNKS];
+	uint64_t clock;
+
+	/* Whether the decoder is active. */
+	bool decoding;
+	/* Uncompressed offset of the next byte that the decoder outputs. */
+	uint64_t decoder_offset;
+	/* Offset in the file of the next input to read. */
+	uint64_t input_offset;
+	/* Whether the end of the file was reached. */
+	bool input_eof;
+	unsigned char *input;
+	z_stream zstream;
+	lzma_stream lzma;
+	/* lzma_block_decoder() updates this when it finishes. */
+	lzma_block xz_block;
+#ifdef WITH_ZSTD
+	ZSTD_DStream *zstd;
+	ZSTD_inBuffer zstd_input;
+	size_t zstd_ret;
+#endif
+};
+
+static struct drgn_error *read_at(int fd, void *buf, size_t count,
+				  uint64_t offset, size_t *ret)
+{
+	char *p = buf;
+
+	*ret = 0;
+	while (count) {
+		ssize_t sret;
+
+		sret = pread(fd, p, count, offset);
+		if (sret == -1) {
+			if (errno == EINTR)
+				continue;
+			return drgn_error_create_os("pread", errno, NULL);
+		} else if (sret == 0) {
+			break;
+		}
+		p += sret;
+		count -= sret;
+		offset += sret;
+		*ret += sret;
+	}
+	return NULL;
+}
+
+static struct drgn_error *truncated_error(void)
+{
+	return drgn_error_create(DRGN_ERROR_OTHER,
+				 "compressed file is truncated");
+}
+
+static struct drgn_error *read_exact(int fd, void *buf, size_t count,
+				     uint64_t offset)
+{
+	struct drgn_error *err;
+	size_t n;
+
+	err = read_at(fd, buf, count, offset, &n);
+	if (err)
+		return err;
+	if (n < count)
+		return truncated_error();
+	return NULL;
+}
+
+/* Read the next piece of input into file->input. */
+static struct drgn_error *read_input(struct drgn_compressed_file *file,
+				     size_t *ret)
+{
+	struct drgn_error *err;
+
+	err = read_at(file->fd, file->input, INPUT_BUFFER_SIZE,
+		      file->input_offset, ret);
+	if (err)
+		return err;
+	file->input_offset += *ret;
+	if (!*ret)
+		file->input_eof = true;
+	return NULL;
+}
+
+static struct drgn_error *gzip_error(z_stream *strm, int ret)
+{
+	if (ret == Z_MEM_ERROR)
+		return &drgn_enomem;
+	return drgn_error_format(DRGN_ERROR_OTHER, "invalid gzip data: %s",
+				 strm->msg ? strm->msg : "unknown error");
+}
+
+static struct drgn_error *xz_error(lzma_ret ret)
+{
+	switch (ret) {
+	case LZMA_MEM_ERROR:
+		return &drgn_enomem;
+	case LZMA_OPTIONS_ERROR:
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "unsupported xz options");
+	case LZMA_UNSUPPORTED_CHECK:
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "unsupported xz integrity check");
+	default:
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "invalid xz data (error %d)", (int)ret);
+	}
+}
+
+#ifdef WITH_ZSTD
+static struct drgn_error *zstd_error(size_t ret)
+{
+	return drgn_error_format(DRGN_ERROR_OTHER, "invalid zstd data: %s",
+				 ZSTD_getErrorName(ret));
+}
+#endif
+
+static struct drgn_error *
+add_access_point(struct access_point_vector *points,
+		 uint64_t uncompressed_offset, uint64_t compressed_offset,
+		 uint32_t flags, unsigned char *window)
+{
+	struct drgn_compressed_access_point *point;
+
+	point = access_point_vector_append_entry(points);
+	if (!point)
+		return &drgn_enomem;
+	point->uncompressed_offset = uncompressed_offset;
+	point->compressed_offset = compressed_offset;
+	point->flags = flags;
+	point->window = window;
+	return NULL;
+}
+
+static void free_access_points(struct drgn_compressed_access_point *points,
+			       size_t num_points)
+{
+	size_t i;
+
+	for (i = 0; i < num_points; i++)
+		free(points[i].window);
+	free(points);
+}
+
+static struct drgn_error *gzip_build_index(struct drgn_compressed_file *file,
+					   struct access_point_vector *points)
+{
+	struct drgn_error *err;
+	z_stream strm = {};
+	unsigned char *window;
+	uint64_t totin = 0, totout = 0, last = 0;
+	bool output_full = false;
+	int ret;
+
+	window = malloc(GZIP_WINDOW_SIZE);
+	if (!window)
+		return &drgn_enomem;
+	/* 15 + 16 means a gzip header and a 32 KiB window. */
+	ret = inflateInit2(&strm, 15 + 16);
+	if (ret != Z_OK) {
+		err = gzip_error(&strm, ret);
+		goto out_window;
+	}
+
+	err = add_access_point(points, 0, 0, GZIP_MEMBER_START, NULL);
+	if (err)
+		goto out;
+	file->input_offset = 0;
+	for (;;) {
+		if (!strm.avail_out) {
+			strm.next_out = window;
+			strm.avail_out = GZIP_WINDOW_SIZE;
+		}
+		if (!strm.avail_in && !output_full) {
+			size_t n;
+
+			err = read_input(file, &n);
+			if (err)
+				goto out;
+			if (!n) {
+				err = truncated_error();
+				goto out;
+			}
+			strm.next_in = file->input;
+			strm.avail_in = n;
+		}
+
+		/*
+		 * Z_BLOCK makes inflate() return at the end of each deflate
+		 * block, which is where decompression can resume.
+		 */
+		totin += strm.avail_in;
+		totout += strm.avail_out;
+		ret = inflate(&strm, Z_BLOCK);
+		totin -= strm.avail_in;
+		totout -= strm.avail_out;
+		output_full = !strm.avail_out;
+		if (ret == Z_STREAM_END) {
+			unsigned char magic[2];
+			size_t n;
+
+			/* Another member may follow. */
+			err = read_at(file->fd, magic, sizeof(magic), totin,
+				      &n);
+			if (err)
+				goto out;
+			if (n < sizeof(magic) || magic[0] != 0x1f ||
+			    magic[1] != 0x8b)
+				break;
+			ret = inflateReset(&strm);
+			if (ret != Z_OK) {
+				err = gzip_error(&strm, ret);
+				goto out;
+			}
+			err = add_access_point(points, totout, totin,
+					       GZIP_MEMBER_START, NULL);
+			if (err)
+				goto out;
+			last = totout;
+			continue;
+		} else if (ret != Z_OK) {
+			err = gzip_error(&strm, ret == Z_NEED_DICT ?
+					 Z_DATA_ERROR : ret);
+			goto out;
+		}
+
+		/*
+		 * Bit 7 of data_type is set at the end of a deflate block, and
+		 * bit 6 is set if it was the last block.
+		 */
+		if ((strm.data_type & 128) && !(strm.data_type & 64) &&
+		    totout - last > DRGN_COMPRESSED_FILE_GZIP_SPAN) {
+			unsigned char *point_window;
+			size_t left = strm.avail_out;
+
+			point_window = malloc(GZIP_WINDOW_SIZE);
+			if (!point_window) {
+				err = &drgn_enomem;
+				goto out;
+			}
+			/* The output buffer is a circular window. */
+			memcpy(point_window, window + GZIP_WINDOW_SIZE - left,
+			       left);
+			memcpy(point_window + left, window,
+			       GZIP_WINDOW_SIZE - left);
+			err = add_access_point(points, totout, totin,
+					       strm.data_type & 7,
+					       point_window);
+			if (err) {
+				free(point_window);
+				goto out;
+			}
+			last = totout;
+		}
+	}
+	file->size = totout;
+	err = NULL;
+out:
+	inflateEnd(&strm);
+out_window:
+	free(window);
+	return err;
+}
+
+static struct drgn_error *gzip_start(struct drgn_compressed_file *file,
+				     struct drgn_compressed_access_point *point)
+{
+	struct drgn_error *err;
+	z_stream *strm = &file->zstream;
+	int ret;
+
+	memset(strm, 0, sizeof(*strm));
+	file->input_offset = point->compressed_offset;
+	if (point->flags & GZIP_MEMBER_START) {
+		ret = inflateInit2(strm, 15 + 16);
+		if (ret != Z_OK)
+			return gzip_error(strm, ret);
+		return NULL;
+	}
+
+	/* -15 means raw deflate data with a 32 KiB window. */
+	ret = inflateInit2(strm, -15);
+	if (ret != Z_OK)
+		return gzip_error(strm, ret);
+	if (point->flags) {
+		unsigned char byte;
+
+		err = read_exact(file->fd, &byte, 1,
+				 point->compressed_offset - 1);
+		if (err)
+			goto err;
+		ret = inflatePrime(strm, point->flags,
+				   byte >> (8 - point->flags));
+	}
+	if (ret == Z_OK) {
+		ret = inflateSetDictionary(strm, point->window,
+					   GZIP_WINDOW_SIZE);
+	}
+	if (ret != Z_OK) {
+		err = gzip_error(strm, ret);
+		goto err;
+	}
+	return NULL;
+
+err:
+	inflateEnd(strm);
+	return err;
+}
+
+static struct drgn_error *gzip_read(struct drgn_compressed_file *file,
+				    void *buf, size_t count, size_t *ret,
+				    bool *end)
+{
+	struct drgn_error *err;
+	z_stream *strm = &file->zstream;
+
+	strm->next_out = buf;
+	strm->avail_out = count;
+	while (strm->avail_out) {
+		int zret;
+
+		if (!strm->avail_in && !file->input_eof) {
+			size_t n;
+
+			err = read_input(file, &n);
+			if (err)
+				return err;
+			strm->next_in = file->input;
+			strm->avail_in = n;
+		}
+		zret = inflate(strm, Z_NO_FLUSH);
+		if (zret == Z_STREAM_END) {
+			*end = true;
+			break;
+		} else if (zret == Z_BUF_ERROR && file->input_eof) {
+			return truncated_error();
+		} else if (zret != Z_OK && zret != Z_BUF_ERROR) {
+			return gzip_error(strm, zret == Z_NEED_DICT ?
+					  Z_DATA_ERROR : zret);
+		}
+	}
+	*ret = count - strm->avail_out;
+	return NULL;
+}
+
+/*
+ * Read the index of the xz stream ending at *pos and prepend it to *indexp.
+ * *pos is set to the start of the stream.
+ */
+static struct drgn_error *xz_read_stream_index(struct drgn_compressed_file *file,
+					       uint64_t *pos,
+					       lzma_index **indexp)
+{
+	struct drgn_error *err;
+	uint8_t buf[LZMA_STREAM_HEADER_SIZE];
+	lzma_stream_flags header_flags, footer_flags;
+	lzma_vli padding = 0;
+	uint64_t index_offset, stream_size, memlimit = UINT64_MAX;
+	uint8_t *index_buf;
+	size_t in_pos = 0;
+	lzma_index *index = NULL;
+	lzma_ret ret;
+
+	/* Skip stream padding. */
+	for (;;) {
+		if (*pos < 2 * LZMA_STREAM_HEADER_SIZE)
+			goto invalid;
+		err = read_exact(file->fd, buf, 4, *pos - 4);
+		if (err)
+			return err;
+		if (buf[0] || buf[1] || buf[2] || buf[3])
+			break;
+		*pos -= 4;
+		padding += 4;
+	}
+
+	err = read_exact(file->fd, buf, LZMA_STREAM_HEADER_SIZE,
+			 *pos - LZMA_STREAM_HEADER_SIZE);
+	if (err)
+		return err;
+	ret = lzma_stream_footer_decode(&footer_flags, buf);
+	if (ret != LZMA_OK)
+		return xz_error(ret);
+	if (*pos - 2 * LZMA_STREAM_HEADER_SIZE < footer_flags.backward_size)
+		goto invalid;
+	index_offset = (*pos - LZMA_STREAM_HEADER_SIZE -
+			footer_flags.backward_size);
+
+	index_buf = malloc(footer_flags.backward_size);
+	if (!index_buf)
+		return &drgn_enomem;
+	err = read_exact(file->fd, index_buf, footer_flags.backward_size,
+			 index_offset);
+	if (err) {
+		free(index_buf);
+		return err;
+	}
+	ret = lzma_index_buffer_decode(&index, &memlimit, NULL, index_buf,
+				       &in_pos, footer_flags.backward_size);
+	free(index_buf);
+	if (ret != LZMA_OK)
+		return xz_error(ret);
+
+	stream_size = lzma_index_stream_size(index);
+	if (stream_size > *pos)
+		goto invalid_index;
+	err = read_exact(file->fd, buf, LZMA_STREAM_HEADER_SIZE,
+			 *pos - stream_size);
+	if (err)
+		goto err_index;
+	ret = lzma_stream_header_decode(&header_flags, buf);
+	if (ret == LZMA_OK)
+		ret = lzma_stream_flags_compare(&header_flags, &footer_flags);
+	if (ret == LZMA_OK)
+		ret = lzma_index_stream_flags(index, &footer_flags);
+	if (ret == LZMA_OK)
+		ret = lzma_index_stream_padding(index, padding);
+	if (ret == LZMA_OK && *indexp)
+		ret = lzma_index_cat(index, *indexp, NULL);
+	if (ret != LZMA_OK) {
+		err = xz_error(ret);
+		goto err_index;
+	}
+	*indexp = index;
+	*pos -= stream_size;
+	return NULL;
+
+invalid_index:
+	err = drgn_error_create(DRGN_ERROR_OTHER, "invalid xz data");
+err_index:
+	lzma_index_end(index, NULL);
+	return err;
+
+invalid:
+	return drgn_error_create(DRGN_ERROR_OTHER, "invalid xz data");
+}
+
+static struct drgn_error *xz_read_index(struct drgn_compressed_file *file,
+					uint64_t file_size,
+					struct access_point_vector *points)
+{
+	struct drgn_error *err;
+	uint64_t pos = file_size;
+	lzma_index *index = NULL;
+	lzma_index_iter iter;
+
+	/* The xz index is at the end, so walk the streams backwards. */
+	while (pos > 0) {
+		err = xz_read_stream_index(file, &pos, &index);
+		if (err)
+			goto out;
+	}
+	if (!index) {
+		err = drgn_error_create(DRGN_ERROR_OTHER, "invalid xz data");
+		goto out;
+	}
+
+	lzma_index_iter_init(&iter, index);
+	while (!lzma_index_iter_next(&iter, LZMA_INDEX_ITER_NONEMPTY_BLOCK)) {
+		err = add_access_point(points,
+				       iter.block.uncompressed_file_offset,
+				       iter.block.compressed_file_offset,
+				       iter.stream.flags->check, NULL);
+		if (err)
+			goto out;
+	}
+	file->size = lzma_index_uncompressed_size(index);
+	err = NULL;
+out:
+	if (index)
+		lzma_index_end(index, NULL);
+	return err;
+}
+
+static struct drgn_error *xz_start(struct drgn_compressed_file *file,
+				   struct drgn_compressed_access_point *point)
+{
+	struct drgn_error *err;
+	uint8_t header[LZMA_BLOCK_HEADER_SIZE_MAX];
+	lzma_filter filters[LZMA_FILTERS_MAX + 1];
+	lzma_block *block = &file->xz_block;
+	lzma_ret ret;
+	size_t i;
+
+	err = read_exact(file->fd, header, 1, point->compressed_offset);
+	if (err)
+		return err;
+	if (!header[0]) {
+		/* This is the start of the index, not a block. */
+		return drgn_error_create(DRGN_ERROR_OTHER, "invalid xz data");
+	}
+	memset(block, 0, sizeof(*block));
+	block->version = 0;
+	block->header_size = lzma_block_header_size_decode(header[0]);
+	block->check = point->flags;
+	block->filters = filters;
+	err = read_exact(file->fd, header + 1, block->header_size - 1,
+			 point->compressed_offset + 1);
+	if (err)
+		return err;
+	/* This frees the filter options on failure. */
+	ret = lzma_block_header_decode(block, NULL, header);
+	if (ret != LZMA_OK)
+		return xz_error(ret);
+
+	file->lzma = (lzma_stream)LZMA_STREAM_INIT;
+	ret = lzma_block_decoder(&file->lzma, block);
+	/* The filter options are only needed to initialize the decoder. */
+	for (i = 0; filters[i].id != LZMA_VLI_UNKNOWN; i++)
+		free(filters[i].options);
+	block->filters = NULL;
+	if (ret != LZMA_OK) {
+		lzma_end(&file->lzma);
+		return xz_error(ret);
+	}
+	file->input_offset = point->compressed_offset + block->header_size;
+	return NULL;
+}
+
+static struct drgn_error *xz_read(struct drgn_compressed_file *file,
+				  void *buf, size_t count, size_t *ret,
+				  bool *end)
+{
+	struct drgn_error *err;
+	lzma_stream *strm = &file->lzma;
+
+	strm->next_out = buf;
+	strm->avail_out = count;
+	while (strm->avail_out) {
+		size_t avail_in, avail_out;
+		lzma_ret lret;
+
+		if (!strm->avail_in && !file->input_eof) {
+			size_t n;
+
+			err = read_input(file, &n);
+			if (err)
+				return err;
+			strm->next_in = file->input;
+			strm->avail_in = n;
+		}
+		avail_in = strm->avail_in;
+		avail_out = strm->avail_out;
+		lret = lzma_code(strm, LZMA_RUN);
+		if (lret == LZMA_STREAM_END) {
+			*end = true;
+			break;
+		} else if (lret != LZMA_OK && lret != LZMA_BUF_ERROR) {
+			return xz_error(lret);
+		} else if (file->input_eof && strm->avail_in == avail_in &&
+			   strm->avail_out == avail_out) {
+			return truncated_error();
+		}
+	}
+	*ret = count - strm->avail_out;
+	return NULL;
+}
+
+#ifdef WITH_ZSTD
+static struct drgn_error *zstd_build_index(struct drgn_compressed_file *file,
+					   struct access_point_vector *points)
+{
+	struct drgn_error *err;
+	ZSTD_inBuffer in = {};
+	ZSTD_outBuffer out;
+	size_t scratch_size = ZSTD_DStreamOutSize(), ret = 0;
+	void *scratch;
+	uint64_t in_base = 0, totout = 0;
+	bool output_full = false;
+
+	scratch = malloc(scratch_size);
+	if (!scratch)
+		return &drgn_enomem;
+	ZSTD_DCtx_reset(file->zstd, ZSTD_reset_session_only);
+	err = add_access_point(points, 0, 0, 0, NULL);
+	if (err)
+		goto out;
+	file->input_offset = 0;
+	for (;;) {
+		if (in.pos == in.size && !output_full) {
+			size_t n;
+
+			in_base = file->input_offset;
+			err = read_input(file, &n);
+			if (err)
+				goto out;
+			if (!n)
+				break;
+			in.src = file->input;
+			in.size = n;
+			in.pos = 0;
+		}
+		out.dst = scratch;
+		out.size = scratch_size;
+		out.pos = 0;
+		ret = ZSTD_decompressStream(file->zstd, &out, &in);
+		if (ZSTD_isError(ret)) {
+			err = zstd_error(ret);
+			goto out;
+		}
+		output_full = out.pos == out.size;
+		totout += out.pos;
+		/* Each frame can be decompressed independently. */
+		if (ret == 0) {
+			err = add_access_point(points, totout,
+					       in_base + in.pos, 0, NULL);
+			if (err)
+				goto out;
+		}
+	}
+	if (ret != 0) {
+		err = truncated_error();
+		goto out;
+	}
+	/* Drop the access points at the end of the file. */
+	while (points->size > 1 &&
+	       points->data[points->size - 1].uncompressed_offset == totout)
+		points->size--;
+	file->size = totout;
+	err = NULL;
+out:
+	free(scratch);
+	return err;
+}
+
+static struct drgn_error *zstd_start(struct drgn_compressed_file *file,
+				     struct drgn_compressed_access_point *point)
+{
+	ZSTD_DCtx_reset(file->zstd, ZSTD_reset_session_only);
+	file->zstd_input.src = file->input;
+	file->zstd_input.size = 0;
+	file->zstd_input.pos = 0;
+	file->zstd_ret = 0;
+	file->input_offset = point->compressed_offset;
+	return NULL;
+}
+
+static struct drgn_error *zstd_read(struct drgn_compressed_file *file,
+				    void *buf, size_t count, size_t *ret,
+				    bool *end)
+{
+	struct drgn_error *err;
+	ZSTD_inBuffer *in = &file->zstd_input;
+	ZSTD_outBuffer out = { buf, count, 0 };
+
+	while (out.pos < out.size) {
+		size_t in_pos, out_pos;
+
+		if (in->pos == in->size && !file->input_eof) {
+			size_t n;
+
+			err = read_input(file, &n);
+			if (err)
+				return err;
+			in->size = n;
+			in->pos = 0;
+		}
+		in_pos = in->pos;
+		out_pos = out.pos;
+		file->zstd_ret = ZSTD_decompressStream(file->zstd, &out, in);
+		if (ZSTD_isError(file->zstd_ret))
+			return zstd_error(file->zstd_ret);
+		if (file->input_eof && in->pos == in_pos && out.pos == out_pos) {
+			if (file->zstd_ret)
+				return truncated_error();
+			*end = true;
+			break;
+		}
+	}
+	*ret = out.pos;
+	return NULL;
+}
+#endif
+
+static void decoder_stop(struct drgn_compressed_file *file)
+{
+	if (!file->decoding)
+		return;
+	switch (file->format) {
+	case DRGN_COMPRESSION_GZIP:
+		inflateEnd(&file->zstream);
+		break;
+	case DRGN_COMPRESSION_XZ:
+		lzma_end(&file->lzma);
+		break;
+	case DRGN_COMPRESSION_ZSTD:
+		break;
+	}
+	file->decoding = false;
+}
+
+static struct drgn_error *decoder_start(struct drgn_compressed_file *file,
+					size_t i)
+{
+	struct drgn_error *err;
+	struct drgn_compressed_access_point *point = &file->points[i];
+
+	decoder_stop(file);
+	file->input_eof = false;
+	switch (file->format) {
+	case DRGN_COMPRESSION_GZIP:
+		err = gzip_start(file, point);
+		break;
+	case DRGN_COMPRESSION_XZ:
+		err = xz_start(file, point);
+		break;
+#ifdef WITH_ZSTD
+	case DRGN_COMPRESSION_ZSTD:
+		err = zstd_start(file, point);
+		break;
+#endif
+	default:
+		DRGN_UNREACHABLE();
+	}
+	if (err)
+		return err;
+	file->decoding = true;
+	file->decoder_offset = point->uncompressed_offset;
+	return NULL;
+}
+
+/*
+ * Decompress up to count bytes. If the end of the data that can be decompressed
+ * from the current access point is reached, the decoder is stopped.
+ */
+static struct drgn_error *decoder_read(struct drgn_compressed_file *file,
+				       void *buf, size_t count, size_t *ret)
+{
+	struct drgn_error *err;
+	bool end = false;
+
+	switch (file->format) {
+	case DRGN_COMPRESSION_GZIP:
+		err = gzip_read(file, buf, count, ret, &end);
+		break;
+	case DRGN_COMPRESSION_XZ:
+		err = xz_read(file, buf, count, ret, &end);
+		break;
+#ifdef WITH_ZSTD
+	case DRGN_COMPRESSION_ZSTD:
+		err = zstd_read(file, buf, count, ret, &end);
+		break;
+#endif
+	default:
+		DRGN_UNREACHABLE();
+	}
+	if (err) {
+		decoder_stop(file);
+		return err;
+	}
+	file->decoder_offset += *ret;
+	if (end)
+		decoder_stop(file);
+	return NULL;
+}
+
+/* Find the last access point at or before the given uncompressed offset. */
+static size_t find_access_point(struct drgn_compressed_file *file,
+				uint64_t offset)
+{
+	size_t lo = 0, hi = file->num_points;
+
+	while (hi - lo > 1) {
+		size_t mid = lo + (hi - lo) / 2;
+
+		if (file->points[mid].uncompressed_offset <= offset)
+			lo = mid;
+		else
+			hi = mid;
+	}
+	return lo;
+}
+
+static struct drgn_error *fill_chunk(struct drgn_compressed_file *file,
+				     uint64_t index,
+				     struct drgn_compressed_chunk *chunk)
+{
+	struct drgn_error *err;
+	uint64_t start = index * DRGN_COMPRESSED_FILE_CHUNK_SIZE;
+	uint64_t end = min(start + DRGN_COMPRESSED_FILE_CHUNK_SIZE,
+			   file->size);
+	uint64_t offset = start;
+
+	while (offset < end) {
+		size_t i, n;
+		bool restarted = false;
+
+		/*
+		 * Keep going with the current decoder if the offset is ahead of
+		 * it and there is no closer access point.
+		 */
+		i = find_access_point(file, offset);
+		if (!file->decoding || file->decoder_offset > offset ||
+		    file->points[i].uncompressed_offset > file->decoder_offset) {
+			err = decoder_start(file, i);
+			if (err)
+				return err;
+			restarted = true;
+		}
+
+		/* Skip to the offset, using the chunk as scratch space. */
+		while (file->decoding && file->decoder_offset < offset) {
+			err = decoder_read(file, chunk->data,
+					   min(offset - file->decoder_offset,
+					       (uint64_t)DRGN_COMPRESSED_FILE_CHUNK_SIZE),
+					   &n);
+			if (err)
+				return err;
+		}
+
+		n = 0;
+		if (file->decoding) {
+			err = decoder_read(file, chunk->data + (offset - start),
+					   end - offset, &n);
+			if (err)
+				return err;
+			offset += n;
+		}
+		if (restarted && !n && !file->decoding) {
+			return drgn_error_create(DRGN_ERROR_OTHER,
+						 "compressed file is corrupt or its index is out of date");
+		}
+	}
+	chunk->size = end - start;
+	return NULL;
+}
+
+static struct drgn_error *get_chunk(struct drgn_compressed_file *file,
+				    uint64_t index,
+				    struct drgn_compressed_chunk **ret)
+{
+	struct drgn_error *err;
+	struct drgn_compressed_chunk *victim = NULL;
+	size_t i;
+
+	for (i = 0; i < ARRAY_SIZE(file->chunks); i++) {
+		struct drgn_compressed_chunk *chunk = &file->chunks[i];
+
+		if (chunk->index == index) {
+			chunk->last_used = ++file->clock;
+			*ret = chunk;
+			return NULL;
+		}
+		if (!victim || chunk->last_used < victim->last_used)
+			victim = chunk;
+	}
+
+	if (!victim->data) {
+		victim->data = malloc(DRGN_COMPRESSED_FILE_CHUNK_SIZE);
+		if (!victim->data)
+			return &drgn_enomem;
+	}
+	victim->index = UINT64_MAX;
+	victim->last_used = 0;
+	err = fill_chunk(file, index, victim);
+	if (err)
+		return err;
+	victim->index = index;
+	victim->last_used = ++file->clock;
+	*ret = victim;
+	return NULL;
+}
+
+struct drgn_error *drgn_compressed_file_pread(struct drgn_compressed_file *file,
+					      void *buf, size_t count,
+					      uint64_t offset, size_t *ret)
+{
+	struct drgn_error *err;
+	char *p = buf;
+	size_t done = 0;
+
+	if (offset >= file->size) {
+		*ret = 0;
+		return NULL;
+	}
+	count = min((uint64_t)count, file->size - offset);
+	while (done < count) {
+		struct drgn_compressed_chunk *chunk;
+		size_t chunk_offset, n;
+
+		err = get_chunk(file, offset / DRGN_COMPRESSED_FILE_CHUNK_SIZE,
+				&chunk);
+		if (err)
+			return err;
+		chunk_offset = offset % DRGN_COMPRESSED_FILE_CHUNK_SIZE;
+		n = min(count - done, chunk->size - chunk_offset);
+		memcpy(p + done, chunk->data + chunk_offset, n);
+		done += n;
+		offset += n;
+	}
+	*ret = count;
+	return NULL;
+}
+
+uint64_t drgn_compressed_file_size(struct drgn_compressed_file *file)
+{
+	return file->size;
+}
+
+/*
+ * The index file saved next to a compressed file: a header followed by an
+ * entry for each access point, each followed by its gzip window if it has one.
+ * It is only intended to be read on the same machine, so it is in host byte
+ * order.
+ */
+#define INDEX_MAGIC "DRGNCIDX"
+#define INDEX_VERSION 1
+
+struct index_header {
+	char magic[8];
+	uint32_t version;
+	uint32_t format;
+	/* Size and modification time of the compressed file. */
+	uint64_t file_size;
+	int64_t mtime_sec;
+	int64_t mtime_nsec;
+	uint64_t size;
+	uint64_t num_points;
+};
+
+struct index_entry {
+	uint64_t uncompressed_offset;
+	uint64_t compressed_offset;
+	uint32_t flags;
+	uint32_t has_window;
+};
+
+static char *index_path(const char *path)
+{
+	char *ret;
+
+	if (asprintf(&ret, "%s.drgnidx", path) == -1)
+		return NULL;
+	return ret;
+}
+
+static void index_header_init(struct index_header *header,
+			      struct drgn_compressed_file *file,
+			      const struct stat *st)
+{
+	memset(header, 0, sizeof(*header));
+	memcpy(header->magic, INDEX_MAGIC, sizeof(header->magic));
+	header->version = INDEX_VERSION;
+	header->format = file->format;
+	header->file_size = st->st_size;
+	header->mtime_sec = st->st_mtim.tv_sec;
+	header->mtime_nsec = st->st_mtim.tv_nsec;
+	header->size = file->size;
+}
+
+/*
+ * Load a saved index. Returns false if there is no valid index for the file,
+ * in which case it must be built.
+ */
+static bool load_index(struct drgn_compressed_file *file, const char *path,
+		       const struct stat *st,
+		       struct access_point_vector *points)
+{
+	struct index_header header, expected;
+	char *idx_path;
+	FILE *f;
+	uint64_t i;
+	bool ret = false;
+
+	idx_path = index_path(path);
+	if (!idx_path)
+		return false;
+	f = fopen(idx_path, "r");
+	free(idx_path);
+	if (!f)
+		return false;
+
+	if (fread(&header, sizeof(header), 1, f) != 1)
+		goto out;
+	index_header_init(&expected, file, st);
+	expected.size = header.size;
+	expected.num_points = header.num_points;
+	if (memcmp(&header, &expected, sizeof(header)) != 0 ||
+	    !header.num_points || header.num_points > st->st_size ||
+	    !access_point_vector_reserve(points, header.num_points))
+		goto out;
+
+	for (i = 0; i < header.num_points; i++) {
+		struct index_entry entry;
+		unsigned char *window = NULL;
+
+		if (fread(&entry, sizeof(entry), 1, f) != 1 ||
+		    entry.compressed_offset > st->st_size ||
+		    entry.uncompressed_offset > header.size ||
+		    (i == 0 ? entry.uncompressed_offset != 0 :
+		     entry.uncompressed_offset <
+		     points->data[i - 1].uncompressed_offset))
+			goto out;
+		if (header.format == DRGN_COMPRESSION_GZIP &&
+		    !(entry.flags & GZIP_MEMBER_START)) {
+			if (entry.flags > 7 || !entry.has_window ||
+			    entry.compressed_offset < 1)
+				goto out;
+		} else if (entry.has_window) {
+			goto out;
+		}
+		if (entry.has_window) {
+			window = malloc(GZIP_WINDOW_SIZE);
+			if (!window)
+				goto out;
+			if (fread(window, GZIP_WINDOW_SIZE, 1, f) != 1) {
+				free(window);
+				goto out;
+			}
+		}
+		add_access_point(points, entry.uncompressed_offset,
+				 entry.compressed_offset, entry.flags, window);
+	}
+	file->size = header.size;
+	ret = true;
+out:
+	if (!ret) {
+		for (i = 0; i < points->size; i++)
+			free(points->data[i].window);
+		points->size = 0;
+	}
+	fclose(f);
+	return ret;
+}
+
+/* Save the index next to the file. This is best effort. */
+static void save_index(struct drgn_compressed_file *file, const char *path,
+		       const struct stat *st)
+{
+	struct index_header header;
+	char *idx_path, *tmp_path;
+	FILE *f;
+	int fd;
+	size_t i;
+	bool ok;
+
+	idx_path = index_path(path);
+	if (!idx_path)
+		return;
+	if (asprintf(&tmp_path, "%s.XXXXXX", idx_path) == -1)
+		goto out_idx_path;
+	fd = mkstemp(tmp_path);
+	if (fd == -1)
+		goto out_tmp_path;
+	f = fdopen(fd, "w");
+	if (!f) {
+		close(fd);
+		goto out_unlink;
+	}
+
+	index_header_init(&header, file, st);
+	header.num_points = file->num_points;
+	ok = fwrite(&header, sizeof(header), 1, f) == 1;
+	for (i = 0; ok && i < file->num_points; i++) {
+		struct index_entry entry = {
+			.uncompressed_offset = file->points[i].uncompressed_offset,
+			.compressed_offset = file->points[i].compressed_offset,
+			.flags = file->points[i].flags,
+			.has_window = file->points[i].window != NULL,
+		};
+
+		ok = fwrite(&entry, sizeof(entry), 1, f) == 1;
+		if (ok && file->points[i].window) {
+			ok = fwrite(file->points[i].window, GZIP_WINDOW_SIZE, 1,
+				    f) == 1;
+		}
+	}
+	if (fclose(f) == EOF)
+		ok = false;
+	if (ok && rename(tmp_path, idx_path) == 0)
+		goto out_tmp_path;
+out_unlink:
+	unlink(tmp_path);
+out_tmp_path:
+	free(tmp_path);
+out_idx_path:
+	free(idx_path);
+}
+
+struct drgn_error *drgn_compressed_file_open(int fd, const char *path,
+					     struct drgn_compressed_file **ret)
+{
+	static const unsigned char gzip_magic[] = { 0x1f, 0x8b };
+	static const unsigned char xz_magic[] = { 0xfd, '7', 'z', 'X', 'Z', 0 };
+	static const unsigned char zstd_magic[] = { 0x28, 0xb5, 0x2f, 0xfd };
+	struct drgn_error *err;
+	unsigned char magic[6];
+	enum drgn_compression_format format;
+	struct drgn_compressed_file *file;
+	struct access_point_vector points;
+	struct stat st;
+	size_t n, i;
+
+	err = read_at(fd, magic, sizeof(magic), 0, &n);
+	if (err)
+		return err;
+	if (n >= sizeof(gzip_magic) &&
+	    memcmp(magic, gzip_magic, sizeof(gzip_magic)) == 0) {
+		format = DRGN_COMPRESSION_GZIP;
+	} else if (n >= sizeof(xz_magic) &&
+		   memcmp(magic, xz_magic, sizeof(xz_magic)) == 0) {
+		format = DRGN_COMPRESSION_XZ;
+	} else if (n >= sizeof(zstd_magic) &&
+		   memcmp(magic, zstd_magic, sizeof(zstd_magic)) == 0) {
+#ifdef WITH_ZSTD
+		format = DRGN_COMPRESSION_ZSTD;
+#else
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "drgn was built without zstd support");
+#endif
+	} else {
+		*ret = NULL;
+		return NULL;
+	}
+
+	if (fstat(fd, &st) == -1)
+		return drgn_error_create_os("fstat", errno, path);
+
+	file = calloc(1, sizeof(*file));
+	if (!file)
+		return &drgn_enomem;
+	file->fd = fd;
+	file->format = format;
+	for (i = 0; i < ARRAY_SIZE(file->chunks); i++)
+		file->chunks[i].index = UINT64_MAX;
+	file->input = malloc(INPUT_BUFFER_SIZE);
+	if (!file->input) {
+		err = &drgn_enomem;
+		goto err;
+	}
+#ifdef WITH_ZSTD
+	if (format == DRGN_COMPRESSION_ZSTD) {
+		file->zstd = ZSTD_createDStream();
+		if (!file->zstd) {
+			err = &drgn_enomem;
+			goto err;
+		}
+		/*
+		 * Allow the large windows used by zstd --long, which the
+		 * decoder rejects by default.
+		 */
+		ZSTD_DCtx_setParameter(file->zstd, ZSTD_d_windowLogMax,
+				       sizeof(size_t) == 4 ? 30 : 31);
+	}
+#endif
+
+	access_point_vector_init(&points);
+	if (format == DRGN_COMPRESSION_XZ) {
+		/* xz files already have an index. */
+		err = xz_read_index(file, st.st_size, &points);
+	} else if (load_index(file, path, &st, &points)) {
+		err = NULL;
+	} else {
+		if (format == DRGN_COMPRESSION_GZIP)
+			err = gzip_build_index(file, &points);
+#ifdef WITH_ZSTD
+		else
+			err = zstd_build_index(file, &points);
+#endif
+		if (!err) {
+			file->points = points.data;
+			file->num_points = points.size;
+			save_index(file, path, &st);
+		}
+	}
+	if (err) {
+		free_access_points(points.data, points.size);
+		goto err;
+	}
+	if (!points.size) {
+		/* The file is empty. */
+		err = add_access_point(&points, 0, 0, 0, NULL);
+		if (err) {
+			access_point_vector_deinit(&points);
+			goto err;
+		}
+	}
+	access_point_vector_shrink_to_fit(&points);
+	file->points = points.data;
+	file->num_points = points.size;
+	*ret = file;
+	return NULL;
+
+err:
+	drgn_compressed_file_destroy(file);
+	return err;
+}
+
+void drgn_compressed_file_destroy(struct drgn_compressed_file *file)
+{
+	size_t i;
+
+	if (!file)
+		return;
+	decoder_stop(file);
+	for (i = 0; i < ARRAY_SIZE(file->chunks); i++)
+		free(file->chunks[i].data);
+	free_access_points(file->points, file->num_points);
+#ifdef WITH_ZSTD
+	ZSTD_freeDStream(file->zstd);
+#endif
+	free(file->input);
+	free(file);
+}
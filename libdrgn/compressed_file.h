@@ -0,0 +1,99 @@
+// Copyright 2019 - Omar Sandoval
+// SPDX-License-Identifier: GPL-3.0+
+
+/**
+ * @file
+ *
+ * Random access to compressed files.
+ *
+ * See @ref CompressedFile.
+ */
+
+#ifndef DRGN_COMPRESSED_FILE_H
+#define DRGN_COMPRESSED_FILE_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include "drgn.h"
+
+/**
+ * @ingroup Internals
+ *
+ * @defgroup CompressedFile Compressed files
+ *
+ * Random access to gzip, xz, and zstd compressed files.
+ *
+ * None of these formats support seeking by themselves, so a compressed file is
+ * opened with an index of <em>access points</em>: positions in the compressed
+ * stream where decompression can start. For xz, these are the blocks listed in
+ * the index at the end of each stream. For zstd, these are the starts of
+ * frames. For gzip, these are the starts of members plus a checkpoint roughly
+ * every @ref DRGN_COMPRESSED_FILE_GZIP_SPAN bytes of uncompressed data, which
+ * saves the last 32 KiB of uncompressed data (the deflate window) so that
+ * decompression can resume there.
+ *
+ * Finding the access points of gzip and zstd files requires decompressing the
+ * whole file once, so the index is saved next to the file (as
+ * <tt>path.drgnidx</tt>) and reused as long as the file is not modified. If the
+ * index can't be saved, it is rebuilt every time the file is opened.
+ *
+ * Reads decompress @ref DRGN_COMPRESSED_FILE_CHUNK_SIZE byte chunks starting
+ * from the nearest access point and keep the most recently used chunks in an
+ * LRU cache. The decoder is also kept between reads, so reading a file
+ * sequentially decompresses it once.
+ *
+ * @{
+ */
+
+/** Size of the chunks of decompressed data that are cached. */
+#define DRGN_COMPRESSED_FILE_CHUNK_SIZE (256 * 1024)
+/** Maximum number of decompressed chunks that are cached. */
+#define DRGN_COMPRESSED_FILE_MAX_CHUNKS 64
+/** Approximate distance between checkpoints in a gzip file. */
+#define DRGN_COMPRESSED_FILE_GZIP_SPAN (1024 * 1024)
+
+struct drgn_compressed_file;
+
+/**
+ * Open a compressed file.
+ *
+ * The format is detected from the magic number at the start of the file. If the
+ * file is not compressed in a supported format, this succeeds and returns @c
+ * NULL.
+ *
+ * @param[in] fd File descriptor of the file. This is not closed by @ref
+ * drgn_compressed_file_destroy(), so it must remain open until then.
+ * @param[in] path Path of the file. The index is saved next to it.
+ * @param[out] ret Returned file, or @c NULL if the file is not compressed.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_compressed_file_open(int fd, const char *path,
+					     struct drgn_compressed_file **ret);
+
+/** Free a @ref drgn_compressed_file. */
+void drgn_compressed_file_destroy(struct drgn_compressed_file *file);
+
+/** Get the uncompressed size of a @ref drgn_compressed_file. */
+uint64_t drgn_compressed_file_size(struct drgn_compressed_file *file);
+
+/**
+ * Read uncompressed data from a @ref drgn_compressed_file.
+ *
+ * Like @c pread(), this may return fewer bytes than requested if the read
+ * extends past the end of the file.
+ *
+ * @param[out] buf Buffer to read into.
+ * @param[in] count Number of bytes to read.
+ * @param[in] offset Offset in the uncompressed data to read from.
+ * @param[out] ret Number of bytes read. This is zero if @p offset is at or
+ * past the end of the file.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_compressed_file_pread(struct drgn_compressed_file *file,
+					      void *buf, size_t count,
+					      uint64_t offset, size_t *ret);
+
+/** @} */
+
+#endif /* DRGN_COMPRESSED_FILE_H */
@@ -0,0 +1,294 @@
+// Copyright 2019 - Omar Sandoval
+// SPDX-License-Identifier: GPL-3.0+
+
+#include <byteswap.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <gelf.h>
+#include <inttypes.h>
+#include <stdio.h>
+#include <string.h>
+#include <unistd.h>
+
+#include "internal.h"
+#include "core_writer.h"
+#include "memory_reader.h"
+#include "program.h"
+
+/*
+ * Return whether a page continues the run of the previous page. A partial page
+ * (see drgn_memory_reader_recorded_pages()) can only end a run at its start or
+ * start a run at its end.
+ */
+static bool page_continues_run(const struct drgn_memory_cache_page *prev,
+			       const struct drgn_memory_cache_page *page)
+{
+	return (prev->valid_end == DRGN_MEMORY_CACHE_PAGE_SIZE &&
+		page->valid_start == 0 &&
+		page->address == prev->address + DRGN_MEMORY_CACHE_PAGE_SIZE);
+}
+
+static size_t count_page_runs(struct drgn_memory_cache_page * const *pages,
+			      size_t num_pages)
+{
+	size_t runs = 0, i;
+
+	for (i = 0; i < num_pages; i++) {
+		if (i == 0 || !page_continues_run(pages[i - 1], pages[i]))
+			runs++;
+	}
+	return runs;
+}
+
+/*
+ * Advance a file offset so that it is congruent to the address of the start of
+ * a run modulo the page size, as required for PT_LOAD segments. This only
+ * matters after a partial page.
+ */
+static uint64_t align_run_offset(uint64_t offset,
+				 const struct drgn_memory_cache_page *page)
+{
+	uint64_t start = page->address + page->valid_start;
+
+	return offset + ((start - offset) & (DRGN_MEMORY_CACHE_PAGE_SIZE - 1));
+}
+
+/*
+ * Fill in a PT_LOAD program header for each run of contiguous pages, starting
+ * at file offset *offset. *offset is advanced past the runs.
+ */
+static struct drgn_error *
+add_page_run_phdrs(Elf *elf, size_t *phdr_index,
+		   struct drgn_memory_cache_page * const *pages,
+		   size_t num_pages, bool physical, uint64_t no_address,
+		   uint64_t *offset)
+{
+	size_t i = 0;
+
+	while (i < num_pages) {
+		GElf_Phdr phdr = {
+			.p_type = PT_LOAD,
+			.p_flags = PF_R | PF_W | PF_X,
+			.p_align = DRGN_MEMORY_CACHE_PAGE_SIZE,
+		};
+		uint64_t start = pages[i]->address + pages[i]->valid_start;
+		uint64_t size = 0;
+
+		*offset = align_run_offset(*offset, pages[i]);
+		phdr.p_offset = *offset;
+		do {
+			size += pages[i]->valid_end - pages[i]->valid_start;
+			i++;
+		} while (i < num_pages &&
+			 page_continues_run(pages[i - 1], pages[i]));
+
+		phdr.p_vaddr = physical ? no_address : start;
+		phdr.p_paddr = physical ? start : no_address;
+		phdr.p_filesz = phdr.p_memsz = size;
+		if (!gelf_update_phdr(elf, (*phdr_index)++, &phdr))
+			return drgn_error_libelf();
+		*offset += size;
+	}
+	return NULL;
+}
+
+static struct drgn_error *pwrite_all(int fd, const void *buf, size_t count,
+				     uint64_t offset)
+{
+	const char *p = buf;
+
+	while (count) {
+		ssize_t ret;
+
+		ret = pwrite(fd, p, count, offset);
+		if (ret == -1) {
+			if (errno == EINTR)
+				continue;
+			return drgn_error_create_os("pwrite", errno, NULL);
+		}
+		p += ret;
+		count -= ret;
+		offset += ret;
+	}
+	return NULL;
+}
+
+static struct drgn_error *
+write_pages(int fd, struct drgn_memory_cache_page * const *pages,
+	    size_t num_pages, uint64_t *offset)
+{
+	struct drgn_error *err;
+	size_t i;
+
+	for (i = 0; i < num_pages; i++) {
+		size_t size = pages[i]->valid_end - pages[i]->valid_start;
+
+		if (i == 0 || !page_continues_run(pages[i - 1], pages[i]))
+			*offset = align_run_offset(*offset, pages[i]);
+		err = pwrite_all(fd, pages[i]->data + pages[i]->valid_start,
+				 size, *offset);
+		if (err)
+			return err;
+		*offset += size;
+	}
+	return NULL;
+}
+
+/* Build a VMCOREINFO note in the byte order of the core dump. */
+static size_t build_vmcoreinfo_note(struct drgn_program *prog, char *buf,
+				    size_t size, bool bswap)
+{
+	static const char name[] = "VMCOREINFO";
+	char desc[256];
+	uint32_t words[3];
+	size_t namesz, descsz, len;
+
+	descsz = snprintf(desc, sizeof(desc),
+			  "OSRELEASE=%s\nPAGESIZE=%" PRIu64 "\nKERNELOFFSET=%" PRIx64 "\nNUMBER(pgtable_l5_enabled)=%d\n",
+			  prog->vmcoreinfo.osrelease,
+			  prog->vmcoreinfo.page_size,
+			  prog->vmcoreinfo.kaslr_offset,
+			  prog->vmcoreinfo.pgtable_l5_enabled);
+	if (descsz >= sizeof(desc))
+		descsz = sizeof(desc) - 1;
+	namesz = sizeof(name);
+	words[0] = namesz;
+	words[1] = descsz;
+	words[2] = 0;
+	if (bswap) {
+		words[0] = bswap_32(words[0]);
+		words[1] = bswap_32(words[1]);
+	}
+
+	len = sizeof(words) + ((namesz + 3) & ~3) + ((descsz + 3) & ~3);
+	if (len > size)
+		return 0;
+	memset(buf, 0, len);
+	memcpy(buf, words, sizeof(words));
+	memcpy(buf + sizeof(words), name, namesz);
+	memcpy(buf + sizeof(words) + ((namesz + 3) & ~3), desc, descsz);
+	return len;
+}
+
+struct drgn_error *
+drgn_write_core_dump(struct drgn_program *prog, const char *path,
+		     struct drgn_memory_cache_page * const *virtual_pages,
+		     size_t num_virtual_pages,
+		     struct drgn_memory_cache_page * const *physical_pages,
+		     size_t num_physical_pages)
+{
+	struct drgn_error *err;
+	bool is_64_bit, is_little_endian;
+	uint64_t no_address, offset, note_offset, data_offset;
+	char note[512];
+	size_t note_size = 0, phnum, phdr_index = 0;
+	GElf_Ehdr ehdr_mem, *ehdr;
+	Elf *elf;
+	int fd;
+
+	if (!prog->has_platform) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "cannot write core dump of program with unknown platform");
+	}
+	is_64_bit = prog->platform.flags & DRGN_PLATFORM_IS_64_BIT;
+	is_little_endian = prog->platform.flags & DRGN_PLATFORM_IS_LITTLE_ENDIAN;
+	no_address = is_64_bit ? UINT64_MAX : UINT32_MAX;
+
+	if (prog->flags & DRGN_PROGRAM_IS_LINUX_KERNEL) {
+		note_size = build_vmcoreinfo_note(prog, note, sizeof(note),
+						  is_little_endian !=
+						  (__BYTE_ORDER__ ==
+						   __ORDER_LITTLE_ENDIAN__));
+	}
+	phnum = (count_page_runs(virtual_pages, num_virtual_pages) +
+		 count_page_runs(physical_pages, num_physical_pages) +
+		 (note_size != 0));
+
+	fd = open(path, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+	if (fd == -1)
+		return drgn_error_create_os("open", errno, path);
+
+	elf_version(EV_CURRENT);
+	elf = elf_begin(fd, ELF_C_WRITE, NULL);
+	if (!elf) {
+		err = drgn_error_libelf();
+		goto out_fd;
+	}
+	if (!gelf_newehdr(elf, is_64_bit ? ELFCLASS64 : ELFCLASS32) ||
+	    !gelf_newphdr(elf, phnum) ||
+	    !(ehdr = gelf_getehdr(elf, &ehdr_mem))) {
+		err = drgn_error_libelf();
+		goto out_elf;
+	}
+	drgn_platform_to_elf(&prog->platform, ehdr);
+	ehdr->e_type = ET_CORE;
+	ehdr->e_version = EV_CURRENT;
+	ehdr->e_ehsize = gelf_fsize(elf, ELF_T_EHDR, 1, EV_CURRENT);
+	ehdr->e_phentsize = gelf_fsize(elf, ELF_T_PHDR, 1, EV_CURRENT);
+	ehdr->e_phoff = ehdr->e_ehsize;
+	if (!gelf_update_ehdr(elf, ehdr)) {
+		err = drgn_error_libelf();
+		goto out_elf;
+	}
+
+	note_offset = ehdr->e_phoff + (uint64_t)ehdr->e_phentsize * phnum;
+	if (note_size) {
+		GElf_Phdr phdr = {
+			.p_type = PT_NOTE,
+			.p_offset = note_offset,
+			.p_filesz = note_size,
+			.p_align = 4,
+		};
+
+		if (!gelf_update_phdr(elf, phdr_index++, &phdr)) {
+			err = drgn_error_libelf();
+			goto out_elf;
+		}
+	}
+	/* Page-align the data so that it can be mapped efficiently. */
+	data_offset = ((note_offset + note_size +
+			DRGN_MEMORY_CACHE_PAGE_SIZE - 1) &
+		       ~(DRGN_MEMORY_CACHE_PAGE_SIZE - 1));
+	offset = data_offset;
+	err = add_page_run_phdrs(elf, &phdr_index, virtual_pages,
+				 num_virtual_pages, false, no_address, &offset);
+	if (err)
+		goto out_elf;
+	err = add_page_run_phdrs(elf, &phdr_index, physical_pages,
+				 num_physical_pages, true, no_address, &offset);
+	if (err)
+		goto out_elf;
+
+	elf_flagelf(elf, ELF_C_SET, ELF_F_LAYOUT);
+	if (elf_update(elf, ELF_C_WRITE) < 0) {
+		err = drgn_error_libelf();
+		goto out_elf;
+	}
+	elf_end(elf);
+	elf = NULL;
+
+	err = pwrite_all(fd, note, note_size, note_offset);
+	if (err)
+		goto out_fd;
+	offset = data_offset;
+	err = write_pages(fd, virtual_pages, num_virtual_pages, &offset);
+	if (err)
+		goto out_fd;
+	err = write_pages(fd, physical_pages, num_physical_pages, &offset);
+	if (err)
+		goto out_fd;
+	if (close(fd) == -1) {
+		fd = -1;
+		err = drgn_error_create_os("close", errno, path);
+		goto out_fd;
+	}
+	return NULL;
+
+out_elf:
+	elf_end(elf);
+out_fd:
+	if (fd != -1)
+		close(fd);
+	unlink(path);
+	return err;
+}
@@ -0,0 +1,64 @@
+// Copyright 2019 - Omar Sandoval
+// SPDX-License-Identifier: GPL-3.0+
+
+/**
+ * @file
+ *
+ * ELF core dump writer.
+ *
+ * See @ref CoreWriter.
+ */
+
+#ifndef DRGN_CORE_WRITER_H
+#define DRGN_CORE_WRITER_H
+
+#include <stddef.h>
+
+#include "drgn.h"
+
+struct drgn_memory_cache_page;
+
+/**
+ * @ingroup Internals
+ *
+ * @defgroup CoreWriter Core dump writer
+ *
+ * Writing captured memory to an ELF core dump.
+ *
+ * The core dump is sparse: it only contains the pages that were captured, with
+ * a @c PT_LOAD segment for each run of contiguous pages. A page which is only
+ * partially valid (see @ref drgn_memory_cache_page::valid_start) only
+ * contributes its valid bytes, so it ends or begins a run. Virtual pages have
+ * an invalid (all ones) @c p_paddr, and physical pages have an invalid @c
+ * p_vaddr. If the program is the Linux kernel, a @c VMCOREINFO note is
+ * included so that the core dump is also recognized as the Linux kernel when
+ * it is opened with @ref drgn_program_set_core_dump().
+ *
+ * @{
+ */
+
+/**
+ * Write pages of a program's memory to an ELF core dump.
+ *
+ * @param[in] prog Program that the pages were read from. Its platform must be
+ * known.
+ * @param[in] path Path of the core dump to create. If it already exists, it is
+ * overwritten.
+ * @param[in] virtual_pages Virtual memory pages sorted by address and then by
+ * @ref drgn_memory_cache_page::valid_start.
+ * @param[in] num_virtual_pages Number of virtual memory pages.
+ * @param[in] physical_pages Physical memory pages sorted like @p
+ * virtual_pages.
+ * @param[in] num_physical_pages Number of physical memory pages.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *
+drgn_write_core_dump(struct drgn_program *prog, const char *path,
+		     struct drgn_memory_cache_page * const *virtual_pages,
+		     size_t num_virtual_pages,
+		     struct drgn_memory_cache_page * const *physical_pages,
+		     size_t num_physical_pages);
+
+/** @} */
+
+#endif /* DRGN_CORE_WRITER_H */
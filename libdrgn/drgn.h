@@ -1092,6 +1092,9 @@ drgn_program_add_object_finder(struct drgn_program *prog,
 /**
  * Set a @ref drgn_program to a core dump.
  *
+ * The core dump may be compressed with gzip, xz, or zstd, in which case only
+ * the parts that are read are decompressed.
+ *
  * @sa drgn_program_from_core_dump()
  *
  * @param[in] path Core dump file path.
@@ -1117,6 +1120,49 @@ struct drgn_error *drgn_program_set_kernel(struct drgn_program *prog);
  */
 struct drgn_error *drgn_program_set_pid(struct drgn_program *prog, pid_t pid);
 
+/** Method used to read the memory of a running process. */
+enum drgn_process_memory_backend {
+	/**
+	 * Use @c process_vm_readv(), falling back to @c /proc/$pid/mem if the
+	 * system call is not permitted.
+	 */
+	DRGN_PROCESS_MEMORY_AUTO,
+	/** Only use @c process_vm_readv(). */
+	DRGN_PROCESS_MEMORY_VM_READV,
+	/** Only use @c /proc/$pid/mem. */
+	DRGN_PROCESS_MEMORY_PROC_MEM,
+} __attribute__((packed));
+
+/**
+ * Set a @ref drgn_program to a running process, reading its memory with the
+ * given backend.
+ *
+ * @ref drgn_program_set_pid() is equivalent to this with @ref
+ * DRGN_PROCESS_MEMORY_AUTO.
+ *
+ * @param[in] pid Process ID.
+ * @param[in] backend Backend to read memory with.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *
+drgn_program_set_pid_with_backend(struct drgn_program *prog, pid_t pid,
+				  enum drgn_process_memory_backend backend);
+
+/**
+ * Set a @ref drgn_program to memory served by a remote memory server over a
+ * Unix socket.
+ *
+ * The server determines the platform of the program and whether it is the
+ * Linux kernel. Reads are pipelined, and the memory is cached (see @ref
+ * drgn_program_set_memory_cache()) even if the server says that the program
+ * is running, since every cache miss costs a round trip to the server.
+ *
+ * @param[in] path Path of the server's Unix socket.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_set_remote(struct drgn_program *prog,
+					   const char *path);
+
 /** Load debugging information for a list of executable or library files. */
 struct drgn_error *drgn_program_load_debug_info(struct drgn_program *prog,
 						const char **paths, size_t n);
@@ -1128,6 +1174,73 @@ struct drgn_error *drgn_program_load_debug_info(struct drgn_program *prog,
 struct drgn_error *
 drgn_program_load_default_debug_info(struct drgn_program *prog);
 
+/**
+ * Set the directory used to cache the index of debugging information.
+ *
+ * Indexing the debugging information of a large program (e.g., the Linux
+ * kernel and its modules) dominates the time it takes to load it. When a cache
+ * directory is set, the index of each file with a build ID is saved in the
+ * directory the first time the file is loaded, and later loads of a file with
+ * the same build ID use the saved index instead. Files without a build ID are
+ * always indexed.
+ *
+ * This only affects debugging information loaded after it is called.
+ *
+ * @param[in] path Cache directory, or @c NULL to not use a cache (the
+ * default). The directory is created if it doesn't exist, but its parent
+ * directory must exist.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_set_debug_info_cache(struct drgn_program *prog,
+						     const char *path);
+
+/**
+ * Set whether to defer indexing Linux kernel modules until they are needed.
+ *
+ * When this is enabled, @ref drgn_program_load_default_debug_info() for the
+ * Linux kernel only indexes @c vmlinux. Loaded kernel modules are found and
+ * reported with their address ranges, but they are only indexed the first
+ * time that a type or object lookup isn't answered by any finder (including
+ * the debugging information indexed so far), or that a symbol lookup falls
+ * inside of the module. Kernel modules whose files have no debugging information are not
+ * reported as missing until then, and are then dropped silently.
+ *
+ * This only affects debugging information loaded after it is called.
+ *
+ * @param[in] lazy Whether to defer indexing. It is disabled by default.
+ */
+void drgn_program_set_lazy_module_indexing(struct drgn_program *prog,
+					   bool lazy);
+
+/** Information about a file that debugging information was loaded from. */
+struct drgn_module_info {
+	/** Name of the module (usually the path of the file). */
+	const char *name;
+	/** Start address of the module, or 0 if it is not loaded. */
+	uint64_t start;
+	/** End address of the module, or 0 if it is not loaded. */
+	uint64_t end;
+	/**
+	 * Whether the module's debugging information has been indexed. This is
+	 * @c false if indexing was deferred (see @ref
+	 * drgn_program_set_lazy_module_indexing()).
+	 */
+	bool indexed;
+};
+
+/**
+ * Get the modules that debugging information was loaded from.
+ *
+ * @param[out] ret Returned array of modules. It must be freed with @c free().
+ * The names are only valid until debugging information is next loaded or
+ * indexed.
+ * @param[out] count_ret Returned number of modules.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_modules(struct drgn_program *prog,
+					struct drgn_module_info **ret,
+					size_t *count_ret);
+
 /**
  * Create a @ref drgn_program from a core dump file.
  *
@@ -1189,6 +1302,411 @@ struct drgn_error *drgn_program_read_memory(struct drgn_program *prog,
 					    void *buf, uint64_t address,
 					    size_t count, bool physical);
 
+/**
+ * Get a pointer to a program's memory without copying it, if possible.
+ *
+ * This is possible when the memory is in a core dump that is mapped into memory
+ * and the range does not extend past the data in the file. Otherwise, the
+ * memory must be read with @ref drgn_program_read_memory().
+ *
+ * @param[in] prog Program to read from.
+ * @param[in] address Starting address in memory.
+ * @param[in] count Number of bytes.
+ * @param[in] physical Whether @c address is physical.
+ * @return Read-only pointer to the memory, which remains valid until the
+ * program is destroyed, or @c NULL if the memory cannot be mapped.
+ */
+const void *drgn_program_map_memory(struct drgn_program *prog,
+				    uint64_t address, size_t count,
+				    bool physical);
+
+/**
+ * Translate a virtual address to a physical address by walking a page table.
+ *
+ * This is only supported for some architectures (currently x86-64). Page
+ * table entries are read from the program's physical memory, so this works
+ * even if the virtual address is not in any memory segment of the program.
+ * For the Linux kernel, 5-level page tables are used if the VMCOREINFO says
+ * that they are enabled; otherwise, 4-level page tables are used.
+ *
+ * Translations are cached by page table and page until @ref
+ * drgn_program_invalidate_memory_cache() is called, except for running
+ * programs.
+ *
+ * @param[in] prog Program to translate for.
+ * @param[in] address Virtual address to translate.
+ * @param[in] pgd Physical address of the top-level page table (e.g., the
+ * value of the CR3 register on x86-64).
+ * @param[out] ret Returned physical address.
+ * @return @c NULL on success, non-@c NULL on error. If the address is not
+ * mapped by the page table, the error code is @ref DRGN_ERROR_FAULT.
+ */
+struct drgn_error *drgn_program_translate(struct drgn_program *prog,
+					  uint64_t address, uint64_t pgd,
+					  uint64_t *ret);
+
+/**
+ * Read from a program's memory through a page table.
+ *
+ * This is like @ref drgn_program_read_memory() with a virtual address, but the
+ * address is translated with @ref drgn_program_translate() and the memory is
+ * read from physical memory. This can be used to read the memory of a user
+ * task from a Linux kernel core dump or virtual memory which is not in the
+ * segments of a core dump.
+ *
+ * @param[in] prog Program to read from.
+ * @param[out] buf Buffer to read into.
+ * @param[in] address Starting virtual address in memory to read.
+ * @param[in] count Number of bytes to read.
+ * @param[in] pgd Physical address of the top-level page table.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_read_memory_pgd(struct drgn_program *prog,
+						void *buf, uint64_t address,
+						size_t count, uint64_t pgd);
+
+/** Request to read memory for @ref drgn_program_read_memory_vec(). */
+struct drgn_memory_read_request {
+	/** Buffer to read into. */
+	void *buf;
+	/** Starting address in memory to read. */
+	uint64_t address;
+	/** Number of bytes to read. */
+	size_t count;
+	/**
+	 * Returned error for this request, or @c NULL if it was read
+	 * successfully. This must be freed with @ref drgn_error_destroy().
+	 */
+	struct drgn_error *err;
+};
+
+/**
+ * Read multiple ranges of a program's memory.
+ *
+ * This is equivalent to calling @ref drgn_program_read_memory() for each
+ * request, but requests are sorted by address and adjacent or overlapping
+ * ranges are coalesced into a single read.
+ *
+ * @param[in] prog Program to read from.
+ * @param[in,out] reqs Requests to read. On return, @ref
+ * drgn_memory_read_request::err is set for each request.
+ * @param[in] n Number of requests.
+ * @param[in] physical Whether the addresses are physical. See @ref
+ * drgn_program_read_memory().
+ * @return @c NULL if every request was processed, even if some of them failed
+ * with a fault, in which case their @ref drgn_memory_read_request::err is set.
+ * Non-@c NULL if another kind of error occurred, in which case no @ref
+ * drgn_memory_read_request::err needs to be freed.
+ */
+struct drgn_error *
+drgn_program_read_memory_vec(struct drgn_program *prog,
+			     struct drgn_memory_read_request *reqs, size_t n,
+			     bool physical);
+
+/**
+ * Granularity of the validity bitmap returned by @ref
+ * drgn_program_read_memory_sparse().
+ */
+#define DRGN_SPARSE_READ_PAGE_SIZE 4096
+
+/**
+ * Read a range of a program's memory which may contain unreadable holes.
+ *
+ * Unlike @ref drgn_program_read_memory(), this doesn't fail when part of the
+ * range can't be read. Instead, the range is divided into pages of @ref
+ * DRGN_SPARSE_READ_PAGE_SIZE bytes (the first and last of which may be
+ * partial), and every page that can't be read in its entirety is filled with
+ * zeroes. Gaps between memory segments are skipped without being read, and a
+ * fault in a segment is narrowed down by splitting the read in half, so a large
+ * range with few holes only takes a few reads.
+ *
+ * @param[in] prog Program to read from.
+ * @param[out] buf Buffer to read into.
+ * @param[in] address Starting address in memory to read.
+ * @param[in] count Number of bytes to read.
+ * @param[in] physical Whether @c address is physical.
+ * @param[out] valid Returned bitmap with one bit for each page of the range,
+ * starting with the page containing @p address. Bit @c i (i.e., bit <tt>i %
+ * 8</tt> of byte <tt>i / 8</tt>) is set if page @c i was read and cleared if it
+ * was filled with zeroes. It must have room for <tt>(num_pages + 7) / 8</tt>
+ * bytes, where @c num_pages is <tt>(address % DRGN_SPARSE_READ_PAGE_SIZE +
+ * count + DRGN_SPARSE_READ_PAGE_SIZE - 1) / DRGN_SPARSE_READ_PAGE_SIZE</tt>
+ * (or zero if @p count is zero).
+ * @return @c NULL on success, non-@c NULL on error. Faults are not errors.
+ */
+struct drgn_error *
+drgn_program_read_memory_sparse(struct drgn_program *prog, void *buf,
+				uint64_t address, size_t count, bool physical,
+				unsigned char *valid);
+
+/**
+ * Configure the memory cache of a @ref drgn_program.
+ *
+ * The memory cache keeps recently read pages of memory so that repeated small
+ * reads of the same page don't have to go to the underlying memory segment each
+ * time. Virtual and physical memory are cached separately.
+ *
+ * Caching is enabled by default for core dumps. It is disabled by default for
+ * running programs, since their memory may change at any time.
+ *
+ * @param[in] size Maximum number of bytes to cache for each address space, or
+ * zero to disable caching. This is rounded down to a multiple of the cache page
+ * size.
+ * @param[in] max_age Maximum time in nanoseconds that a cached page is used
+ * before it is read again, or zero if cached pages should not expire.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_set_memory_cache(struct drgn_program *prog,
+						 uint64_t size,
+						 uint64_t max_age);
+
+/**
+ * Configure read-ahead for the memory cache of a @ref drgn_program.
+ *
+ * When read-ahead is enabled, a cache miss reads an aligned window of memory
+ * around the missing page instead of only that page, so walking data
+ * structures whose nodes are close together only needs a few large reads. The
+ * window adapts between one page and @p max_size depending on how much of the
+ * memory read ahead is used.
+ *
+ * Read-ahead is enabled by default when caching is enabled by default. It has
+ * no effect if caching is disabled.
+ *
+ * @param[in] max_size Maximum number of bytes to read on a cache miss, or zero
+ * to disable read-ahead. This is rounded down to a power of two times the cache
+ * page size.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_set_memory_readahead(struct drgn_program *prog,
+						     uint64_t max_size);
+
+/**
+ * Begin a consistent snapshot of a program's memory.
+ *
+ * Until the matching call to @ref drgn_program_end_snapshot(), each page of
+ * memory is read from the program the first time it is accessed, and all later
+ * reads of that page return the captured copy. This is useful for getting a
+ * consistent view of a running program across multiple reads (e.g., while
+ * walking a linked list) and avoids reading the same memory repeatedly.
+ * Snapshots may be nested; the captured pages are discarded when the outermost
+ * snapshot ends.
+ */
+void drgn_program_begin_snapshot(struct drgn_program *prog);
+
+/**
+ * End a snapshot begun by @ref drgn_program_begin_snapshot().
+ */
+void drgn_program_end_snapshot(struct drgn_program *prog);
+
+/**
+ * Save the memory captured by the active snapshot of a program as an ELF core
+ * dump.
+ *
+ * The core dump only contains the pages that were captured. It can be opened
+ * with @ref drgn_program_set_core_dump(). If the program is the Linux kernel,
+ * the core dump is also recognized as the Linux kernel.
+ *
+ * @param[in] path Path of the core dump to write.
+ * @return @c NULL on success, non-@c NULL on error (including if there is no
+ * active snapshot).
+ */
+struct drgn_error *drgn_program_save_snapshot(struct drgn_program *prog,
+					      const char *path);
+
+/**
+ * Start recording which pages of a program's memory are read.
+ *
+ * Until @ref drgn_program_stop_recording() is called, the address of every page
+ * that is read is recorded so that @ref drgn_program_write_core() can extract
+ * just those pages. Unlike a snapshot, this does not keep a copy of the pages
+ * or change what later reads return. Any pages recorded previously are
+ * forgotten.
+ */
+void drgn_program_start_recording(struct drgn_program *prog);
+
+/**
+ * Stop recording begun by @ref drgn_program_start_recording().
+ *
+ * The pages recorded so far are kept for @ref drgn_program_write_core().
+ */
+void drgn_program_stop_recording(struct drgn_program *prog);
+
+/**
+ * Write the pages recorded by @ref drgn_program_start_recording() to an ELF
+ * core dump.
+ *
+ * The pages are read again from the program. The core dump can be opened with
+ * @ref drgn_program_set_core_dump(), and reading any of the recorded memory
+ * from it returns the same contents as the program (as long as the program
+ * hasn't changed). If the program is the Linux kernel, the core dump is also
+ * recognized as the Linux kernel.
+ *
+ * This may be called while recording or after recording has stopped.
+ *
+ * @param[in] path Path of the core dump to write.
+ * @return @c NULL on success, non-@c NULL on error (including if recording was
+ * never started).
+ */
+struct drgn_error *drgn_program_write_core(struct drgn_program *prog,
+					   const char *path);
+
+/**
+ * Discard all memory cached by a @ref drgn_program.
+ *
+ * This should be called when the memory of a running program may have changed
+ * since it was last read.
+ *
+ * @sa drgn_program_set_memory_cache()
+ */
+void drgn_program_invalidate_memory_cache(struct drgn_program *prog);
+
+/** Kind of memory segment, for @ref drgn_memory_stats. */
+enum drgn_memory_segment_kind {
+	/** Segment of a core dump file. */
+	DRGN_MEMORY_SEGMENT_FILE,
+	/** Memory of a running process. */
+	DRGN_MEMORY_SEGMENT_PROCESS,
+	/** Memory served by a remote memory server. */
+	DRGN_MEMORY_SEGMENT_REMOTE,
+	/** Memory of a kdump file read with libkdumpfile. */
+	DRGN_MEMORY_SEGMENT_KDUMP,
+	/**
+	 * Any other segment, e.g., one added with @ref
+	 * drgn_program_add_memory_segment().
+	 */
+	DRGN_MEMORY_SEGMENT_OTHER,
+	DRGN_NUM_MEMORY_SEGMENT_KINDS,
+} __attribute__((packed));
+
+/** Statistics about reads from one kind of memory segment. */
+struct drgn_memory_read_stats {
+	/** Number of reads from segments. */
+	uint64_t reads;
+	/** Number of bytes read. */
+	uint64_t bytes;
+	/** Total time spent reading in nanoseconds. */
+	uint64_t ns;
+};
+
+/** Statistics about a program's memory reads. */
+struct drgn_memory_stats {
+	/**
+	 * Reads from segments, indexed by @ref drgn_memory_segment_kind. Reads
+	 * served by the page cache or a snapshot are not included.
+	 */
+	struct drgn_memory_read_stats segments[DRGN_NUM_MEMORY_SEGMENT_KINDS];
+	/**
+	 * Number of page lookups served by the page cache or the active
+	 * snapshot.
+	 */
+	uint64_t cache_hits;
+	/**
+	 * Number of page lookups in the page cache or the active snapshot which
+	 * had to read the page.
+	 */
+	uint64_t cache_misses;
+};
+
+/** Statistics about reads from the memory of a running process. */
+struct drgn_process_memory_stats {
+	/** Number of reads served by @c process_vm_readv(). */
+	uint64_t vm_readv_reads;
+	/**
+	 * Number of @c process_vm_readv() calls. This may be less than @ref
+	 * drgn_process_memory_stats::vm_readv_reads if reads were batched.
+	 */
+	uint64_t vm_readv_calls;
+	/** Number of bytes read with @c process_vm_readv(). */
+	uint64_t vm_readv_bytes;
+	/** Number of reads served by @c /proc/$pid/mem. */
+	uint64_t proc_mem_reads;
+	/** Number of bytes read from @c /proc/$pid/mem. */
+	uint64_t proc_mem_bytes;
+};
+
+/** Statistics about calls to a program's type or object finders. */
+struct drgn_finder_stats {
+	/** Number of lookups which found something. */
+	uint64_t hits;
+	/** Number of lookups which found nothing or failed. */
+	uint64_t misses;
+	/** Total time spent in lookups in nanoseconds. */
+	uint64_t ns;
+};
+
+/** Statistics about parsing types from DWARF debugging information. */
+struct drgn_dwarf_stats {
+	/** Number of type DIEs parsed. */
+	uint64_t dies_parsed;
+	/** Number of type DIEs which had already been parsed. */
+	uint64_t cache_hits;
+	/** Total time spent parsing in nanoseconds. */
+	uint64_t ns;
+	/**
+	 * Number of files whose index was loaded from the cache set with @ref
+	 * drgn_program_set_debug_info_cache().
+	 */
+	uint64_t index_cache_hits;
+	/** Number of files with a build ID that weren't in the cache. */
+	uint64_t index_cache_misses;
+	/**
+	 * Number of DIEs currently in the name index. This is not reset by
+	 * @ref drgn_program_reset_stats().
+	 */
+	uint64_t index_dies;
+	/**
+	 * Number of bytes currently allocated for the name index. This is not
+	 * reset by @ref drgn_program_reset_stats().
+	 */
+	uint64_t index_bytes;
+};
+
+/** Statistics about stack unwinding. */
+struct drgn_stack_trace_stats {
+	/** Number of stack traces unwound. */
+	uint64_t unwinds;
+	/** Total number of stack frames unwound. */
+	uint64_t frames;
+	/** Total time spent unwinding in nanoseconds. */
+	uint64_t ns;
+};
+
+/** Statistics about where a program spends its time. */
+struct drgn_program_stats {
+	/** Memory reads. */
+	struct drgn_memory_stats memory;
+	/**
+	 * Reads from a running process by the backend which served them. These
+	 * are zero if the program is not a running process.
+	 */
+	struct drgn_process_memory_stats process_backend;
+	/** Type finder lookups. */
+	struct drgn_finder_stats type_finders;
+	/** Object finder lookups. */
+	struct drgn_finder_stats object_finders;
+	/** DWARF parsing. */
+	struct drgn_dwarf_stats dwarf;
+	/** Stack unwinding. */
+	struct drgn_stack_trace_stats stack_traces;
+};
+
+/**
+ * Get the statistics of a @ref drgn_program.
+ *
+ * Statistics are always collected. Counting is a few increments, and only
+ * operations which are already expensive (reads from a file which isn't
+ * mapped into memory, a process, a remote server, or a kdump file, finder
+ * lookups, DWARF parsing, and unwinding) are timed.
+ *
+ * @param[out] ret Returned statistics. They accumulate until @ref
+ * drgn_program_reset_stats() is called.
+ */
+void drgn_program_stats(struct drgn_program *prog,
+			struct drgn_program_stats *ret);
+
+/** Reset the statistics of a @ref drgn_program to zero. */
+void drgn_program_reset_stats(struct drgn_program *prog);
+
 /**
  * Read a C string from a program's memory.
  *
@@ -1247,6 +1765,130 @@ struct drgn_error *drgn_program_find_object(struct drgn_program *prog,
 					    enum drgn_find_object_flags flags,
 					    struct drgn_object *ret);
 
+/**
+ * @struct drgn_type_iterator
+ *
+ * Iterator over the named types in the debugging information of a program.
+ */
+struct drgn_type_iterator;
+
+/**
+ * Create a @ref drgn_type_iterator.
+ *
+ * Types are returned in no particular order. Types with the same name that are
+ * defined in different files are all returned. Any modules whose indexing was
+ * deferred (see @ref drgn_program_set_lazy_module_indexing()) are indexed
+ * first.
+ *
+ * @param[in] prog Program.
+ * @param[in] kind Kind of types to iterate over, or 0 for any kind. Only types
+ * that can have a name are indexed, so this cannot be @ref DRGN_TYPE_VOID, @ref
+ * DRGN_TYPE_POINTER, @ref DRGN_TYPE_ARRAY, or @ref DRGN_TYPE_FUNCTION.
+ * @param[out] ret Returned iterator. It must be destroyed with @ref
+ * drgn_type_iterator_destroy().
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_type_iterator_create(struct drgn_program *prog,
+					     enum drgn_type_kind kind,
+					     struct drgn_type_iterator **ret);
+
+/** Destroy a @ref drgn_type_iterator. */
+void drgn_type_iterator_destroy(struct drgn_type_iterator *it);
+
+/**
+ * Get the next type from a @ref drgn_type_iterator.
+ *
+ * @param[out] ret Returned type. It is valid for the lifetime of the @ref
+ * drgn_program.
+ * @return @c NULL on success, non-@c NULL on error. In particular, when there
+ * are no more types, @p ret is not modified and an error with code @ref
+ * DRGN_ERROR_STOP is returned; this @ref DRGN_ERROR_STOP error does not have to
+ * be passed to @ref drgn_error_destroy().
+ */
+struct drgn_error *drgn_type_iterator_next(struct drgn_type_iterator *it,
+					   struct drgn_qualified_type *ret);
+
+/**
+ * @struct drgn_function_iterator
+ *
+ * Iterator over the functions in the debugging information of a program.
+ */
+struct drgn_function_iterator;
+
+/**
+ * Create a @ref drgn_function_iterator.
+ *
+ * Functions are returned in no particular order. Functions without an address
+ * (e.g., functions that were always inlined) are skipped. Any modules whose
+ * indexing was deferred are indexed first.
+ *
+ * @param[in] prog Program.
+ * @param[out] ret Returned iterator. It must be destroyed with @ref
+ * drgn_function_iterator_destroy().
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *
+drgn_function_iterator_create(struct drgn_program *prog,
+			      struct drgn_function_iterator **ret);
+
+/** Destroy a @ref drgn_function_iterator. */
+void drgn_function_iterator_destroy(struct drgn_function_iterator *it);
+
+/**
+ * Get the next function from a @ref drgn_function_iterator.
+ *
+ * @param[out] ret Returned function object. This must have already been
+ * initialized with @ref drgn_object_init().
+ * @return @c NULL on success, non-@c NULL on error. In particular, when there
+ * are no more functions, @p ret is not modified and an error with code @ref
+ * DRGN_ERROR_STOP is returned; this @ref DRGN_ERROR_STOP error does not have to
+ * be passed to @ref drgn_error_destroy().
+ */
+struct drgn_error *
+drgn_function_iterator_next(struct drgn_function_iterator *it,
+			    struct drgn_object *ret);
+
+/** Kinds of names for @ref drgn_program_search(). */
+enum drgn_search_kind {
+	/** Search type names (including typedefs). */
+	DRGN_SEARCH_TYPE = 1 << 0,
+	/** Search constant names (e.g., enumeration constants). */
+	DRGN_SEARCH_CONSTANT = 1 << 1,
+	/** Search function names. */
+	DRGN_SEARCH_FUNCTION = 1 << 2,
+	/** Search variable names. */
+	DRGN_SEARCH_VARIABLE = 1 << 3,
+	/** Search any kind of name. */
+	DRGN_SEARCH_ANY = (1 << 4) - 1,
+};
+
+/**
+ * Search for names in the debugging information of a program.
+ *
+ * Names of structure, union, class, and enumerated types don't include the
+ * keyword. Any modules whose indexing was deferred (see @ref
+ * drgn_program_set_lazy_module_indexing()) are indexed first.
+ *
+ * The first search sorts all of the indexed names, after which searches for a
+ * pattern starting with a literal prefix only look at names with that prefix.
+ *
+ * @param[in] prog Program.
+ * @param[in] pattern Shell wildcard pattern to match names with (see
+ * <tt>fnmatch(3)</tt>). For example, <tt>"task_*"</tt> matches names starting
+ * with <tt>"task_"</tt>, and <tt>"*task*"</tt> matches names containing
+ * <tt>"task"</tt>.
+ * @param[in] kinds Kinds of names to search for.
+ * @param[out] ret Returned array of matching names in sorted order, without
+ * duplicates. It must be freed with @c free(). The names themselves are valid
+ * for the lifetime of the @ref drgn_program.
+ * @param[out] count_ret Returned number of names.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_search(struct drgn_program *prog,
+				       const char *pattern,
+				       enum drgn_search_kind kinds,
+				       const char ***ret, size_t *count_ret);
+
 /**
  * @ingroup Symbols
  *
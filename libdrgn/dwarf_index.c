@@ -4,14 +4,19 @@
 #include <assert.h>
 #include <dwarf.h>
 #include <elfutils/libdw.h>
+#include <elfutils/libdwelf.h>
+#include <errno.h>
 #include <fcntl.h>
+#include <fnmatch.h>
 #include <gelf.h>
 #include <inttypes.h>
 #include <libelf.h>
 #include <stdbool.h>
+#include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <unistd.h>
+#include <sys/mman.h>
 #include <sys/stat.h>
 #include <sys/types.h>
 
@@ -36,6 +41,13 @@ void
 drgn_dwfl_module_userdata_destroy(struct drgn_dwfl_module_userdata *userdata)
 {
 	if (userdata) {
+		struct drgn_dwo_file *file, *next;
+
+		for (file = userdata->dwo_files; file; file = next) {
+			next = file->next;
+			elf_end(file->elf);
+			free(file);
+		}
 		elf_end(userdata->elf);
 		if (userdata->fd != -1)
 			close(userdata->fd);
@@ -140,7 +152,10 @@ enum {
 	SECTION_DEBUG_ABBREV,
 	SECTION_DEBUG_INFO,
 	SECTION_DEBUG_LINE,
+	SECTION_DEBUG_LINE_STR,
+	SECTION_DEBUG_NAMES,
 	SECTION_DEBUG_STR,
+	SECTION_DEBUG_STR_OFFSETS,
 	DRGN_DWARF_INDEX_NUM_SECTIONS,
 };
 
@@ -148,9 +163,18 @@ static const char * const section_name[DRGN_DWARF_INDEX_NUM_SECTIONS] = {
 	[SECTION_DEBUG_ABBREV] = ".debug_abbrev",
 	[SECTION_DEBUG_INFO] = ".debug_info",
 	[SECTION_DEBUG_LINE] = ".debug_line",
+	[SECTION_DEBUG_LINE_STR] = ".debug_line_str",
+	[SECTION_DEBUG_NAMES] = ".debug_names",
 	[SECTION_DEBUG_STR] = ".debug_str",
+	[SECTION_DEBUG_STR_OFFSETS] = ".debug_str_offsets",
 };
 
+static inline bool section_is_optional(size_t i)
+{
+	return (i == SECTION_DEBUG_LINE || i == SECTION_DEBUG_LINE_STR ||
+		i == SECTION_DEBUG_NAMES || i == SECTION_DEBUG_STR_OFFSETS);
+}
+
 /*
  * The DWARF abbreviation table gets translated into a series of instructions.
  * An instruction <= INSN_MAX_SKIP indicates a number of bytes to be skipped
@@ -162,7 +186,7 @@ static const char * const section_name[DRGN_DWARF_INDEX_NUM_SECTIONS] = {
  * tag is not of interest).
  */
 enum {
-	INSN_MAX_SKIP = 229,
+	INSN_MAX_SKIP = 219,
 	ATTRIB_BLOCK1,
 	ATTRIB_BLOCK2,
 	ATTRIB_BLOCK4,
@@ -177,6 +201,11 @@ enum {
 	ATTRIB_NAME_STRP4,
 	ATTRIB_NAME_STRP8,
 	ATTRIB_NAME_STRING,
+	ATTRIB_NAME_STRX,
+	ATTRIB_NAME_STRX1,
+	ATTRIB_NAME_STRX2,
+	ATTRIB_NAME_STRX3,
+	ATTRIB_NAME_STRX4,
 	ATTRIB_STMT_LIST_LINEPTR4,
 	ATTRIB_STMT_LIST_LINEPTR8,
 	ATTRIB_DECL_FILE_DATA1,
@@ -184,12 +213,38 @@ enum {
 	ATTRIB_DECL_FILE_DATA4,
 	ATTRIB_DECL_FILE_DATA8,
 	ATTRIB_DECL_FILE_UDATA,
+	/* Followed by the ULEB128 value from the abbreviation declaration. */
+	ATTRIB_DECL_FILE_IMPLICIT,
 	ATTRIB_SPECIFICATION_REF1,
 	ATTRIB_SPECIFICATION_REF2,
 	ATTRIB_SPECIFICATION_REF4,
 	ATTRIB_SPECIFICATION_REF8,
 	ATTRIB_SPECIFICATION_REF_UDATA,
-	ATTRIB_MAX_INSN = ATTRIB_SPECIFICATION_REF_UDATA,
+	/* Attributes of unit DIEs which are only needed for split DWARF. */
+	ATTRIB_STR_OFFSETS_BASE4,
+	ATTRIB_STR_OFFSETS_BASE8,
+	ATTRIB_DWO_ID,
+	/* Followed by a UNIT_STRING_* byte and a STRING_FORM_* byte. */
+	ATTRIB_UNIT_STRING,
+	ATTRIB_MAX_INSN = ATTRIB_UNIT_STRING,
+};
+
+/* String attributes of unit DIEs, for ATTRIB_UNIT_STRING. */
+enum {
+	UNIT_STRING_DWO_NAME,
+	UNIT_STRING_COMP_DIR,
+};
+
+/* Classes of string forms, for ATTRIB_UNIT_STRING. */
+enum {
+	STRING_FORM_STRING,
+	STRING_FORM_STRP,
+	STRING_FORM_LINE_STRP,
+	STRING_FORM_STRX,
+	STRING_FORM_STRX1,
+	STRING_FORM_STRX2,
+	STRING_FORM_STRX3,
+	STRING_FORM_STRX4,
 };
 
 enum {
@@ -201,6 +256,9 @@ enum {
 	TAG_FLAG_CHILDREN = 0x80,
 };
 
+static_assert(TAG_BITS == DRGN_DWARF_INDEX_TAG_BITS,
+	      "TAG_BITS doesn't match DRGN_DWARF_INDEX_TAG_BITS");
+
 DEFINE_VECTOR(uint8_vector, uint8_t)
 DEFINE_VECTOR(uint32_vector, uint32_t)
 DEFINE_VECTOR(uint64_vector, uint64_t)
@@ -231,15 +289,55 @@ static void abbrev_table_deinit(struct abbrev_table *abbrev)
 	uint32_vector_deinit(&abbrev->decls);
 }
 
+/* An entry to be saved in the index cache. */
+struct index_cache_entry {
+	const char *name;
+	uint64_t tag;
+	uint64_t file_name_hash;
+	uint64_t offset;
+	uint64_t skeleton_offset;
+};
+
+DEFINE_VECTOR(index_cache_entry_vector, struct index_cache_entry)
+
 struct compilation_unit {
 	Dwfl_Module *module;
+	/* See drgn_dwfl_module_userdata::module_id. */
+	uint16_t module_id;
+	/*
+	 * For a split unit, these are the sections of the split DWARF file
+	 * (e.g., .debug_info.dwo).
+	 */
 	Elf_Data *sections[DRGN_DWARF_INDEX_NUM_SECTIONS];
 	const char *ptr;
 	uint64_t unit_length;
 	uint64_t debug_abbrev_offset;
+	/*
+	 * Unit ID of a DWARF 5 skeleton or split unit. This is zero for
+	 * earlier versions, where it is in the DW_AT_GNU_dwo_id attribute
+	 * instead.
+	 */
+	uint64_t dwo_id;
+	/* Offset of the unit's entries in .debug_str_offsets. */
+	uint64_t str_offsets_base;
+	/*
+	 * If this is a split unit, the offset of the skeleton unit DIE in the
+	 * module's .debug_info. Otherwise, UINT64_MAX.
+	 */
+	uint64_t skeleton_offset;
+	uint16_t version;
+	/* DW_UT_*. Units before DWARF 5 are DW_UT_compile. */
+	uint8_t unit_type;
+	uint8_t header_size;
 	uint8_t address_size;
 	bool is_64_bit;
 	bool bswap;
+	/*
+	 * Whether to save the entries indexed from this CU in cache_entries so
+	 * that they can be written to the index cache.
+	 */
+	bool write_cache;
+	struct index_cache_entry_vector cache_entries;
 };
 
 static inline const char *section_ptr(Elf_Data *data, size_t offset)
@@ -253,31 +351,78 @@ static inline const char *section_end(Elf_Data *data)
 }
 
 /*
- * An indexed DIE.
+ * An indexed DIE. There is one of these for every name, tag, and file, so it is
+ * packed tightly.
  *
- * DIEs with the same name but different tags or files are considered distinct.
- * We only compare the hash of the file name, not the string value, because a
- * 64-bit collision is unlikely enough, especially when also considering the
- * name and tag.
+ * DIEs with the same name but different tags or files are considered distinct,
+ * and index_die() drops any other DIE with the same name, tag, and file. To
+ * keep this structure small, files are compared by a hash of the file name
+ * truncated to 32 bits, not by the string value. So, if the hashes of two
+ * different files collide, a DIE from one of them with the same name and tag
+ * as a DIE from the other is silently dropped from the index. This is unlikely,
+ * since it requires a collision between files declaring the same name.
  */
 struct drgn_dwarf_index_die {
-	uint64_t tag;
-	uint64_t file_name_hash;
 	/*
 	 * The next DIE with the same name (as an index into
-	 * drgn_dwarf_index_shard::dies), or SIZE_MAX if this is the last DIE.
+	 * drgn_dwarf_index_shard::dies), or UINT32_MAX if this is the last DIE.
 	 */
-	size_t next;
-	Dwfl_Module *module;
+	uint32_t next;
+	/*
+	 * If flags has DIE_FLAG_OFFSETS, an index into
+	 * drgn_dwarf_index_shard::die_offsets. Otherwise, the offset of the DIE
+	 * in the module.
+	 */
+	uint32_t offset;
+	/*
+	 * Hash of the name of the file that the DIE is declared in, truncated
+	 * to 32 bits. This is only used to tell apart DIEs with the same name
+	 * and tag (see above).
+	 */
+	uint32_t file_name_hash;
+	/* ID of the DIE's module in drgn_dwarf_index::modules. */
+	uint16_t module;
+	/* Indexed tags fit in TAG_BITS. */
+	uint8_t tag;
+	uint8_t flags;
+};
+
+/*
+ * The DIE's offset doesn't fit in 32 bits or the DIE is in a split unit, so its
+ * offsets are stored in drgn_dwarf_index_shard::die_offsets.
+ */
+#define DIE_FLAG_OFFSETS 0x1
+
+struct drgn_dwarf_index_die_offsets {
 	uint64_t offset;
+	/*
+	 * If the DIE is in a split unit, the offset of the skeleton unit DIE in
+	 * the module. In that case, offset is in the split DWARF file.
+	 * Otherwise, UINT64_MAX.
+	 */
+	uint64_t skeleton_offset;
+};
+
+/* A block of interned names in drgn_dwarf_index_shard::name_blocks. */
+struct drgn_dwarf_index_name_block {
+	struct drgn_dwarf_index_name_block *next;
+	size_t size;
+	char names[];
 };
 
+#define NAME_BLOCK_MIN_SIZE 4096
+#define NAME_BLOCK_MAX_SIZE 65536
+
 /*
  * The key is the DIE name. The value is the first DIE with that name (as an
  * index into drgn_dwarf_index_shard::dies).
  */
 DEFINE_HASH_TABLE_FUNCTIONS(drgn_dwarf_index_die_map, string_hash, string_eq)
 DEFINE_VECTOR_FUNCTIONS(drgn_dwarf_index_die_vector)
+DEFINE_VECTOR_FUNCTIONS(drgn_dwarf_index_die_offsets_vector)
+DEFINE_VECTOR_FUNCTIONS(dwfl_module_vector)
+DEFINE_VECTOR_FUNCTIONS(drgn_dwarf_index_sorted_name_vector)
+DEFINE_VECTOR_FUNCTIONS(drgn_dwarf_index_die_ref_vector)
 
 static inline size_t hash_pair_to_shard(struct hash_pair hp)
 {
@@ -351,9 +496,17 @@ static void free_shards(struct drgn_dwarf_index *dindex, size_t n)
 	size_t i;
 
 	for (i = 0; i < n; i++) {
-		drgn_dwarf_index_die_vector_deinit(&dindex->shards[i].dies);
-		drgn_dwarf_index_die_map_deinit(&dindex->shards[i].map);
-		omp_destroy_lock(&dindex->shards[i].lock);
+		struct drgn_dwarf_index_shard *shard = &dindex->shards[i];
+		struct drgn_dwarf_index_name_block *block, *next;
+
+		for (block = shard->name_blocks; block; block = next) {
+			next = block->next;
+			free(block);
+		}
+		drgn_dwarf_index_die_offsets_vector_deinit(&shard->die_offsets);
+		drgn_dwarf_index_die_vector_deinit(&shard->dies);
+		drgn_dwarf_index_die_map_deinit(&shard->map);
+		omp_destroy_lock(&shard->lock);
 	}
 }
 
@@ -367,13 +520,63 @@ void drgn_dwarf_index_init(struct drgn_dwarf_index *dindex)
 		omp_init_lock(&shard->lock);
 		drgn_dwarf_index_die_map_init(&shard->map);
 		drgn_dwarf_index_die_vector_init(&shard->dies);
+		drgn_dwarf_index_die_offsets_vector_init(&shard->die_offsets);
+		shard->name_blocks = NULL;
+		shard->name_block_space = 0;
 	}
+	dwfl_module_vector_init(&dindex->modules);
+	drgn_dwarf_index_sorted_name_vector_init(&dindex->sorted_names);
+	dindex->has_sorted_names = false;
+	for (i = 0; i < ARRAY_SIZE(dindex->tag_dies); i++)
+		drgn_dwarf_index_die_ref_vector_init(&dindex->tag_dies[i]);
+	dindex->has_tag_dies = 0;
+	dindex->cache_hits = 0;
+	dindex->cache_misses = 0;
 }
 
 void drgn_dwarf_index_deinit(struct drgn_dwarf_index *dindex)
 {
-	if (dindex)
+	size_t i;
+
+	if (dindex) {
 		free_shards(dindex, ARRAY_SIZE(dindex->shards));
+		dwfl_module_vector_deinit(&dindex->modules);
+		drgn_dwarf_index_sorted_name_vector_deinit(&dindex->sorted_names);
+		for (i = 0; i < ARRAY_SIZE(dindex->tag_dies); i++)
+			drgn_dwarf_index_die_ref_vector_deinit(&dindex->tag_dies[i]);
+	}
+}
+
+void drgn_dwarf_index_size(struct drgn_dwarf_index *dindex,
+			   uint64_t *num_dies_ret, uint64_t *bytes_ret)
+{
+	uint64_t num_dies = 0, bytes;
+	size_t i;
+
+	bytes = (dindex->modules.capacity * sizeof(*dindex->modules.data) +
+		 dindex->sorted_names.capacity *
+		 sizeof(*dindex->sorted_names.data));
+	for (i = 0; i < ARRAY_SIZE(dindex->tag_dies); i++) {
+		bytes += (dindex->tag_dies[i].capacity *
+			  sizeof(*dindex->tag_dies[i].data));
+	}
+	for (i = 0; i < ARRAY_SIZE(dindex->shards); i++) {
+		struct drgn_dwarf_index_shard *shard = &dindex->shards[i];
+		struct drgn_dwarf_index_name_block *block;
+
+		num_dies += shard->dies.size;
+		bytes += (shard->dies.capacity * sizeof(*shard->dies.data) +
+			  shard->die_offsets.capacity *
+			  sizeof(*shard->die_offsets.data));
+		if (shard->map.size) {
+			bytes += ((shard->map.chunk_mask + 1) *
+				  sizeof(struct drgn_dwarf_index_die_map_chunk));
+		}
+		for (block = shard->name_blocks; block; block = block->next)
+			bytes += sizeof(*block) + block->size;
+	}
+	*num_dies_ret = num_dies;
+	*bytes_ret = bytes;
 }
 
 static struct drgn_error *apply_relocation(Elf_Data *data, uint64_t r_offset,
@@ -411,11 +614,11 @@ static struct drgn_error *apply_relocation(Elf_Data *data, uint64_t r_offset,
 }
 
 static struct drgn_error *relocate_section(Elf_Scn *scn, Elf_Scn *rela_scn,
-					   Elf_Scn *symtab_scn,
+					   Elf_Data *symtab_data,
 					   uint64_t *sh_addrs, size_t shdrnum)
 {
 	struct drgn_error *err;
-	Elf_Data *data, *rela_data, *symtab_data;
+	Elf_Data *data, *rela_data;
 	const Elf64_Rela *relocs;
 	const Elf64_Sym *syms;
 	size_t num_relocs, num_syms;
@@ -426,9 +629,6 @@ static struct drgn_error *relocate_section(Elf_Scn *scn, Elf_Scn *rela_scn,
 	if (err)
 		return err;
 	err = read_elf_section(rela_scn, &rela_data);
-	if (err)
-		return err;
-	err = read_elf_section(symtab_scn, &symtab_data);
 	if (err)
 		return err;
 
@@ -486,10 +686,13 @@ static struct drgn_error *relocate_section(Elf_Scn *scn, Elf_Scn *rela_scn,
  * usually done by libdwfl. However, libdwfl is relatively slow at it. This is a
  * much faster implementation. It is only implemented for x86-64; for other
  * architectures, we can fall back to libdwfl.
+ *
+ * Each relocation section is applied in its own task. This must be called from
+ * a task, and it returns once all of the sections have been relocated.
  */
 static struct drgn_error *apply_elf_relocations(Elf *elf)
 {
-	struct drgn_error *err;
+	struct drgn_error *err = NULL, *task_err = NULL;
 	GElf_Ehdr ehdr_mem, *ehdr;
 	size_t shdrnum, shstrndx;
 	uint64_t *sh_addrs;
@@ -541,51 +744,81 @@ static struct drgn_error *apply_elf_relocations(Elf *elf)
 		goto out;
 	}
 
+	/*
+	 * libelf is not thread-safe, so everything shared between the
+	 * relocation sections (the section headers and the symbol table) is
+	 * loaded here before creating the tasks. The tasks only modify their
+	 * own relocation section and the section that it applies to.
+	 */
 	scn = NULL;
 	while ((scn = elf_nextscn(elf, scn))) {
 		GElf_Shdr *shdr, shdr_mem;
 		const char *scnname;
+		Elf_Scn *info_scn, *link_scn;
+		Elf_Data *symtab_data;
 
 		shdr = gelf_getshdr(scn, &shdr_mem);
 		if (!shdr) {
 			err = drgn_error_libelf();
-			goto out;
+			break;
 		}
 
 		if (shdr->sh_type != SHT_RELA)
 			continue;
 
 		scnname = elf_strptr(elf, shstrndx, shdr->sh_name);
-		if (!scnname)
+		if (!scnname || strncmp(scnname, ".rela.debug_", 12) != 0)
 			continue;
 
-		if (strncmp(scnname, ".rela.debug_", 12) == 0) {
-			Elf_Scn *info_scn, *link_scn;
+		info_scn = elf_getscn(elf, shdr->sh_info);
+		if (!info_scn) {
+			err = drgn_error_libelf();
+			break;
+		}
 
-			info_scn = elf_getscn(elf, shdr->sh_info);
-			if (!info_scn) {
-				err = drgn_error_libelf();
-				goto out;
-			}
+		link_scn = elf_getscn(elf, shdr->sh_link);
+		if (!link_scn) {
+			err = drgn_error_libelf();
+			break;
+		}
+		err = read_elf_section(link_scn, &symtab_data);
+		if (err)
+			break;
 
-			link_scn = elf_getscn(elf, shdr->sh_link);
-			if (!link_scn) {
-				err = drgn_error_libelf();
-				goto out;
-			}
+		#pragma omp task shared(task_err)
+		{
+			struct drgn_error *err2;
 
-			err = relocate_section(info_scn, scn, link_scn,
-					       sh_addrs, shdrnum);
-			if (err)
-				goto out;
+			err2 = relocate_section(info_scn, scn, symtab_data,
+						sh_addrs, shdrnum);
+			if (err2) {
+				#pragma omp critical(drgn_apply_elf_relocations)
+				{
+					if (task_err)
+						drgn_error_destroy(err2);
+					else
+						task_err = err2;
+				}
+			}
 		}
 	}
+	#pragma omp taskwait
+	if (err)
+		drgn_error_destroy(task_err);
+	else
+		err = task_err;
 out:
 	free(sh_addrs);
-	return NULL;
+	return err;
 }
 
-static struct drgn_error *get_debug_sections(Elf *elf, Elf_Data **sections)
+/*
+ * Get the debugging sections of an ELF file. If dwo is true, the file is a
+ * split DWARF file, and the sections have a .dwo suffix (e.g.,
+ * .debug_info.dwo).
+ */
+static struct drgn_error *get_debug_sections(Elf *elf, bool dwo,
+					     Elf_Data **sections)
 {
 	struct drgn_error *err;
 	size_t shstrndx;
@@ -599,6 +832,7 @@ static struct drgn_error *get_debug_sections(Elf *elf, Elf_Data **sections)
 	while ((scn = elf_nextscn(elf, scn))) {
 		GElf_Shdr *shdr, shdr_mem;
 		const char *scnname;
+		bool gnu;
 
 		shdr = gelf_getshdr(scn, &shdr_mem);
 		if (!shdr)
@@ -611,13 +845,39 @@ static struct drgn_error *get_debug_sections(Elf *elf, Elf_Data **sections)
 		if (!scnname)
 			continue;
 
+		/*
+		 * Sections compressed in the GNU format are named .zdebug_*
+		 * instead of .debug_*. Match the names without the leading
+		 * ".z" or ".".
+		 */
+		if (strncmp(scnname, ".zdebug_", 8) == 0) {
+			gnu = true;
+			scnname += 2;
+		} else if (strncmp(scnname, ".debug_", 7) == 0) {
+			gnu = false;
+			scnname++;
+		} else {
+			continue;
+		}
+
 		for (i = 0; i < DRGN_DWARF_INDEX_NUM_SECTIONS; i++) {
+			size_t len;
+
 			if (sections[i])
 				continue;
 
-			if (strcmp(scnname, section_name[i]) != 0)
+			len = strlen(section_name[i] + 1);
+			if (strncmp(scnname, section_name[i] + 1, len) != 0 ||
+			    strcmp(scnname + len, dwo ? ".dwo" : "") != 0)
 				continue;
 
+			/*
+			 * We can't tell whether a GNU compressed section was
+			 * already decompressed, so ignore errors, like libdw
+			 * does.
+			 */
+			if (gnu)
+				elf_compress_gnu(scn, 0, 0);
 			err = read_elf_section(scn, &sections[i]);
 			if (err)
 				return err;
@@ -625,10 +885,11 @@ static struct drgn_error *get_debug_sections(Elf *elf, Elf_Data **sections)
 	}
 
 	for (i = 0; i < DRGN_DWARF_INDEX_NUM_SECTIONS; i++) {
-		if (i != SECTION_DEBUG_LINE && !sections[i]) {
+		if (!section_is_optional(i) && !sections[i]) {
 			return drgn_error_format(DRGN_ERROR_MISSING_DEBUG_INFO,
-						 "ELF file has no %s section",
-						 section_name[i]);
+						 "ELF file has no %s%s section",
+						 section_name[i],
+						 dwo ? ".dwo" : "");
 		}
 	}
 
@@ -638,6 +899,12 @@ static struct drgn_error *get_debug_sections(Elf *elf, Elf_Data **sections)
 		return drgn_error_create(DRGN_ERROR_OTHER,
 					 ".debug_str is not null terminated");
 	}
+	debug_str = sections[SECTION_DEBUG_LINE_STR];
+	if (debug_str && debug_str->d_size &&
+	    ((char *)debug_str->d_buf)[debug_str->d_size - 1] != '\0') {
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 ".debug_line_str is not null terminated");
+	}
 	return NULL;
 }
 
@@ -645,8 +912,8 @@ static struct drgn_error *read_compilation_unit_header(const char *ptr,
 						       const char *end,
 						       struct compilation_unit *cu)
 {
+	const char *start = ptr;
 	uint32_t tmp;
-	uint16_t version;
 
 	if (!read_u32(&ptr, end, cu->bswap, &tmp))
 		return drgn_eof();
@@ -657,13 +924,27 @@ static struct drgn_error *read_compilation_unit_header(const char *ptr,
 	} else {
 		cu->unit_length = tmp;
 	}
+	if (cu->unit_length > end - ptr)
+		return drgn_eof();
 
-	if (!read_u16(&ptr, end, cu->bswap, &version))
+	if (!read_u16(&ptr, end, cu->bswap, &cu->version))
 		return drgn_eof();
-	if (version != 2 && version != 3 && version != 4) {
+	if (cu->version < 2 || cu->version > 5) {
 		return drgn_error_format(DRGN_ERROR_OTHER,
 					 "unknown DWARF CU version %" PRIu16,
-					 version);
+					 cu->version);
+	}
+
+	/*
+	 * DWARF 5 added the unit type and moved the address size before the
+	 * abbreviation table offset.
+	 */
+	if (cu->version >= 5) {
+		if (!read_u8(&ptr, end, &cu->unit_type) ||
+		    !read_u8(&ptr, end, &cu->address_size))
+			return drgn_eof();
+	} else {
+		cu->unit_type = DW_UT_compile;
 	}
 
 	if (cu->is_64_bit) {
@@ -675,182 +956,585 @@ static struct drgn_error *read_compilation_unit_header(const char *ptr,
 			return drgn_eof();
 	}
 
-	if (!read_u8(&ptr, end, &cu->address_size))
+	if (cu->version < 5 && !read_u8(&ptr, end, &cu->address_size))
 		return drgn_eof();
 
+	cu->dwo_id = 0;
+	switch (cu->unit_type) {
+	case DW_UT_compile:
+	case DW_UT_partial:
+		break;
+	case DW_UT_skeleton:
+	case DW_UT_split_compile:
+		if (!read_u64(&ptr, end, cu->bswap, &cu->dwo_id))
+			return drgn_eof();
+		break;
+	case DW_UT_type:
+	case DW_UT_split_type:
+		/* type_signature, type_offset */
+		if (!read_in_bounds(ptr, end, cu->is_64_bit ? 16 : 12))
+			return drgn_eof();
+		ptr += cu->is_64_bit ? 16 : 12;
+		break;
+	default:
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "unknown DWARF unit type 0x%" PRIx8,
+					 cu->unit_type);
+	}
+	cu->header_size = ptr - start;
+	if (cu->header_size > (cu->is_64_bit ? 12 : 4) + cu->unit_length)
+		return drgn_eof();
+	cu->str_offsets_base = 0;
+	cu->skeleton_offset = UINT64_MAX;
 	return NULL;
 }
 
-DEFINE_VECTOR(compilation_unit_vector, struct compilation_unit)
-
-static struct drgn_error *read_cus(struct drgn_dwarf_index *dindex,
-				   Dwfl_Module **modules, size_t num_modules,
-				   struct compilation_unit_vector *all_cus)
+/* Get the end of a unit in .debug_info. */
+static inline const char *cu_end(const struct compilation_unit *cu)
 {
-	struct drgn_error *err = NULL;
+	return &cu->ptr[(cu->is_64_bit ? 12 : 4) + cu->unit_length];
+}
 
-	#pragma omp parallel
-	{
-		struct compilation_unit_vector cus;
-		size_t i;
+DEFINE_VECTOR(compilation_unit_vector, struct compilation_unit)
 
-		compilation_unit_vector_init(&cus);
-		#pragma omp for schedule(dynamic)
-		for (i = 0; i < num_modules; i++) {
-			struct drgn_error *err2;
-			struct drgn_dwfl_module_userdata *userdata;
-			Dwarf *dwarf;
-			Dwarf_Addr bias;
-			Elf *elf;
-			bool bswap;
-			Elf_Data *sections[DRGN_DWARF_INDEX_NUM_SECTIONS] = {};
-			const char *ptr, *end;
+/*
+ * A name index from a .debug_names section. A .debug_names section is a
+ * sequence of name indexes, each covering one or more CUs.
+ */
+struct name_index {
+	Dwfl_Module *module;
+	uint16_t module_id;
+	Elf_Data *sections[DRGN_DWARF_INDEX_NUM_SECTIONS];
+	bool is_64_bit;
+	bool bswap;
+	uint32_t comp_unit_count;
+	uint32_t name_count;
+	const char *cu_offsets;
+	const char *str_offsets;
+	const char *entry_offsets;
+	const char *abbrevs;
+	const char *abbrevs_end;
+	const char *entry_pool;
+	const char *end;
+};
 
-			if (err)
-				continue;
+DEFINE_VECTOR(name_index_vector, struct name_index)
 
-			userdata = drgn_dwfl_module_userdata(modules[i]);
-			if (userdata->err)
-				continue;
+static bool skip_name_index_array(const char **ptr, const char *end,
+				  uint64_t count, size_t size)
+{
+	if (count > (end - *ptr) / size)
+		return false;
+	*ptr += count * size;
+	return true;
+}
 
-			if (userdata->elf) {
-				err2 = apply_elf_relocations(userdata->elf);
-				if (err2) {
-					drgn_dwfl_module_userdata_set_error(userdata,
-									    NULL,
-									    err2);
-					continue;
-				}
-			}
+/*
+ * Parse the header of the name index at *ptr and advance *ptr past the name
+ * index.
+ */
+static struct drgn_error *read_name_index_header(const char **ptr,
+						 const char *end,
+						 struct name_index *ni)
+{
+	uint32_t tmp;
+	uint64_t unit_length;
+	uint16_t version, padding;
+	uint32_t local_type_unit_count, foreign_type_unit_count;
+	uint32_t bucket_count, abbrev_table_size, augmentation_string_size;
+	size_t offset_size;
 
-			/*
-			 * Note: not dwfl_module_getelf(), because then libdwfl
-			 * applies ELF relocations to all sections, not just
-			 * debug sections.
-			 */
-			dwarf = dwfl_module_getdwarf(modules[i], &bias);
-			if (!dwarf) {
-				drgn_dwfl_module_userdata_set_error(userdata,
-								    NULL,
-								    drgn_error_libdwfl());
-				continue;
-			}
-			elf = dwarf_getelf(dwarf);
-			if (!elf) {
-				drgn_dwfl_module_userdata_set_error(userdata,
-								    NULL,
-								    drgn_error_libdw());
-				continue;
-			}
+	if (!read_u32(ptr, end, ni->bswap, &tmp))
+		return drgn_eof();
+	ni->is_64_bit = tmp == UINT32_C(0xffffffff);
+	if (ni->is_64_bit) {
+		if (!read_u64(ptr, end, ni->bswap, &unit_length))
+			return drgn_eof();
+	} else {
+		unit_length = tmp;
+	}
+	if (unit_length > end - *ptr)
+		return drgn_eof();
+	ni->end = *ptr + unit_length;
+	end = ni->end;
 
-			err2 = get_debug_sections(elf, sections);
-			if (err2) {
-				drgn_dwfl_module_userdata_set_error(userdata,
-								    NULL, err2);
-				continue;
-			}
+	if (!read_u16(ptr, end, ni->bswap, &version))
+		return drgn_eof();
+	if (version != 5) {
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "unknown .debug_names version %" PRIu16,
+					 version);
+	}
+	if (!read_u16(ptr, end, ni->bswap, &padding) ||
+	    !read_u32(ptr, end, ni->bswap, &ni->comp_unit_count) ||
+	    !read_u32(ptr, end, ni->bswap, &local_type_unit_count) ||
+	    !read_u32(ptr, end, ni->bswap, &foreign_type_unit_count) ||
+	    !read_u32(ptr, end, ni->bswap, &bucket_count) ||
+	    !read_u32(ptr, end, ni->bswap, &ni->name_count) ||
+	    !read_u32(ptr, end, ni->bswap, &abbrev_table_size) ||
+	    !read_u32(ptr, end, ni->bswap, &augmentation_string_size) ||
+	    !skip_name_index_array(ptr, end, augmentation_string_size, 1))
+		return drgn_eof();
 
-			bswap = (elf_getident(elf, NULL)[EI_DATA] !=
-				 (__BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__ ?
-				  ELFDATA2LSB : ELFDATA2MSB));
-
-			ptr = section_ptr(sections[SECTION_DEBUG_INFO], 0);
-			end = section_end(sections[SECTION_DEBUG_INFO]);
-			while (ptr < end) {
-				struct compilation_unit *cu;
-
-				cu = compilation_unit_vector_append_entry(&cus);
-				if (!cu) {
-					#pragma omp critical(drgn_read_cus)
-					{
-						if (!err)
-							err = &drgn_enomem;
-					}
-					break;
-				}
-				cu->module = modules[i];
-				memcpy(cu->sections, sections, sizeof(cu->sections));
-				cu->ptr = ptr;
-				cu->bswap = bswap;
-				err2 = read_compilation_unit_header(ptr, end, cu);
-				if (err2) {
-					#pragma omp critical(drgn_read_cus)
-					{
-						if (err)
-							drgn_error_destroy(err2);
-						else
-							err = err2;
-					}
-					break;
-				}
+	offset_size = ni->is_64_bit ? 8 : 4;
+	ni->cu_offsets = *ptr;
+	if (!skip_name_index_array(ptr, end, ni->comp_unit_count, offset_size) ||
+	    !skip_name_index_array(ptr, end, local_type_unit_count,
+				   offset_size) ||
+	    !skip_name_index_array(ptr, end, foreign_type_unit_count,
+				   sizeof(uint64_t)) ||
+	    /* The hash table is omitted if bucket_count is zero. */
+	    !skip_name_index_array(ptr, end, bucket_count, sizeof(uint32_t)) ||
+	    !skip_name_index_array(ptr, end, bucket_count ? ni->name_count : 0,
+				   sizeof(uint32_t)))
+		return drgn_eof();
+	ni->str_offsets = *ptr;
+	if (!skip_name_index_array(ptr, end, ni->name_count, offset_size))
+		return drgn_eof();
+	ni->entry_offsets = *ptr;
+	if (!skip_name_index_array(ptr, end, ni->name_count, offset_size))
+		return drgn_eof();
+	ni->abbrevs = *ptr;
+	if (!skip_name_index_array(ptr, end, abbrev_table_size, 1))
+		return drgn_eof();
+	ni->abbrevs_end = *ptr;
+	ni->entry_pool = *ptr;
+	*ptr = end;
+	return NULL;
+}
 
-				ptr += (cu->is_64_bit ? 12 : 4) + cu->unit_length;
-			}
-		}
+static uint64_t name_index_offset(const struct name_index *ni,
+				  const char *array, uint64_t i)
+{
+	const char *ptr;
 
-		if (cus.size) {
-			#pragma omp critical(drgn_read_cus)
-			if (!err) {
-				if (compilation_unit_vector_reserve(all_cus,
-								    all_cus->size + cus.size)) {
-					memcpy(all_cus->data + all_cus->size,
-					       cus.data,
-					       cus.size * sizeof(*cus.data));
-					all_cus->size += cus.size;
-				} else {
-					err = &drgn_enomem;
-				}
-			}
-		}
+	if (ni->is_64_bit) {
+		uint64_t value;
+
+		ptr = array + i * sizeof(uint64_t);
+		read_u64_nocheck(&ptr, ni->bswap, &value);
+		return value;
+	} else {
+		uint32_t value;
 
-		compilation_unit_vector_deinit(&cus);
+		ptr = array + i * sizeof(uint32_t);
+		read_u32_nocheck(&ptr, ni->bswap, &value);
+		return value;
 	}
-	return err;
 }
 
-static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
-					   const struct compilation_unit *cu,
-					   struct abbrev_table *abbrev)
+DEFINE_HASH_SET(cu_offset_set, uint64_t, hash_pair_int_type,
+		hash_table_scalar_eq)
+
+/*
+ * Read the name indexes in the .debug_names section of a module and add the
+ * offsets of the CUs that they cover to covered_cus. If the section is invalid,
+ * the module is indexed by scanning its CUs instead, so this returns
+ * &drgn_not_found rather than a parsing error.
+ */
+static struct drgn_error *
+read_name_indexes(Dwfl_Module *module, Elf_Data **sections, bool bswap,
+		  struct name_index_vector *name_indexes,
+		  struct cu_offset_set *covered_cus)
 {
 	struct drgn_error *err;
-	uint64_t code;
-	uint32_t insn_index;
-	uint64_t tag;
-	uint8_t children;
-	uint8_t die_flags;
-	bool should_index;
-	bool first = true;
-	uint8_t insn;
+	const char *ptr = section_ptr(sections[SECTION_DEBUG_NAMES], 0);
+	const char *end = section_end(sections[SECTION_DEBUG_NAMES]);
+	size_t debug_info_size = sections[SECTION_DEBUG_INFO]->d_size;
 
-	static_assert(ATTRIB_MAX_INSN == UINT8_MAX,
-		      "maximum DWARF attribute instruction is invalid");
+	while (ptr < end) {
+		struct name_index *ni;
+		uint32_t i;
 
-	if ((err = read_uleb128(ptr, end, &code)))
-		return err;
-	if (code == 0)
-		return &drgn_stop;
-	if (code != abbrev->decls.size + 1) {
-		return drgn_error_create(DRGN_ERROR_OTHER,
-					 "DWARF abbreviation table is not sequential");
+		ni = name_index_vector_append_entry(name_indexes);
+		if (!ni)
+			return &drgn_enomem;
+		ni->module = module;
+		ni->module_id = drgn_dwfl_module_userdata(module)->module_id;
+		memcpy(ni->sections, sections, sizeof(ni->sections));
+		ni->bswap = bswap;
+		err = read_name_index_header(&ptr, end, ni);
+		if (err) {
+			drgn_error_destroy(err);
+			return &drgn_not_found;
+		}
+		for (i = 0; i < ni->comp_unit_count; i++) {
+			uint64_t cu_offset;
+
+			cu_offset = name_index_offset(ni, ni->cu_offsets, i);
+			if (cu_offset >= debug_info_size)
+				return &drgn_not_found;
+			if (cu_offset_set_insert(covered_cus, &cu_offset,
+						 NULL) == -1)
+				return &drgn_enomem;
+		}
 	}
+	return NULL;
+}
 
-	insn_index = abbrev->insns.size;
-	if (!uint32_vector_append(&abbrev->decls, &insn_index))
-		return &drgn_enomem;
+/*
+ * Decompress the compressed debugging sections of an ELF file that we opened
+ * ourselves. libdw would otherwise decompress them one after another when it
+ * creates the Dwarf handle, so instead, each section gets its own task. This
+ * must be called from a task; it returns once all of the sections have been
+ * decompressed, and the thread may index other modules in the meantime.
+ *
+ * Errors are ignored here; libdw will try again and report them.
+ */
+static void decompress_debug_sections(Elf *elf)
+{
+	size_t shstrndx;
+	Elf_Scn *scn = NULL;
 
-	if ((err = read_uleb128(ptr, end, &tag)))
-		return err;
+	if (elf_getshdrstrndx(elf, &shstrndx))
+		return;
 
-	switch (tag) {
-	/* Types. */
-	case DW_TAG_base_type:
-	case DW_TAG_class_type:
-	case DW_TAG_enumeration_type:
-	case DW_TAG_structure_type:
-	case DW_TAG_typedef:
-	case DW_TAG_union_type:
-	/* Variables. */
-	case DW_TAG_variable:
+	/*
+	 * libelf is not thread-safe, but decompressing distinct sections only
+	 * modifies the sections themselves once the section headers and the
+	 * section header string table have been loaded, which this loop does.
+	 */
+	while ((scn = elf_nextscn(elf, scn))) {
+		GElf_Shdr *shdr, shdr_mem;
+		const char *scnname;
+
+		shdr = gelf_getshdr(scn, &shdr_mem);
+		if (!shdr)
+			return;
+
+		if (shdr->sh_type == SHT_NOBITS ||
+		    (shdr->sh_flags & (SHF_ALLOC | SHF_GROUP)))
+			continue;
+
+		scnname = elf_strptr(elf, shstrndx, shdr->sh_name);
+		if (!scnname)
+			continue;
+
+		if (strncmp(scnname, ".zdebug_", 8) == 0) {
+			#pragma omp task
+			elf_compress_gnu(scn, 0, 0);
+		} else if (strncmp(scnname, ".debug_", 7) == 0 &&
+			   (shdr->sh_flags & SHF_COMPRESSED)) {
+			#pragma omp task
+			elf_compress(scn, 0, 0);
+		}
+	}
+	#pragma omp taskwait
+}
+
+static struct drgn_error *
+index_cu(struct drgn_dwarf_index *dindex, struct compilation_unit *cu,
+	 const struct uint64_vector *skeleton_file_name_table);
+
+static void set_read_cus_error(struct drgn_error **errp,
+			       struct drgn_error *err)
+{
+	#pragma omp critical(drgn_read_cus)
+	{
+		if (*errp)
+			drgn_error_destroy(err);
+		else
+			*errp = err;
+	}
+}
+
+/*
+ * Read the CUs of a module into cus and create a task to index each one that
+ * isn't covered by a name index. This is run as a task per module, so a
+ * module's CUs are indexed while other modules are still being decompressed
+ * and read. Errors that make the module unusable are recorded in the module's
+ * userdata; other errors are stored in *errp.
+ */
+static void read_module_cus(struct drgn_dwarf_index *dindex,
+			    Dwfl_Module *module, bool write_cache,
+			    struct compilation_unit_vector *cus,
+			    struct name_index_vector *all_name_indexes,
+			    struct drgn_error **errp)
+{
+	struct drgn_error *err;
+	struct drgn_dwfl_module_userdata *userdata;
+	Dwarf *dwarf;
+	Dwarf_Addr bias;
+	Elf *elf;
+	bool bswap;
+	Elf_Data *sections[DRGN_DWARF_INDEX_NUM_SECTIONS] = {};
+	struct name_index_vector name_indexes;
+	struct cu_offset_set covered_cus;
+	const char *debug_info_buffer, *ptr, *end;
+	size_t num_covered = 0;
+	size_t i, j;
+
+	userdata = drgn_dwfl_module_userdata(module);
+	if (userdata->err)
+		return;
+
+	if (userdata->elf) {
+		decompress_debug_sections(userdata->elf);
+		err = apply_elf_relocations(userdata->elf);
+		if (err) {
+			drgn_dwfl_module_userdata_set_error(userdata, NULL,
+							    err);
+			return;
+		}
+	}
+
+	/*
+	 * Note: not dwfl_module_getelf(), because then libdwfl applies ELF
+	 * relocations to all sections, not just debug sections.
+	 */
+	dwarf = dwfl_module_getdwarf(module, &bias);
+	if (!dwarf) {
+		drgn_dwfl_module_userdata_set_error(userdata, NULL,
+						    drgn_error_libdwfl());
+		return;
+	}
+	elf = dwarf_getelf(dwarf);
+	if (!elf) {
+		drgn_dwfl_module_userdata_set_error(userdata, NULL,
+						    drgn_error_libdw());
+		return;
+	}
+
+	err = get_debug_sections(elf, false, sections);
+	if (err) {
+		drgn_dwfl_module_userdata_set_error(userdata, NULL, err);
+		return;
+	}
+
+	bswap = (elf_getident(elf, NULL)[EI_DATA] !=
+		 (__BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__ ?
+		  ELFDATA2LSB : ELFDATA2MSB));
+
+	name_index_vector_init(&name_indexes);
+	cu_offset_set_init(&covered_cus);
+	if (sections[SECTION_DEBUG_NAMES]) {
+		err = read_name_indexes(module, sections, bswap, &name_indexes,
+					&covered_cus);
+		if (err == &drgn_not_found) {
+			/*
+			 * The name index is invalid; fall back to scanning all
+			 * of the CUs.
+			 */
+			name_indexes.size = 0;
+			cu_offset_set_clear(&covered_cus);
+		} else if (err) {
+			set_read_cus_error(errp, err);
+			goto out;
+		}
+	}
+
+	debug_info_buffer = section_ptr(sections[SECTION_DEBUG_INFO], 0);
+	ptr = debug_info_buffer;
+	end = section_end(sections[SECTION_DEBUG_INFO]);
+	while (ptr < end) {
+		struct compilation_unit *cu;
+
+		cu = compilation_unit_vector_append_entry(cus);
+		if (!cu) {
+			set_read_cus_error(errp, &drgn_enomem);
+			break;
+		}
+		cu->module = module;
+		cu->module_id = userdata->module_id;
+		memcpy(cu->sections, sections, sizeof(cu->sections));
+		cu->ptr = ptr;
+		cu->bswap = bswap;
+		cu->write_cache = write_cache;
+		index_cache_entry_vector_init(&cu->cache_entries);
+		err = read_compilation_unit_header(ptr, end, cu);
+		if (err) {
+			cus->size--;
+			set_read_cus_error(errp, err);
+			break;
+		}
+
+		/*
+		 * Type units are only referenced by signature, which we don't
+		 * use.
+		 */
+		if (cu->unit_type == DW_UT_type) {
+			cus->size--;
+		} else if (!cu_offset_set_empty(&covered_cus)) {
+			uint64_t cu_offset;
+
+			cu_offset = ptr - debug_info_buffer;
+			if (cu_offset_set_search(&covered_cus,
+						 &cu_offset).entry)
+				num_covered++;
+		}
+
+		ptr = cu_end(cu);
+	}
+	if (*errp)
+		goto out;
+
+	if (num_covered != cu_offset_set_size(&covered_cus)) {
+		/*
+		 * The name index refers to CUs that don't exist; fall back to
+		 * scanning all of the CUs.
+		 */
+		name_indexes.size = 0;
+	} else if (num_covered) {
+		/*
+		 * CUs in a name index don't need to be scanned. Skeleton units
+		 * are scanned regardless to find their split units. The index
+		 * cache is only written from scanned CUs, so it would be
+		 * incomplete for this module.
+		 */
+		for (i = 0, j = 0; i < cus->size; i++) {
+			struct compilation_unit *cu = &cus->data[i];
+			uint64_t cu_offset = cu->ptr - debug_info_buffer;
+
+			cu->write_cache = false;
+			if (cu->unit_type != DW_UT_skeleton &&
+			    cu_offset_set_search(&covered_cus,
+						 &cu_offset).entry)
+				continue;
+			cus->data[j++] = *cu;
+		}
+		cus->size = j;
+	}
+	if (name_indexes.size) {
+		#pragma omp critical(drgn_read_cus)
+		{
+			if (name_index_vector_reserve(all_name_indexes,
+						      all_name_indexes->size +
+						      name_indexes.size)) {
+				memcpy(all_name_indexes->data +
+				       all_name_indexes->size,
+				       name_indexes.data,
+				       name_indexes.size *
+				       sizeof(*name_indexes.data));
+				all_name_indexes->size += name_indexes.size;
+			} else if (!*errp) {
+				*errp = &drgn_enomem;
+			}
+		}
+	}
+
+	/*
+	 * cus doesn't change from here on, so the tasks can refer to its
+	 * entries.
+	 */
+	for (i = 0; i < cus->size; i++) {
+		#pragma omp task
+		{
+			if (!*errp) {
+				err = index_cu(dindex, &cus->data[i], NULL);
+				if (err)
+					set_read_cus_error(errp, err);
+			}
+		}
+	}
+
+out:
+	cu_offset_set_deinit(&covered_cus);
+	name_index_vector_deinit(&name_indexes);
+}
+
+/*
+ * Read and index the CUs of the given modules, and collect their name indexes
+ * in all_name_indexes. The indexed CUs are appended to all_cus.
+ */
+static struct drgn_error *read_cus(struct drgn_dwarf_index *dindex,
+				   Dwfl_Module **modules, size_t num_modules,
+				   bool write_cache,
+				   struct compilation_unit_vector *all_cus,
+				   struct name_index_vector *all_name_indexes)
+{
+	struct drgn_error *err = NULL;
+	struct compilation_unit_vector *module_cus;
+	size_t i, j;
+
+	if (!num_modules)
+		return NULL;
+
+	module_cus = malloc_array(num_modules, sizeof(*module_cus));
+	if (!module_cus)
+		return &drgn_enomem;
+	for (i = 0; i < num_modules; i++)
+		compilation_unit_vector_init(&module_cus[i]);
+
+	#pragma omp parallel
+	#pragma omp single
+	for (i = 0; i < num_modules; i++) {
+		#pragma omp task firstprivate(i)
+		{
+			if (!err) {
+				read_module_cus(dindex, modules[i], write_cache,
+						&module_cus[i],
+						all_name_indexes, &err);
+			}
+		}
+	}
+
+	/*
+	 * All of the tasks are done. Hand the CUs over to the caller even on
+	 * error so that their cache entries are freed.
+	 */
+	for (i = 0; i < num_modules; i++) {
+		struct compilation_unit_vector *cus = &module_cus[i];
+
+		if (compilation_unit_vector_reserve(all_cus,
+						    all_cus->size + cus->size)) {
+			memcpy(all_cus->data + all_cus->size, cus->data,
+			       cus->size * sizeof(*cus->data));
+			all_cus->size += cus->size;
+		} else {
+			if (!err)
+				err = &drgn_enomem;
+			for (j = 0; j < cus->size; j++)
+				index_cache_entry_vector_deinit(&cus->data[j].cache_entries);
+		}
+		compilation_unit_vector_deinit(cus);
+	}
+	free(module_cus);
+	return err;
+}
+
+static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
+					   const struct compilation_unit *cu,
+					   struct abbrev_table *abbrev)
+{
+	struct drgn_error *err;
+	uint64_t code;
+	uint32_t insn_index;
+	uint64_t tag;
+	uint8_t children;
+	uint8_t die_flags;
+	bool should_index, is_unit;
+	bool first = true;
+	uint8_t insn;
+
+	static_assert(ATTRIB_MAX_INSN == UINT8_MAX,
+		      "maximum DWARF attribute instruction is invalid");
+
+	if ((err = read_uleb128(ptr, end, &code)))
+		return err;
+	if (code == 0)
+		return &drgn_stop;
+	if (code != abbrev->decls.size + 1) {
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "DWARF abbreviation table is not sequential");
+	}
+
+	insn_index = abbrev->insns.size;
+	if (!uint32_vector_append(&abbrev->decls, &insn_index))
+		return &drgn_enomem;
+
+	if ((err = read_uleb128(ptr, end, &tag)))
+		return err;
+
+	switch (tag) {
+	/* Types. */
+	case DW_TAG_base_type:
+	case DW_TAG_class_type:
+	case DW_TAG_enumeration_type:
+	case DW_TAG_structure_type:
+	case DW_TAG_typedef:
+	case DW_TAG_union_type:
+	/* Variables. */
+	case DW_TAG_variable:
 	/* Constants. */
 	case DW_TAG_enumerator:
 	/* Functions. */
@@ -862,8 +1546,16 @@ static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
 		break;
 	}
 
-	if (should_index || tag == DW_TAG_compile_unit)
+	/*
+	 * A skeleton unit is only a stub for the split unit in a separate file,
+	 * but it has the same attributes that we need as a compile unit.
+	 * DW_TAG_skeleton_unit doesn't fit in TAG_BITS, so treat it like one.
+	 */
+	is_unit = tag == DW_TAG_compile_unit || tag == DW_TAG_skeleton_unit;
+	if (should_index)
 		die_flags = tag;
+	else if (is_unit)
+		die_flags = DW_TAG_compile_unit;
 	else
 		die_flags = 0;
 
@@ -918,11 +1610,26 @@ static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
 			case DW_FORM_string:
 				insn = ATTRIB_NAME_STRING;
 				goto append_insn;
+			case DW_FORM_strx:
+			case DW_FORM_GNU_str_index:
+				insn = ATTRIB_NAME_STRX;
+				goto append_insn;
+			case DW_FORM_strx1:
+				insn = ATTRIB_NAME_STRX1;
+				goto append_insn;
+			case DW_FORM_strx2:
+				insn = ATTRIB_NAME_STRX2;
+				goto append_insn;
+			case DW_FORM_strx3:
+				insn = ATTRIB_NAME_STRX3;
+				goto append_insn;
+			case DW_FORM_strx4:
+				insn = ATTRIB_NAME_STRX4;
+				goto append_insn;
 			default:
 				break;
 			}
-		} else if (name == DW_AT_stmt_list &&
-			   tag == DW_TAG_compile_unit &&
+		} else if (name == DW_AT_stmt_list && is_unit &&
 			   cu->sections[SECTION_DEBUG_LINE]) {
 			switch (form) {
 			case DW_FORM_data4:
@@ -963,9 +1670,98 @@ static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
 			case DW_FORM_udata:
 				insn = ATTRIB_DECL_FILE_UDATA;
 				goto append_insn;
+			case DW_FORM_implicit_const: {
+				const char *value = *ptr;
+
+				/*
+				 * Likewise, the value is positive, so its
+				 * SLEB128 encoding is also a valid ULEB128
+				 * encoding. Copy it into the instructions.
+				 */
+				if (!skip_leb128(ptr, end))
+					return drgn_eof();
+				insn = ATTRIB_DECL_FILE_IMPLICIT;
+				if (!uint8_vector_append(&abbrev->insns, &insn))
+					return &drgn_enomem;
+				while (value < *ptr) {
+					insn = *value++;
+					if (!uint8_vector_append(&abbrev->insns,
+								 &insn))
+						return &drgn_enomem;
+				}
+				/*
+				 * Don't merge a following skip into the
+				 * operand.
+				 */
+				first = true;
+				continue;
+			}
+			default:
+				break;
+			}
+		} else if (name == DW_AT_str_offsets_base && is_unit) {
+			switch (form) {
+			case DW_FORM_sec_offset:
+				if (cu->is_64_bit)
+					insn = ATTRIB_STR_OFFSETS_BASE8;
+				else
+					insn = ATTRIB_STR_OFFSETS_BASE4;
+				goto append_insn;
+			default:
+				break;
+			}
+		} else if (name == DW_AT_GNU_dwo_id && is_unit) {
+			switch (form) {
+			case DW_FORM_data8:
+				insn = ATTRIB_DWO_ID;
+				goto append_insn;
 			default:
 				break;
 			}
+		} else if ((name == DW_AT_dwo_name ||
+			    name == DW_AT_GNU_dwo_name ||
+			    name == DW_AT_comp_dir) && is_unit) {
+			uint8_t string_form;
+
+			switch (form) {
+			case DW_FORM_string:
+				string_form = STRING_FORM_STRING;
+				break;
+			case DW_FORM_strp:
+				string_form = STRING_FORM_STRP;
+				break;
+			case DW_FORM_line_strp:
+				string_form = STRING_FORM_LINE_STRP;
+				break;
+			case DW_FORM_strx:
+			case DW_FORM_GNU_str_index:
+				string_form = STRING_FORM_STRX;
+				break;
+			case DW_FORM_strx1:
+				string_form = STRING_FORM_STRX1;
+				break;
+			case DW_FORM_strx2:
+				string_form = STRING_FORM_STRX2;
+				break;
+			case DW_FORM_strx3:
+				string_form = STRING_FORM_STRX3;
+				break;
+			case DW_FORM_strx4:
+				string_form = STRING_FORM_STRX4;
+				break;
+			default:
+				goto skip_attrib;
+			}
+			insn = ATTRIB_UNIT_STRING;
+			if (!uint8_vector_append(&abbrev->insns, &insn))
+				return &drgn_enomem;
+			insn = (name == DW_AT_comp_dir ?
+				UNIT_STRING_COMP_DIR : UNIT_STRING_DWO_NAME);
+			if (!uint8_vector_append(&abbrev->insns, &insn) ||
+			    !uint8_vector_append(&abbrev->insns, &string_form))
+				return &drgn_enomem;
+			first = true;
+			continue;
 		} else if (name == DW_AT_declaration) {
 			/*
 			 * In theory, this could be DW_FORM_flag with a value of
@@ -995,6 +1791,7 @@ static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
 			}
 		}
 
+skip_attrib:
 		switch (form) {
 		case DW_FORM_addr:
 			insn = cu->address_size;
@@ -1002,21 +1799,36 @@ static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
 		case DW_FORM_data1:
 		case DW_FORM_ref1:
 		case DW_FORM_flag:
+		case DW_FORM_strx1:
+		case DW_FORM_addrx1:
 			insn = 1;
 			break;
 		case DW_FORM_data2:
 		case DW_FORM_ref2:
+		case DW_FORM_strx2:
+		case DW_FORM_addrx2:
 			insn = 2;
 			break;
+		case DW_FORM_strx3:
+		case DW_FORM_addrx3:
+			insn = 3;
+			break;
 		case DW_FORM_data4:
 		case DW_FORM_ref4:
+		case DW_FORM_ref_sup4:
+		case DW_FORM_strx4:
+		case DW_FORM_addrx4:
 			insn = 4;
 			break;
 		case DW_FORM_data8:
 		case DW_FORM_ref8:
 		case DW_FORM_ref_sig8:
+		case DW_FORM_ref_sup8:
 			insn = 8;
 			break;
+		case DW_FORM_data16:
+			insn = 16;
+			break;
 		case DW_FORM_block1:
 			insn = ATTRIB_BLOCK1;
 			goto append_insn;
@@ -1032,16 +1844,31 @@ static struct drgn_error *read_abbrev_decl(const char **ptr, const char *end,
 		case DW_FORM_sdata:
 		case DW_FORM_udata:
 		case DW_FORM_ref_udata:
+		case DW_FORM_strx:
+		case DW_FORM_addrx:
+		case DW_FORM_loclistx:
+		case DW_FORM_rnglistx:
+		case DW_FORM_GNU_addr_index:
+		case DW_FORM_GNU_str_index:
 			insn = ATTRIB_LEB128;
 			goto append_insn;
 		case DW_FORM_ref_addr:
 		case DW_FORM_sec_offset:
 		case DW_FORM_strp:
+		case DW_FORM_line_strp:
+		case DW_FORM_strp_sup:
+		case DW_FORM_GNU_ref_alt:
+		case DW_FORM_GNU_strp_alt:
 			insn = cu->is_64_bit ? 8 : 4;
 			break;
 		case DW_FORM_string:
 			insn = ATTRIB_STRING;
 			goto append_insn;
+		case DW_FORM_implicit_const:
+			/* The value is in the abbreviation, not the DIE. */
+			if (!skip_leb128(ptr, end))
+				return drgn_eof();
+			/* fallthrough */
 		case DW_FORM_flag_present:
 			continue;
 		case DW_FORM_indirect:
@@ -1096,7 +1923,9 @@ static struct drgn_error *read_abbrev_table(const char *ptr, const char *end,
 }
 
 static struct drgn_error *skip_lnp_header(struct compilation_unit *cu,
-					  const char **ptr, const char *end)
+					  const char **ptr, const char *end,
+					  uint16_t *version_ret,
+					  bool *is_64_bit_ret)
 {
 	uint32_t tmp;
 	bool is_64_bit;
@@ -1111,27 +1940,175 @@ static struct drgn_error *skip_lnp_header(struct compilation_unit *cu,
 
 	if (!read_u16(ptr, end, cu->bswap, &version))
 		return drgn_eof();
-	if (version != 2 && version != 3 && version != 4) {
+	if (version < 2 || version > 5) {
 		return drgn_error_format(DRGN_ERROR_OTHER,
 					 "unknown DWARF LNP version %" PRIu16,
 					 version);
 	}
 
 	/*
+	 * address_size (DWARF 5 only)
+	 * segment_selector_size (DWARF 5 only)
 	 * header_length
 	 * minimum_instruction_length
-	 * maximum_operations_per_instruction (DWARF 4 only)
+	 * maximum_operations_per_instruction (DWARF 4 and later)
 	 * default_is_stmt
 	 * line_base
 	 * line_range
 	 */
-	*ptr += (is_64_bit ? 8 : 4) + 4 + (version >= 4);
+	*ptr += (version >= 5 ? 2 : 0) + (is_64_bit ? 8 : 4) + 4 +
+		(version >= 4);
 
 	if (!read_u8(ptr, end, &opcode_base))
 		return drgn_eof();
 	/* standard_opcode_lengths */
 	*ptr += opcode_base - 1;
 
+	*version_ret = version;
+	*is_64_bit_ret = is_64_bit;
+	return NULL;
+}
+
+/*
+ * Read an attribute of a directory or file name entry in a DWARF 5 line number
+ * program header. If the attribute is a string, *str_ret and *len_ret are set.
+ * If it is a constant, *value_ret is set.
+ */
+static struct drgn_error *read_lnp_entry_attrib(struct compilation_unit *cu,
+						bool is_64_bit, uint64_t form,
+						const char **ptr,
+						const char *end,
+						const char **str_ret,
+						size_t *len_ret,
+						uint64_t *value_ret)
+{
+	struct drgn_error *err;
+	Elf_Data *data;
+	size_t offset, skip;
+	uint8_t u8;
+	uint16_t u16;
+	uint32_t u32;
+
+	switch (form) {
+	case DW_FORM_string:
+		if (!read_string(ptr, end, str_ret, len_ret))
+			return drgn_eof();
+		return NULL;
+	case DW_FORM_line_strp:
+	case DW_FORM_strp:
+		if (is_64_bit ?
+		    !read_u64_into_size_t(ptr, end, cu->bswap, &offset) :
+		    !read_u32_into_size_t(ptr, end, cu->bswap, &offset))
+			return drgn_eof();
+		data = cu->sections[form == DW_FORM_line_strp ?
+				    SECTION_DEBUG_LINE_STR : SECTION_DEBUG_STR];
+		if (!data || offset >= data->d_size)
+			return drgn_eof();
+		/* get_debug_sections() checked that this is null terminated. */
+		*str_ret = section_ptr(data, offset);
+		*len_ret = strlen(*str_ret);
+		return NULL;
+	case DW_FORM_udata:
+		return read_uleb128(ptr, end, value_ret);
+	case DW_FORM_data1:
+		if (!read_u8(ptr, end, &u8))
+			return drgn_eof();
+		*value_ret = u8;
+		return NULL;
+	case DW_FORM_data2:
+		if (!read_u16(ptr, end, cu->bswap, &u16))
+			return drgn_eof();
+		*value_ret = u16;
+		return NULL;
+	case DW_FORM_data4:
+		if (!read_u32(ptr, end, cu->bswap, &u32))
+			return drgn_eof();
+		*value_ret = u32;
+		return NULL;
+	case DW_FORM_data8:
+		if (!read_u64(ptr, end, cu->bswap, value_ret))
+			return drgn_eof();
+		return NULL;
+	case DW_FORM_data16:
+		skip = 16;
+		break;
+	case DW_FORM_block:
+		if ((err = read_uleb128_into_size_t(ptr, end, &skip)))
+			return err;
+		break;
+	default:
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "unknown attribute form %" PRIu64 " in line number program header",
+					 form);
+	}
+	if (!read_in_bounds(*ptr, end, skip))
+		return drgn_eof();
+	*ptr += skip;
+	return NULL;
+}
+
+/*
+ * Read the directory or file name entries of a DWARF 5 line number program
+ * header. The path and directory index of each entry are passed to the given
+ * callback.
+ */
+static struct drgn_error *
+read_lnp_entries(struct compilation_unit *cu, bool is_64_bit,
+		 const char **ptr, const char *end,
+		 struct drgn_error *(*cb)(const char *, size_t, uint64_t,
+					  void *),
+		 void *arg)
+{
+	struct drgn_error *err;
+	uint8_t format_count;
+	const char *format;
+	uint64_t count, i;
+
+	if (!read_u8(ptr, end, &format_count))
+		return drgn_eof();
+	format = *ptr;
+	for (i = 0; i < 2 * format_count; i++) {
+		if (!skip_leb128(ptr, end))
+			return drgn_eof();
+	}
+
+	if ((err = read_uleb128(ptr, end, &count)))
+		return err;
+	for (i = 0; i < count; i++) {
+		const char *format_ptr = format;
+		const char *path = NULL;
+		size_t path_len = 0;
+		uint64_t directory_index = 0;
+		uint8_t j;
+
+		for (j = 0; j < format_count; j++) {
+			uint64_t content_type, form;
+			const char *str = NULL;
+			size_t len = 0;
+			uint64_t value = 0;
+
+			/* These were already bounds checked above. */
+			if ((err = read_uleb128(&format_ptr, end,
+						&content_type)) ||
+			    (err = read_uleb128(&format_ptr, end, &form)) ||
+			    (err = read_lnp_entry_attrib(cu, is_64_bit, form,
+							 ptr, end, &str, &len,
+							 &value)))
+				return err;
+			if (content_type == DW_LNCT_path && str) {
+				path = str;
+				path_len = len;
+			} else if (content_type == DW_LNCT_directory_index) {
+				directory_index = value;
+			}
+		}
+		if (!path) {
+			return drgn_error_create(DRGN_ERROR_OTHER,
+						 "line number program header entry has no path");
+		}
+		if ((err = cb(path, path_len, directory_index, arg)))
+			return err;
+	}
 	return NULL;
 }
 
@@ -1159,53 +2136,117 @@ static void hash_directory(struct siphash *hash, const char *path,
 
 DEFINE_VECTOR(siphash_vector, struct siphash)
 
-static struct drgn_error *
-read_file_name_table(struct drgn_dwarf_index *dindex,
-		     struct compilation_unit *cu, size_t stmt_list,
-		     struct uint64_vector *file_name_table)
-{
-	/*
-	 * We don't care about hash flooding attacks, so don't bother with the
-	 * random key.
-	 */
-	static const uint64_t siphash_key[2];
+/*
+ * We don't care about hash flooding attacks, so don't bother with the random
+ * key.
+ */
+static const uint64_t file_name_siphash_key[2];
+
+struct file_name_table_arg {
+	struct siphash_vector directories;
+	struct uint64_vector *file_name_table;
+};
+
+static struct drgn_error *append_directory(const char *path, size_t path_len,
+					   uint64_t directory_index, void *arg_)
+{
+	struct file_name_table_arg *arg = arg_;
+	struct siphash *hash;
+
+	hash = siphash_vector_append_entry(&arg->directories);
+	if (!hash)
+		return &drgn_enomem;
+	siphash_init(hash, file_name_siphash_key);
+	hash_directory(hash, path, path_len);
+	return NULL;
+}
+
+/*
+ * Append a file name to the file name table. directory_index is an index into
+ * the directory table, which is the same in DWARF 5 and earlier versions
+ * because earlier versions don't include the compilation directory as entry 0.
+ */
+static struct drgn_error *append_file_name(const char *path, size_t path_len,
+					   uint64_t directory_index, void *arg_)
+{
+	struct file_name_table_arg *arg = arg_;
+	struct siphash hash;
+	uint64_t file_name_hash;
+
+	if (directory_index >= arg->directories.size) {
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "directory index %" PRIu64 " is invalid",
+					 directory_index);
+	}
+	hash = arg->directories.data[directory_index];
+	siphash_update(&hash, path, path_len);
+	file_name_hash = siphash_final(&hash);
+	if (!uint64_vector_append(arg->file_name_table, &file_name_hash))
+		return &drgn_enomem;
+	return NULL;
+}
+
+/*
+ * Read the file name table of a line number program. The table is indexed by
+ * DW_AT_decl_file values. Before DWARF 5, file names are numbered from one, so
+ * entry 0 is a placeholder.
+ */
+static struct drgn_error *
+read_file_name_table(struct drgn_dwarf_index *dindex,
+		     struct compilation_unit *cu, size_t stmt_list,
+		     struct uint64_vector *file_name_table)
+{
 	struct drgn_error *err;
 	Elf_Data *debug_line = cu->sections[SECTION_DEBUG_LINE];
 	const char *ptr = section_ptr(debug_line, stmt_list);
 	const char *end = section_end(debug_line);
-	struct siphash_vector directories;
+	struct file_name_table_arg arg = {
+		.file_name_table = file_name_table,
+	};
+	uint16_t version;
+	bool is_64_bit;
 
-	siphash_vector_init(&directories);
+	siphash_vector_init(&arg.directories);
 
-	err = skip_lnp_header(cu, &ptr, end);
+	err = skip_lnp_header(cu, &ptr, end, &version, &is_64_bit);
 	if (err)
-		return err;
+		goto out;
+
+	if (version >= 5) {
+		if ((err = read_lnp_entries(cu, is_64_bit, &ptr, end,
+					    append_directory, &arg)) ||
+		    (err = read_lnp_entries(cu, is_64_bit, &ptr, end,
+					    append_file_name, &arg)))
+			goto out;
+		err = NULL;
+		goto out;
+	}
 
+	/* The compilation directory is implicitly directory 0. */
+	if ((err = append_directory("", 0, 0, &arg)))
+		goto out;
 	for (;;) {
-		struct siphash *hash;
 		const char *path;
 		size_t path_len;
 
-		if (!read_string(&ptr, end, &path, &path_len))
-			return drgn_eof();
+		if (!read_string(&ptr, end, &path, &path_len)) {
+			err = drgn_eof();
+			goto out;
+		}
 		if (!path_len)
 			break;
-
-		hash = siphash_vector_append_entry(&directories);
-		if (!hash) {
-			err = &drgn_enomem;
+		if ((err = append_directory(path, path_len, 0, &arg)))
 			goto out;
-		}
-		siphash_init(hash, siphash_key);
-		hash_directory(hash, path, path_len);
 	}
 
+	if (!uint64_vector_append(file_name_table, &(uint64_t){0})) {
+		err = &drgn_enomem;
+		goto out;
+	}
 	for (;;) {
 		const char *path;
 		size_t path_len;
 		uint64_t directory_index;
-		struct siphash hash;
-		uint64_t file_name_hash;
 
 		if (!read_string(&ptr, end, &path, &path_len)) {
 			err = drgn_eof();
@@ -1221,61 +2262,127 @@ read_file_name_table(struct drgn_dwarf_index *dindex,
 			err = drgn_eof();
 			goto out;
 		}
-
-		if (directory_index > directories.size) {
-			err = drgn_error_format(DRGN_ERROR_OTHER,
-						"directory index %" PRIu64 " is invalid",
-						directory_index);
-			goto out;
-		}
-
-		if (directory_index)
-			hash = directories.data[directory_index - 1];
-		else
-			siphash_init(&hash, siphash_key);
-		siphash_update(&hash, path, path_len);
-
-		file_name_hash = siphash_final(&hash);
-		if (!uint64_vector_append(file_name_table, &file_name_hash)) {
-			err = &drgn_enomem;
+		if ((err = append_file_name(path, path_len, directory_index,
+					    &arg)))
 			goto out;
-		}
 	}
 
 	err = NULL;
 out:
-	siphash_vector_deinit(&directories);
+	siphash_vector_deinit(&arg.directories);
 	return err;
 }
 
+/*
+ * Get the hash of the file name for a DW_AT_decl_file value, or 0 if there is
+ * no DW_AT_decl_file.
+ */
+static struct drgn_error *
+lookup_file_name_hash(const struct uint64_vector *file_name_table,
+		      size_t decl_file, uint64_t *ret)
+{
+	if (decl_file == SIZE_MAX || (decl_file == 0 && !file_name_table->size)) {
+		*ret = 0;
+		return NULL;
+	}
+	if (decl_file >= file_name_table->size) {
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "invalid DW_AT_decl_file %zu",
+					 decl_file);
+	}
+	*ret = file_name_table->data[decl_file];
+	return NULL;
+}
+
+/*
+ * Copy a name and its null terminator into the name arena of a shard. The shard
+ * must be locked. Returns NULL if allocation fails.
+ */
+static const char *intern_name(struct drgn_dwarf_index_shard *shard,
+			       const char *name, size_t len)
+{
+	struct drgn_dwarf_index_name_block *block = shard->name_blocks;
+	char *ret;
+
+	len++;
+	if (len > shard->name_block_space) {
+		size_t size;
+
+		/* Blocks double in size up to a limit. */
+		if (block)
+			size = min(block->size * 2, (size_t)NAME_BLOCK_MAX_SIZE);
+		else
+			size = NAME_BLOCK_MIN_SIZE;
+		if (size < len)
+			size = len;
+		block = malloc(sizeof(*block) + size);
+		if (!block)
+			return NULL;
+		block->next = shard->name_blocks;
+		block->size = size;
+		shard->name_blocks = block;
+		shard->name_block_space = size;
+	}
+	ret = &block->names[block->size - shard->name_block_space];
+	memcpy(ret, name, len);
+	shard->name_block_space -= len;
+	return ret;
+}
+
 static bool append_die_entry(struct drgn_dwarf_index_shard *shard, uint64_t tag,
-			     uint64_t file_name_hash, Dwfl_Module *module,
-			     uint64_t offset)
+			     uint64_t file_name_hash, uint16_t module_id,
+			     uint64_t offset, uint64_t skeleton_offset)
 {
 	struct drgn_dwarf_index_die *die;
 
+	/* The last index is reserved for the end of the chain. */
+	if (shard->dies.size >= UINT32_MAX)
+		return false;
 	die = drgn_dwarf_index_die_vector_append_entry(&shard->dies);
 	if (!die)
 		return false;
-	die->tag = tag;
+	die->next = UINT32_MAX;
+	die->module = module_id;
 	die->file_name_hash = file_name_hash;
-	die->module = module;
-	die->offset = offset;
-	die->next = SIZE_MAX;
+	die->tag = tag;
+	if (offset <= UINT32_MAX && skeleton_offset == UINT64_MAX) {
+		die->offset = offset;
+		die->flags = 0;
+	} else {
+		struct drgn_dwarf_index_die_offsets *offsets;
+
+		if (shard->die_offsets.size > UINT32_MAX)
+			goto err;
+		offsets = drgn_dwarf_index_die_offsets_vector_append_entry(&shard->die_offsets);
+		if (!offsets)
+			goto err;
+		offsets->offset = offset;
+		offsets->skeleton_offset = skeleton_offset;
+		die->offset = shard->die_offsets.size - 1;
+		die->flags = DIE_FLAG_OFFSETS;
+	}
 	return true;
+
+err:
+	shard->dies.size--;
+	return false;
 }
 
+/*
+ * Add a DIE to the index. If intern is true, the name is copied into the index.
+ * Otherwise, it must stay valid as long as the module, which is the case for
+ * names in the module's debugging sections and in its split DWARF files.
+ */
 static struct drgn_error *index_die(struct drgn_dwarf_index *dindex,
-				    const char *name, uint64_t tag,
-				    uint64_t file_name_hash,
-				    Dwfl_Module *module, uint64_t offset)
+				    const char *name, bool intern,
+				    uint64_t tag, uint64_t file_name_hash,
+				    uint16_t module_id, uint64_t offset,
+				    uint64_t skeleton_offset)
 {
 	struct drgn_error *err;
-	struct drgn_dwarf_index_die_map_entry entry = {
-		.key = {
-			.str = name,
-			.len = strlen(name),
-		},
+	struct string key = {
+		.str = name,
+		.len = strlen(name),
 	};
 	struct hash_pair hp;
 	struct drgn_dwarf_index_shard *shard;
@@ -1283,42 +2390,60 @@ static struct drgn_error *index_die(struct drgn_dwarf_index *dindex,
 	size_t index;
 	struct drgn_dwarf_index_die *die;
 
-	hp = drgn_dwarf_index_die_map_hash(&entry.key);
+	if (key.len > UINT32_MAX)
+		return &drgn_enomem;
+	hp = drgn_dwarf_index_die_map_hash(&key);
 	shard = &dindex->shards[hash_pair_to_shard(hp)];
 	omp_set_lock(&shard->lock);
-	it = drgn_dwarf_index_die_map_search_hashed(&shard->map, &entry.key,
-						    hp);
+	it = drgn_dwarf_index_die_map_search_hashed(&shard->map, &key, hp);
 	if (!it.entry) {
-		if (!append_die_entry(shard, tag, file_name_hash, module,
-				      offset)) {
+		struct drgn_dwarf_index_name entry = {
+			.len = key.len,
+		};
+
+		if (!append_die_entry(shard, tag, file_name_hash, module_id,
+				      offset, skeleton_offset)) {
 			err = &drgn_enomem;
 			goto out;
 		}
-		entry.value = shard->dies.size - 1;
-		if (drgn_dwarf_index_die_map_insert_searched(&shard->map,
+		entry.die = shard->dies.size - 1;
+		/*
+		 * If inserting fails, the name is left in the arena until the
+		 * index is freed.
+		 */
+		entry.str = intern ? intern_name(shard, name, key.len) : name;
+		if (entry.str &&
+		    drgn_dwarf_index_die_map_insert_searched(&shard->map,
 							     &entry, hp,
-							     NULL) == 1)
+							     NULL) == 1) {
 			err = NULL;
-		else
+		} else {
+			shard->dies.size--;
 			err = &drgn_enomem;
+		}
 		goto out;
 	}
 
-	die = &shard->dies.data[it.entry->value];
+	die = &shard->dies.data[it.entry->die];
 	for (;;) {
+		/*
+		 * This is a duplicate, or a DIE from a different file whose
+		 * truncated hash collides; see struct drgn_dwarf_index_die.
+		 */
 		if (die->tag == tag &&
-		    die->file_name_hash == file_name_hash) {
+		    die->file_name_hash == (uint32_t)file_name_hash) {
 			err = NULL;
 			goto out;
 		}
 
-		if (die->next == SIZE_MAX)
+		if (die->next == UINT32_MAX)
 			break;
 		die = &shard->dies.data[die->next];
 	}
 
 	index = die - shard->dies.data;
-	if (!append_die_entry(shard, tag, file_name_hash, module, offset)) {
+	if (!append_die_entry(shard, tag, file_name_hash, module_id, offset,
+			      skeleton_offset)) {
 		err = &drgn_enomem;
 		goto out;
 	}
@@ -1329,15 +2454,433 @@ out:
 	return err;
 }
 
+/*
+ * Index cache files are in the native byte order, since they are only ever read
+ * on the machine that wrote them. A file consists of a header, an array of
+ * entries, and a string table containing the null-terminated names of the
+ * entries.
+ */
+#define INDEX_CACHE_MAGIC "DRGNIDX"
+#define INDEX_CACHE_VERSION 2
+
+struct index_cache_header {
+	char magic[8];
+	uint32_t version;
+	uint32_t reserved;
+	uint64_t num_entries;
+	uint64_t strtab_size;
+};
+
+struct index_cache_file_entry {
+	uint64_t tag;
+	uint64_t file_name_hash;
+	uint64_t offset;
+	uint64_t skeleton_offset;
+	/* Offset of the name in the string table. */
+	uint64_t name;
+};
+
+static int module_build_id(Dwfl_Module *module,
+			   struct drgn_dwfl_module_userdata *userdata,
+			   const void **ret)
+{
+	const unsigned char *bits;
+	GElf_Addr vaddr;
+	int len;
+
+	len = dwfl_module_build_id(module, &bits, &vaddr);
+	if (len > 0) {
+		*ret = bits;
+		return len;
+	}
+	/*
+	 * libdwfl only knows the build ID once it has the ELF file, which it
+	 * doesn't for modules whose ELF handle we set up ourselves.
+	 */
+	if (userdata->elf) {
+		ssize_t elf_len;
+
+		elf_len = dwelf_elf_gnu_build_id(userdata->elf, ret);
+		if (elf_len > 0 && elf_len <= INT_MAX)
+			return elf_len;
+	}
+	return 0;
+}
+
+static char *index_cache_path(const char *cache_dir, const void *build_id,
+			      int build_id_len)
+{
+	struct string_builder sb = {};
+	char *path;
+	int i;
+
+	if (!string_builder_append(&sb, cache_dir) ||
+	    !string_builder_appendc(&sb, '/'))
+		goto err;
+	for (i = 0; i < build_id_len; i++) {
+		if (!string_builder_appendf(&sb, "%02x",
+					    ((const uint8_t *)build_id)[i]))
+			goto err;
+	}
+	if (!string_builder_append(&sb, ".idx") ||
+	    !string_builder_finalize(&sb, &path))
+		goto err;
+	return path;
+
+err:
+	free(sb.str);
+	return NULL;
+}
+
+/*
+ * Index a module from its cache file. If the module isn't cached or the cache
+ * file is invalid, *hit is set to false and the module must be indexed
+ * normally.
+ */
+static struct drgn_error *
+read_index_cache(struct drgn_dwarf_index *dindex, Dwfl_Module *module,
+		 struct drgn_dwfl_module_userdata *userdata, const char *path,
+		 bool *hit)
+{
+	struct drgn_error *err = NULL;
+	int fd;
+	struct stat st;
+	void *map;
+	const struct index_cache_header *header;
+	const struct index_cache_file_entry *entries;
+	const char *strtab;
+	uint64_t i;
+
+	*hit = false;
+	fd = open(path, O_RDONLY | O_CLOEXEC);
+	if (fd == -1)
+		return NULL;
+	if (fstat(fd, &st) == -1 || st.st_size < sizeof(*header) ||
+	    st.st_size > SIZE_MAX) {
+		close(fd);
+		return NULL;
+	}
+	map = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+	close(fd);
+	if (map == MAP_FAILED)
+		return NULL;
+
+	header = map;
+	if (memcmp(header->magic, INDEX_CACHE_MAGIC,
+		   sizeof(INDEX_CACHE_MAGIC)) != 0 ||
+	    header->version != INDEX_CACHE_VERSION ||
+	    header->num_entries > (st.st_size - sizeof(*header)) /
+				  sizeof(*entries) ||
+	    header->strtab_size != (st.st_size - sizeof(*header) -
+				    header->num_entries * sizeof(*entries)))
+		goto invalid;
+	entries = (const struct index_cache_file_entry *)(header + 1);
+	strtab = (const char *)&entries[header->num_entries];
+	if (header->strtab_size &&
+	    strtab[header->strtab_size - 1] != '\0')
+		goto invalid;
+	for (i = 0; i < header->num_entries; i++) {
+		if (entries[i].name >= header->strtab_size ||
+		    entries[i].tag > TAG_MASK)
+			goto invalid;
+	}
+
+	/* The index copies the names, so the mapping isn't needed after this. */
+	for (i = 0; i < header->num_entries; i++) {
+		err = index_die(dindex, &strtab[entries[i].name], true,
+				entries[i].tag, entries[i].file_name_hash,
+				userdata->module_id, entries[i].offset,
+				entries[i].skeleton_offset);
+		if (err)
+			break;
+	}
+	*hit = !err;
+invalid:
+	munmap(map, st.st_size);
+	return err;
+}
+
+/*
+ * Load every module that we can from the index cache. hits[i] is set to whether
+ * modules[i] was loaded.
+ */
+static struct drgn_error *read_index_caches(struct drgn_dwarf_index *dindex,
+					    const char *cache_dir,
+					    Dwfl_Module **modules,
+					    size_t num_modules, bool *hits)
+{
+	struct drgn_error *err = NULL;
+	size_t i;
+
+	#pragma omp parallel for schedule(dynamic)
+	for (i = 0; i < num_modules; i++) {
+		struct drgn_error *err2;
+		struct drgn_dwfl_module_userdata *userdata;
+		const void *build_id;
+		int build_id_len;
+		char *path;
+
+		hits[i] = false;
+		if (err)
+			continue;
+
+		userdata = drgn_dwfl_module_userdata(modules[i]);
+		if (userdata->err)
+			continue;
+		build_id_len = module_build_id(modules[i], userdata, &build_id);
+		if (build_id_len <= 0)
+			continue;
+
+		/*
+		 * A cached module won't be passed to read_cus(), and we don't
+		 * call dwfl_module_getdwarf() until it is used, so apply ELF
+		 * relocations now. Applying them again in read_cus() for a
+		 * module that isn't cached is a no-op.
+		 */
+		if (userdata->elf) {
+			err2 = apply_elf_relocations(userdata->elf);
+			if (err2) {
+				drgn_dwfl_module_userdata_set_error(userdata,
+								    NULL,
+								    err2);
+				continue;
+			}
+		}
+
+		path = index_cache_path(cache_dir, build_id, build_id_len);
+		if (!path) {
+			err2 = &drgn_enomem;
+			goto err;
+		}
+		err2 = read_index_cache(dindex, modules[i], userdata, path,
+					&hits[i]);
+		free(path);
+		if (err2)
+			goto err;
+		if (hits[i]) {
+			#pragma omp atomic
+			dindex->cache_hits++;
+		} else {
+			#pragma omp atomic
+			dindex->cache_misses++;
+		}
+		continue;
+
+err:
+		#pragma omp critical(drgn_read_index_caches)
+		{
+			if (err)
+				drgn_error_destroy(err2);
+			else
+				err = err2;
+		}
+	}
+	return err;
+}
+
+static struct drgn_error *
+write_index_cache_file(FILE *file, struct compilation_unit *cus, size_t num_cus)
+{
+	struct index_cache_header header = {
+		.magic = INDEX_CACHE_MAGIC,
+		.version = INDEX_CACHE_VERSION,
+	};
+	size_t i, j;
+
+	for (i = 0; i < num_cus; i++) {
+		struct index_cache_entry_vector *cache_entries;
+
+		cache_entries = &cus[i].cache_entries;
+		header.num_entries += cache_entries->size;
+		for (j = 0; j < cache_entries->size; j++) {
+			header.strtab_size +=
+				strlen(cache_entries->data[j].name) + 1;
+		}
+	}
+	if (fwrite(&header, sizeof(header), 1, file) != 1)
+		return drgn_error_create_os("fwrite", errno, NULL);
+
+	header.strtab_size = 0;
+	for (i = 0; i < num_cus; i++) {
+		struct index_cache_entry_vector *cache_entries;
+
+		cache_entries = &cus[i].cache_entries;
+		for (j = 0; j < cache_entries->size; j++) {
+			struct index_cache_entry *entry;
+			struct index_cache_file_entry file_entry;
+
+			entry = &cache_entries->data[j];
+			file_entry.tag = entry->tag;
+			file_entry.file_name_hash = entry->file_name_hash;
+			file_entry.offset = entry->offset;
+			file_entry.skeleton_offset = entry->skeleton_offset;
+			file_entry.name = header.strtab_size;
+			if (fwrite(&file_entry, sizeof(file_entry), 1,
+				   file) != 1)
+				return drgn_error_create_os("fwrite", errno,
+							    NULL);
+			header.strtab_size += strlen(entry->name) + 1;
+		}
+	}
+
+	for (i = 0; i < num_cus; i++) {
+		struct index_cache_entry_vector *cache_entries;
+
+		cache_entries = &cus[i].cache_entries;
+		for (j = 0; j < cache_entries->size; j++) {
+			const char *name = cache_entries->data[j].name;
+
+			if (fwrite(name, strlen(name) + 1, 1, file) != 1)
+				return drgn_error_create_os("fwrite", errno,
+							    NULL);
+		}
+	}
+	return NULL;
+}
+
+/*
+ * Write the index cache file for a module from the entries saved for its CUs.
+ * The file is written to a temporary file and renamed so that other processes
+ * never see a partially written file.
+ */
+static struct drgn_error *write_index_cache(const char *cache_dir,
+					    struct compilation_unit *cus,
+					    size_t num_cus)
+{
+	struct drgn_error *err;
+	struct drgn_dwfl_module_userdata *userdata;
+	const void *build_id;
+	int build_id_len;
+	char *path, *tmp_path;
+	int fd;
+	FILE *file;
+
+	userdata = drgn_dwfl_module_userdata(cus[0].module);
+	build_id_len = module_build_id(cus[0].module, userdata, &build_id);
+	if (build_id_len <= 0)
+		return NULL;
+	path = index_cache_path(cache_dir, build_id, build_id_len);
+	if (!path)
+		return &drgn_enomem;
+	tmp_path = malloc(strlen(path) + sizeof(".XXXXXX"));
+	if (!tmp_path) {
+		err = &drgn_enomem;
+		goto out_path;
+	}
+	strcpy(tmp_path, path);
+	strcat(tmp_path, ".XXXXXX");
+
+	fd = mkstemp(tmp_path);
+	if (fd == -1) {
+		err = drgn_error_create_os("mkstemp", errno, tmp_path);
+		goto out_tmp_path;
+	}
+	file = fdopen(fd, "w");
+	if (!file) {
+		err = drgn_error_create_os("fdopen", errno, tmp_path);
+		close(fd);
+		goto out_unlink;
+	}
+	err = write_index_cache_file(file, cus, num_cus);
+	if (fclose(file) == EOF && !err)
+		err = drgn_error_create_os("fclose", errno, tmp_path);
+	if (err)
+		goto out_unlink;
+	if (rename(tmp_path, path) == -1) {
+		err = drgn_error_create_os("rename", errno, path);
+		goto out_unlink;
+	}
+	err = NULL;
+	goto out_tmp_path;
+
+out_unlink:
+	unlink(tmp_path);
+out_tmp_path:
+	free(tmp_path);
+out_path:
+	free(path);
+	return err;
+}
+
+/*
+ * Write the index cache files for all of the modules that were indexed from
+ * their debugging information. The failure to write a cache file isn't fatal,
+ * since it only means that the module will be indexed again next time.
+ */
+static struct drgn_error *write_index_caches(const char *cache_dir,
+					     struct compilation_unit *cus,
+					     size_t num_cus)
+{
+	struct drgn_error *err;
+	size_t i, j;
+
+	if (mkdir(cache_dir, 0777) == -1 && errno != EEXIST)
+		return NULL;
+
+	/*
+	 * read_cus() reads all of the CUs of a module in one go, so each
+	 * module's CUs are contiguous.
+	 */
+	for (i = 0; i < num_cus; i = j) {
+		for (j = i + 1; j < num_cus; j++) {
+			if (cus[j].module != cus[i].module)
+				break;
+		}
+		if (!cus[i].write_cache)
+			continue;
+		err = write_index_cache(cache_dir, &cus[i], j - i);
+		if (err == &drgn_enomem)
+			return err;
+		drgn_error_destroy(err);
+	}
+	return NULL;
+}
+
 struct die {
 	const char *sibling;
 	const char *name;
 	size_t stmt_list;
+	/* SIZE_MAX if the DIE doesn't have a DW_AT_decl_file. */
 	size_t decl_file;
 	const char *specification;
+	/* Only for unit DIEs. */
+	const char *unit_strings[2];
+	uint64_t dwo_id;
 	uint8_t flags;
 };
 
+/* Look up an index in .debug_str_offsets (DW_FORM_strx). */
+static struct drgn_error *read_strx(const struct compilation_unit *cu,
+				    size_t index, const char **ret)
+{
+	Elf_Data *debug_str_offsets = cu->sections[SECTION_DEBUG_STR_OFFSETS];
+	Elf_Data *debug_str = cu->sections[SECTION_DEBUG_STR];
+	size_t offset_size = cu->is_64_bit ? 8 : 4;
+	const char *ptr;
+	size_t offset;
+
+	if (!debug_str_offsets) {
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "DW_FORM_strx without .debug_str_offsets section");
+	}
+	if (cu->str_offsets_base > debug_str_offsets->d_size ||
+	    index >= (debug_str_offsets->d_size - cu->str_offsets_base) /
+		     offset_size)
+		return drgn_eof();
+	ptr = section_ptr(debug_str_offsets,
+			  cu->str_offsets_base + index * offset_size);
+	if (cu->is_64_bit)
+		read_u64_into_size_t(&ptr, section_end(debug_str_offsets),
+				     cu->bswap, &offset);
+	else
+		read_u32_into_size_t(&ptr, section_end(debug_str_offsets),
+				     cu->bswap, &offset);
+	if (offset >= debug_str->d_size)
+		return drgn_eof();
+	*ret = section_ptr(debug_str, offset);
+	return NULL;
+}
+
 static struct drgn_error *read_die(struct compilation_unit *cu,
 				   const struct abbrev_table *abbrev,
 				   const char **ptr, const char *end,
@@ -1348,6 +2891,13 @@ static struct drgn_error *read_die(struct compilation_unit *cu,
 	uint64_t code;
 	uint8_t *insnp;
 	uint8_t insn;
+	/*
+	 * DW_AT_str_offsets_base may come after the strings of the unit DIE
+	 * that need it, so they are looked up at the end.
+	 */
+	size_t unit_strx[2];
+	bool has_unit_strx[2] = {};
+	uint8_t which;
 
 	if ((err = read_uleb128(ptr, end, &code)))
 		return err;
@@ -1361,6 +2911,10 @@ static struct drgn_error *read_die(struct compilation_unit *cu,
 	}
 	insnp = &abbrev->insns.data[abbrev->decls.data[code - 1]];
 
+	*die = (struct die){
+		.stmt_list = SIZE_MAX,
+		.decl_file = SIZE_MAX,
+	};
 	while ((insn = *insnp++)) {
 		size_t skip, tmp;
 
@@ -1431,6 +2985,30 @@ strp:
 			die->name = &debug_str_buffer[tmp];
 			__builtin_prefetch(die->name);
 			break;
+		case ATTRIB_NAME_STRX:
+			if ((err = read_uleb128_into_size_t(ptr, end, &tmp)))
+				return err;
+			goto strx;
+		case ATTRIB_NAME_STRX1:
+			if (!read_u8_into_size_t(ptr, end, &tmp))
+				return drgn_eof();
+			goto strx;
+		case ATTRIB_NAME_STRX2:
+			if (!read_u16_into_size_t(ptr, end, cu->bswap, &tmp))
+				return drgn_eof();
+			goto strx;
+		case ATTRIB_NAME_STRX3:
+			if (!read_u24_into_size_t(ptr, end, cu->bswap, &tmp))
+				return drgn_eof();
+			goto strx;
+		case ATTRIB_NAME_STRX4:
+			if (!read_u32_into_size_t(ptr, end, cu->bswap, &tmp))
+				return drgn_eof();
+strx:
+			if ((err = read_strx(cu, tmp, &die->name)))
+				return err;
+			__builtin_prefetch(die->name);
+			break;
 		case ATTRIB_STMT_LIST_LINEPTR4:
 			if (!read_u32_into_size_t(ptr, end, cu->bswap,
 						  &die->stmt_list))
@@ -1465,6 +3043,16 @@ strp:
 							    &die->decl_file)))
 				return err;
 			break;
+		case ATTRIB_DECL_FILE_IMPLICIT: {
+			const char *value = (const char *)insnp;
+
+			if ((err = read_uleb128_into_size_t(&value,
+							    (const char *)&abbrev->insns.data[abbrev->insns.size],
+							    &die->decl_file)))
+				return err;
+			insnp = (uint8_t *)value;
+			break;
+		}
 		case ATTRIB_SPECIFICATION_REF1:
 			if (!read_u8_into_size_t(ptr, end, &tmp))
 				return drgn_eof();
@@ -1490,6 +3078,91 @@ specification:
 			die->specification = &cu->ptr[tmp];
 			__builtin_prefetch(die->specification);
 			break;
+		case ATTRIB_STR_OFFSETS_BASE4:
+			if (!read_u32_into_u64(ptr, end, cu->bswap,
+					       &cu->str_offsets_base))
+				return drgn_eof();
+			break;
+		case ATTRIB_STR_OFFSETS_BASE8:
+			if (!read_u64(ptr, end, cu->bswap,
+				      &cu->str_offsets_base))
+				return drgn_eof();
+			break;
+		case ATTRIB_DWO_ID:
+			if (!read_u64(ptr, end, cu->bswap, &die->dwo_id))
+				return drgn_eof();
+			break;
+		case ATTRIB_UNIT_STRING:
+			which = *insnp++;
+			switch (*insnp++) {
+			case STRING_FORM_STRING:
+				die->unit_strings[which] = *ptr;
+				if (!skip_string(ptr, end))
+					return drgn_eof();
+				break;
+			case STRING_FORM_STRP:
+				if (cu->is_64_bit ?
+				    !read_u64_into_size_t(ptr, end, cu->bswap,
+							  &tmp) :
+				    !read_u32_into_size_t(ptr, end, cu->bswap,
+							  &tmp))
+					return drgn_eof();
+				if (tmp >= debug_str_end - debug_str_buffer)
+					return drgn_eof();
+				die->unit_strings[which] =
+					&debug_str_buffer[tmp];
+				break;
+			case STRING_FORM_LINE_STRP: {
+				Elf_Data *debug_line_str =
+					cu->sections[SECTION_DEBUG_LINE_STR];
+
+				if (cu->is_64_bit ?
+				    !read_u64_into_size_t(ptr, end, cu->bswap,
+							  &tmp) :
+				    !read_u32_into_size_t(ptr, end, cu->bswap,
+							  &tmp))
+					return drgn_eof();
+				if (!debug_line_str ||
+				    tmp >= debug_line_str->d_size)
+					return drgn_eof();
+				die->unit_strings[which] =
+					section_ptr(debug_line_str, tmp);
+				break;
+			}
+			case STRING_FORM_STRX:
+				if ((err = read_uleb128_into_size_t(ptr, end,
+								    &unit_strx[which])))
+					return err;
+				has_unit_strx[which] = true;
+				break;
+			case STRING_FORM_STRX1:
+				if (!read_u8_into_size_t(ptr, end,
+							 &unit_strx[which]))
+					return drgn_eof();
+				has_unit_strx[which] = true;
+				break;
+			case STRING_FORM_STRX2:
+				if (!read_u16_into_size_t(ptr, end, cu->bswap,
+							  &unit_strx[which]))
+					return drgn_eof();
+				has_unit_strx[which] = true;
+				break;
+			case STRING_FORM_STRX3:
+				if (!read_u24_into_size_t(ptr, end, cu->bswap,
+							  &unit_strx[which]))
+					return drgn_eof();
+				has_unit_strx[which] = true;
+				break;
+			case STRING_FORM_STRX4:
+				if (!read_u32_into_size_t(ptr, end, cu->bswap,
+							  &unit_strx[which]))
+					return drgn_eof();
+				has_unit_strx[which] = true;
+				break;
+			default:
+				DRGN_UNREACHABLE();
+			}
+			break;
 		default:
 			skip = insn;
 skip:
@@ -1502,19 +3175,36 @@ skip:
 
 	die->flags = *insnp;
 
+	for (which = 0; which < ARRAY_SIZE(has_unit_strx); which++) {
+		if (has_unit_strx[which] &&
+		    (err = read_strx(cu, unit_strx[which],
+				     &die->unit_strings[which])))
+			return err;
+	}
 	return NULL;
 }
 
-static struct drgn_error *index_cu(struct drgn_dwarf_index *dindex,
-				   struct compilation_unit *cu)
+static struct drgn_error *
+index_split_unit(struct drgn_dwarf_index *dindex,
+		 struct compilation_unit *skeleton, const struct die *die,
+		 const struct uint64_vector *file_name_table);
+
+/*
+ * Index a CU. For a split unit, skeleton_file_name_table is the file name table
+ * of its skeleton unit, which DW_AT_decl_file refers to. Otherwise, it is NULL.
+ */
+static struct drgn_error *
+index_cu(struct drgn_dwarf_index *dindex, struct compilation_unit *cu,
+	 const struct uint64_vector *skeleton_file_name_table)
 {
 	struct drgn_error *err;
 	struct abbrev_table abbrev;
 	struct uint64_vector file_name_table;
+	const struct uint64_vector *decl_file_table;
 	Elf_Data *debug_abbrev = cu->sections[SECTION_DEBUG_ABBREV];
 	const char *debug_abbrev_end = section_end(debug_abbrev);
-	const char *ptr = &cu->ptr[cu->is_64_bit ? 23 : 11];
-	const char *end = &cu->ptr[(cu->is_64_bit ? 12 : 4) + cu->unit_length];
+	const char *ptr = &cu->ptr[cu->header_size];
+	const char *end = cu_end(cu);
 	Elf_Data *debug_info = cu->sections[SECTION_DEBUG_INFO];
 	const char *debug_info_buffer = section_ptr(debug_info, 0);
 	Elf_Data *debug_str = cu->sections[SECTION_DEBUG_STR];
@@ -1525,104 +3215,1009 @@ static struct drgn_error *index_cu(struct drgn_dwarf_index *dindex,
 
 	abbrev_table_init(&abbrev);
 	uint64_vector_init(&file_name_table);
+	if (skeleton_file_name_table)
+		decl_file_table = skeleton_file_name_table;
+	else
+		decl_file_table = &file_name_table;
+
+	if (cu->debug_abbrev_offset >= debug_abbrev->d_size) {
+		err = drgn_eof();
+		goto out;
+	}
+	if ((err = read_abbrev_table(section_ptr(debug_abbrev,
+						 cu->debug_abbrev_offset),
+				     debug_abbrev_end, cu, &abbrev)))
+		goto out;
+
+	for (;;) {
+		struct die die;
+		uint64_t die_offset = ptr - debug_info_buffer;
+		uint64_t tag;
+
+		err = read_die(cu, &abbrev, &ptr, end, debug_str_buffer,
+			       debug_str_end, &die);
+		if (err && err->code == DRGN_ERROR_STOP) {
+			depth--;
+			if (depth == 1)
+				enum_die_offset = 0;
+			else if (depth == 0)
+				break;
+			continue;
+		} else if (err) {
+			goto out;
+		}
+
+		tag = die.flags & TAG_MASK;
+		if (tag == DW_TAG_compile_unit) {
+			if (depth != 0)
+				goto next;
+			if (!skeleton_file_name_table &&
+			    die.stmt_list != SIZE_MAX &&
+			    (err = read_file_name_table(dindex, cu,
+							die.stmt_list,
+							&file_name_table)))
+				goto out;
+			if (cu->skeleton_offset != UINT64_MAX) {
+				/*
+				 * Before DWARF 5, the unit ID is an attribute.
+				 * If it doesn't match the skeleton, the split
+				 * DWARF file is stale.
+				 */
+				if (cu->version < 5 && die.dwo_id != cu->dwo_id)
+					goto out;
+			} else if (cu->unit_type == DW_UT_skeleton ||
+				   die.unit_strings[UNIT_STRING_DWO_NAME]) {
+				err = index_split_unit(dindex, cu, &die,
+						       &file_name_table);
+				goto out;
+			}
+		} else if (tag && !(die.flags & TAG_FLAG_DECLARATION)) {
+			uint64_t file_name_hash;
+
+			/*
+			 * NB: the enumerator name points to the
+			 * enumeration_type DIE instead of the enumerator DIE.
+			 */
+			if (depth == 1 && tag == DW_TAG_enumeration_type)
+				enum_die_offset = die_offset;
+			else if (depth == 2 && tag == DW_TAG_enumerator &&
+				 enum_die_offset)
+				die_offset = enum_die_offset;
+			else if (depth != 1)
+				goto next;
+
+			if (die.specification &&
+			    (!die.name || die.decl_file == SIZE_MAX)) {
+				struct die decl;
+				const char *decl_ptr = die.specification;
+
+				if ((err = read_die(cu, &abbrev, &decl_ptr, end,
+						    debug_str_buffer,
+						    debug_str_end, &decl)))
+					goto out;
+				if (!die.name && decl.name)
+					die.name = decl.name;
+				if (die.decl_file == SIZE_MAX)
+					die.decl_file = decl.decl_file;
+			}
+
+			if (die.name) {
+				if ((err = lookup_file_name_hash(decl_file_table,
+								 die.decl_file,
+								 &file_name_hash)))
+					goto out;
+				if ((err = index_die(dindex, die.name, false,
+						     tag, file_name_hash,
+						     cu->module_id, die_offset,
+						     cu->skeleton_offset)))
+					goto out;
+				if (cu->write_cache) {
+					struct index_cache_entry *entry;
+
+					entry = index_cache_entry_vector_append_entry(&cu->cache_entries);
+					if (!entry) {
+						err = &drgn_enomem;
+						goto out;
+					}
+					entry->name = die.name;
+					entry->tag = tag;
+					entry->file_name_hash = file_name_hash;
+					entry->offset = die_offset;
+					entry->skeleton_offset = cu->skeleton_offset;
+				}
+			}
+		}
+
+next:
+		if (die.flags & TAG_FLAG_CHILDREN) {
+			if (die.sibling)
+				ptr = die.sibling;
+			else
+				depth++;
+		} else if (depth == 0) {
+			break;
+		}
+	}
+
+	err = NULL;
+out:
+	uint64_vector_deinit(&file_name_table);
+	abbrev_table_deinit(&abbrev);
+	return err;
+}
+
+/*
+ * Open the split DWARF file of a skeleton unit. This looks in the same places
+ * as libdw so that the DIEs can be found again later: dwo_name if it is
+ * absolute, dwo_name relative to the directory of the module's debugging
+ * information file, and dwo_name relative to the compilation directory. Returns
+ * -1 if the file wasn't found.
+ */
+static int open_dwo_file(Dwfl_Module *module, const char *dwo_name,
+			 const char *comp_dir)
+{
+	const char *mainfile, *debugfile, *path;
+	const char *slash;
+	struct string_builder sb = {};
+	int fd;
+
+	if (dwo_name[0] == '/')
+		return open(dwo_name, O_RDONLY | O_CLOEXEC);
+
+	dwfl_module_info(module, NULL, NULL, NULL, NULL, NULL, &mainfile,
+			 &debugfile);
+	path = debugfile ? debugfile : mainfile;
+	if (path && (slash = strrchr(path, '/'))) {
+		if (!string_builder_appendn(&sb, path, slash - path + 1) ||
+		    !string_builder_append(&sb, dwo_name) ||
+		    !string_builder_appendc(&sb, '\0'))
+			goto err;
+		fd = open(sb.str, O_RDONLY | O_CLOEXEC);
+		if (fd != -1)
+			goto out;
+		sb.len = 0;
+	}
+
+	if (comp_dir) {
+		/* A relative compilation directory is relative to the file. */
+		if (comp_dir[0] != '/') {
+			if (!path || !(slash = strrchr(path, '/')))
+				goto err;
+			if (!string_builder_appendn(&sb, path,
+						    slash - path + 1))
+				goto err;
+		}
+		if (!string_builder_append(&sb, comp_dir) ||
+		    !string_builder_appendc(&sb, '/') ||
+		    !string_builder_append(&sb, dwo_name) ||
+		    !string_builder_appendc(&sb, '\0'))
+			goto err;
+		fd = open(sb.str, O_RDONLY | O_CLOEXEC);
+		goto out;
+	}
+
+err:
+	fd = -1;
+out:
+	free(sb.str);
+	return fd;
+}
+
+/*
+ * Index the split unit of a skeleton unit. The split DWARF file is kept mapped
+ * until the module is destroyed, but its file descriptor is closed right away;
+ * a split DWARF kernel has thousands of them. If the file can't be found, the
+ * unit is skipped like a module without debugging information would be.
+ */
+static struct drgn_error *
+index_split_unit(struct drgn_dwarf_index *dindex,
+		 struct compilation_unit *skeleton, const struct die *die,
+		 const struct uint64_vector *file_name_table)
+{
+	struct drgn_error *err;
+	const char *dwo_name = die->unit_strings[UNIT_STRING_DWO_NAME];
+	struct drgn_dwfl_module_userdata *userdata;
+	struct drgn_dwo_file *file;
+	struct compilation_unit split;
+	const char *ptr, *end;
+	int fd;
+
+	if (!dwo_name)
+		return NULL;
+
+	fd = open_dwo_file(skeleton->module, dwo_name,
+			   die->unit_strings[UNIT_STRING_COMP_DIR]);
+	if (fd == -1)
+		return NULL;
+	file = malloc(sizeof(*file));
+	if (!file) {
+		close(fd);
+		return &drgn_enomem;
+	}
+	file->elf = elf_begin(fd, ELF_C_READ_MMAP_PRIVATE, NULL);
+	if (!file->elf) {
+		close(fd);
+		err = drgn_error_libelf();
+		goto err;
+	}
+	/* Read anything that isn't mapped so that we can close the file. */
+	if (elf_cntl(file->elf, ELF_C_FDREAD) == -1) {
+		close(fd);
+		err = drgn_error_libelf();
+		goto err;
+	}
+	close(fd);
+
+	memset(&split, 0, sizeof(split));
+	err = get_debug_sections(file->elf, true, split.sections);
+	if (err)
+		goto err;
+
+	/* Find the split compilation unit (as opposed to type units). */
+	ptr = section_ptr(split.sections[SECTION_DEBUG_INFO], 0);
+	end = section_end(split.sections[SECTION_DEBUG_INFO]);
+	split.module = skeleton->module;
+	split.module_id = skeleton->module_id;
+	split.bswap = skeleton->bswap;
+	for (;;) {
+		if (ptr >= end) {
+			/* Not the split DWARF file we're looking for. */
+			err = NULL;
+			goto err;
+		}
+		split.ptr = ptr;
+		err = read_compilation_unit_header(ptr, end, &split);
+		if (err)
+			goto err;
+		if (split.unit_type == DW_UT_split_compile &&
+		    split.dwo_id == skeleton->dwo_id)
+			break;
+		if (split.version < 5 && split.unit_type == DW_UT_compile) {
+			split.dwo_id = die->dwo_id;
+			/*
+			 * GNU split DWARF doesn't have DW_AT_str_offsets_base.
+			 */
+			break;
+		}
+		ptr = cu_end(&split);
+	}
+
+	/* The string offsets of a split unit start after the header. */
+	if (split.version >= 5)
+		split.str_offsets_base = split.is_64_bit ? 16 : 8;
+	split.skeleton_offset = (skeleton->ptr + skeleton->header_size -
+				 section_ptr(skeleton->sections[SECTION_DEBUG_INFO],
+					     0));
+
+	userdata = drgn_dwfl_module_userdata(skeleton->module);
+	#pragma omp critical(drgn_dwo_files)
+	{
+		file->next = userdata->dwo_files;
+		userdata->dwo_files = file;
+	}
+
+	split.write_cache = skeleton->write_cache;
+	split.cache_entries = skeleton->cache_entries;
+	err = index_cu(dindex, &split, file_name_table);
+	skeleton->cache_entries = split.cache_entries;
+	return err;
+
+err:
+	elf_end(file->elf);
+	free(file);
+	return err;
+}
+
+/* Attributes of .debug_names entries (DW_IDX_*). */
+enum {
+	IDX_COMPILE_UNIT = 1,
+	IDX_TYPE_UNIT = 2,
+	IDX_DIE_OFFSET = 3,
+	IDX_PARENT = 4,
+};
+
+struct name_index_abbrev {
+	uint64_t code;
+	uint64_t tag;
+	/* Index of the first attribute in name_index_abbrev_table::attribs. */
+	size_t attribs;
+	size_t num_attribs;
+};
+
+struct name_index_attrib {
+	uint64_t idx;
+	uint64_t form;
+};
+
+DEFINE_VECTOR(name_index_abbrev_vector, struct name_index_abbrev)
+DEFINE_VECTOR(name_index_attrib_vector, struct name_index_attrib)
+
+struct name_index_abbrev_table {
+	struct name_index_abbrev_vector abbrevs;
+	struct name_index_attrib_vector attribs;
+};
+
+/* A CU referenced by a name index, which is parsed the first time it's used. */
+struct name_index_cu {
+	bool initialized;
+	/* Whether the CU must be scanned because the name index is lacking. */
+	bool fallback;
+	struct compilation_unit cu;
+	struct abbrev_table abbrev;
+	struct uint64_vector file_name_table;
+};
+
+/* A parsed entry in a name index. */
+struct name_index_entry {
+	uint64_t tag;
+	uint64_t cu_index;
+	uint64_t die_offset;
+	/* Offset of the parent entry in the entry pool. */
+	uint64_t parent;
+	bool has_die_offset;
+	bool has_parent;
+	bool in_type_unit;
+};
+
+static struct drgn_error *
+read_name_index_abbrevs(struct name_index *ni,
+			struct name_index_abbrev_table *table)
+{
+	struct drgn_error *err;
+	const char *ptr = ni->abbrevs;
+
+	for (;;) {
+		struct name_index_abbrev *abbrev;
+
+		abbrev = name_index_abbrev_vector_append_entry(&table->abbrevs);
+		if (!abbrev)
+			return &drgn_enomem;
+		if ((err = read_uleb128(&ptr, ni->abbrevs_end, &abbrev->code)))
+			return err;
+		if (abbrev->code == 0) {
+			table->abbrevs.size--;
+			return NULL;
+		}
+		if ((err = read_uleb128(&ptr, ni->abbrevs_end, &abbrev->tag)))
+			return err;
+		abbrev->attribs = table->attribs.size;
+		for (;;) {
+			struct name_index_attrib *attrib;
+
+			attrib = name_index_attrib_vector_append_entry(&table->attribs);
+			if (!attrib)
+				return &drgn_enomem;
+			if ((err = read_uleb128(&ptr, ni->abbrevs_end,
+						&attrib->idx)) ||
+			    (err = read_uleb128(&ptr, ni->abbrevs_end,
+						&attrib->form)))
+				return err;
+			if (attrib->idx == 0 && attrib->form == 0) {
+				table->attribs.size--;
+				break;
+			}
+		}
+		abbrev->num_attribs = table->attribs.size - abbrev->attribs;
+	}
+}
+
+static struct drgn_error *read_name_index_form(struct name_index *ni,
+					       const char **ptr, uint64_t form,
+					       uint64_t *ret)
+{
+	uint8_t u8;
+	uint16_t u16;
+	uint32_t u32;
+
+	switch (form) {
+	case DW_FORM_data1:
+	case DW_FORM_ref1:
+	case DW_FORM_flag:
+		if (!read_u8(ptr, ni->end, &u8))
+			return drgn_eof();
+		*ret = u8;
+		return NULL;
+	case DW_FORM_data2:
+	case DW_FORM_ref2:
+		if (!read_u16(ptr, ni->end, ni->bswap, &u16))
+			return drgn_eof();
+		*ret = u16;
+		return NULL;
+	case DW_FORM_data4:
+	case DW_FORM_ref4:
+		if (!read_u32(ptr, ni->end, ni->bswap, &u32))
+			return drgn_eof();
+		*ret = u32;
+		return NULL;
+	case DW_FORM_data8:
+	case DW_FORM_ref8:
+	case DW_FORM_ref_sig8:
+		if (!read_u64(ptr, ni->end, ni->bswap, ret))
+			return drgn_eof();
+		return NULL;
+	case DW_FORM_udata:
+	case DW_FORM_ref_udata:
+		return read_uleb128(ptr, ni->end, ret);
+	case DW_FORM_flag_present:
+		*ret = 1;
+		return NULL;
+	default:
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "unknown .debug_names attribute form %" PRIu64,
+					 form);
+	}
+}
+
+/*
+ * Parse the name index entry at *ptr. Returns &drgn_stop at the end of the
+ * list of entries for a name.
+ */
+static struct drgn_error *
+read_name_index_entry(struct name_index *ni,
+		      struct name_index_abbrev_table *table, const char **ptr,
+		      struct name_index_entry *entry)
+{
+	struct drgn_error *err;
+	uint64_t code;
+	struct name_index_abbrev *abbrev;
+	size_t i;
+
+	if ((err = read_uleb128(ptr, ni->end, &code)))
+		return err;
+	if (code == 0)
+		return &drgn_stop;
+	/* Abbreviation codes are almost always sequential starting at 1. */
+	if (code <= table->abbrevs.size &&
+	    table->abbrevs.data[code - 1].code == code) {
+		abbrev = &table->abbrevs.data[code - 1];
+	} else {
+		for (i = 0; i < table->abbrevs.size; i++) {
+			if (table->abbrevs.data[i].code == code)
+				break;
+		}
+		if (i == table->abbrevs.size) {
+			return drgn_error_format(DRGN_ERROR_OTHER,
+						 "unknown .debug_names abbreviation code %" PRIu64,
+						 code);
+		}
+		abbrev = &table->abbrevs.data[i];
+	}
+
+	memset(entry, 0, sizeof(*entry));
+	entry->tag = abbrev->tag;
+	for (i = 0; i < abbrev->num_attribs; i++) {
+		struct name_index_attrib *attrib;
+		uint64_t value;
+
+		attrib = &table->attribs.data[abbrev->attribs + i];
+		if ((err = read_name_index_form(ni, ptr, attrib->form, &value)))
+			return err;
+		switch (attrib->idx) {
+		case IDX_COMPILE_UNIT:
+			entry->cu_index = value;
+			break;
+		case IDX_TYPE_UNIT:
+			entry->in_type_unit = true;
+			break;
+		case IDX_DIE_OFFSET:
+			entry->die_offset = value;
+			entry->has_die_offset = true;
+			break;
+		case IDX_PARENT:
+			/*
+			 * DW_FORM_flag_present means that the entry has no
+			 * indexed parent.
+			 */
+			if (attrib->form != DW_FORM_flag_present) {
+				entry->parent = value;
+				entry->has_parent = true;
+			}
+			break;
+		default:
+			break;
+		}
+	}
+	return NULL;
+}
+
+static struct drgn_error *get_name_index_cu(struct drgn_dwarf_index *dindex,
+					    struct name_index *ni,
+					    struct name_index_cu *cus,
+					    uint64_t cu_index,
+					    struct name_index_cu **ret)
+{
+	struct drgn_error *err;
+	struct name_index_cu *nicu;
+	struct compilation_unit *cu;
+	Elf_Data *debug_info = ni->sections[SECTION_DEBUG_INFO];
+	Elf_Data *debug_abbrev = ni->sections[SECTION_DEBUG_ABBREV];
+	Elf_Data *debug_str = ni->sections[SECTION_DEBUG_STR];
+	const char *ptr, *end;
+	struct die die;
+
+	if (cu_index >= ni->comp_unit_count) {
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "invalid .debug_names CU index %" PRIu64,
+					 cu_index);
+	}
+	nicu = &cus[cu_index];
+	*ret = nicu;
+	if (nicu->initialized)
+		return NULL;
+
+	cu = &nicu->cu;
+	cu->module = ni->module;
+	cu->module_id = ni->module_id;
+	memcpy(cu->sections, ni->sections, sizeof(cu->sections));
+	/* read_name_indexes() checked that this is in bounds. */
+	cu->ptr = section_ptr(debug_info,
+			      name_index_offset(ni, ni->cu_offsets, cu_index));
+	cu->bswap = ni->bswap;
+	index_cache_entry_vector_init(&cu->cache_entries);
+	abbrev_table_init(&nicu->abbrev);
+	uint64_vector_init(&nicu->file_name_table);
+	nicu->initialized = true;
+
+	end = section_end(debug_info);
+	if ((err = read_compilation_unit_header(cu->ptr, end, cu)))
+		return err;
+	if (cu->debug_abbrev_offset >= debug_abbrev->d_size)
+		return drgn_eof();
+	if ((err = read_abbrev_table(section_ptr(debug_abbrev,
+						 cu->debug_abbrev_offset),
+				     section_end(debug_abbrev), cu,
+				     &nicu->abbrev)))
+		return err;
+
+	ptr = &cu->ptr[cu->header_size];
+	end = cu_end(cu);
+	if ((err = read_die(cu, &nicu->abbrev, &ptr, end,
+			    section_ptr(debug_str, 0), section_end(debug_str),
+			    &die)))
+		return err;
+	if ((die.flags & TAG_MASK) == DW_TAG_compile_unit &&
+	    die.stmt_list != SIZE_MAX &&
+	    (err = read_file_name_table(dindex, cu, die.stmt_list,
+					&nicu->file_name_table)))
+		return err;
+	return NULL;
+}
+
+/*
+ * Read the DIE at the given CU-relative offset in a CU referenced by a name
+ * index. *ptr_ret is set to just after the DIE.
+ */
+static struct drgn_error *read_name_index_die(struct name_index *ni,
+					      struct name_index_cu *nicu,
+					      uint64_t die_offset,
+					      const char **ptr_ret,
+					      struct die *die)
+{
+	struct drgn_error *err;
+	struct compilation_unit *cu = &nicu->cu;
+	Elf_Data *debug_str = ni->sections[SECTION_DEBUG_STR];
+	const char *debug_str_buffer = section_ptr(debug_str, 0);
+	const char *debug_str_end = section_end(debug_str);
+	const char *end = cu_end(cu);
+	const char *ptr;
+
+	if (die_offset >= end - cu->ptr)
+		return drgn_eof();
+	ptr = &cu->ptr[die_offset];
+	if ((err = read_die(cu, &nicu->abbrev, &ptr, end, debug_str_buffer,
+			    debug_str_end, die)))
+		return err;
+
+	if (die->specification && die->decl_file == SIZE_MAX) {
+		struct die decl;
+		const char *decl_ptr = die->specification;
+
+		if ((err = read_die(cu, &nicu->abbrev, &decl_ptr, end,
+				    debug_str_buffer, debug_str_end, &decl)))
+			return err;
+		die->decl_file = decl.decl_file;
+	}
+	*ptr_ret = ptr;
+	return NULL;
+}
+
+/*
+ * Index the enumerators of a DW_TAG_enumeration_type DIE. Producers don't
+ * always add enumerators to the name index, so we get them from the DIE
+ * instead.
+ */
+static struct drgn_error *
+index_name_index_enumerators(struct drgn_dwarf_index *dindex,
+			     struct name_index *ni, struct name_index_cu *nicu,
+			     const char *ptr, uint64_t enum_die_offset)
+{
+	struct drgn_error *err;
+	struct compilation_unit *cu = &nicu->cu;
+	Elf_Data *debug_str = ni->sections[SECTION_DEBUG_STR];
+	const char *end = cu_end(cu);
+	unsigned int depth = 1;
+
+	for (;;) {
+		struct die die;
+		uint64_t file_name_hash;
+
+		err = read_die(cu, &nicu->abbrev, &ptr, end,
+			       section_ptr(debug_str, 0),
+			       section_end(debug_str), &die);
+		if (err && err->code == DRGN_ERROR_STOP) {
+			if (--depth == 0)
+				return NULL;
+			continue;
+		} else if (err) {
+			return err;
+		}
+
+		if (depth == 1 &&
+		    (die.flags & TAG_MASK) == DW_TAG_enumerator &&
+		    !(die.flags & TAG_FLAG_DECLARATION) && die.name) {
+			if ((err = lookup_file_name_hash(&nicu->file_name_table,
+							 die.decl_file,
+							 &file_name_hash)) ||
+			    (err = index_die(dindex, die.name, false,
+					     DW_TAG_enumerator, file_name_hash,
+					     cu->module_id, enum_die_offset,
+					     UINT64_MAX)))
+				return err;
+		}
+
+		if (die.flags & TAG_FLAG_CHILDREN) {
+			if (die.sibling)
+				ptr = die.sibling;
+			else
+				depth++;
+		}
+	}
+}
+
+static struct drgn_error *
+index_name_index_entry(struct drgn_dwarf_index *dindex, struct name_index *ni,
+		       struct name_index_abbrev_table *table,
+		       struct name_index_cu *cus, const char *name,
+		       struct name_index_entry *entry)
+{
+	struct drgn_error *err;
+	struct name_index_cu *nicu;
+	struct die die;
+	const char *ptr;
+	uint64_t tag, cu_offset, die_offset, file_name_hash;
+
+	/*
+	 * We only handle compilation units. Type units aren't used in the Linux
+	 * kernel or by default in userspace.
+	 */
+	if (entry->in_type_unit || !entry->has_die_offset)
+		return NULL;
+
+	if ((err = get_name_index_cu(dindex, ni, cus,
+				     ni->comp_unit_count == 1 ?
+				     0 : entry->cu_index, &nicu)))
+		return err;
+	/*
+	 * The entries of a skeleton unit refer to DIEs in its split unit. The
+	 * skeleton unit is always scanned instead.
+	 */
+	if (nicu->fallback || nicu->cu.unit_type == DW_UT_skeleton)
+		return NULL;
+	cu_offset = nicu->cu.ptr - section_ptr(ni->sections[SECTION_DEBUG_INFO],
+					       0);
+
+	if (entry->tag == DW_TAG_enumerator) {
+		struct name_index_entry parent;
+
+		/*
+		 * Enumerators are indexed by their enumeration type, which we
+		 * can only find from the parent entry. If there isn't one
+		 * (e.g., because the enumeration type is anonymous), fall back
+		 * to scanning the CU.
+		 */
+		if (!entry->has_parent ||
+		    entry->parent >= ni->end - ni->entry_pool) {
+			nicu->fallback = true;
+			return NULL;
+		}
+		ptr = ni->entry_pool + entry->parent;
+		err = read_name_index_entry(ni, table, &ptr, &parent);
+		if (err == &drgn_stop) {
+			nicu->fallback = true;
+			return NULL;
+		} else if (err) {
+			return err;
+		}
+		if (parent.tag != DW_TAG_enumeration_type ||
+		    !parent.has_die_offset || parent.in_type_unit ||
+		    (ni->comp_unit_count != 1 &&
+		     parent.cu_index != entry->cu_index)) {
+			nicu->fallback = true;
+			return NULL;
+		}
+		if ((err = read_name_index_die(ni, nicu, entry->die_offset,
+					       &ptr, &die)))
+			return err;
+		if ((die.flags & TAG_MASK) != DW_TAG_enumerator ||
+		    (die.flags & TAG_FLAG_DECLARATION))
+			return NULL;
+		if ((err = lookup_file_name_hash(&nicu->file_name_table,
+						 die.decl_file,
+						 &file_name_hash)))
+			return err;
+		return index_die(dindex, name, false, DW_TAG_enumerator,
+				 file_name_hash, ni->module_id,
+				 cu_offset + parent.die_offset, UINT64_MAX);
+	}
+
+	/*
+	 * Like when scanning, only index DIEs at the top level of the CU. A
+	 * name index doesn't tell us the depth of the DIE, so DIEs nested in
+	 * unindexed DIEs (e.g., function-local types) are indexed, too.
+	 */
+	if (entry->has_parent)
+		return NULL;
+
+	if ((err = read_name_index_die(ni, nicu, entry->die_offset, &ptr,
+				       &die)))
+		return err;
+	tag = die.flags & TAG_MASK;
+	if (!tag || tag == DW_TAG_compile_unit ||
+	    (die.flags & TAG_FLAG_DECLARATION))
+		return NULL;
+	if ((err = lookup_file_name_hash(&nicu->file_name_table, die.decl_file,
+					 &file_name_hash)))
+		return err;
+	die_offset = cu_offset + entry->die_offset;
+	if ((err = index_die(dindex, name, false, tag, file_name_hash,
+			     ni->module_id, die_offset, UINT64_MAX)))
+		return err;
+	if (tag == DW_TAG_enumeration_type && (die.flags & TAG_FLAG_CHILDREN))
+		return index_name_index_enumerators(dindex, ni, nicu, ptr,
+						    die_offset);
+	return NULL;
+}
+
+/*
+ * Append all of the CUs covered by a name index to fallback_cus, except for
+ * skeleton units, which read_module_cus() always scans.
+ */
+static struct drgn_error *
+fall_back_name_index_cus(struct name_index *ni,
+			 struct compilation_unit_vector *fallback_cus)
+{
+	struct drgn_error *err;
+	Elf_Data *debug_info = ni->sections[SECTION_DEBUG_INFO];
+	uint32_t i;
+
+	for (i = 0; i < ni->comp_unit_count; i++) {
+		struct compilation_unit *cu;
+
+		cu = compilation_unit_vector_append_entry(fallback_cus);
+		if (!cu)
+			return &drgn_enomem;
+		memset(cu, 0, sizeof(*cu));
+		cu->module = ni->module;
+		cu->module_id = ni->module_id;
+		memcpy(cu->sections, ni->sections, sizeof(cu->sections));
+		/* read_module_cus() checked that this is the start of a CU. */
+		cu->ptr = section_ptr(debug_info,
+				      name_index_offset(ni, ni->cu_offsets, i));
+		cu->bswap = ni->bswap;
+		index_cache_entry_vector_init(&cu->cache_entries);
+		err = read_compilation_unit_header(cu->ptr,
+						   section_end(debug_info), cu);
+		if (err) {
+			fallback_cus->size--;
+			return err;
+		}
+		if (cu->unit_type == DW_UT_skeleton)
+			fallback_cus->size--;
+	}
+	return NULL;
+}
+
+/*
+ * Index the entries in a name index. CUs that can't be indexed from the name
+ * index are appended to fallback_cus. If the name index is malformed, all of
+ * its CUs are.
+ */
+static struct drgn_error *
+index_name_index(struct drgn_dwarf_index *dindex, struct name_index *ni,
+		 struct compilation_unit_vector *fallback_cus)
+{
+	struct drgn_error *err;
+	struct name_index_abbrev_table table;
+	struct name_index_cu *cus;
+	Elf_Data *debug_str = ni->sections[SECTION_DEBUG_STR];
+	size_t num_fallback_cus = fallback_cus->size;
+	uint32_t i;
+
+	name_index_abbrev_vector_init(&table.abbrevs);
+	name_index_attrib_vector_init(&table.attribs);
+	cus = calloc(ni->comp_unit_count, sizeof(*cus));
+	if (!cus && ni->comp_unit_count) {
+		err = &drgn_enomem;
+		goto out;
+	}
 
-	if ((err = read_abbrev_table(section_ptr(debug_abbrev,
-						 cu->debug_abbrev_offset),
-				     debug_abbrev_end, cu, &abbrev)))
+	if ((err = read_name_index_abbrevs(ni, &table)))
 		goto out;
 
-	for (;;) {
-		struct die die = {
-			.stmt_list = SIZE_MAX,
-		};
-		uint64_t die_offset = ptr - debug_info_buffer;
-		uint64_t tag;
+	for (i = 0; i < ni->name_count; i++) {
+		uint64_t str_offset, entry_offset;
+		const char *name, *ptr;
 
-		err = read_die(cu, &abbrev, &ptr, end, debug_str_buffer,
-			       debug_str_end, &die);
-		if (err && err->code == DRGN_ERROR_STOP) {
-			depth--;
-			if (depth == 1)
-				enum_die_offset = 0;
-			else if (depth == 0)
+		str_offset = name_index_offset(ni, ni->str_offsets, i);
+		entry_offset = name_index_offset(ni, ni->entry_offsets, i);
+		if (str_offset >= debug_str->d_size ||
+		    entry_offset >= ni->end - ni->entry_pool) {
+			err = drgn_eof();
+			goto out;
+		}
+		name = section_ptr(debug_str, str_offset);
+		ptr = ni->entry_pool + entry_offset;
+		for (;;) {
+			struct name_index_entry entry;
+
+			err = read_name_index_entry(ni, &table, &ptr, &entry);
+			if (err == &drgn_stop)
 				break;
+			else if (err)
+				goto out;
+			if ((err = index_name_index_entry(dindex, ni, &table,
+							  cus, name, &entry)))
+				goto out;
+		}
+	}
+
+	for (i = 0; i < ni->comp_unit_count; i++) {
+		if (!cus[i].fallback)
 			continue;
-		} else if (err) {
+		if (!compilation_unit_vector_append(fallback_cus,
+						    &cus[i].cu)) {
+			err = &drgn_enomem;
 			goto out;
 		}
+	}
+	err = NULL;
+out:
+	if (err && err != &drgn_enomem) {
+		/*
+		 * The DIEs that were already indexed from the name index are
+		 * valid, and indexing them again while scanning is a no-op.
+		 */
+		drgn_error_destroy(err);
+		fallback_cus->size = num_fallback_cus;
+		err = fall_back_name_index_cus(ni, fallback_cus);
+	}
+	for (i = 0; cus && i < ni->comp_unit_count; i++) {
+		if (cus[i].initialized) {
+			uint64_vector_deinit(&cus[i].file_name_table);
+			abbrev_table_deinit(&cus[i].abbrev);
+		}
+	}
+	free(cus);
+	name_index_attrib_vector_deinit(&table.attribs);
+	name_index_abbrev_vector_deinit(&table.abbrevs);
+	return err;
+}
 
-		tag = die.flags & TAG_MASK;
-		if (tag == DW_TAG_compile_unit) {
-			if (depth == 0 && die.stmt_list != SIZE_MAX &&
-			    (err = read_file_name_table(dindex, cu,
-							die.stmt_list,
-							&file_name_table)))
-				goto out;
-		} else if (tag && !(die.flags & TAG_FLAG_DECLARATION)) {
-			uint64_t file_name_hash;
+static struct drgn_error *
+index_name_indexes(struct drgn_dwarf_index *dindex,
+		   struct name_index *name_indexes, size_t num_name_indexes,
+		   struct compilation_unit_vector *all_fallback_cus)
+{
+	struct drgn_error *err = NULL;
 
-			/*
-			 * NB: the enumerator name points to the
-			 * enumeration_type DIE instead of the enumerator DIE.
-			 */
-			if (depth == 1 && tag == DW_TAG_enumeration_type)
-				enum_die_offset = die_offset;
-			else if (depth == 2 && tag == DW_TAG_enumerator &&
-				 enum_die_offset)
-				die_offset = enum_die_offset;
-			else if (depth != 1)
-				goto next;
+	#pragma omp parallel
+	{
+		struct compilation_unit_vector fallback_cus;
+		size_t i;
 
-			if (die.specification && (!die.name || !die.decl_file)) {
-				struct die decl = {};
-				const char *decl_ptr = die.specification;
+		compilation_unit_vector_init(&fallback_cus);
+		#pragma omp for schedule(dynamic)
+		for (i = 0; i < num_name_indexes; i++) {
+			struct drgn_error *err2;
 
-				if ((err = read_die(cu, &abbrev, &decl_ptr, end,
-						    debug_str_buffer,
-						    debug_str_end, &decl)))
-					goto out;
-				if (!die.name && decl.name)
-					die.name = decl.name;
-				if (!die.decl_file && decl.decl_file)
-					die.decl_file = decl.decl_file;
-			}
+			if (err)
+				continue;
 
-			if (die.name) {
-				if (die.decl_file > file_name_table.size) {
-					err = drgn_error_format(DRGN_ERROR_OTHER,
-								"invalid DW_AT_decl_file %zu",
-								die.decl_file);
-					goto out;
+			err2 = index_name_index(dindex, &name_indexes[i],
+						&fallback_cus);
+			if (err2) {
+				#pragma omp critical(drgn_index_name_indexes)
+				{
+					if (err)
+						drgn_error_destroy(err2);
+					else
+						err = err2;
 				}
-				if (die.decl_file)
-					file_name_hash = file_name_table.data[die.decl_file - 1];
-				else
-					file_name_hash = 0;
-				if ((err = index_die(dindex, die.name, tag,
-						     file_name_hash, cu->module,
-						     die_offset)))
-					goto out;
 			}
 		}
 
-next:
-		if (die.flags & TAG_FLAG_CHILDREN) {
-			if (die.sibling)
-				ptr = die.sibling;
-			else
-				depth++;
-		} else if (depth == 0) {
-			break;
+		if (fallback_cus.size) {
+			#pragma omp critical(drgn_index_name_indexes)
+			if (!err) {
+				if (compilation_unit_vector_reserve(all_fallback_cus,
+								    all_fallback_cus->size +
+								    fallback_cus.size)) {
+					memcpy(all_fallback_cus->data +
+					       all_fallback_cus->size,
+					       fallback_cus.data,
+					       fallback_cus.size *
+					       sizeof(*fallback_cus.data));
+					all_fallback_cus->size += fallback_cus.size;
+				} else {
+					err = &drgn_enomem;
+				}
+			}
 		}
-	}
 
-	err = NULL;
-out:
-	uint64_vector_deinit(&file_name_table);
-	abbrev_table_deinit(&abbrev);
+		compilation_unit_vector_deinit(&fallback_cus);
+	}
 	return err;
 }
 
+/*
+ * Delete all of the entries added since the last successful update, which are
+ * the entries for modules with an ID of at least num_modules.
+ */
+static void rollback_index(struct drgn_dwarf_index *dindex, size_t num_modules)
+{
+	size_t i;
+
+	for (i = 0; i < ARRAY_SIZE(dindex->shards); i++) {
+		struct drgn_dwarf_index_shard *shard;
+		struct drgn_dwarf_index_die *die;
+		struct drgn_dwarf_index_die_map_iterator it;
+		size_t index;
+
+		shard = &dindex->shards[i];
+
+		/*
+		 * Because we're deleting everything that was added since the
+		 * last update, we can just shrink the dies array to the first
+		 * entry that was added for this update. The same goes for the
+		 * offsets of those entries. Names interned for the new entries
+		 * stay in the arena until the index is freed.
+		 */
+		while (shard->dies.size) {
+			die = &shard->dies.data[shard->dies.size - 1];
+			if (die->module < num_modules)
+				break;
+			if (die->flags & DIE_FLAG_OFFSETS)
+				shard->die_offsets.size = die->offset;
+			shard->dies.size--;
+		}
+
+		/*
+		 * The new entries may be chained off of existing entries;
+		 * unchain them. Note that any entries chained off of the new
+		 * entries must also be new, so there's no need to preserve
+		 * them.
+		 */
+		for (index = 0; index < shard->dies.size; index++) {
+			die = &shard->dies.data[index];
+			if (die->next != UINT32_MAX &&
+			    die->next >= shard->dies.size)
+				die->next = UINT32_MAX;
+		}
+
+		/* Finally, delete the new entries in the map. */
+		for (it = drgn_dwarf_index_die_map_first(&shard->map);
+		     it.entry; ) {
+			if (it.entry->die >= shard->dies.size) {
+				it = drgn_dwarf_index_die_map_delete_iterator(&shard->map,
+									      it);
+			} else {
+				it = drgn_dwarf_index_die_map_next(it);
+			}
+		}
+	}
+	dindex->modules.size = num_modules;
+}
+
 static struct drgn_error *index_cus(struct drgn_dwarf_index *dindex,
 				    struct compilation_unit *cus,
 				    size_t num_cus)
@@ -1637,7 +4232,7 @@ static struct drgn_error *index_cus(struct drgn_dwarf_index *dindex,
 		if (err)
 			continue;
 
-		err2 = index_cu(dindex, &cus[i]);
+		err2 = index_cu(dindex, &cus[i], NULL);
 		if (err2) {
 			#pragma omp critical(drgn_index_cus)
 			{
@@ -1648,60 +4243,120 @@ static struct drgn_error *index_cus(struct drgn_dwarf_index *dindex,
 			}
 		}
 	}
+	return err;
+}
 
-	/* If we have an error while indexing, delete all new entries. */
-	if (err) {
-		for (i = 0; i < ARRAY_SIZE(dindex->shards); i++) {
-			struct drgn_dwarf_index_shard *shard;
-			struct drgn_dwarf_index_die *die;
-			struct drgn_dwarf_index_die_map_iterator it;
-			size_t index;
+static int sorted_name_cmp(const void *_a, const void *_b)
+{
+	const struct drgn_dwarf_index_sorted_name *a = _a, *b = _b;
 
-			shard = &dindex->shards[i];
+	return strcmp(a->str, b->str);
+}
 
-			/*
-			 * Because we're deleting everything that was added
-			 * since the last update, we can just shrink the dies
-			 * array to the first entry that was added for this
-			 * update.
-			 */
-			while (shard->dies.size) {
-				die = &shard->dies.data[shard->dies.size - 1];
-				if (drgn_dwfl_module_userdata(die->module)->indexed)
-					break;
-				else
-					shard->dies.size--;
-			}
+/*
+ * (Re)build drgn_dwarf_index::sorted_names from the name tables of the shards.
+ * Each name is only in one shard, so this doesn't need to deduplicate anything.
+ */
+static bool build_sorted_names(struct drgn_dwarf_index *dindex)
+{
+	struct drgn_dwarf_index_sorted_name_vector *sorted_names =
+		&dindex->sorted_names;
+	size_t num_names = 0;
+	size_t i;
+
+	for (i = 0; i < ARRAY_SIZE(dindex->shards); i++)
+		num_names += dindex->shards[i].map.size;
+	if (!drgn_dwarf_index_sorted_name_vector_reserve(sorted_names,
+							 num_names))
+		return false;
+	sorted_names->size = 0;
+	for (i = 0; i < ARRAY_SIZE(dindex->shards); i++) {
+		struct drgn_dwarf_index_shard *shard = &dindex->shards[i];
+		struct drgn_dwarf_index_die_map_iterator it;
+
+		for (it = drgn_dwarf_index_die_map_first(&shard->map);
+		     it.entry; it = drgn_dwarf_index_die_map_next(it)) {
+			struct drgn_dwarf_index_sorted_name *name;
+			uint32_t index = it.entry->die;
+
+			name = &sorted_names->data[sorted_names->size++];
+			name->str = it.entry->str;
+			name->tags = 0;
+			do {
+				struct drgn_dwarf_index_die *die;
 
-			/*
-			 * The new entries may be chained off of existing
-			 * entries; unchain them. Note that any entries chained
-			 * off of the new entries must also be new, so there's
-			 * no need to preserve them.
-			 */
-			for (index = 0; index < shard->dies.size; i++) {
 				die = &shard->dies.data[index];
-				if (die->next != SIZE_MAX &&
-				    die->next >= shard->dies.size)
-					die->next = SIZE_MAX;
-			}
+				name->tags |= UINT64_C(1) << die->tag;
+				index = die->next;
+			} while (index != UINT32_MAX);
+		}
+	}
+	qsort(sorted_names->data, sorted_names->size,
+	      sizeof(*sorted_names->data), sorted_name_cmp);
+	return true;
+}
 
-			/* Finally, delete the new entries in the map. */
-			for (it = drgn_dwarf_index_die_map_first(&shard->map);
-			     it.entry; ) {
-				if (it.entry->value >= shard->dies.size) {
-					it = drgn_dwarf_index_die_map_delete_iterator(&shard->map,
-										      it);
-				} else {
-					it = drgn_dwarf_index_die_map_next(it);
-				}
-			}
+/* Build drgn_dwarf_index::tag_dies[tag] from scratch. */
+static bool build_tag_dies(struct drgn_dwarf_index *dindex, uint64_t tag)
+{
+	struct drgn_dwarf_index_die_ref_vector *refs = &dindex->tag_dies[tag];
+	size_t i;
+
+	refs->size = 0;
+	for (i = 0; i < ARRAY_SIZE(dindex->shards); i++) {
+		struct drgn_dwarf_index_shard *shard = &dindex->shards[i];
+		size_t index;
+
+		for (index = 0; index < shard->dies.size; index++) {
+			struct drgn_dwarf_index_die_ref *ref;
+
+			if (shard->dies.data[index].tag != tag)
+				continue;
+			ref = drgn_dwarf_index_die_ref_vector_append_entry(refs);
+			if (!ref)
+				return false;
+			ref->shard = i;
+			ref->index = index;
 		}
 	}
-	return err;
+	drgn_dwarf_index_die_ref_vector_shrink_to_fit(refs);
+	return true;
 }
 
-DEFINE_VECTOR(dwfl_module_vector, Dwfl_Module *)
+/*
+ * Add the DIEs from the modules indexed by the last update to the lists in
+ * drgn_dwarf_index::tag_dies that are already built. Those are the DIEs at the
+ * end of each shard with a module ID of at least num_old_modules.
+ */
+static bool update_tag_dies(struct drgn_dwarf_index *dindex,
+			    size_t num_old_modules)
+{
+	size_t i;
+
+	for (i = 0; i < ARRAY_SIZE(dindex->shards); i++) {
+		struct drgn_dwarf_index_shard *shard = &dindex->shards[i];
+		size_t index = shard->dies.size;
+
+		while (index &&
+		       shard->dies.data[index - 1].module >= num_old_modules)
+			index--;
+		for (; index < shard->dies.size; index++) {
+			uint8_t tag = shard->dies.data[index].tag;
+			struct drgn_dwarf_index_die_ref_vector *refs;
+			struct drgn_dwarf_index_die_ref *ref;
+
+			if (!(dindex->has_tag_dies & (UINT64_C(1) << tag)))
+				continue;
+			refs = &dindex->tag_dies[tag];
+			ref = drgn_dwarf_index_die_ref_vector_append_entry(refs);
+			if (!ref)
+				return false;
+			ref->shard = i;
+			ref->index = index;
+		}
+	}
+	return true;
+}
 
 static int drgn_append_dwfl_module(Dwfl_Module *module, void **userdatap,
 				   const char *name, Dwarf_Addr base, void *arg)
@@ -1709,7 +4364,8 @@ static int drgn_append_dwfl_module(Dwfl_Module *module, void **userdatap,
 	struct drgn_dwfl_module_userdata *userdata = *userdatap;
 	struct dwfl_module_vector *modules = arg;
 
-	if (userdata && userdata->indexed)
+	if (userdata && (userdata->indexed ||
+			 (userdata->deferred && !userdata->err)))
 		return DWARF_CB_OK;
 	if (!userdata) {
 		userdata = drgn_dwfl_module_userdata_create();
@@ -1723,28 +4379,95 @@ static int drgn_append_dwfl_module(Dwfl_Module *module, void **userdatap,
 }
 
 struct drgn_error *drgn_dwarf_index_update(struct drgn_dwarf_index *dindex,
-					   Dwfl *dwfl)
+					   Dwfl *dwfl, const char *cache_dir)
 {
 	struct drgn_error *err = NULL;
-	struct dwfl_module_vector modules;
-	struct compilation_unit_vector cus;
+	struct dwfl_module_vector modules, uncached_modules;
+	bool *cache_hits = NULL;
+	struct compilation_unit_vector cus, fallback_cus;
+	struct name_index_vector name_indexes;
 	struct string_builder missing = {};
 	size_t num_missing = 0;
 	static const size_t max_missing = 5;
+	size_t num_old_modules = dindex->modules.size;
 	size_t i;
 
 	dwfl_module_vector_init(&modules);
+	dwfl_module_vector_init(&uncached_modules);
 	compilation_unit_vector_init(&cus);
+	compilation_unit_vector_init(&fallback_cus);
+	name_index_vector_init(&name_indexes);
 	if (dwfl_getmodules(dwfl, drgn_append_dwfl_module, &modules, 0)) {
 		err = &drgn_enomem;
 		goto out;
 	}
-	err = read_cus(dindex, modules.data, modules.size, &cus);
-	if (err)
+	if (modules.size > UINT16_MAX + 1 - num_old_modules) {
+		err = drgn_error_create(DRGN_ERROR_OTHER,
+					"too many modules to index");
 		goto out;
-	err = index_cus(dindex, cus.data, cus.size);
-	if (err)
+	}
+	if (!dwfl_module_vector_reserve(&dindex->modules,
+					num_old_modules + modules.size)) {
+		err = &drgn_enomem;
 		goto out;
+	}
+	for (i = 0; i < modules.size; i++) {
+		drgn_dwfl_module_userdata(modules.data[i])->module_id =
+			dindex->modules.size;
+		dwfl_module_vector_append(&dindex->modules, &modules.data[i]);
+	}
+	if (cache_dir && modules.size) {
+		cache_hits = malloc_array(modules.size, sizeof(*cache_hits));
+		if (!cache_hits) {
+			err = &drgn_enomem;
+			goto out;
+		}
+		err = read_index_caches(dindex, cache_dir, modules.data,
+					modules.size, cache_hits);
+		if (err)
+			goto err;
+		for (i = 0; i < modules.size; i++) {
+			if (!cache_hits[i] &&
+			    !dwfl_module_vector_append(&uncached_modules,
+						       &modules.data[i])) {
+				err = &drgn_enomem;
+				goto err;
+			}
+		}
+		err = read_cus(dindex, uncached_modules.data,
+			       uncached_modules.size, true, &cus,
+			       &name_indexes);
+	} else {
+		err = read_cus(dindex, modules.data, modules.size, false, &cus,
+			       &name_indexes);
+	}
+	if (err)
+		goto err;
+	err = index_name_indexes(dindex, name_indexes.data, name_indexes.size,
+				 &fallback_cus);
+	if (err)
+		goto err;
+	err = index_cus(dindex, fallback_cus.data, fallback_cus.size);
+	if (err)
+		goto err;
+	if (cache_dir) {
+		err = write_index_caches(cache_dir, cus.data, cus.size);
+		if (err)
+			goto err;
+	}
+	/*
+	 * If the sorted names can't be rebuilt, the next search will try
+	 * again.
+	 */
+	if (dindex->has_sorted_names && modules.size)
+		dindex->has_sorted_names = build_sorted_names(dindex);
+	/*
+	 * Likewise, if the tag lists can't be updated, they will be rebuilt
+	 * when they are needed.
+	 */
+	if (dindex->has_tag_dies && modules.size &&
+	    !update_tag_dies(dindex, num_old_modules))
+		dindex->has_tag_dies = 0;
 
 	for (i = 0; i < modules.size; i++) {
 		const char *name;
@@ -1789,9 +4512,20 @@ struct drgn_error *drgn_dwarf_index_update(struct drgn_dwarf_index *dindex,
 	} else {
 		err = NULL;
 	}
+	goto out;
+
+err:
+	/* If we have an error while indexing, delete all new entries. */
+	rollback_index(dindex, num_old_modules);
 out:
 	free(missing.str);
+	for (i = 0; i < cus.size; i++)
+		index_cache_entry_vector_deinit(&cus.data[i].cache_entries);
 	compilation_unit_vector_deinit(&cus);
+	compilation_unit_vector_deinit(&fallback_cus);
+	name_index_vector_deinit(&name_indexes);
+	free(cache_hits);
+	dwfl_module_vector_deinit(&uncached_modules);
 	dwfl_module_vector_deinit(&modules);
 	return err;
 }
@@ -1808,11 +4542,12 @@ static int drgn_dwfl_module_removed(Dwfl_Module *module, void *userdatap,
 	struct drgn_dwfl_module_userdata *userdata = *(void **)userdatap;
 	Dwarf_Addr end;
 
-	if (arg && userdata && userdata->indexed) {
+	if (arg && userdata &&
+	    (userdata->indexed || (userdata->deferred && !userdata->err))) {
 		/*
-		 * The file is already indexed and drgn_remove_dwfl_modules()
-		 * was called with unindexed == true; report the module again so
-		 * libdwfl doesn't remove it.
+		 * The file is already indexed or is deferred and
+		 * drgn_remove_dwfl_modules() was called with unindexed == true;
+		 * report the module again so libdwfl doesn't remove it.
 		 */
 		dwfl_module_info(module, NULL, NULL, &end, NULL, NULL, NULL,
 				 NULL);
@@ -1840,6 +4575,64 @@ void drgn_remove_all_dwfl_modules(Dwfl *dwfl)
 	drgn_remove_dwfl_modules(dwfl, false);
 }
 
+struct drgn_error *drgn_dwarf_index_search(struct drgn_dwarf_index *dindex,
+					   const char *pattern,
+					   const uint64_t *tags,
+					   size_t num_tags,
+					   drgn_dwarf_index_search_fn *fn,
+					   void *arg)
+{
+	struct drgn_error *err;
+	const struct drgn_dwarf_index_sorted_name *names;
+	uint64_t tag_mask;
+	size_t prefix_len, lo, hi, i;
+
+	if (!dindex->has_sorted_names) {
+		if (!build_sorted_names(dindex))
+			return &drgn_enomem;
+		dindex->has_sorted_names = true;
+	}
+
+	if (num_tags) {
+		tag_mask = 0;
+		for (i = 0; i < num_tags; i++) {
+			if (tags[i] <= TAG_MASK)
+				tag_mask |= UINT64_C(1) << tags[i];
+		}
+	} else {
+		tag_mask = UINT64_MAX;
+	}
+
+	/*
+	 * Everything before the first special character must match literally,
+	 * so only the names starting with that prefix need to be matched
+	 * against the whole pattern. Find the first one with a binary search.
+	 */
+	prefix_len = strcspn(pattern, "*?[\\");
+	names = dindex->sorted_names.data;
+	lo = 0;
+	hi = dindex->sorted_names.size;
+	while (lo < hi) {
+		size_t mid = lo + (hi - lo) / 2;
+
+		if (strncmp(names[mid].str, pattern, prefix_len) < 0)
+			lo = mid + 1;
+		else
+			hi = mid;
+	}
+	for (i = lo; i < dindex->sorted_names.size; i++) {
+		if (strncmp(names[i].str, pattern, prefix_len) != 0)
+			break;
+		if ((names[i].tags & tag_mask) &&
+		    fnmatch(pattern, names[i].str, 0) == 0) {
+			err = fn(names[i].str, arg);
+			if (err)
+				return err;
+		}
+	}
+	return NULL;
+}
+
 void drgn_dwarf_index_iterator_init(struct drgn_dwarf_index_iterator *it,
 				    struct drgn_dwarf_index *dindex,
 				    const char *name, size_t name_len,
@@ -1860,16 +4653,34 @@ void drgn_dwarf_index_iterator_init(struct drgn_dwarf_index_iterator *it,
 		shard = &dindex->shards[it->shard];
 		map_it = drgn_dwarf_index_die_map_search_hashed(&shard->map,
 								&key, hp);
-		it->index = map_it.entry ? map_it.entry->value : SIZE_MAX;
+		it->index = map_it.entry ? map_it.entry->die : SIZE_MAX;
 		it->any_name = false;
 	} else {
+		size_t i;
+
+		it->any_name = true;
 		it->index = 0;
+		/*
+		 * If we're looking for specific tags, use the tag lists,
+		 * building any that we haven't built yet. If we can't, fall
+		 * back to looking at every DIE.
+		 */
+		it->by_tag = num_tags > 0;
+		for (i = 0; i < num_tags && it->by_tag; i++) {
+			if (tags[i] >= ARRAY_SIZE(dindex->tag_dies) ||
+			    (dindex->has_tag_dies & (UINT64_C(1) << tags[i])))
+				continue;
+			if (build_tag_dies(dindex, tags[i]))
+				dindex->has_tag_dies |= UINT64_C(1) << tags[i];
+			else
+				it->by_tag = false;
+		}
+		it->tag = 0;
 		for (it->shard = 0; it->shard < ARRAY_SIZE(dindex->shards);
 		     it->shard++) {
 			if (dindex->shards[it->shard].dies.size)
 				break;
 		}
-		it->any_name = true;
 	}
 	it->tags = tags;
 	it->num_tags = num_tags;
@@ -1895,14 +4706,36 @@ drgn_dwarf_index_iterator_next(struct drgn_dwarf_index_iterator *it,
 			       Dwarf_Die *die_ret, uint64_t *bias_ret)
 {
 	struct drgn_dwarf_index *dindex = it->dindex;
+	struct drgn_dwarf_index_shard *shard;
 	struct drgn_dwarf_index_die *die;
+	uint64_t offset, skeleton_offset;
 	Dwarf *dwarf;
 	Dwarf_Addr bias;
 
-	if (it->any_name) {
+	if (it->any_name && it->by_tag) {
 		for (;;) {
-			struct drgn_dwarf_index_shard *shard;
+			const struct drgn_dwarf_index_die_ref_vector *refs;
+			const struct drgn_dwarf_index_die_ref *ref;
 
+			if (it->tag >= it->num_tags)
+				return &drgn_stop;
+			if (it->tags[it->tag] >= ARRAY_SIZE(dindex->tag_dies)) {
+				it->tag++;
+				continue;
+			}
+			refs = &dindex->tag_dies[it->tags[it->tag]];
+			if (it->index >= refs->size) {
+				it->tag++;
+				it->index = 0;
+				continue;
+			}
+			ref = &refs->data[it->index++];
+			shard = &dindex->shards[ref->shard];
+			die = &shard->dies.data[ref->index];
+			break;
+		}
+	} else if (it->any_name) {
+		for (;;) {
 			if (it->shard >= ARRAY_SIZE(dindex->shards))
 				return &drgn_stop;
 
@@ -1922,25 +4755,47 @@ drgn_dwarf_index_iterator_next(struct drgn_dwarf_index_iterator *it,
 		}
 	} else {
 		for (;;) {
-			struct drgn_dwarf_index_shard *shard;
-
 			if (it->index == SIZE_MAX)
 				return &drgn_stop;
 
 			shard = &dindex->shards[it->shard];
 			die = &shard->dies.data[it->index];
 
-			it->index = die->next;
+			it->index = (die->next == UINT32_MAX ?
+				     SIZE_MAX : die->next);
 
 			if (drgn_dwarf_index_iterator_matches_tag(it, die))
 				break;
 		}
 	}
 
-	dwarf = dwfl_module_getdwarf(die->module, &bias);
+	if (die->flags & DIE_FLAG_OFFSETS) {
+		offset = shard->die_offsets.data[die->offset].offset;
+		skeleton_offset =
+			shard->die_offsets.data[die->offset].skeleton_offset;
+	} else {
+		offset = die->offset;
+		skeleton_offset = UINT64_MAX;
+	}
+
+	dwarf = dwfl_module_getdwarf(dindex->modules.data[die->module], &bias);
 	if (!dwarf)
 		return drgn_error_libdwfl();
-	if (!dwarf_offdie(dwarf, die->offset, die_ret))
+	if (skeleton_offset != UINT64_MAX) {
+		Dwarf_Die skeleton, split;
+
+		/* libdw opens the split DWARF file the same way we did. */
+		if (!dwarf_offdie(dwarf, skeleton_offset, &skeleton) ||
+		    dwarf_cu_info(skeleton.cu, NULL, NULL, NULL, &split, NULL,
+				  NULL, NULL))
+			return drgn_error_libdw();
+		if (!split.addr) {
+			return drgn_error_create(DRGN_ERROR_MISSING_DEBUG_INFO,
+						 "could not find split DWARF file");
+		}
+		dwarf = dwarf_cu_getdwarf(split.cu);
+	}
+	if (!dwarf_offdie(dwarf, offset, die_ret))
 		return drgn_error_libdw();
 	if (bias_ret)
 		*bias_ret = bias;
@@ -36,15 +36,53 @@
  *
  * Because this indexing step happens as part of startup, it is parallelized and
  * highly optimized. This is implemented as a homegrown DWARF parser specialized
- * for the task of scanning over DIEs quickly.
+ * for the task of scanning over DIEs quickly. Each file is handled by its own
+ * task, which decompresses its compressed debugging sections and applies its
+ * ELF relocations with a task per section, and then creates a task for each of
+ * its CUs, so CUs are indexed while other files are still being prepared.
  *
- * Although the DWARF standard defines ".debug_pubnames" and ".debug_names"
- * sections, GCC and Clang currently don't emit them by default, so we don't use
- * them.
+ * The DWARF standard also defines accelerator tables which index names ahead of
+ * time. GCC and Clang don't emit them by default, but when a file has a
+ * ".debug_names" section (e.g., from <tt>clang -gpubnames</tt>), the CUs it
+ * covers are indexed from it instead of being scanned: each entry is resolved
+ * to its DIE to get the information that the name index doesn't have (whether
+ * it is a declaration and the file it was declared in). CUs that the name
+ * index doesn't cover, and files where it is invalid, are scanned as usual.
+ * Since a name index doesn't record anonymous types, the enumerators of an
+ * anonymous enumeration type are only found if the producer indexed them.
+ * ".debug_pubnames" and ".gdb_index" only map names to CUs rather than to
+ * DIEs, so they aren't used.
+ *
+ * Both DWARF 5 and earlier versions are supported, including split DWARF
+ * (<tt>-gsplit-dwarf</tt>): the split unit of each skeleton unit is read from
+ * its ".dwo" file, which is looked up the same way as libdw does, relative to
+ * the directory of the debugging information file or to the compilation
+ * directory. Split units are indexed in parallel along with the other CUs.
+ * Skeleton units whose ".dwo" file can't be found are skipped. DWARF package
+ * files (".dwp") aren't supported, since libdw can't read them.
+ *
+ * Indexing is still the most expensive part of startup for large programs like
+ * the Linux kernel, so the entries found for each module can be saved in an
+ * index cache directory. Cache files are keyed by the module's build ID, so a
+ * module that has been indexed before is loaded by mapping its cache file
+ * instead of scanning all of its compilation units again.
  *
  * @{
  */
 
+/**
+ * Split DWARF file opened for a @c Dwfl_Module.
+ *
+ * The file descriptor is closed as soon as the file is mapped, so a module can
+ * have more of these than the open file limit.
+ */
+struct drgn_dwo_file {
+	/** Next file in the list. */
+	struct drgn_dwo_file *next;
+	/** ELF handle of the file. */
+	Elf *elf;
+};
+
 /**
  * drgn-specific data for the @c Dwfl_Module userdata pointer.
  *
@@ -53,12 +91,20 @@
  * @ref drgn_dwfl_module_userdata_set_error() before @ref
  * drgn_dwarf_index_update() is called to skip indexing for that module; the
  * error message will be added to the @ref DRGN_ERROR_MISSING_DEBUG_INFO error.
+ * @c deferred may be set to skip indexing for that module until it is cleared.
  *
  * @sa drgn_dwfl_find_elf(), drgn_dwfl_section_address()
  */
 struct drgn_dwfl_module_userdata {
 	/** Whether the module is indexed in a @ref drgn_dwarf_index. */
 	bool indexed;
+	/**
+	 * Whether indexing the module was deferred until it is needed. Deferred
+	 * modules without an error are not indexed by @ref
+	 * drgn_dwarf_index_update() and are not removed by @ref
+	 * drgn_remove_unindexed_dwfl_modules().
+	 */
+	bool deferred;
 	/** File descriptor of @ref drgn_dwfl_module_userdata::elf. */
 	int fd;
 	/** Error encountered while indexing. */
@@ -67,6 +113,16 @@ struct drgn_dwfl_module_userdata {
 	char *path;
 	/** ELF handle to use. */
 	Elf *elf;
+	/**
+	 * Split DWARF files of the module's skeleton units. These stay mapped
+	 * as long as the module.
+	 */
+	struct drgn_dwo_file *dwo_files;
+	/**
+	 * ID of the module in @ref drgn_dwarf_index::modules. Only valid while
+	 * and after the module is indexed.
+	 */
+	uint16_t module_id;
 };
 
 struct drgn_dwfl_module_userdata *drgn_dwfl_module_userdata_create(void);
@@ -93,9 +149,59 @@ drgn_dwfl_module_userdata(Dwfl_Module *module)
 	return *userdatap;
 }
 
+/* An entry in the name table of a shard. */
+struct drgn_dwarf_index_name {
+	/*
+	 * The name. This points into the module's debugging information, or
+	 * into the shard's name arena if that doesn't live as long as the
+	 * module (e.g., for names loaded from the index cache).
+	 */
+	const char *str;
+	uint32_t len;
+	/*
+	 * The first DIE with this name, as an index into
+	 * drgn_dwarf_index_shard::dies.
+	 */
+	uint32_t die;
+};
+
+static inline struct string
+drgn_dwarf_index_name_key(const struct drgn_dwarf_index_name *name)
+{
+	return (struct string){ name->str, name->len };
+}
+
 struct drgn_dwarf_index_die;
-DEFINE_HASH_MAP_TYPE(drgn_dwarf_index_die_map, struct string, size_t)
+struct drgn_dwarf_index_die_offsets;
+struct drgn_dwarf_index_name_block;
+DEFINE_HASH_TABLE_TYPE(drgn_dwarf_index_die_map, struct drgn_dwarf_index_name,
+		       drgn_dwarf_index_name_key)
 DEFINE_VECTOR_TYPE(drgn_dwarf_index_die_vector, struct drgn_dwarf_index_die)
+DEFINE_VECTOR_TYPE(drgn_dwarf_index_die_offsets_vector,
+		   struct drgn_dwarf_index_die_offsets)
+DEFINE_VECTOR_TYPE(dwfl_module_vector, Dwfl_Module *)
+
+/* An entry in drgn_dwarf_index::sorted_names. */
+struct drgn_dwarf_index_sorted_name {
+	/* The name. This is null-terminated. */
+	const char *str;
+	/* Bitmask of the tags of the DIEs with this name (1 << tag). */
+	uint64_t tags;
+};
+
+DEFINE_VECTOR_TYPE(drgn_dwarf_index_sorted_name_vector,
+		   struct drgn_dwarf_index_sorted_name)
+
+/* A reference to a DIE in drgn_dwarf_index::tag_dies. */
+struct drgn_dwarf_index_die_ref {
+	/* Index of the DIE's shard in drgn_dwarf_index::shards. */
+	uint32_t shard;
+	/* Index of the DIE in drgn_dwarf_index_shard::dies. */
+	uint32_t index;
+};
+
+DEFINE_VECTOR_TYPE(drgn_dwarf_index_die_ref_vector,
+		   struct drgn_dwarf_index_die_ref)
 
 struct drgn_dwarf_index_shard {
 	/** @privatesection */
@@ -106,9 +212,19 @@ struct drgn_dwarf_index_shard {
 	 * cache friendly.
 	 */
 	struct drgn_dwarf_index_die_vector dies;
+	/* Offsets of DIEs that don't fit in a drgn_dwarf_index_die. */
+	struct drgn_dwarf_index_die_offsets_vector die_offsets;
+	/*
+	 * Arena for names in the map that are copied into the index. Names are
+	 * never freed individually, only with the whole index.
+	 */
+	struct drgn_dwarf_index_name_block *name_blocks;
+	size_t name_block_space;
 };
 
 #define DRGN_DWARF_INDEX_SHARD_BITS 8
+/* All of the indexed DIE tags are less than 1 << DRGN_DWARF_INDEX_TAG_BITS. */
+#define DRGN_DWARF_INDEX_TAG_BITS 6
 
 /**
  * Fast index of DWARF debugging information.
@@ -118,7 +234,8 @@ struct drgn_dwarf_index_shard {
  * files. It is much faster for this task than other generic DWARF parsing
  * libraries.
  *
- * Searches in the index are done with a @ref drgn_dwarf_index_iterator.
+ * Lookups by name are done with a @ref drgn_dwarf_index_iterator. Names can
+ * also be searched by pattern with @ref drgn_dwarf_index_search().
  */
 struct drgn_dwarf_index {
 	/**
@@ -127,6 +244,40 @@ struct drgn_dwarf_index {
 	 * This is sharded to reduce lock contention.
 	 */
 	struct drgn_dwarf_index_shard shards[1 << DRGN_DWARF_INDEX_SHARD_BITS];
+	/**
+	 * Modules that have been indexed, indexed by @ref
+	 * drgn_dwfl_module_userdata::module_id. Indexed DIEs refer to their
+	 * module by this ID rather than by pointer to keep them small.
+	 */
+	struct dwfl_module_vector modules;
+	/**
+	 * Every indexed name, sorted. This is only built by the first @ref
+	 * drgn_dwarf_index_search(). After that, it is rebuilt at the end of
+	 * each @ref drgn_dwarf_index_update().
+	 */
+	struct drgn_dwarf_index_sorted_name_vector sorted_names;
+	/** Whether @ref drgn_dwarf_index::sorted_names is up to date. */
+	bool has_sorted_names;
+	/**
+	 * DIEs with each tag, indexed by tag.
+	 *
+	 * The list for a tag is only built by the first @ref
+	 * drgn_dwarf_index_iterator over any name that asks for that tag, so
+	 * that iterating over, e.g., every structure type doesn't need to look
+	 * at every indexed DIE. After that, it is kept up to date by @ref
+	 * drgn_dwarf_index_update().
+	 */
+	struct drgn_dwarf_index_die_ref_vector
+		tag_dies[1 << DRGN_DWARF_INDEX_TAG_BITS];
+	/** Bitmask of the lists in @ref tag_dies that are built (1 << tag). */
+	uint64_t has_tag_dies;
+	/** Number of modules loaded from the index cache. */
+	uint64_t cache_hits;
+	/**
+	 * Number of modules which had a build ID but weren't in the index
+	 * cache.
+	 */
+	uint64_t cache_misses;
 };
 
 /** Initialize a @ref drgn_dwarf_index. */
@@ -140,11 +291,21 @@ void drgn_dwarf_index_init(struct drgn_dwarf_index *dindex);
  */
 void drgn_dwarf_index_deinit(struct drgn_dwarf_index *dindex);
 
+/**
+ * Get the size of a @ref drgn_dwarf_index.
+ *
+ * @param[out] num_dies_ret Returned number of indexed DIEs.
+ * @param[out] bytes_ret Returned number of bytes allocated for the index,
+ * including its names.
+ */
+void drgn_dwarf_index_size(struct drgn_dwarf_index *dindex,
+			   uint64_t *num_dies_ret, uint64_t *bytes_ret);
+
 /**
  * Index new DWARF information.
  *
  * This parses and indexes the debugging information for all modules in @p dwfl
- * that have not yet been indexed.
+ * that have not yet been indexed and are not deferred.
  *
  * On success, @ref drgn_dwfl_module_userdata::indexed is set to @c true for all
  * modules that we were able to index, and @ref drgn_dwfl_module_userdata::err
@@ -155,14 +316,53 @@ void drgn_dwarf_index_deinit(struct drgn_dwarf_index *dindex);
  *
  * On any other error, no new debugging information is indexed.
  *
+ * @param[in] cache_dir Index cache directory, or @c NULL to not use the index
+ * cache. Modules with a build ID are loaded from this directory if they were
+ * cached before, and otherwise they are indexed and saved to it. Failing to
+ * save a module to the cache is not an error.
  * @return @c NULL on success, non-@c NULL on error.
  */
 struct drgn_error *drgn_dwarf_index_update(struct drgn_dwarf_index *dindex,
-					   Dwfl *dwfl);
+					   Dwfl *dwfl, const char *cache_dir);
 
 /**
- * Remove all @c Dwfl_Modules that aren't indexed (see @ref
- * drgn_dwfl_module_userdata::indexed) from @p dwfl.
+ * Callback for @ref drgn_dwarf_index_search().
+ *
+ * @param[in] name Matching name. This is valid as long as the module it was
+ * indexed from.
+ * @param[in] arg Argument passed to @ref drgn_dwarf_index_search().
+ * @return @c NULL to continue searching, non-@c NULL to stop searching and
+ * return the error.
+ */
+typedef struct drgn_error *drgn_dwarf_index_search_fn(const char *name,
+						      void *arg);
+
+/**
+ * Search for indexed names matching a pattern.
+ *
+ * The first search sorts all of the indexed names. After that, the literal
+ * prefix of @p pattern (everything before the first wildcard) is found with a
+ * binary search, so patterns that start with a literal prefix only look at the
+ * names starting with that prefix.
+ *
+ * @param[in] pattern Shell wildcard pattern (see <tt>fnmatch(3)</tt>).
+ * @param[in] tags List of DIE tags to search for.
+ * @param[in] num_tags Number of tags in @p tags, or zero to search for any tag.
+ * @param[in] fn Callback called with each matching name in sorted order.
+ * @param[in] arg Argument to pass to @p fn.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_dwarf_index_search(struct drgn_dwarf_index *dindex,
+					   const char *pattern,
+					   const uint64_t *tags,
+					   size_t num_tags,
+					   drgn_dwarf_index_search_fn *fn,
+					   void *arg);
+
+/**
+ * Remove all @c Dwfl_Modules that aren't indexed or deferred (see @ref
+ * drgn_dwfl_module_userdata::indexed and @ref
+ * drgn_dwfl_module_userdata::deferred) from @p dwfl.
  *
  * This should be called if @ref drgn_dwarf_index_update() returned an error or
  * if modules were reported and @ref drgn_dwarf_index_update() was not called.
@@ -186,6 +386,12 @@ struct drgn_dwarf_index_iterator {
 	size_t shard;
 	size_t index;
 	bool any_name;
+	/*
+	 * If any_name is true and this is true, iterating over
+	 * drgn_dwarf_index::tag_dies[tags[tag]] instead of every shard.
+	 */
+	bool by_tag;
+	size_t tag;
 };
 
 /**
@@ -206,8 +412,10 @@ void drgn_dwarf_index_iterator_init(struct drgn_dwarf_index_iterator *it,
 /**
  * Get the next matching DIE from a DWARF index iterator.
  *
- * If matching any name, this is O(n), where n is the number of indexed DIEs. If
- * matching by name, this is O(1) on average and O(n) worst case.
+ * If matching any name and any tag, this is O(n), where n is the number of
+ * indexed DIEs. If matching any name and specific tags, this is O(1) (but see
+ * @ref drgn_dwarf_index::tag_dies). If matching by name, this is O(1) on
+ * average and O(n) worst case.
  *
  * Note that this returns the parent @c DW_TAG_enumeration_type for indexed @c
  * DW_TAG_enumerator DIEs.
@@ -1267,6 +1267,7 @@ drgn_type_from_dwarf_internal(struct drgn_dwarf_info_cache *dicache,
 	};
 	struct dwarf_type_map *map;
 	struct dwarf_type_map_iterator it;
+	uint64_t start;
 
 	if (dicache->depth >= 1000) {
 		return drgn_error_create(DRGN_ERROR_RECURSION,
@@ -1284,10 +1285,17 @@ drgn_type_from_dwarf_internal(struct drgn_dwarf_info_cache *dicache,
 		if (it.entry) {
 			ret->type = it.entry->value.type;
 			ret->qualifiers = it.entry->value.qualifiers;
+			dicache->stats.cache_hits++;
 			return NULL;
 		}
 	}
 
+	/*
+	 * Only time the outermost parse so that nested parses aren't counted
+	 * twice.
+	 */
+	start = dicache->depth ? 0 : monotonic_ns();
+	dicache->stats.dies_parsed++;
 	ret->qualifiers = 0;
 	dicache->depth++;
 	entry.value.is_incomplete_array = false;
@@ -1374,6 +1382,8 @@ drgn_type_from_dwarf_internal(struct drgn_dwarf_info_cache *dicache,
 		break;
 	}
 	dicache->depth--;
+	if (!dicache->depth)
+		dicache->stats.ns += monotonic_ns() - start;
 	if (err)
 		return err;
 
@@ -1575,6 +1585,79 @@ drgn_dwarf_object_find(const char *name, size_t name_len, const char *filename,
 	return &drgn_not_found;
 }
 
+void drgn_dwarf_type_iterator_init(struct drgn_dwarf_info_iterator *it,
+				   struct drgn_dwarf_info_cache *dicache,
+				   enum drgn_type_kind kind)
+{
+	size_t num_tags = 0;
+
+	it->dicache = dicache;
+	it->kind = kind;
+	if (kind == DRGN_TYPE_INT || kind == DRGN_TYPE_BOOL ||
+	    kind == DRGN_TYPE_FLOAT || kind == DRGN_TYPE_COMPLEX || !kind)
+		it->tags[num_tags++] = DW_TAG_base_type;
+	if (kind == DRGN_TYPE_STRUCT || !kind)
+		it->tags[num_tags++] = DW_TAG_structure_type;
+	if (kind == DRGN_TYPE_UNION || !kind)
+		it->tags[num_tags++] = DW_TAG_union_type;
+	if (kind == DRGN_TYPE_ENUM || !kind)
+		it->tags[num_tags++] = DW_TAG_enumeration_type;
+	if (kind == DRGN_TYPE_TYPEDEF || !kind)
+		it->tags[num_tags++] = DW_TAG_typedef;
+	drgn_dwarf_index_iterator_init(&it->it, &dicache->dindex, NULL, 0,
+				       it->tags, num_tags);
+}
+
+struct drgn_error *
+drgn_dwarf_type_iterator_next(struct drgn_dwarf_info_iterator *it,
+			      struct drgn_qualified_type *ret)
+{
+	struct drgn_error *err;
+	Dwarf_Die die;
+
+	while (!(err = drgn_dwarf_index_iterator_next(&it->it, &die, NULL))) {
+		err = drgn_type_from_dwarf(it->dicache, &die, ret);
+		if (err)
+			return err;
+		/*
+		 * For DW_TAG_base_type, we need to check that the type we found
+		 * was the right kind.
+		 */
+		if (!it->kind || drgn_type_kind(ret->type) == it->kind)
+			return NULL;
+	}
+	return err;
+}
+
+void drgn_dwarf_function_iterator_init(struct drgn_dwarf_info_iterator *it,
+				       struct drgn_dwarf_info_cache *dicache)
+{
+	it->dicache = dicache;
+	it->tags[0] = DW_TAG_subprogram;
+	drgn_dwarf_index_iterator_init(&it->it, &dicache->dindex, NULL, 0,
+				       it->tags, 1);
+}
+
+struct drgn_error *
+drgn_dwarf_function_iterator_next(struct drgn_dwarf_info_iterator *it,
+				  struct drgn_object *ret)
+{
+	struct drgn_error *err;
+	Dwarf_Die die;
+	uint64_t bias;
+	Dwarf_Addr low_pc;
+
+	while (!(err = drgn_dwarf_index_iterator_next(&it->it, &die, &bias))) {
+		if (dwarf_lowpc(&die, &low_pc) == -1)
+			continue;
+		return drgn_object_from_dwarf_subprogram(it->dicache, &die,
+							 bias,
+							 dwarf_diename(&die),
+							 ret);
+	}
+	return err;
+}
+
 struct drgn_error *
 drgn_dwarf_info_cache_create(struct drgn_type_index *tindex,
 			     struct drgn_dwarf_info_cache **ret)
@@ -1588,6 +1671,7 @@ drgn_dwarf_info_cache_create(struct drgn_type_index *tindex,
 	dwarf_type_map_init(&dicache->map);
 	dwarf_type_map_init(&dicache->cant_be_incomplete_array_map);
 	dicache->depth = 0;
+	memset(&dicache->stats, 0, sizeof(dicache->stats));
 	dicache->tindex = tindex;
 	*ret = dicache;
 	return NULL;
@@ -73,6 +73,8 @@ struct drgn_dwarf_info_cache {
 	struct dwarf_type_map cant_be_incomplete_array_map;
 	/** Current parsing recursion depth. */
 	int depth;
+	/** Statistics about parsing types. */
+	struct drgn_dwarf_stats stats;
 	/** Type index. */
 	struct drgn_type_index *tindex;
 };
@@ -97,6 +99,62 @@ drgn_dwarf_object_find(const char *name, size_t name_len, const char *filename,
 		       enum drgn_find_object_flags flags, void *arg,
 		       struct drgn_object *ret);
 
+/**
+ * Iterator over the named types or the functions in a @ref
+ * drgn_dwarf_info_cache.
+ */
+struct drgn_dwarf_info_iterator {
+	/** @privatesection */
+	struct drgn_dwarf_info_cache *dicache;
+	struct drgn_dwarf_index_iterator it;
+	enum drgn_type_kind kind;
+	uint64_t tags[5];
+};
+
+/**
+ * Initialize an iterator over the named types in a @ref drgn_dwarf_info_cache.
+ *
+ * @param[in] kind Kind of types to iterate over, or 0 for any kind. This must
+ * not be a kind of type that can't have a name (void, pointer, array, or
+ * function).
+ */
+void drgn_dwarf_type_iterator_init(struct drgn_dwarf_info_iterator *it,
+				   struct drgn_dwarf_info_cache *dicache,
+				   enum drgn_type_kind kind);
+
+/**
+ * Get the next type from an iterator initialized with @ref
+ * drgn_dwarf_type_iterator_init().
+ *
+ * @return @c NULL on success, non-@c NULL on error. When there are no more
+ * types, an error with code @ref DRGN_ERROR_STOP is returned.
+ */
+struct drgn_error *
+drgn_dwarf_type_iterator_next(struct drgn_dwarf_info_iterator *it,
+			      struct drgn_qualified_type *ret);
+
+/**
+ * Initialize an iterator over the functions in a @ref drgn_dwarf_info_cache.
+ *
+ * Functions without an address (e.g., functions that were always inlined) are
+ * skipped.
+ */
+void drgn_dwarf_function_iterator_init(struct drgn_dwarf_info_iterator *it,
+				       struct drgn_dwarf_info_cache *dicache);
+
+/**
+ * Get the next function from an iterator initialized with @ref
+ * drgn_dwarf_function_iterator_init().
+ *
+ * @param[out] ret Returned function object. This must have already been
+ * initialized with @ref drgn_object_init().
+ * @return @c NULL on success, non-@c NULL on error. When there are no more
+ * functions, an error with code @ref DRGN_ERROR_STOP is returned.
+ */
+struct drgn_error *
+drgn_dwarf_function_iterator_next(struct drgn_dwarf_info_iterator *it,
+				  struct drgn_object *ret);
+
 /** @} */
 
 #endif /* DRGN_DWARF_INFO_CACHE_H */
@@ -16,6 +16,7 @@
 #include <stdbool.h>
 #include <stdint.h>
 #include <stdlib.h>
+#include <time.h>
 #include <elfutils/libdw.h>
 #include <elfutils/version.h>
 
@@ -173,6 +174,15 @@ static inline void *malloc64(uint64_t size)
 	return malloc(size);
 }
 
+/** Return the current time of the monotonic clock in nanoseconds. */
+static inline uint64_t monotonic_ns(void)
+{
+	struct timespec ts;
+
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return (uint64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
 struct drgn_error *read_elf_section(Elf_Scn *scn, Elf_Data **ret);
 
 /**
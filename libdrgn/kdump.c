@@ -49,9 +49,8 @@ static struct drgn_error *drgn_platform_from_kdump(kdump_ctx_t *ctx,
 	return NULL;
 }
 
-static struct drgn_error *drgn_read_kdump(void *buf, uint64_t address,
-					  size_t count, uint64_t offset,
-					  void *arg, bool physical)
+struct drgn_error *drgn_read_kdump(void *buf, uint64_t address, size_t count,
+				   uint64_t offset, void *arg, bool physical)
 {
 	kdump_ctx_t *ctx = arg;
 	kdump_status ks;
@@ -122,7 +121,25 @@ struct drgn_error *drgn_program_set_kdump(struct drgn_program *prog)
 		drgn_memory_reader_init(&prog->reader);
 		goto err;
 	}
+	err = drgn_memory_reader_freeze(&prog->reader);
+	if (err) {
+		drgn_memory_reader_deinit(&prog->reader);
+		drgn_memory_reader_init(&prog->reader);
+		goto err;
+	}
 
+	/*
+	 * Pages in a kdump file are usually compressed individually, and
+	 * kdump_read() decompresses the whole page again for every access, so
+	 * keep the decompressed pages in the memory cache. The memory of a core
+	 * dump never changes, so they never need to be read again.
+	 */
+	drgn_memory_reader_set_cache(&prog->reader,
+				     DRGN_MEMORY_CACHE_DEFAULT_MAX_PAGES, 0);
+	drgn_memory_reader_set_readahead(&prog->reader,
+					 DRGN_MEMORY_READAHEAD_DEFAULT_MAX_PAGES);
+
+	prog->kdump_ctx = ctx;
 	prog->flags |= DRGN_PROGRAM_IS_LINUX_KERNEL;
 	drgn_program_set_platform(prog, &platform);
 	return NULL;
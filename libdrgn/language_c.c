@@ -857,21 +857,26 @@ c_pretty_print_string(struct drgn_memory_reader *reader, uint64_t address,
 	if (!string_builder_appendc(sb, '"'))
 		return &drgn_enomem;
 	while (length) {
-		unsigned char c;
+		unsigned char buf[DRGN_MEMORY_CACHE_PAGE_SIZE];
+		size_t n, i;
 
-		err = drgn_memory_reader_read(reader, &c, address++, 1, false);
+		err = drgn_memory_reader_read_partial(reader, buf, address,
+						      min(length, (uint64_t)sizeof(buf)),
+						      false, &n);
 		if (err)
 			return err;
 
-		if (c == '\0') {
-			break;
-		} else {
-			err = c_pretty_print_character(c, sb);
+		for (i = 0; i < n; i++) {
+			if (buf[i] == '\0')
+				goto out;
+			err = c_pretty_print_character(buf[i], sb);
 			if (err)
 				return err;
 		}
-		length--;
+		address += n;
+		length -= n;
 	}
+out:
 	if (!string_builder_appendc(sb, '"'))
 		return &drgn_enomem;
 	return NULL;
@@ -58,6 +58,7 @@ struct drgn_error *parse_vmcoreinfo(const char *desc, size_t descsz,
 	ret->osrelease[0] = '\0';
 	ret->page_size = 0;
 	ret->kaslr_offset = 0;
+	ret->pgtable_l5_enabled = false;
 	while (line < end) {
 		const char *newline;
 
@@ -82,6 +83,13 @@ struct drgn_error *parse_vmcoreinfo(const char *desc, size_t descsz,
 					  &ret->kaslr_offset);
 			if (err)
 				return err;
+		} else if (linematch(&line, "NUMBER(pgtable_l5_enabled)=")) {
+			uint64_t tmp;
+
+			err = line_to_u64(line, newline, 0, &tmp);
+			if (err)
+				return err;
+			ret->pgtable_l5_enabled = tmp;
 		}
 		line = newline + 1;
 	}
@@ -1271,6 +1279,14 @@ report_kernel_module(Dwfl *dwfl, struct kernel_module_iterator *kmod_it,
 	dwfl_module_info(module, &userdatap, NULL, NULL, NULL, NULL, NULL,
 			 NULL);
 	if (*userdatap) {
+		/*
+		 * If the module was deferred before but it isn't now, it will
+		 * be indexed now.
+		 */
+		if (!userdata->deferred) {
+			((struct drgn_dwfl_module_userdata *)*userdatap)->deferred =
+				false;
+		}
 		drgn_dwfl_module_userdata_destroy(userdata);
 	} else {
 		*userdatap = userdata;
@@ -1340,6 +1356,10 @@ report_default_kernel_module(struct drgn_program *prog, Dwfl *dwfl,
 	}
 
 	if (userdata->elf) {
+		if (prog->lazy_module_indexing) {
+			userdata->deferred = true;
+			prog->has_deferred_modules = true;
+		}
 		err = report_kernel_module(dwfl, kmod_it, userdata);
 	} else {
 		err = report_failed(dwfl, userdata, kmod_it->name,
@@ -1,20 +1,298 @@
 // Copyright 2018-2019 - Omar Sandoval
 // SPDX-License-Identifier: GPL-3.0+
 
+#include <errno.h>
 #include <inttypes.h>
+#include <limits.h>
 #include <string.h>
+#include <sys/uio.h>
 #include <unistd.h>
 
 #include "internal.h"
+#include "compressed_file.h"
 #include "memory_reader.h"
+#include "remote.h"
 
 DEFINE_BINARY_SEARCH_TREE_FUNCTIONS(drgn_memory_segment_tree,
 				    binary_search_tree_scalar_cmp, splay)
+DEFINE_HASH_TABLE_FUNCTIONS(drgn_memory_cache_page_map, hash_pair_int_type,
+			    hash_table_scalar_eq)
+DEFINE_HASH_TABLE_FUNCTIONS(drgn_memory_page_set, hash_pair_int_type,
+			    hash_table_scalar_eq)
+
+static void drgn_memory_cache_init(struct drgn_memory_cache *cache)
+{
+	drgn_memory_cache_page_map_init(&cache->map);
+	cache->first = cache->last = NULL;
+}
+
+static void drgn_memory_cache_clear(struct drgn_memory_cache *cache)
+{
+	struct drgn_memory_cache_page *page, *next;
+
+	for (page = cache->first; page; page = next) {
+		next = page->next;
+		free(page);
+	}
+	cache->first = cache->last = NULL;
+	drgn_memory_cache_page_map_clear(&cache->map);
+}
+
+static void drgn_memory_cache_deinit(struct drgn_memory_cache *cache)
+{
+	drgn_memory_cache_clear(cache);
+	drgn_memory_cache_page_map_deinit(&cache->map);
+}
+
+static void drgn_memory_cache_unlink(struct drgn_memory_cache *cache,
+				     struct drgn_memory_cache_page *page)
+{
+	if (page->prev)
+		page->prev->next = page->next;
+	else
+		cache->first = page->next;
+	if (page->next)
+		page->next->prev = page->prev;
+	else
+		cache->last = page->prev;
+}
+
+static void drgn_memory_cache_link_last(struct drgn_memory_cache *cache,
+					struct drgn_memory_cache_page *page)
+{
+	page->prev = cache->last;
+	page->next = NULL;
+	if (cache->last)
+		cache->last->next = page;
+	else
+		cache->first = page;
+	cache->last = page;
+}
+
+static void drgn_memory_cache_link_first(struct drgn_memory_cache *cache,
+					 struct drgn_memory_cache_page *page)
+{
+	page->prev = NULL;
+	page->next = cache->first;
+	if (cache->first)
+		cache->first->prev = page;
+	else
+		cache->last = page;
+	cache->first = page;
+}
+
+/* Evict the least recently used pages until at most max_pages are cached. */
+static void drgn_memory_cache_shrink(struct drgn_memory_cache *cache,
+				     size_t max_pages)
+{
+	while (drgn_memory_cache_page_map_size(&cache->map) > max_pages) {
+		struct drgn_memory_cache_page *page = cache->last;
+
+		drgn_memory_cache_unlink(cache, page);
+		drgn_memory_cache_page_map_delete(&cache->map, &page->address);
+		free(page);
+	}
+}
+
+static void
+drgn_memory_segment_array_init(struct drgn_memory_segment_array *array)
+{
+	array->segments = NULL;
+	array->size = 0;
+	array->last_hit = 0;
+}
+
+static void
+drgn_memory_segment_array_deinit(struct drgn_memory_segment_array *array)
+{
+	free(array->segments);
+}
+
+static struct drgn_error *
+drgn_memory_segment_array_build(struct drgn_memory_segment_array *array,
+				struct drgn_memory_segment_tree *tree)
+{
+	struct drgn_memory_segment_tree_iterator it;
+	size_t size = 0;
+
+	for (it = drgn_memory_segment_tree_first(tree); it.entry;
+	     it = drgn_memory_segment_tree_next(it))
+		size++;
+	array->segments = malloc_array(size, sizeof(*array->segments));
+	if (!array->segments && size)
+		return &drgn_enomem;
+	array->size = 0;
+	for (it = drgn_memory_segment_tree_first(tree); it.entry;
+	     it = drgn_memory_segment_tree_next(it))
+		array->segments[array->size++] = it.entry;
+	array->last_hit = 0;
+	return NULL;
+}
+
+/*
+ * Find the segment containing an address in a frozen address space, or NULL if
+ * there is none. Segments never overlap, so this is the last segment starting
+ * at or before the address, if it extends past the address.
+ */
+static struct drgn_memory_segment *
+drgn_memory_segment_array_search(struct drgn_memory_segment_array *array,
+				 uint64_t address)
+{
+	struct drgn_memory_segment *segment;
+	size_t i, lo, hi;
+
+	if (!array->size)
+		return NULL;
+
+	i = __atomic_load_n(&array->last_hit, __ATOMIC_RELAXED);
+	segment = array->segments[i];
+	if (segment->address <= address &&
+	    address - segment->address < segment->size)
+		return segment;
+
+	/* Find the first segment starting after the address. */
+	lo = 0;
+	hi = array->size;
+	while (lo < hi) {
+		size_t mid = lo + (hi - lo) / 2;
+
+		if (array->segments[mid]->address <= address)
+			lo = mid + 1;
+		else
+			hi = mid;
+	}
+	if (lo == 0)
+		return NULL;
+	segment = array->segments[lo - 1];
+	if (address - segment->address >= segment->size)
+		return NULL;
+	__atomic_store_n(&array->last_hit, lo - 1, __ATOMIC_RELAXED);
+	return segment;
+}
+
+static void drgn_memory_reader_thaw(struct drgn_memory_reader *reader)
+{
+	if (!reader->frozen)
+		return;
+	drgn_memory_segment_array_deinit(&reader->frozen_physical_segments);
+	drgn_memory_segment_array_deinit(&reader->frozen_virtual_segments);
+	drgn_memory_segment_array_init(&reader->frozen_virtual_segments);
+	drgn_memory_segment_array_init(&reader->frozen_physical_segments);
+	reader->frozen = false;
+}
+
+struct drgn_error *drgn_memory_reader_freeze(struct drgn_memory_reader *reader)
+{
+	struct drgn_error *err;
+
+	drgn_memory_reader_thaw(reader);
+	err = drgn_memory_segment_array_build(&reader->frozen_virtual_segments,
+					      &reader->virtual_segments);
+	if (err)
+		return err;
+	err = drgn_memory_segment_array_build(&reader->frozen_physical_segments,
+					      &reader->physical_segments);
+	if (err) {
+		drgn_memory_segment_array_deinit(&reader->frozen_virtual_segments);
+		drgn_memory_segment_array_init(&reader->frozen_virtual_segments);
+		return err;
+	}
+	reader->frozen = true;
+	return NULL;
+}
+
+static struct drgn_memory_segment *
+drgn_memory_reader_find_segment(struct drgn_memory_reader *reader,
+				uint64_t address, bool physical)
+{
+	struct drgn_memory_segment *segment;
+
+	if (reader->frozen) {
+		return drgn_memory_segment_array_search(physical ?
+							&reader->frozen_physical_segments :
+							&reader->frozen_virtual_segments,
+							address);
+	}
+
+	segment = drgn_memory_segment_tree_search_le(physical ?
+						     &reader->physical_segments :
+						     &reader->virtual_segments,
+						     &address).entry;
+	if (!segment || segment->address + segment->size <= address)
+		return NULL;
+	return segment;
+}
+
+/*
+ * Find the segment containing the given address or, if there isn't one, the
+ * first segment after it.
+ */
+static struct drgn_memory_segment *
+drgn_memory_reader_find_segment_ge(struct drgn_memory_reader *reader,
+				   uint64_t address, bool physical)
+{
+	struct drgn_memory_segment_tree *tree;
+	struct drgn_memory_segment_tree_iterator it;
+
+	if (reader->frozen) {
+		struct drgn_memory_segment_array *array;
+		size_t lo = 0, hi;
+
+		array = (physical ? &reader->frozen_physical_segments :
+			 &reader->frozen_virtual_segments);
+		hi = array->size;
+		/* Find the first segment starting after the address. */
+		while (lo < hi) {
+			size_t mid = lo + (hi - lo) / 2;
+
+			if (array->segments[mid]->address <= address)
+				lo = mid + 1;
+			else
+				hi = mid;
+		}
+		if (lo > 0 &&
+		    address - array->segments[lo - 1]->address <
+		    array->segments[lo - 1]->size)
+			return array->segments[lo - 1];
+		return lo < array->size ? array->segments[lo] : NULL;
+	}
+
+	tree = physical ? &reader->physical_segments : &reader->virtual_segments;
+	it = drgn_memory_segment_tree_search_le(tree, &address);
+	if (it.entry) {
+		if (address - it.entry->address < it.entry->size)
+			return it.entry;
+		it = drgn_memory_segment_tree_next(it);
+	} else {
+		it = drgn_memory_segment_tree_first(tree);
+	}
+	return it.entry;
+}
 
 void drgn_memory_reader_init(struct drgn_memory_reader *reader)
 {
 	drgn_memory_segment_tree_init(&reader->virtual_segments);
 	drgn_memory_segment_tree_init(&reader->physical_segments);
+	reader->frozen = false;
+	drgn_memory_segment_array_init(&reader->frozen_virtual_segments);
+	drgn_memory_segment_array_init(&reader->frozen_physical_segments);
+	drgn_memory_cache_init(&reader->virtual_cache);
+	drgn_memory_cache_init(&reader->physical_cache);
+	reader->cache_max_pages = 0;
+	reader->cache_max_age = 0;
+	reader->readahead_max_pages = 1;
+	reader->readahead_pages = 1;
+	reader->readahead_loaded = 0;
+	reader->readahead_used = 0;
+	reader->readahead_last_miss = 0;
+	reader->readahead_buf = NULL;
+	reader->snapshot_depth = 0;
+	drgn_memory_cache_init(&reader->virtual_snapshot);
+	drgn_memory_cache_init(&reader->physical_snapshot);
+	reader->recording = false;
+	drgn_memory_page_set_init(&reader->virtual_recorded);
+	drgn_memory_page_set_init(&reader->physical_recorded);
+	memset(&reader->stats, 0, sizeof(reader->stats));
 }
 
 static void free_memory_segment_tree(struct drgn_memory_segment_tree *tree)
@@ -32,6 +310,15 @@ static void free_memory_segment_tree(struct drgn_memory_segment_tree *tree)
 
 void drgn_memory_reader_deinit(struct drgn_memory_reader *reader)
 {
+	drgn_memory_page_set_deinit(&reader->physical_recorded);
+	drgn_memory_page_set_deinit(&reader->virtual_recorded);
+	drgn_memory_cache_deinit(&reader->physical_cache);
+	drgn_memory_cache_deinit(&reader->virtual_cache);
+	drgn_memory_cache_deinit(&reader->physical_snapshot);
+	drgn_memory_cache_deinit(&reader->virtual_snapshot);
+	free(reader->readahead_buf);
+	drgn_memory_segment_array_deinit(&reader->frozen_physical_segments);
+	drgn_memory_segment_array_deinit(&reader->frozen_virtual_segments);
 	free_memory_segment_tree(&reader->physical_segments);
 	free_memory_segment_tree(&reader->virtual_segments);
 }
@@ -42,6 +329,37 @@ bool drgn_memory_reader_empty(struct drgn_memory_reader *reader)
 		drgn_memory_segment_tree_empty(&reader->physical_segments));
 }
 
+void drgn_memory_reader_set_cache(struct drgn_memory_reader *reader,
+				  size_t max_pages, uint64_t max_age)
+{
+	drgn_memory_cache_shrink(&reader->virtual_cache, max_pages);
+	drgn_memory_cache_shrink(&reader->physical_cache, max_pages);
+	reader->cache_max_pages = max_pages;
+	reader->cache_max_age = max_age;
+}
+
+void drgn_memory_reader_set_readahead(struct drgn_memory_reader *reader,
+				      size_t max_pages)
+{
+	size_t pages = 1;
+
+	while (pages <= max_pages / 2)
+		pages *= 2;
+	if (pages != reader->readahead_max_pages) {
+		free(reader->readahead_buf);
+		reader->readahead_buf = NULL;
+	}
+	reader->readahead_max_pages = pages;
+	reader->readahead_pages = min(reader->readahead_pages, pages);
+	reader->readahead_loaded = reader->readahead_used = 0;
+}
+
+void drgn_memory_reader_invalidate_cache(struct drgn_memory_reader *reader)
+{
+	drgn_memory_cache_clear(&reader->virtual_cache);
+	drgn_memory_cache_clear(&reader->physical_cache);
+}
+
 struct drgn_error *
 drgn_memory_reader_add_segment(struct drgn_memory_reader *reader,
 			       uint64_t address, uint64_t size,
@@ -64,6 +382,11 @@ drgn_memory_reader_add_segment(struct drgn_memory_reader *reader,
 					 "memory segment end is too large");
 	}
 
+	/* Any cached pages may now be stale. */
+	drgn_memory_cache_clear(physical ? &reader->physical_cache :
+				&reader->virtual_cache);
+	drgn_memory_reader_thaw(reader);
+
 	/*
 	 * This is split into two steps: the first step handles an overlapping
 	 * segment with address <= new address, and the second step handles
@@ -223,23 +546,57 @@ insert:
 	return NULL;
 }
 
-struct drgn_error *drgn_memory_reader_read(struct drgn_memory_reader *reader,
-					   void *buf, uint64_t address,
-					   size_t count, bool physical)
+static enum drgn_memory_segment_kind
+drgn_memory_segment_kind(drgn_memory_read_fn read_fn)
+{
+	if (read_fn == drgn_read_memory_file)
+		return DRGN_MEMORY_SEGMENT_FILE;
+	else if (read_fn == drgn_read_memory_process)
+		return DRGN_MEMORY_SEGMENT_PROCESS;
+	else if (read_fn == drgn_read_memory_remote)
+		return DRGN_MEMORY_SEGMENT_REMOTE;
+#ifdef WITH_LIBKDUMPFILE
+	else if (read_fn == drgn_read_kdump)
+		return DRGN_MEMORY_SEGMENT_KDUMP;
+#endif
+	else
+		return DRGN_MEMORY_SEGMENT_OTHER;
+}
+
+/*
+ * Return whether reads from a segment are worth timing. Reads from a mapped
+ * file or from a segment added by the user are usually just a memcpy(), so the
+ * clock_gettime() calls would cost more than the read itself.
+ */
+static bool drgn_memory_segment_timed(struct drgn_memory_segment *segment,
+				      enum drgn_memory_segment_kind kind)
+{
+	if (kind == DRGN_MEMORY_SEGMENT_FILE) {
+		struct drgn_memory_file_segment *file_segment = segment->arg;
+
+		return !file_segment->map;
+	}
+	return kind != DRGN_MEMORY_SEGMENT_OTHER;
+}
+
+static struct drgn_error *
+drgn_memory_reader_read_uncached(struct drgn_memory_reader *reader, void *buf,
+				 uint64_t address, size_t count, bool physical)
 {
-	struct drgn_memory_segment_tree *tree = (physical ?
-						 &reader->physical_segments :
-						 &reader->virtual_segments);
 	struct drgn_error *err;
 	size_t read = 0;
 
 	while (read < count) {
 		struct drgn_memory_segment *segment;
+		enum drgn_memory_segment_kind kind;
+		struct drgn_memory_read_stats *stats;
+		uint64_t start = 0;
+		bool timed;
 		size_t n;
 
-		segment = drgn_memory_segment_tree_search_le(tree,
-							     &address).entry;
-		if (!segment || segment->address + segment->size <= address) {
+		segment = drgn_memory_reader_find_segment(reader, address,
+							  physical);
+		if (!segment) {
 			return drgn_error_format(DRGN_ERROR_FAULT,
 						 "could not find memory segment containing 0x%" PRIx64,
 						 address);
@@ -247,11 +604,20 @@ struct drgn_error *drgn_memory_reader_read(struct drgn_memory_reader *reader,
 
 		n = min(segment->address + segment->size - address,
 			(uint64_t)(count - read));
+		kind = drgn_memory_segment_kind(segment->read_fn);
+		stats = &reader->stats.segments[kind];
+		timed = drgn_memory_segment_timed(segment, kind);
+		if (timed)
+			start = monotonic_ns();
 		err = segment->read_fn((char *)buf + read, address, n,
 				       address - segment->orig_address,
 				       segment->arg, physical);
+		if (timed)
+			stats->ns += monotonic_ns() - start;
+		stats->reads++;
 		if (err)
 			return err;
+		stats->bytes += n;
 
 		read += n;
 		address += n;
@@ -259,6 +625,1246 @@ struct drgn_error *drgn_memory_reader_read(struct drgn_memory_reader *reader,
 	return NULL;
 }
 
+/*
+ * Adapt the read-ahead window to how many of the pages read ahead after the
+ * previous miss were used, and return the number of pages to read for a miss
+ * on the given page number.
+ */
+static size_t drgn_memory_reader_readahead_window(struct drgn_memory_reader *reader,
+						  uint64_t pfn)
+{
+	size_t max_pages = min(reader->readahead_max_pages,
+			       reader->cache_max_pages / 2);
+	uint64_t distance;
+
+	if (reader->readahead_loaded) {
+		if (2 * reader->readahead_used >= reader->readahead_loaded)
+			reader->readahead_pages *= 2;
+		else
+			reader->readahead_pages /= 2;
+	} else if (reader->readahead_pages == 1) {
+		/*
+		 * Nothing was read ahead, so we can only guess from whether
+		 * this miss is close to the previous one.
+		 */
+		distance = (pfn > reader->readahead_last_miss ?
+			    pfn - reader->readahead_last_miss :
+			    reader->readahead_last_miss - pfn);
+		if (distance <= 8)
+			reader->readahead_pages = 2;
+	}
+	reader->readahead_pages = max(min(reader->readahead_pages, max_pages),
+				      (size_t)1);
+	/* The window must be a power of two so that it can be aligned. */
+	while (reader->readahead_pages & (reader->readahead_pages - 1))
+		reader->readahead_pages &= reader->readahead_pages - 1;
+	reader->readahead_loaded = reader->readahead_used = 0;
+	reader->readahead_last_miss = pfn;
+	return reader->readahead_pages;
+}
+
+/*
+ * Fill a missing page along with the rest of the read-ahead window around it.
+ * The pages read ahead are added at the least recently used end of the cache so
+ * that they are the first to be evicted if they aren't used. If read-ahead
+ * doesn't apply, *filled is set to false.
+ */
+static struct drgn_error *
+drgn_memory_cache_readahead(struct drgn_memory_reader *reader,
+			    struct drgn_memory_cache *cache,
+			    struct drgn_memory_cache_page *page,
+			    uint64_t address, bool physical, bool *filled)
+{
+	struct drgn_error *err;
+	uint64_t pfn = address / DRGN_MEMORY_CACHE_PAGE_SIZE;
+	uint64_t first_pfn, end_pfn, seg_first_pfn, seg_end_pfn, i;
+	struct drgn_memory_segment *segment;
+	size_t window, num_missing;
+	char *buf;
+
+	*filled = false;
+	window = drgn_memory_reader_readahead_window(reader, pfn);
+	if (window <= 1)
+		return NULL;
+
+	/* Only read pages that are entirely within the segment. */
+	segment = drgn_memory_reader_find_segment(reader, address, physical);
+	if (!segment)
+		return NULL;
+	seg_first_pfn = (segment->address / DRGN_MEMORY_CACHE_PAGE_SIZE +
+			 (segment->address % DRGN_MEMORY_CACHE_PAGE_SIZE != 0));
+	seg_end_pfn = ((segment->address + segment->size) /
+		       DRGN_MEMORY_CACHE_PAGE_SIZE);
+	first_pfn = max(pfn & ~(uint64_t)(window - 1), seg_first_pfn);
+	end_pfn = min((pfn & ~(uint64_t)(window - 1)) + window, seg_end_pfn);
+	if (pfn < first_pfn || pfn >= end_pfn || end_pfn - first_pfn <= 1)
+		return NULL;
+
+	if (!reader->readahead_buf) {
+		reader->readahead_buf = malloc_array(reader->readahead_max_pages,
+						     DRGN_MEMORY_CACHE_PAGE_SIZE);
+		if (!reader->readahead_buf)
+			return NULL;
+	}
+	buf = reader->readahead_buf;
+	err = drgn_memory_reader_read_uncached(reader, buf,
+					       first_pfn * DRGN_MEMORY_CACHE_PAGE_SIZE,
+					       (end_pfn - first_pfn) *
+					       DRGN_MEMORY_CACHE_PAGE_SIZE,
+					       physical);
+	if (err) {
+		if (err->code == DRGN_ERROR_FAULT) {
+			drgn_error_destroy(err);
+			return NULL;
+		}
+		return err;
+	}
+
+	memcpy(page->data,
+	       buf + (pfn - first_pfn) * DRGN_MEMORY_CACHE_PAGE_SIZE,
+	       DRGN_MEMORY_CACHE_PAGE_SIZE);
+	*filled = true;
+
+	/*
+	 * Make room for the pages read ahead before inserting any of them, so
+	 * that they don't evict each other. The missing page isn't in the map
+	 * yet, but our caller inserts it after we return, so it needs a slot,
+	 * too.
+	 */
+	num_missing = 1;
+	for (i = first_pfn; i < end_pfn; i++) {
+		uint64_t key = i * DRGN_MEMORY_CACHE_PAGE_SIZE;
+
+		if (i != pfn &&
+		    !drgn_memory_cache_page_map_search(&cache->map, &key).entry)
+			num_missing++;
+	}
+	/* The window is at most half of the cache, so this can't underflow. */
+	drgn_memory_cache_shrink(cache, reader->cache_max_pages - num_missing);
+
+	for (i = first_pfn; i < end_pfn; i++) {
+		struct drgn_memory_cache_page_map_entry entry = {
+			.key = i * DRGN_MEMORY_CACHE_PAGE_SIZE,
+		};
+		struct hash_pair hp;
+		struct drgn_memory_cache_page *ahead;
+
+		if (i == pfn)
+			continue;
+		hp = drgn_memory_cache_page_map_hash(&entry.key);
+		if (drgn_memory_cache_page_map_search_hashed(&cache->map,
+							     &entry.key,
+							     hp).entry)
+			continue;
+		/*
+		 * Evicting above may have dropped a page in the window which
+		 * was counted as cached; don't go over the limit for it.
+		 */
+		if (drgn_memory_cache_page_map_size(&cache->map) + 1 >=
+		    reader->cache_max_pages)
+			break;
+		ahead = malloc(sizeof(*ahead));
+		if (!ahead)
+			break;
+		ahead->address = entry.key;
+		if (reader->cache_max_age)
+			ahead->timestamp = monotonic_ns();
+		ahead->readahead = true;
+		memcpy(ahead->data,
+		       buf + (i - first_pfn) * DRGN_MEMORY_CACHE_PAGE_SIZE,
+		       DRGN_MEMORY_CACHE_PAGE_SIZE);
+		entry.value = ahead;
+		if (drgn_memory_cache_page_map_insert_searched(&cache->map,
+							       &entry, hp,
+							       NULL) == -1) {
+			free(ahead);
+			break;
+		}
+		drgn_memory_cache_link_last(cache, ahead);
+		reader->readahead_loaded++;
+	}
+	return NULL;
+}
+
+/*
+ * Get the cached page at the given page-aligned address, reading it if it is
+ * not cached or has expired. If the page can't be read in its entirety (e.g.,
+ * because part of it isn't in any segment), *ret is set to NULL and the caller
+ * should fall back to an uncached read.
+ */
+static struct drgn_error *
+drgn_memory_cache_get(struct drgn_memory_reader *reader, uint64_t address,
+		      bool physical, struct drgn_memory_cache_page **ret)
+{
+	struct drgn_error *err;
+	struct drgn_memory_cache *cache = (physical ? &reader->physical_cache :
+					   &reader->virtual_cache);
+	struct hash_pair hp;
+	struct drgn_memory_cache_page_map_iterator it;
+	struct drgn_memory_cache_page *page;
+	bool new_page;
+
+	hp = drgn_memory_cache_page_map_hash(&address);
+	it = drgn_memory_cache_page_map_search_hashed(&cache->map, &address,
+						      hp);
+	if (it.entry) {
+		page = it.entry->value;
+		drgn_memory_cache_unlink(cache, page);
+		if (!reader->cache_max_age ||
+		    monotonic_ns() - page->timestamp <= reader->cache_max_age) {
+			if (page->readahead) {
+				page->readahead = false;
+				reader->readahead_used++;
+			}
+			drgn_memory_cache_link_first(cache, page);
+			reader->stats.cache_hits++;
+			*ret = page;
+			return NULL;
+		}
+		/* The page expired, so read it again. */
+		new_page = false;
+	} else if (drgn_memory_cache_page_map_size(&cache->map) >=
+		   reader->cache_max_pages) {
+		/* Recycle the least recently used page. */
+		page = cache->last;
+		drgn_memory_cache_unlink(cache, page);
+		drgn_memory_cache_page_map_delete(&cache->map, &page->address);
+		new_page = true;
+	} else {
+		page = malloc(sizeof(*page));
+		if (!page) {
+			*ret = NULL;
+			return NULL;
+		}
+		new_page = true;
+	}
+	page->readahead = false;
+	reader->stats.cache_misses++;
+
+	if (new_page && reader->readahead_max_pages > 1) {
+		bool filled;
+
+		err = drgn_memory_cache_readahead(reader, cache, page, address,
+						  physical, &filled);
+		if (err)
+			goto err;
+		if (filled)
+			goto filled;
+	}
+	err = drgn_memory_reader_read_uncached(reader, page->data, address,
+					       sizeof(page->data), physical);
+	if (err)
+		goto err;
+filled:
+	if (reader->cache_max_age)
+		page->timestamp = monotonic_ns();
+	if (new_page) {
+		struct drgn_memory_cache_page_map_entry entry = {
+			.key = address,
+			.value = page,
+		};
+
+		page->address = address;
+		if (drgn_memory_cache_page_map_insert_searched(&cache->map,
+							       &entry, hp,
+							       NULL) == -1) {
+			free(page);
+			*ret = NULL;
+			return NULL;
+		}
+	}
+	drgn_memory_cache_link_first(cache, page);
+	*ret = page;
+	return NULL;
+
+err:
+	if (!new_page)
+		drgn_memory_cache_page_map_delete_hashed(&cache->map, &address,
+							 hp);
+	free(page);
+	if (err->code == DRGN_ERROR_FAULT) {
+		drgn_error_destroy(err);
+		*ret = NULL;
+		return NULL;
+	}
+	return err;
+}
+
+void drgn_memory_reader_begin_snapshot(struct drgn_memory_reader *reader)
+{
+	reader->snapshot_depth++;
+}
+
+void drgn_memory_reader_end_snapshot(struct drgn_memory_reader *reader)
+{
+	if (reader->snapshot_depth && --reader->snapshot_depth == 0) {
+		drgn_memory_cache_clear(&reader->virtual_snapshot);
+		drgn_memory_cache_clear(&reader->physical_snapshot);
+	}
+}
+
+static int drgn_memory_cache_page_cmp(const void *_a, const void *_b)
+{
+	const struct drgn_memory_cache_page *a = *(void * const *)_a;
+	const struct drgn_memory_cache_page *b = *(void * const *)_b;
+
+	if (a->address < b->address)
+		return -1;
+	else if (a->address > b->address)
+		return 1;
+	else if (a->valid_start < b->valid_start)
+		return -1;
+	else if (a->valid_start > b->valid_start)
+		return 1;
+	else
+		return 0;
+}
+
+struct drgn_error *
+drgn_memory_reader_snapshot_pages(struct drgn_memory_reader *reader,
+				  bool physical,
+				  struct drgn_memory_cache_page ***ret,
+				  size_t *count_ret)
+{
+	struct drgn_memory_cache *snapshot = (physical ?
+					      &reader->physical_snapshot :
+					      &reader->virtual_snapshot);
+	struct drgn_memory_cache_page **pages, *page;
+	size_t count, i = 0;
+
+	count = drgn_memory_cache_page_map_size(&snapshot->map);
+	pages = malloc_array(count, sizeof(*pages));
+	if (!pages && count)
+		return &drgn_enomem;
+	for (page = snapshot->first; page; page = page->next)
+		pages[i++] = page;
+	qsort(pages, count, sizeof(*pages), drgn_memory_cache_page_cmp);
+	*ret = pages;
+	*count_ret = count;
+	return NULL;
+}
+
+/*
+ * Get the page captured by the active snapshot at the given page-aligned
+ * address, capturing it if this is the first access. If the page can't be read
+ * in its entirety, *ret is set to NULL and the caller should fall back to an
+ * uncached read.
+ */
+static struct drgn_error *
+drgn_memory_snapshot_get(struct drgn_memory_reader *reader, uint64_t address,
+			 bool physical, struct drgn_memory_cache_page **ret)
+{
+	struct drgn_error *err;
+	struct drgn_memory_cache *snapshot = (physical ?
+					      &reader->physical_snapshot :
+					      &reader->virtual_snapshot);
+	struct drgn_memory_cache_page_map_entry entry = { .key = address };
+	struct hash_pair hp;
+	struct drgn_memory_cache_page_map_iterator it;
+	struct drgn_memory_cache_page *page;
+
+	hp = drgn_memory_cache_page_map_hash(&address);
+	it = drgn_memory_cache_page_map_search_hashed(&snapshot->map, &address,
+						      hp);
+	if (it.entry) {
+		reader->stats.cache_hits++;
+		*ret = it.entry->value;
+		return NULL;
+	}
+	reader->stats.cache_misses++;
+
+	*ret = NULL;
+	page = malloc(sizeof(*page));
+	if (!page)
+		return NULL;
+	err = drgn_memory_reader_read_uncached(reader, page->data, address,
+					       sizeof(page->data), physical);
+	if (err) {
+		free(page);
+		if (err->code == DRGN_ERROR_FAULT) {
+			drgn_error_destroy(err);
+			return NULL;
+		}
+		return err;
+	}
+	page->address = address;
+	page->readahead = false;
+	page->valid_start = 0;
+	page->valid_end = DRGN_MEMORY_CACHE_PAGE_SIZE;
+	entry.value = page;
+	if (drgn_memory_cache_page_map_insert_searched(&snapshot->map, &entry,
+						       hp, NULL) == -1) {
+		free(page);
+		return NULL;
+	}
+	/* The list is only used to free the pages. */
+	drgn_memory_cache_link_first(snapshot, page);
+	*ret = page;
+	return NULL;
+}
+
+void drgn_memory_reader_start_recording(struct drgn_memory_reader *reader)
+{
+	drgn_memory_page_set_clear(&reader->virtual_recorded);
+	drgn_memory_page_set_clear(&reader->physical_recorded);
+	reader->recording = true;
+}
+
+void drgn_memory_reader_stop_recording(struct drgn_memory_reader *reader)
+{
+	reader->recording = false;
+}
+
+/* Record the address of every page in the given range. */
+static struct drgn_error *
+drgn_memory_reader_record(struct drgn_memory_reader *reader, uint64_t address,
+			  size_t count, bool physical)
+{
+	struct drgn_memory_page_set *set = (physical ?
+					    &reader->physical_recorded :
+					    &reader->virtual_recorded);
+	uint64_t page_address, last_page_address, end;
+
+	if (!count)
+		return NULL;
+	if (__builtin_add_overflow(address, count - 1, &end))
+		end = UINT64_MAX;
+	page_address = address & ~(DRGN_MEMORY_CACHE_PAGE_SIZE - 1);
+	last_page_address = end & ~(DRGN_MEMORY_CACHE_PAGE_SIZE - 1);
+	for (;;) {
+		if (drgn_memory_page_set_insert(set, &page_address, NULL) == -1)
+			return &drgn_enomem;
+		if (page_address == last_page_address)
+			return NULL;
+		page_address += DRGN_MEMORY_CACHE_PAGE_SIZE;
+	}
+}
+
+/* Array of pages being built by drgn_memory_reader_recorded_pages(). */
+struct drgn_recorded_pages {
+	struct drgn_memory_cache_page **pages;
+	size_t count, capacity;
+};
+
+static bool drgn_recorded_pages_append(struct drgn_recorded_pages *recorded,
+				       struct drgn_memory_cache_page *page)
+{
+	if (recorded->count >= recorded->capacity) {
+		size_t capacity = recorded->capacity ? 2 * recorded->capacity : 1;
+
+		if (!resize_array(&recorded->pages, capacity))
+			return false;
+		recorded->capacity = capacity;
+	}
+	recorded->pages[recorded->count++] = page;
+	return true;
+}
+
+/*
+ * Add a partial page for each part of a recorded page that is in a segment and
+ * can be read. This is used for pages which can't be read in their entirety.
+ */
+static struct drgn_error *
+drgn_memory_reader_record_partial_page(struct drgn_memory_reader *reader,
+				       uint64_t address, bool physical,
+				       struct drgn_recorded_pages *recorded)
+{
+	struct drgn_error *err;
+	uint64_t cur = address, end = address + DRGN_MEMORY_CACHE_PAGE_SIZE - 1;
+
+	for (;;) {
+		struct drgn_memory_segment *segment;
+		struct drgn_memory_cache_page *page;
+		uint64_t last;
+
+		segment = drgn_memory_reader_find_segment_ge(reader, cur,
+							     physical);
+		if (!segment || segment->address > end)
+			return NULL;
+		if (segment->address > cur)
+			cur = segment->address;
+		last = min(segment->address + segment->size - 1, end);
+
+		page = malloc(sizeof(*page));
+		if (!page)
+			return &drgn_enomem;
+		err = drgn_memory_reader_read_uncached(reader,
+						       page->data + (cur - address),
+						       cur, last - cur + 1,
+						       physical);
+		if (err) {
+			/* Skip the part of the segment that faulted. */
+			free(page);
+			if (err->code != DRGN_ERROR_FAULT)
+				return err;
+			drgn_error_destroy(err);
+		} else {
+			page->address = address;
+			page->readahead = false;
+			page->valid_start = cur - address;
+			page->valid_end = last - address + 1;
+			if (!drgn_recorded_pages_append(recorded, page)) {
+				free(page);
+				return &drgn_enomem;
+			}
+		}
+		if (last == end)
+			return NULL;
+		cur = last + 1;
+	}
+}
+
+struct drgn_error *
+drgn_memory_reader_recorded_pages(struct drgn_memory_reader *reader,
+				  bool physical,
+				  struct drgn_memory_cache_page ***ret,
+				  size_t *count_ret)
+{
+	struct drgn_error *err;
+	struct drgn_memory_page_set *set = (physical ?
+					    &reader->physical_recorded :
+					    &reader->virtual_recorded);
+	struct drgn_memory_page_set_iterator it;
+	struct drgn_recorded_pages recorded = {};
+	size_t i;
+
+	recorded.capacity = drgn_memory_page_set_size(set);
+	recorded.pages = malloc_array(recorded.capacity,
+				      sizeof(*recorded.pages));
+	if (!recorded.pages && recorded.capacity)
+		return &drgn_enomem;
+	for (it = drgn_memory_page_set_first(set); it.entry;
+	     it = drgn_memory_page_set_next(it)) {
+		struct drgn_memory_cache_page *page;
+
+		page = malloc(sizeof(*page));
+		if (!page) {
+			err = &drgn_enomem;
+			goto err;
+		}
+		err = drgn_memory_reader_read_uncached(reader, page->data,
+						       *it.entry,
+						       sizeof(page->data),
+						       physical);
+		if (err) {
+			free(page);
+			if (err->code != DRGN_ERROR_FAULT)
+				goto err;
+			drgn_error_destroy(err);
+			err = drgn_memory_reader_record_partial_page(reader,
+								     *it.entry,
+								     physical,
+								     &recorded);
+			if (err)
+				goto err;
+			continue;
+		}
+		page->address = *it.entry;
+		page->readahead = false;
+		page->valid_start = 0;
+		page->valid_end = DRGN_MEMORY_CACHE_PAGE_SIZE;
+		if (!drgn_recorded_pages_append(&recorded, page)) {
+			free(page);
+			err = &drgn_enomem;
+			goto err;
+		}
+	}
+	qsort(recorded.pages, recorded.count, sizeof(*recorded.pages),
+	      drgn_memory_cache_page_cmp);
+	*ret = recorded.pages;
+	*count_ret = recorded.count;
+	return NULL;
+
+err:
+	for (i = 0; i < recorded.count; i++)
+		free(recorded.pages[i]);
+	free(recorded.pages);
+	return err;
+}
+
+/*
+ * Read page by page, getting each page with get_page() (either from the cache
+ * or from the active snapshot).
+ */
+static struct drgn_error *
+drgn_memory_reader_read_pages(struct drgn_memory_reader *reader, void *buf,
+			      uint64_t address, size_t count, bool physical,
+			      struct drgn_error *(*get_page)(struct drgn_memory_reader *,
+							     uint64_t, bool,
+							     struct drgn_memory_cache_page **))
+{
+	struct drgn_error *err;
+	char *p = buf;
+
+	while (count) {
+		uint64_t page_address, page_offset;
+		struct drgn_memory_cache_page *page;
+		size_t n;
+
+		page_address = address & ~(DRGN_MEMORY_CACHE_PAGE_SIZE - 1);
+		page_offset = address - page_address;
+		n = min(DRGN_MEMORY_CACHE_PAGE_SIZE - page_offset,
+			(uint64_t)count);
+		err = get_page(reader, page_address, physical, &page);
+		if (err)
+			return err;
+		if (page) {
+			memcpy(p, page->data + page_offset, n);
+		} else {
+			err = drgn_memory_reader_read_uncached(reader, p,
+							       address, n,
+							       physical);
+			if (err)
+				return err;
+		}
+		p += n;
+		address += n;
+		count -= n;
+	}
+	return NULL;
+}
+
+struct drgn_error *drgn_memory_reader_read(struct drgn_memory_reader *reader,
+					   void *buf, uint64_t address,
+					   size_t count, bool physical)
+{
+	if (reader->recording) {
+		struct drgn_error *err;
+
+		err = drgn_memory_reader_record(reader, address, count,
+						physical);
+		if (err)
+			return err;
+	}
+
+	/* A snapshot must capture everything, no matter the size. */
+	if (reader->snapshot_depth) {
+		return drgn_memory_reader_read_pages(reader, buf, address,
+						     count, physical,
+						     drgn_memory_snapshot_get);
+	}
+
+	/*
+	 * Reads larger than a page are unlikely to be repeated, so don't pollute
+	 * the cache with them.
+	 */
+	if (!reader->cache_max_pages || count > DRGN_MEMORY_CACHE_PAGE_SIZE) {
+		return drgn_memory_reader_read_uncached(reader, buf, address,
+							count, physical);
+	}
+	return drgn_memory_reader_read_pages(reader, buf, address, count,
+					     physical, drgn_memory_cache_get);
+}
+
+const void *drgn_memory_reader_map(struct drgn_memory_reader *reader,
+				   uint64_t address, size_t count,
+				   bool physical)
+{
+	struct drgn_memory_segment *segment;
+	struct drgn_memory_file_segment *file_segment;
+	uint64_t offset;
+
+	if (reader->snapshot_depth)
+		return NULL;
+	if (reader->recording) {
+		struct drgn_error *err;
+
+		err = drgn_memory_reader_record(reader, address, count,
+						physical);
+		if (err) {
+			drgn_error_destroy(err);
+			return NULL;
+		}
+	}
+	segment = drgn_memory_reader_find_segment(reader, address, physical);
+	if (!segment || segment->read_fn != drgn_read_memory_file ||
+	    segment->address + segment->size - address < count)
+		return NULL;
+	file_segment = segment->arg;
+	offset = address - segment->orig_address;
+	if (!file_segment->map || offset > file_segment->file_size ||
+	    count > file_segment->file_size - offset)
+		return NULL;
+	reader->stats.segments[DRGN_MEMORY_SEGMENT_FILE].reads++;
+	reader->stats.segments[DRGN_MEMORY_SEGMENT_FILE].bytes += count;
+	return file_segment->map + offset;
+}
+
+struct drgn_error *
+drgn_memory_reader_read_partial(struct drgn_memory_reader *reader, void *buf,
+				uint64_t address, size_t count, bool physical,
+				size_t *ret)
+{
+	struct drgn_error *err;
+	uint64_t chunk;
+	size_t i;
+
+	chunk = DRGN_MEMORY_CACHE_PAGE_SIZE -
+		(address % DRGN_MEMORY_CACHE_PAGE_SIZE);
+	if (chunk > count)
+		chunk = count;
+	err = drgn_memory_reader_read(reader, buf, address, chunk, physical);
+	if (!err) {
+		*ret = chunk;
+		return NULL;
+	} else if (err->code != DRGN_ERROR_FAULT) {
+		return err;
+	}
+	drgn_error_destroy(err);
+
+	/*
+	 * Part of the chunk is invalid (e.g., it is at the end of a segment).
+	 * Find out how much of it is valid.
+	 */
+	for (i = 0; i < chunk; i++) {
+		err = drgn_memory_reader_read(reader, (char *)buf + i,
+					      address + i, 1, physical);
+		if (err) {
+			if (i == 0 || err->code != DRGN_ERROR_FAULT)
+				return err;
+			drgn_error_destroy(err);
+			break;
+		}
+	}
+	*ret = i;
+	return NULL;
+}
+
+static struct drgn_error *drgn_memory_process_fault(uint64_t address)
+{
+	return drgn_error_format(DRGN_ERROR_FAULT,
+				 "could not read memory at 0x%" PRIx64,
+				 address);
+}
+
+/*
+ * Read with process_vm_readv(). This returns 0 on success or an errno value on
+ * failure.
+ */
+static int drgn_memory_process_vm_readv(struct drgn_memory_process *process,
+					void *buf, uint64_t address,
+					size_t count, uint64_t *fault_address)
+{
+	char *p = buf;
+
+	while (count) {
+		struct iovec local = { p, count };
+		struct iovec remote = { (void *)(uintptr_t)address, count };
+		ssize_t ret;
+
+		ret = process_vm_readv(process->pid, &local, 1, &remote, 1, 0);
+		process->stats.vm_readv_calls++;
+		if (ret == -1) {
+			if (errno == EINTR)
+				continue;
+			*fault_address = address;
+			return errno;
+		} else if (ret == 0) {
+			*fault_address = address;
+			return EFAULT;
+		}
+		process->stats.vm_readv_bytes += ret;
+		p += ret;
+		address += ret;
+		count -= ret;
+	}
+	return 0;
+}
+
+static struct drgn_error *
+drgn_memory_process_pread(struct drgn_memory_process *process, void *buf,
+			  uint64_t address, size_t count)
+{
+	char *p = buf;
+
+	process->stats.proc_mem_reads++;
+	while (count) {
+		ssize_t ret;
+
+		ret = pread(process->mem_fd, p, count, address);
+		if (ret == -1) {
+			if (errno == EINTR)
+				continue;
+			else if (errno == EIO)
+				return drgn_memory_process_fault(address);
+			return drgn_error_create_os("pread", errno, NULL);
+		} else if (ret == 0) {
+			return drgn_memory_process_fault(address);
+		}
+		process->stats.proc_mem_bytes += ret;
+		p += ret;
+		address += ret;
+		count -= ret;
+	}
+	return NULL;
+}
+
+/*
+ * Handle a process_vm_readv() error. If we should fall back to
+ * /proc/$pid/mem, this returns NULL.
+ */
+static struct drgn_error *
+drgn_memory_process_vm_readv_error(struct drgn_memory_process *process,
+				   int errnum, uint64_t address)
+{
+	if (errnum == EFAULT)
+		return drgn_memory_process_fault(address);
+	if ((errnum == EPERM || errnum == ENOSYS) &&
+	    process->backend == DRGN_PROCESS_MEMORY_AUTO &&
+	    process->mem_fd != -1) {
+		process->backend = DRGN_PROCESS_MEMORY_PROC_MEM;
+		return NULL;
+	}
+	return drgn_error_create_os("process_vm_readv", errnum, NULL);
+}
+
+struct drgn_error *drgn_read_memory_process(void *buf, uint64_t address,
+					    size_t count, uint64_t offset,
+					    void *arg, bool physical)
+{
+	struct drgn_error *err;
+	struct drgn_memory_process *process = arg;
+
+	if (process->backend != DRGN_PROCESS_MEMORY_PROC_MEM) {
+		uint64_t fault_address;
+		int errnum;
+
+		errnum = drgn_memory_process_vm_readv(process, buf, address,
+						      count, &fault_address);
+		if (errnum) {
+			err = drgn_memory_process_vm_readv_error(process,
+								 errnum,
+								 fault_address);
+		} else {
+			err = NULL;
+		}
+		/*
+		 * Only count the read if process_vm_readv() served it (or
+		 * faulted); a read which falls back to /proc/$pid/mem is
+		 * counted there.
+		 */
+		if (!errnum || err) {
+			process->stats.vm_readv_reads++;
+			return err;
+		}
+	}
+	return drgn_memory_process_pread(process, buf, address, count);
+}
+
+/*
+ * Read a batch of requests from a process with as few process_vm_readv() calls
+ * as possible. The requests must be sorted by address. This returns non-NULL
+ * only for fatal errors; faults are stored in the requests.
+ */
+static struct drgn_error *
+drgn_memory_process_read_vec(struct drgn_memory_process *process,
+			     struct drgn_memory_read_request **reqs, size_t n)
+{
+	struct drgn_error *err;
+	struct iovec local[64], remote[64];
+	size_t i = 0;
+
+	while (i < n) {
+		size_t batch, j;
+		ssize_t ret;
+
+		if (process->backend == DRGN_PROCESS_MEMORY_PROC_MEM)
+			goto read_individually;
+
+		batch = min(n - i, ARRAY_SIZE(local));
+		for (j = 0; j < batch; j++) {
+			local[j].iov_base = reqs[i + j]->buf;
+			local[j].iov_len = reqs[i + j]->count;
+			remote[j].iov_base =
+				(void *)(uintptr_t)reqs[i + j]->address;
+			remote[j].iov_len = reqs[i + j]->count;
+		}
+		ret = process_vm_readv(process->pid, local, batch, remote,
+				       batch, 0);
+		process->stats.vm_readv_calls++;
+		if (ret == -1) {
+			if (errno == EINTR)
+				continue;
+			/*
+			 * Let the individual read of the first request report
+			 * the error or fall back to /proc/$pid/mem.
+			 */
+			if (errno != EFAULT && errno != EPERM &&
+			    errno != ENOSYS) {
+				return drgn_error_create_os("process_vm_readv",
+							    errno, NULL);
+			}
+			goto read_individually;
+		}
+		process->stats.vm_readv_bytes += ret;
+		/* Skip the requests that were read completely. */
+		for (j = 0; j < batch && (size_t)ret >= reqs[i]->count; j++) {
+			ret -= reqs[i]->count;
+			process->stats.vm_readv_reads++;
+			i++;
+		}
+		if (j == batch)
+			continue;
+		/*
+		 * The read stopped at an invalid address in request i. Read it
+		 * again individually to find out what happened.
+		 */
+read_individually:
+		err = drgn_read_memory_process(reqs[i]->buf, reqs[i]->address,
+					       reqs[i]->count, 0, process,
+					       false);
+		if (err) {
+			if (err->code != DRGN_ERROR_FAULT)
+				return err;
+			reqs[i]->err = err;
+		}
+		i++;
+	}
+	return NULL;
+}
+
+/*
+ * Maximum number of bytes that drgn_memory_reader_read_vec() coalesces into a
+ * single read.
+ */
+#define MAX_COALESCED_READ (UINT64_C(1) << 20)
+
+static int drgn_memory_read_request_cmp(const void *_a, const void *_b)
+{
+	const struct drgn_memory_read_request *a = *(void * const *)_a;
+	const struct drgn_memory_read_request *b = *(void * const *)_b;
+
+	if (a->address < b->address)
+		return -1;
+	else if (a->address > b->address)
+		return 1;
+	else
+		return 0;
+}
+
+static struct drgn_error *
+drgn_memory_read_request_read(struct drgn_memory_reader *reader,
+			      struct drgn_memory_read_request *req,
+			      bool physical)
+{
+	struct drgn_error *err;
+
+	err = drgn_memory_reader_read(reader, req->buf, req->address,
+				      req->count, physical);
+	if (err && err->code == DRGN_ERROR_FAULT) {
+		req->err = err;
+		return NULL;
+	}
+	return err;
+}
+
+struct drgn_error *
+drgn_memory_reader_read_vec(struct drgn_memory_reader *reader,
+			    struct drgn_memory_read_request *reqs, size_t n,
+			    bool physical)
+{
+	struct drgn_error *err;
+	struct drgn_memory_read_request **sorted;
+	char *scratch = NULL;
+	size_t scratch_size = 0;
+	size_t num_sorted, i, j;
+
+	for (i = 0; i < n; i++)
+		reqs[i].err = NULL;
+	if (n == 0)
+		return NULL;
+	/* Batched requests don't go through drgn_memory_reader_read(). */
+	if (reader->recording) {
+		for (i = 0; i < n; i++) {
+			err = drgn_memory_reader_record(reader, reqs[i].address,
+							reqs[i].count,
+							physical);
+			if (err)
+				return err;
+		}
+	}
+
+	/*
+	 * The second half of the array is used for requests that can be
+	 * batched.
+	 */
+	sorted = malloc_array(n, 2 * sizeof(*sorted));
+	if (!sorted)
+		return &drgn_enomem;
+	for (i = 0; i < n; i++)
+		sorted[i] = &reqs[i];
+	qsort(sorted, n, sizeof(*sorted), drgn_memory_read_request_cmp);
+	num_sorted = n;
+
+	/*
+	 * Requests contained in a running process's segment can be read with
+	 * a few process_vm_readv() calls, and requests contained in a remote
+	 * segment can all be sent to the server before waiting for the
+	 * answers. The cache must be bypassed to do so, so this is only done
+	 * if there is no active snapshot and, for a process, if caching is
+	 * disabled. A round trip to a remote server costs more than the cache
+	 * saves, so remote requests are batched even if caching is enabled.
+	 */
+	if (!reader->snapshot_depth) {
+		drgn_memory_read_fn batch_fn = NULL;
+		void *batch_arg = NULL;
+		size_t num_batched = 0;
+
+		num_sorted = 0;
+		for (i = 0; i < n; i++) {
+			struct drgn_memory_read_request *req = sorted[i];
+			struct drgn_memory_segment *segment;
+
+			segment = drgn_memory_reader_find_segment(reader,
+								  req->address,
+								  physical);
+			if (req->count && segment &&
+			    ((segment->read_fn == drgn_read_memory_process &&
+			      !reader->cache_max_pages) ||
+			     segment->read_fn == drgn_read_memory_remote) &&
+			    (!batch_fn || (segment->read_fn == batch_fn &&
+					   segment->arg == batch_arg)) &&
+			    req->count <= (segment->address + segment->size -
+					   req->address)) {
+				batch_fn = segment->read_fn;
+				batch_arg = segment->arg;
+				sorted[n + num_batched++] = req;
+			} else {
+				sorted[num_sorted++] = req;
+			}
+		}
+		if (num_batched) {
+			struct drgn_memory_read_stats *stats;
+			uint64_t start;
+
+			stats = &reader->stats.segments[drgn_memory_segment_kind(batch_fn)];
+			for (i = 0; i < num_batched; i++)
+				stats->bytes += sorted[n + i]->count;
+			stats->reads += num_batched;
+			start = monotonic_ns();
+			if (batch_fn == drgn_read_memory_remote) {
+				err = drgn_memory_remote_read_vec(batch_arg,
+								  sorted + n,
+								  num_batched,
+								  physical);
+			} else {
+				err = drgn_memory_process_read_vec(batch_arg,
+								   sorted + n,
+								   num_batched);
+			}
+			stats->ns += monotonic_ns() - start;
+			if (err)
+				goto err;
+		}
+	}
+
+	for (i = 0; i < num_sorted; i = j) {
+		uint64_t start = sorted[i]->address, end;
+
+		/*
+		 * Find the run of requests starting at i that are adjacent to
+		 * or overlap each other.
+		 */
+		j = i + 1;
+		if (__builtin_add_overflow(start, sorted[i]->count, &end))
+			goto read_individually;
+		for (; j < num_sorted; j++) {
+			uint64_t req_end;
+
+			if (sorted[j]->address > end ||
+			    __builtin_add_overflow(sorted[j]->address,
+						   sorted[j]->count, &req_end))
+				break;
+			if (req_end > end) {
+				if (req_end - start > MAX_COALESCED_READ)
+					break;
+				end = req_end;
+			}
+		}
+		if (j - i == 1)
+			goto read_individually;
+
+		if (end - start > scratch_size) {
+			free(scratch);
+			scratch_size = end - start;
+			scratch = malloc(scratch_size);
+			if (!scratch) {
+				scratch_size = 0;
+				err = &drgn_enomem;
+				goto err;
+			}
+		}
+		err = drgn_memory_reader_read(reader, scratch, start,
+					      end - start, physical);
+		if (!err) {
+			size_t k;
+
+			for (k = i; k < j; k++) {
+				memcpy(sorted[k]->buf,
+				       scratch + (sorted[k]->address - start),
+				       sorted[k]->count);
+			}
+			continue;
+		} else if (err->code != DRGN_ERROR_FAULT) {
+			goto err;
+		}
+		/*
+		 * Part of the range faulted. Read the requests individually to
+		 * find out which ones.
+		 */
+		drgn_error_destroy(err);
+read_individually:
+		for (; i < j; i++) {
+			err = drgn_memory_read_request_read(reader, sorted[i],
+							    physical);
+			if (err)
+				goto err;
+		}
+	}
+	err = NULL;
+	goto out;
+
+err:
+	for (i = 0; i < n; i++) {
+		drgn_error_destroy(reqs[i].err);
+		reqs[i].err = NULL;
+	}
+out:
+	free(scratch);
+	free(sorted);
+	return err;
+}
+
+/*
+ * Clear the bits of the pages overlapping a range of a sparse read. offset is
+ * relative to the start of the first page of the read.
+ */
+static void sparse_read_invalidate(unsigned char *valid, uint64_t offset,
+				   uint64_t count)
+{
+	uint64_t page, last_page;
+
+	page = offset / DRGN_SPARSE_READ_PAGE_SIZE;
+	last_page = (offset + count - 1) / DRGN_SPARSE_READ_PAGE_SIZE;
+	for (; page <= last_page; page++)
+		valid[page / 8] &= ~(1 << (page % 8));
+}
+
+/*
+ * Read a range contained in one segment, splitting it in half at a page
+ * boundary whenever it faults until the faulting pages are found.
+ */
+static struct drgn_error *
+sparse_read_range(struct drgn_memory_reader *reader, char *buf,
+		  uint64_t address, size_t count, bool physical,
+		  unsigned char *valid, uint64_t start_page_address)
+{
+	struct drgn_error *err;
+	uint64_t mid;
+
+	err = drgn_memory_reader_read(reader, buf, address, count, physical);
+	if (!err)
+		return NULL;
+	if (err->code != DRGN_ERROR_FAULT)
+		return err;
+	drgn_error_destroy(err);
+
+	mid = ((address + count / 2) &
+	       ~(uint64_t)(DRGN_SPARSE_READ_PAGE_SIZE - 1));
+	if (mid <= address) {
+		mid = ((address | (DRGN_SPARSE_READ_PAGE_SIZE - 1)) + 1);
+		if (mid - address >= count) {
+			/* The range is within a single page. */
+			memset(buf, 0, count);
+			sparse_read_invalidate(valid,
+					       address - start_page_address,
+					       count);
+			return NULL;
+		}
+	}
+	err = sparse_read_range(reader, buf, address, mid - address, physical,
+				valid, start_page_address);
+	if (err)
+		return err;
+	return sparse_read_range(reader, buf + (mid - address), mid,
+				 count - (mid - address), physical, valid,
+				 start_page_address);
+}
+
+struct drgn_error *
+drgn_memory_reader_read_sparse(struct drgn_memory_reader *reader, void *buf,
+			       uint64_t address, size_t count, bool physical,
+			       unsigned char *valid)
+{
+	struct drgn_error *err;
+	char *p = buf;
+	uint64_t start_page_address, num_pages, end, page;
+	size_t offset = 0;
+
+	if (!count)
+		return NULL;
+	if (__builtin_add_overflow(address, count - 1, &end)) {
+		return drgn_error_create(DRGN_ERROR_OVERFLOW,
+					 "address range overflows");
+	}
+	start_page_address = (address &
+			      ~(uint64_t)(DRGN_SPARSE_READ_PAGE_SIZE - 1));
+	num_pages = (end - start_page_address) / DRGN_SPARSE_READ_PAGE_SIZE + 1;
+	memset(valid, 0xff, (num_pages + 7) / 8);
+
+	while (offset < count) {
+		uint64_t cur = address + offset;
+		struct drgn_memory_segment *segment;
+		size_t n;
+
+		segment = drgn_memory_reader_find_segment_ge(reader, cur,
+							     physical);
+		if (!segment || segment->address > end) {
+			/* The rest of the range isn't in any segment. */
+			n = count - offset;
+			memset(p + offset, 0, n);
+			sparse_read_invalidate(valid, cur - start_page_address,
+					       n);
+		} else if (segment->address > cur) {
+			/* Skip the gap before the next segment. */
+			n = segment->address - cur;
+			memset(p + offset, 0, n);
+			sparse_read_invalidate(valid, cur - start_page_address,
+					       n);
+		} else {
+			n = (min(segment->address + segment->size - 1, end) -
+			     cur + 1);
+			err = sparse_read_range(reader, p + offset, cur, n,
+						physical, valid,
+						start_page_address);
+			if (err)
+				return err;
+		}
+		offset += n;
+	}
+
+	/*
+	 * A page straddling the end of a segment or a fault still has the bytes
+	 * that could be read, so zero the rest of every invalid page.
+	 */
+	for (page = 0; page < num_pages; page++) {
+		uint64_t page_start, page_end;
+
+		if (valid[page / 8] & (1 << (page % 8)))
+			continue;
+		page_start = (page ? page * DRGN_SPARSE_READ_PAGE_SIZE -
+			      (address - start_page_address) : 0);
+		page_end = min((page + 1) * DRGN_SPARSE_READ_PAGE_SIZE -
+			       (address - start_page_address), (uint64_t)count);
+		memset(p + page_start, 0, page_end - page_start);
+	}
+
+	/* Clear the unused bits of the last byte. */
+	if (num_pages % 8)
+		valid[num_pages / 8] &= (1 << (num_pages % 8)) - 1;
+	return NULL;
+}
+
 struct drgn_error *drgn_read_memory_file(void *buf, uint64_t address,
 					 size_t count, uint64_t offset,
 					 void *arg, bool physical)
@@ -275,6 +1881,28 @@ struct drgn_error *drgn_read_memory_file(void *buf, uint64_t address,
 	} else {
 		file_count = 0;
 	}
+	if (file_segment->map) {
+		memcpy(p, file_segment->map + offset, file_count);
+		p += file_count;
+		file_count = 0;
+	}
+	while (file_count && file_segment->compressed) {
+		struct drgn_error *err;
+		size_t ret;
+
+		err = drgn_compressed_file_pread(file_segment->compressed, p,
+						 file_count, file_offset,
+						 &ret);
+		if (err)
+			return err;
+		if (ret == 0) {
+			return drgn_error_format(DRGN_ERROR_FAULT,
+						 "short read from memory file");
+		}
+		p += ret;
+		file_count -= ret;
+		file_offset += ret;
+	}
 	while (file_count) {
 		ssize_t ret;
 
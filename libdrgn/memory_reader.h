@@ -15,8 +15,11 @@
 #include <stdbool.h>
 #include <stddef.h>
 #include <stdint.h>
+#include <sys/types.h>
 
 #include "binary_search_tree.h"
+#include "drgn.h"
+#include "hash_table.h"
 
 /**
  * @ingroup Internals
@@ -61,17 +64,179 @@ DEFINE_BINARY_SEARCH_TREE_TYPE(drgn_memory_segment_tree, struct
 			       drgn_memory_segment, node,
 			       drgn_memory_segment_to_key)
 
+/**
+ * Sorted array of the segments in one address space of a frozen @ref
+ * drgn_memory_reader.
+ *
+ * Unlike a splay tree, looking up a segment in the array doesn't modify it
+ * (other than the last hit hint, which is updated atomically), so it can be
+ * shared by concurrent readers.
+ */
+struct drgn_memory_segment_array {
+	/** Segments sorted by address. */
+	struct drgn_memory_segment **segments;
+	/** Number of segments. */
+	size_t size;
+	/**
+	 * Index of the segment found by the most recent lookup, which is
+	 * checked before doing a binary search.
+	 */
+	size_t last_hit;
+};
+
+/** Size of a page in a @ref drgn_memory_cache. */
+#define DRGN_MEMORY_CACHE_PAGE_SIZE UINT64_C(4096)
+
+/**
+ * Default maximum number of pages in a @ref drgn_memory_cache when caching is
+ * enabled automatically (16 MB with 4 kB pages).
+ */
+#define DRGN_MEMORY_CACHE_DEFAULT_MAX_PAGES 4096
+
+/**
+ * Default maximum read-ahead window in pages when caching is enabled
+ * automatically (128 kB with 4 kB pages).
+ */
+#define DRGN_MEMORY_READAHEAD_DEFAULT_MAX_PAGES 32
+
+/** Page in a @ref drgn_memory_cache. */
+struct drgn_memory_cache_page {
+	/** Page-aligned address of the page. */
+	uint64_t address;
+	/**
+	 * When the page was read, in nanoseconds on @c CLOCK_MONOTONIC.
+	 *
+	 * This is only set if the cache has a maximum age.
+	 */
+	uint64_t timestamp;
+	/** More recently used page, or @c NULL if this is the first page. */
+	struct drgn_memory_cache_page *prev;
+	/** Less recently used page, or @c NULL if this is the last page. */
+	struct drgn_memory_cache_page *next;
+	/**
+	 * Whether the page was read ahead and hasn't been used since.
+	 *
+	 * @sa drgn_memory_reader_set_readahead()
+	 */
+	bool readahead;
+	/**
+	 * Offset in @ref drgn_memory_cache_page::data of the first valid byte.
+	 *
+	 * This and @ref drgn_memory_cache_page::valid_end are only set for
+	 * pages returned by @ref drgn_memory_reader_snapshot_pages() and @ref
+	 * drgn_memory_reader_recorded_pages().
+	 */
+	uint32_t valid_start;
+	/**
+	 * Offset in @ref drgn_memory_cache_page::data one past the last valid
+	 * byte. This is less than @ref DRGN_MEMORY_CACHE_PAGE_SIZE (or @ref
+	 * drgn_memory_cache_page::valid_start is greater than zero) for a
+	 * recorded page which could only be read partially.
+	 */
+	uint32_t valid_end;
+	/** Contents of the page. */
+	char data[DRGN_MEMORY_CACHE_PAGE_SIZE];
+};
+
+DEFINE_HASH_MAP_TYPE(drgn_memory_cache_page_map, uint64_t,
+		     struct drgn_memory_cache_page *)
+DEFINE_HASH_SET_TYPE(drgn_memory_page_set, uint64_t)
+
+/**
+ * Least-recently-used cache of pages read from one address space.
+ *
+ * The pages are kept in a list ordered from most recently used to least
+ * recently used so that the least recently used page can be evicted when the
+ * cache is full.
+ */
+struct drgn_memory_cache {
+	/** Map from page address to page. */
+	struct drgn_memory_cache_page_map map;
+	/** Most recently used page. */
+	struct drgn_memory_cache_page *first;
+	/** Least recently used page. */
+	struct drgn_memory_cache_page *last;
+};
+
 /**
  * Memory reader.
  *
  * A memory reader maps the segments of memory in an address space to callbacks
  * which can be used to read memory from those segments.
+ *
+ * A memory reader can optionally cache pages that it reads. Virtual and
+ * physical memory are cached separately.
  */
 struct drgn_memory_reader {
 	/** Virtual memory segments. */
 	struct drgn_memory_segment_tree virtual_segments;
 	/** Physical memory segments. */
 	struct drgn_memory_segment_tree physical_segments;
+	/**
+	 * Whether the reader is frozen.
+	 *
+	 * @sa drgn_memory_reader_freeze()
+	 */
+	bool frozen;
+	/** Virtual memory segments when the reader is frozen. */
+	struct drgn_memory_segment_array frozen_virtual_segments;
+	/** Physical memory segments when the reader is frozen. */
+	struct drgn_memory_segment_array frozen_physical_segments;
+	/** Cache of virtual memory pages. */
+	struct drgn_memory_cache virtual_cache;
+	/** Cache of physical memory pages. */
+	struct drgn_memory_cache physical_cache;
+	/**
+	 * Maximum number of pages in each cache, or zero if caching is
+	 * disabled.
+	 */
+	size_t cache_max_pages;
+	/**
+	 * Maximum age of a cached page in nanoseconds before it is read again,
+	 * or zero if cached pages never expire.
+	 */
+	uint64_t cache_max_age;
+	/**
+	 * Maximum number of pages to read on a cache miss. This is a power of
+	 * two. If it is 1, read-ahead is disabled.
+	 */
+	size_t readahead_max_pages;
+	/** Current number of pages to read on a cache miss. */
+	size_t readahead_pages;
+	/** Number of pages read ahead since the last cache miss. */
+	size_t readahead_loaded;
+	/**
+	 * Number of pages read ahead that were used since the last cache miss.
+	 */
+	size_t readahead_used;
+	/** Page number of the last cache miss. */
+	uint64_t readahead_last_miss;
+	/** Buffer for read-ahead. */
+	char *readahead_buf;
+	/**
+	 * Number of active snapshots. While this is non-zero, every page that
+	 * is read is captured and all later reads of it are served from the
+	 * captured copy.
+	 *
+	 * @sa drgn_memory_reader_begin_snapshot()
+	 */
+	unsigned int snapshot_depth;
+	/** Virtual memory pages captured by the active snapshot. */
+	struct drgn_memory_cache virtual_snapshot;
+	/** Physical memory pages captured by the active snapshot. */
+	struct drgn_memory_cache physical_snapshot;
+	/**
+	 * Whether the address of every page that is read is being recorded.
+	 *
+	 * @sa drgn_memory_reader_start_recording()
+	 */
+	bool recording;
+	/** Addresses of the virtual memory pages that were recorded. */
+	struct drgn_memory_page_set virtual_recorded;
+	/** Addresses of the physical memory pages that were recorded. */
+	struct drgn_memory_page_set physical_recorded;
+	/** Statistics about reads. */
+	struct drgn_memory_stats stats;
 };
 
 /**
@@ -87,6 +252,121 @@ void drgn_memory_reader_deinit(struct drgn_memory_reader *reader);
 /** Return whether a @ref drgn_memory_reader has no segments. */
 bool drgn_memory_reader_empty(struct drgn_memory_reader *reader);
 
+/**
+ * Configure the page cache of a @ref drgn_memory_reader.
+ *
+ * Caching is disabled by default. If the new maximum size is smaller than the
+ * number of pages currently cached, the least recently used pages are evicted.
+ *
+ * @param[in] max_pages Maximum number of pages to cache for each address space,
+ * or zero to disable caching.
+ * @param[in] max_age Maximum age of a cached page in nanoseconds, or zero if
+ * cached pages should never expire.
+ */
+void drgn_memory_reader_set_cache(struct drgn_memory_reader *reader,
+				  size_t max_pages, uint64_t max_age);
+
+/**
+ * Configure read-ahead for the page cache of a @ref drgn_memory_reader.
+ *
+ * When read-ahead is enabled, a cache miss reads an aligned window of pages
+ * around the missing page in one read instead of only the missing page. This
+ * makes walking data structures whose nodes are close together (e.g., in the
+ * same slab) much cheaper. The window size adapts to how many of the pages
+ * read ahead are actually used: it doubles (up to the maximum) when at least
+ * half of them are used and halves when they are not.
+ *
+ * Read-ahead has no effect if caching is disabled.
+ *
+ * @param[in] max_pages Maximum number of pages to read on a cache miss. This is
+ * rounded down to a power of two. 0 or 1 disables read-ahead.
+ */
+void drgn_memory_reader_set_readahead(struct drgn_memory_reader *reader,
+				      size_t max_pages);
+
+/**
+ * Begin a snapshot of a @ref drgn_memory_reader.
+ *
+ * Until the matching call to @ref drgn_memory_reader_end_snapshot(), each page
+ * is read from its segment the first time it is accessed, and every later read
+ * of that page returns the same contents. Snapshots may be nested, in which
+ * case the pages are captured until the outermost snapshot ends.
+ */
+void drgn_memory_reader_begin_snapshot(struct drgn_memory_reader *reader);
+
+/** End a snapshot begun by @ref drgn_memory_reader_begin_snapshot(). */
+void drgn_memory_reader_end_snapshot(struct drgn_memory_reader *reader);
+
+/**
+ * Get the pages captured by the active snapshot of a @ref drgn_memory_reader.
+ *
+ * @param[in] physical Whether to get physical or virtual pages.
+ * @param[out] ret Returned array of pages sorted by address. It must be freed
+ * with @c free(), but the pages themselves are owned by the reader and are only
+ * valid until the snapshot ends.
+ * @param[out] count_ret Returned number of pages.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *
+drgn_memory_reader_snapshot_pages(struct drgn_memory_reader *reader,
+				  bool physical,
+				  struct drgn_memory_cache_page ***ret,
+				  size_t *count_ret);
+
+/**
+ * Start recording the pages read from a @ref drgn_memory_reader.
+ *
+ * Until @ref drgn_memory_reader_stop_recording() is called, the address of
+ * every page touched by a read (including reads served from the cache or from a
+ * snapshot, and failed reads) is recorded. Only the addresses are recorded, not
+ * the contents. Any pages recorded previously are forgotten.
+ */
+void drgn_memory_reader_start_recording(struct drgn_memory_reader *reader);
+
+/**
+ * Stop recording the pages read from a @ref drgn_memory_reader.
+ *
+ * The pages recorded so far are kept until recording is started again.
+ */
+void drgn_memory_reader_stop_recording(struct drgn_memory_reader *reader);
+
+/**
+ * Read the pages recorded by a @ref drgn_memory_reader.
+ *
+ * Each recorded page is read again from its segment. If a page can't be read
+ * in its entirety (e.g., because it straddles the end of a segment), a partial
+ * page is returned for each part of it that is in a segment and can be read,
+ * and pages that can't be read at all are skipped.
+ *
+ * @param[in] physical Whether to get physical or virtual pages.
+ * @param[out] ret Returned array of pages sorted by address and then by @ref
+ * drgn_memory_cache_page::valid_start. Each page and the array itself must be
+ * freed with @c free().
+ * @param[out] count_ret Returned number of pages.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *
+drgn_memory_reader_recorded_pages(struct drgn_memory_reader *reader,
+				  bool physical,
+				  struct drgn_memory_cache_page ***ret,
+				  size_t *count_ret);
+
+/** Discard all pages cached by a @ref drgn_memory_reader. */
+void drgn_memory_reader_invalidate_cache(struct drgn_memory_reader *reader);
+
+/**
+ * Freeze the segments of a @ref drgn_memory_reader.
+ *
+ * This should be called once all of the segments of a program with a fixed
+ * memory layout (e.g., a core dump) have been added. Segments are then looked
+ * up with a binary search over a sorted array instead of the splay tree.
+ * Adding another segment unfreezes the reader.
+ *
+ * @return @c NULL on success, non-@c NULL on error, in which case the reader
+ * is left unfrozen but is otherwise still usable.
+ */
+struct drgn_error *drgn_memory_reader_freeze(struct drgn_memory_reader *reader);
+
 /** @sa drgn_program_add_memory_segment() */
 struct drgn_error *
 drgn_memory_reader_add_segment(struct drgn_memory_reader *reader,
@@ -97,6 +377,9 @@ drgn_memory_reader_add_segment(struct drgn_memory_reader *reader,
 /**
  * Read from a @ref drgn_memory_reader.
  *
+ * If caching is enabled, small reads are served from the page cache, and pages
+ * which are not cached yet are read in their entirety and added to the cache.
+ *
  * @param[in] reader Memory reader.
  * @param[out] buf Buffer to read into.
  * @param[in] address Starting address in memory to read.
@@ -108,6 +391,69 @@ struct drgn_error *drgn_memory_reader_read(struct drgn_memory_reader *reader,
 					   void *buf, uint64_t address,
 					   size_t count, bool physical);
 
+/**
+ * Read as much as possible of a range from a @ref drgn_memory_reader without
+ * crossing a page boundary.
+ *
+ * This is useful for reading data of unknown length, like a null-terminated
+ * string: the caller can scan each chunk that is returned and only read the
+ * next one if necessary.
+ *
+ * @param[in] reader Memory reader.
+ * @param[out] buf Buffer to read into.
+ * @param[in] address Starting address in memory to read.
+ * @param[in] count Maximum number of bytes to read. Must be greater than zero.
+ * @param[in] physical Whether @c address is physical.
+ * @param[out] ret Returned number of bytes read. This is less than @p count
+ * if the range crosses a page boundary or contains a byte that cannot be read,
+ * but it is always at least 1.
+ * @return @c NULL on success, non-@c NULL on error (including if the first
+ * byte cannot be read).
+ */
+struct drgn_error *
+drgn_memory_reader_read_partial(struct drgn_memory_reader *reader, void *buf,
+				uint64_t address, size_t count, bool physical,
+				size_t *ret);
+
+/**
+ * Get a pointer to a range of memory in a @ref drgn_memory_reader without
+ * copying it.
+ *
+ * This is only possible if the range is contained in a single segment read by
+ * @ref drgn_read_memory_file() from a mapped file and no snapshot is active
+ * (so that every read is captured by the snapshot).
+ *
+ * @return Pointer to the memory, which is valid until the segment is freed, or
+ * @c NULL if the memory cannot be mapped. In the latter case, it may still be
+ * possible to read it with @ref drgn_memory_reader_read().
+ */
+const void *drgn_memory_reader_map(struct drgn_memory_reader *reader,
+				   uint64_t address, size_t count,
+				   bool physical);
+
+/**
+ * Read multiple ranges from a @ref drgn_memory_reader.
+ *
+ * @sa drgn_program_read_memory_vec()
+ */
+struct drgn_error *
+drgn_memory_reader_read_vec(struct drgn_memory_reader *reader,
+			    struct drgn_memory_read_request *reqs, size_t n,
+			    bool physical);
+
+/**
+ * Read a range from a @ref drgn_memory_reader which may contain unreadable
+ * holes.
+ *
+ * @sa drgn_program_read_memory_sparse()
+ */
+struct drgn_error *
+drgn_memory_reader_read_sparse(struct drgn_memory_reader *reader, void *buf,
+			       uint64_t address, size_t count, bool physical,
+			       unsigned char *valid);
+
+struct drgn_compressed_file;
+
 /** Argument for @ref drgn_read_memory_file(). */
 struct drgn_memory_file_segment {
 	/** Offset in the file where the segment starts. */
@@ -118,6 +464,22 @@ struct drgn_memory_file_segment {
 	 * as if they contained zeroes.
 	 */
 	uint64_t file_size;
+	/**
+	 * Contents of the segment in the file if the file is mapped into
+	 * memory, or @c NULL if it must be read from @ref
+	 * drgn_memory_file_segment::fd.
+	 *
+	 * If this is non-@c NULL, then it must be valid for @ref
+	 * drgn_memory_file_segment::file_size bytes.
+	 */
+	const char *map;
+	/**
+	 * Compressed file to read from, or @c NULL if the file is not
+	 * compressed. If this is non-@c NULL, then @ref
+	 * drgn_memory_file_segment::file_offset is an offset in the
+	 * uncompressed data.
+	 */
+	struct drgn_compressed_file *compressed;
 	/** File descriptor. */
 	int fd;
 };
@@ -127,6 +489,38 @@ struct drgn_error *drgn_read_memory_file(void *buf, uint64_t address,
 					 size_t count, uint64_t offset,
 					 void *arg, bool physical);
 
+/** Argument for @ref drgn_read_memory_process(). */
+struct drgn_memory_process {
+	/** Process ID. */
+	pid_t pid;
+	/** File descriptor of @c /proc/$pid/mem, or -1 if it is not open. */
+	int mem_fd;
+	/**
+	 * Backend to read with. If this is @ref DRGN_PROCESS_MEMORY_AUTO and
+	 * @c process_vm_readv() is not permitted, this is changed to @ref
+	 * DRGN_PROCESS_MEMORY_PROC_MEM.
+	 */
+	enum drgn_process_memory_backend backend;
+	/** Statistics about reads from the process. */
+	struct drgn_process_memory_stats stats;
+};
+
+/**
+ * @ref drgn_memory_read_fn which reads from a running process.
+ *
+ * @ref drgn_memory_reader_read_vec() batches reads from a segment using this
+ * function into as few @c process_vm_readv() calls as possible.
+ */
+struct drgn_error *drgn_read_memory_process(void *buf, uint64_t address,
+					    size_t count, uint64_t offset,
+					    void *arg, bool physical);
+
+#ifdef WITH_LIBKDUMPFILE
+/** @ref drgn_memory_read_fn which reads from a kdump file. */
+struct drgn_error *drgn_read_kdump(void *buf, uint64_t address, size_t count,
+				   uint64_t offset, void *arg, bool physical);
+#endif
+
 /** @} */
 
 #endif /* DRGN_MEMORY_READER_H */
@@ -10,6 +10,9 @@
 void drgn_object_index_init(struct drgn_object_index *oindex)
 {
 	oindex->finders = NULL;
+	memset(&oindex->stats, 0, sizeof(oindex->stats));
+	oindex->miss_fn = NULL;
+	oindex->miss_arg = NULL;
 }
 
 void drgn_object_index_deinit(struct drgn_object_index *oindex)
@@ -50,6 +53,7 @@ struct drgn_error *drgn_object_index_find(struct drgn_object_index *oindex,
 	struct drgn_error *err;
 	size_t name_len;
 	struct drgn_object_finder *finder;
+	bool retry;
 	const char *kind_str;
 
 	if ((flags & ~DRGN_FIND_OBJECT_ANY) || !flags) {
@@ -58,14 +62,30 @@ struct drgn_error *drgn_object_index_find(struct drgn_object_index *oindex,
 	}
 
 	name_len = strlen(name);
+again:
 	finder = oindex->finders;
 	while (finder) {
+		uint64_t start = monotonic_ns();
+
 		err = finder->fn(name, name_len, filename, flags, finder->arg,
 				 ret);
+		oindex->stats.ns += monotonic_ns() - start;
+		if (err)
+			oindex->stats.misses++;
+		else
+			oindex->stats.hits++;
 		if (err != &drgn_not_found)
 			return err;
 		finder = finder->next;
 	}
+	if (oindex->miss_fn) {
+		retry = false;
+		err = oindex->miss_fn(oindex->miss_arg, &retry);
+		if (err)
+			return err;
+		if (retry)
+			goto again;
+	}
 
 	switch (flags) {
 	case DRGN_FIND_OBJECT_CONSTANT:
@@ -48,6 +48,16 @@ struct drgn_object_finder {
 struct drgn_object_index {
 	/** Callbacks for finding objects. */
 	struct drgn_object_finder *finders;
+	/** Statistics about calls to @ref drgn_object_index::finders. */
+	struct drgn_finder_stats stats;
+	/**
+	 * Callback to call when none of @ref drgn_object_index::finders find an
+	 * object, or @c NULL. If it sets @p retry_ret to @c true, the finders
+	 * are tried again.
+	 */
+	struct drgn_error *(*miss_fn)(void *arg, bool *retry_ret);
+	/** Argument to pass to @ref drgn_object_index::miss_fn. */
+	void *miss_arg;
 };
 
 /** Initialize a @ref drgn_object_index. */
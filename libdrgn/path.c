@@ -125,6 +125,9 @@ bool die_matches_filename(Dwarf_Die *die, const char *filename)
 	Dwarf_Die cu_die;
 	Dwarf_Attribute attr_mem;
 	Dwarf_Attribute *attr;
+	Dwarf_Word file_index;
+	Dwarf_Files *files;
+	size_t num_files;
 	const char *path;
 
 	if (!filename || !filename[0])
@@ -141,8 +144,18 @@ bool die_matches_filename(Dwarf_Die *die, const char *filename)
 		die_path.num_components++;
 	}
 
-	path = dwarf_decl_file(die);
-	if (!path)
+	/*
+	 * This is like dwarf_decl_file(), but that decodes the whole line
+	 * number program with dwarf_getsrclines() and asserts that it
+	 * succeeded, which it doesn't for split units. We only need the file
+	 * name table, which dwarf_getsrcfiles() reads from the line number
+	 * program header. Unlike dwarf_decl_file(), this also allows file 0,
+	 * which is valid in DWARF 5.
+	 */
+	attr = dwarf_attr_integrate(die, DW_AT_decl_file, &attr_mem);
+	if (!attr || dwarf_formudata(attr, &file_index) ||
+	    dwarf_getsrcfiles(&cu_die, &files, &num_files) ||
+	    !(path = dwarf_filesrc(files, file_index, NULL, NULL)))
 		return false;
 	/*
 	 * If the declaration file name is absolute, the compilation directory
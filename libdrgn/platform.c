@@ -110,3 +110,21 @@ void drgn_platform_from_elf(GElf_Ehdr *ehdr, struct drgn_platform *ret)
 	drgn_platform_from_arch(arch, ehdr->e_ident[EI_CLASS] == ELFCLASS64,
 				ehdr->e_ident[EI_DATA] == ELFDATA2LSB, ret);
 }
+
+void drgn_platform_to_elf(const struct drgn_platform *platform,
+			  GElf_Ehdr *ehdr)
+{
+	switch (platform->arch->arch) {
+	case DRGN_ARCH_X86_64:
+		ehdr->e_machine = EM_X86_64;
+		break;
+	default:
+		ehdr->e_machine = EM_NONE;
+		break;
+	}
+	ehdr->e_ident[EI_CLASS] = (platform->flags & DRGN_PLATFORM_IS_64_BIT ?
+				   ELFCLASS64 : ELFCLASS32);
+	ehdr->e_ident[EI_DATA] = (platform->flags &
+				  DRGN_PLATFORM_IS_LITTLE_ENDIAN ?
+				  ELFDATA2LSB : ELFDATA2MSB);
+}
@@ -14,6 +14,16 @@ struct drgn_architecture_info {
 	enum drgn_platform_flags default_flags;
 	struct drgn_error *(*linux_kernel_set_initial_registers)(Dwfl_Thread *,
 								 struct drgn_object *);
+	/*
+	 * Translate a virtual address to a physical address by walking the page
+	 * table whose top level is at physical address pgd. Returns the
+	 * physical address and the size of the page containing it. Page table
+	 * entries are read from physical memory.
+	 */
+	struct drgn_error *(*pgtable_walk)(struct drgn_program *prog,
+					   uint64_t pgd, uint64_t address,
+					   uint64_t *phys_ret,
+					   uint64_t *page_size_ret);
 };
 
 extern const struct drgn_architecture_info arch_info_unknown;
@@ -38,4 +48,11 @@ void drgn_platform_from_arch(const struct drgn_architecture_info *arch,
 /** Initialize a @ref drgn_platform from an ELF header. */
 void drgn_platform_from_elf(GElf_Ehdr *ehdr, struct drgn_platform *ret);
 
+/**
+ * Fill in the class, data encoding, and machine of an ELF header from a @ref
+ * drgn_platform.
+ */
+void drgn_platform_to_elf(const struct drgn_platform *platform,
+			  GElf_Ehdr *ehdr);
+
 #endif /* DRGN_PLATFORM_H */
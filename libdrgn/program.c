@@ -2,18 +2,23 @@
 // SPDX-License-Identifier: GPL-3.0+
 
 #include <byteswap.h>
+#include <dwarf.h>
 #include <fcntl.h>
 #include <gelf.h>
 #include <inttypes.h>
 #include <limits.h>
+#include <signal.h>
 #include <stdio.h>
 #include <string.h>
 #include <unistd.h>
+#include <sys/mman.h>
 #include <sys/stat.h>
 #include <sys/types.h>
 #include <sys/vfs.h>
 
 #include "internal.h"
+#include "compressed_file.h"
+#include "core_writer.h"
 #include "dwarf_index.h"
 #include "dwarf_info_cache.h"
 #include "language.h"
@@ -22,6 +27,7 @@
 #include "object_index.h"
 #include "program.h"
 #include "read.h"
+#include "remote.h"
 #include "string_builder.h"
 #include "symbol.h"
 #include "type_index.h"
@@ -57,13 +63,33 @@ void drgn_program_set_platform(struct drgn_program *prog,
 	}
 }
 
+/*
+ * Called when no type or object finder found what it was looking for. If any
+ * modules were deferred, index them and retry the lookup. This is only done
+ * once every finder has missed so that lookups which another finder can answer
+ * (e.g., from vmcoreinfo) don't index everything.
+ */
+static struct drgn_error *drgn_program_index_miss(void *arg, bool *retry_ret)
+{
+	struct drgn_program *prog = arg;
+
+	if (!prog->has_deferred_modules)
+		return NULL;
+	*retry_ret = true;
+	return drgn_program_index_deferred_modules(prog, NULL);
+}
+
 void drgn_program_init(struct drgn_program *prog,
 		       const struct drgn_platform *platform)
 {
 	memset(prog, 0, sizeof(*prog));
 	drgn_memory_reader_init(&prog->reader);
 	drgn_type_index_init(&prog->tindex);
+	prog->tindex.miss_fn = drgn_program_index_miss;
+	prog->tindex.miss_arg = prog;
 	drgn_object_index_init(&prog->oindex);
+	prog->oindex.miss_fn = drgn_program_index_miss;
+	prog->oindex.miss_arg = prog;
 	prog->core_fd = -1;
 	if (platform)
 		drgn_program_set_platform(prog, platform);
@@ -76,12 +102,18 @@ void drgn_program_deinit(struct drgn_program *prog)
 	drgn_memory_reader_deinit(&prog->reader);
 
 	free(prog->file_segments);
+	free(prog->process);
 
 #ifdef WITH_LIBKDUMPFILE
 	if (prog->kdump_ctx)
 		kdump_free(prog->kdump_ctx);
 #endif
 
+	free(prog->translation_cache);
+	if (prog->core_map)
+		munmap(prog->core_map, prog->core_map_size);
+	drgn_compressed_file_destroy(prog->core_compressed);
+	drgn_memory_remote_destroy(prog->remote);
 	if (prog->core_fd != -1)
 		close(prog->core_fd);
 
@@ -90,6 +122,7 @@ void drgn_program_deinit(struct drgn_program *prog)
 		drgn_remove_all_dwfl_modules(prog->_dwfl);
 		dwfl_end(prog->_dwfl);
 	}
+	free(prog->debug_info_cache_dir);
 }
 
 LIBDRGN_PUBLIC struct drgn_error *
@@ -114,13 +147,24 @@ LIBDRGN_PUBLIC void drgn_program_destroy(struct drgn_program *prog)
 	}
 }
 
+static void drgn_program_invalidate_translation_cache(struct drgn_program *prog)
+{
+	free(prog->translation_cache);
+	prog->translation_cache = NULL;
+}
+
 LIBDRGN_PUBLIC struct drgn_error *
 drgn_program_add_memory_segment(struct drgn_program *prog, uint64_t address,
 				uint64_t size, drgn_memory_read_fn read_fn,
 				void *arg, bool physical)
 {
-	return drgn_memory_reader_add_segment(&prog->reader, address, size,
-					      read_fn, arg, physical);
+	struct drgn_error *err;
+
+	err = drgn_memory_reader_add_segment(&prog->reader, address, size,
+					     read_fn, arg, physical);
+	if (!err)
+		drgn_program_invalidate_translation_cache(prog);
+	return err;
 }
 
 LIBDRGN_PUBLIC struct drgn_error *
@@ -171,11 +215,187 @@ static struct drgn_error *has_kdump_signature(const char *path, int fd,
 	return NULL;
 }
 
+/*
+ * Map a core dump file into memory so that segments can be read with memcpy()
+ * instead of pread(). This is best effort: if the file can't be mapped, the
+ * segments are read from the file descriptor.
+ */
+static void drgn_program_map_core_dump(struct drgn_program *prog)
+{
+	struct stat st;
+	void *map;
+	size_t i;
+
+	if (fstat(prog->core_fd, &st) == -1 || !S_ISREG(st.st_mode) ||
+	    st.st_size == 0 || st.st_size > SIZE_MAX)
+		return;
+	map = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, prog->core_fd,
+		   0);
+	if (map == MAP_FAILED)
+		return;
+	prog->core_map = map;
+	prog->core_map_size = st.st_size;
+
+	for (i = 0; i < prog->num_file_segments; i++) {
+		struct drgn_memory_file_segment *file_segment;
+
+		/*
+		 * If the segment extends past the end of the file (e.g., the
+		 * core dump was truncated), keep reading it with pread() so
+		 * that reads past the end of the file fail cleanly.
+		 */
+		file_segment = &prog->file_segments[i];
+		if (file_segment->file_offset <= prog->core_map_size &&
+		    file_segment->file_size <=
+		    prog->core_map_size - file_segment->file_offset) {
+			file_segment->map = ((char *)prog->core_map +
+					     file_segment->file_offset);
+		}
+	}
+}
+
+/*
+ * libelf can only parse a file descriptor or memory, so for a compressed core
+ * dump, decompress the parts that are parsed with libelf (the ELF header,
+ * program headers, and notes) into a buffer and parse that. The buffer must be
+ * freed after the returned ELF handle.
+ */
+static struct drgn_error *
+elf_begin_compressed_core(struct drgn_compressed_file *file, Elf **elf_ret,
+			  char **buf_ret)
+{
+	struct drgn_error *err;
+	unsigned char ident[sizeof(Elf64_Ehdr)];
+	Elf64_Ehdr ehdr;
+	Elf_Data src, dst;
+	uint64_t size, total_size;
+	char *buf = NULL;
+	Elf *elf = NULL;
+	size_t n;
+
+	err = drgn_compressed_file_pread(file, ident, sizeof(ident), 0, &n);
+	if (err)
+		return err;
+	if (n < EI_NIDENT || memcmp(ident, ELFMAG, SELFMAG) != 0 ||
+	    (ident[EI_CLASS] != ELFCLASS32 && ident[EI_CLASS] != ELFCLASS64) ||
+	    n < (ident[EI_CLASS] == ELFCLASS64 ?
+		 sizeof(Elf64_Ehdr) : sizeof(Elf32_Ehdr)))
+		goto not_core;
+
+	/* Get the size of the headers from the ELF header. */
+	src.d_buf = ident;
+	src.d_version = EV_CURRENT;
+	src.d_type = ELF_T_EHDR;
+	dst.d_version = EV_CURRENT;
+	if (ident[EI_CLASS] == ELFCLASS64) {
+		src.d_size = sizeof(Elf64_Ehdr);
+		dst.d_buf = &ehdr;
+		dst.d_size = sizeof(ehdr);
+		if (!elf64_xlatetom(&dst, &src, ident[EI_DATA]))
+			return drgn_error_libelf();
+	} else {
+		Elf32_Ehdr ehdr32;
+
+		src.d_size = sizeof(Elf32_Ehdr);
+		dst.d_buf = &ehdr32;
+		dst.d_size = sizeof(ehdr32);
+		if (!elf32_xlatetom(&dst, &src, ident[EI_DATA]))
+			return drgn_error_libelf();
+		ehdr.e_type = ehdr32.e_type;
+		ehdr.e_phoff = ehdr32.e_phoff;
+		ehdr.e_shoff = ehdr32.e_shoff;
+		ehdr.e_ehsize = ehdr32.e_ehsize;
+		ehdr.e_phentsize = ehdr32.e_phentsize;
+		ehdr.e_phnum = ehdr32.e_phnum;
+		ehdr.e_shentsize = ehdr32.e_shentsize;
+		ehdr.e_shnum = ehdr32.e_shnum;
+	}
+	if (ehdr.e_type != ET_CORE)
+		goto not_core;
+	if (ehdr.e_phnum == PN_XNUM) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "compressed core dumps with more than 65535 segments are not supported");
+	}
+	total_size = drgn_compressed_file_size(file);
+	size = max((uint64_t)ehdr.e_ehsize,
+		   ehdr.e_phoff + (uint64_t)ehdr.e_phentsize * ehdr.e_phnum);
+	if (ehdr.e_shoff) {
+		size = max(size,
+			   ehdr.e_shoff +
+			   (uint64_t)ehdr.e_shentsize * (ehdr.e_shnum ? ehdr.e_shnum : 1));
+	}
+
+	/*
+	 * Once the program headers are available, find the notes. If they
+	 * aren't all in the buffer, decompress more and try again.
+	 */
+	for (;;) {
+		size_t phnum, i;
+		uint64_t new_size;
+
+		size = min(size, total_size);
+		if (size > SIZE_MAX) {
+			err = &drgn_enomem;
+			goto err;
+		}
+		free(buf);
+		buf = malloc(size);
+		if (!buf) {
+			err = &drgn_enomem;
+			goto err;
+		}
+		err = drgn_compressed_file_pread(file, buf, size, 0, &n);
+		if (err)
+			goto err;
+		elf = elf_memory(buf, n);
+		if (!elf) {
+			err = drgn_error_libelf();
+			goto err;
+		}
+		if (elf_getphdrnum(elf, &phnum) != 0) {
+			err = drgn_error_libelf();
+			goto err;
+		}
+		new_size = size;
+		for (i = 0; i < phnum; i++) {
+			GElf_Phdr phdr_mem, *phdr;
+
+			phdr = gelf_getphdr(elf, i, &phdr_mem);
+			if (!phdr) {
+				err = drgn_error_libelf();
+				goto err;
+			}
+			if (phdr->p_type == PT_NOTE) {
+				new_size = max(new_size,
+					       phdr->p_offset + phdr->p_filesz);
+			}
+		}
+		if (new_size <= size || size == total_size)
+			break;
+		elf_end(elf);
+		elf = NULL;
+		size = new_size;
+	}
+	*elf_ret = elf;
+	*buf_ret = buf;
+	return NULL;
+
+not_core:
+	return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+				 "not an ELF core file");
+
+err:
+	elf_end(elf);
+	free(buf);
+	return err;
+}
+
 LIBDRGN_PUBLIC struct drgn_error *
 drgn_program_set_core_dump(struct drgn_program *prog, const char *path)
 {
 	struct drgn_error *err;
 	Elf *elf;
+	char *elf_buf = NULL;
 	GElf_Ehdr ehdr_mem, *ehdr;
 	struct drgn_platform platform;
 	bool is_64_bit, is_kdump;
@@ -192,22 +412,34 @@ drgn_program_set_core_dump(struct drgn_program *prog, const char *path)
 	if (prog->core_fd == -1)
 		return drgn_error_create_os("open", errno, path);
 
-	err = has_kdump_signature(path, prog->core_fd, &is_kdump);
+	err = drgn_compressed_file_open(prog->core_fd, path,
+					&prog->core_compressed);
 	if (err)
 		goto out_fd;
-	if (is_kdump) {
-		err = drgn_program_set_kdump(prog);
-		if (err)
-			goto out_fd;
-		return NULL;
-	}
 
 	elf_version(EV_CURRENT);
 
-	elf = elf_begin(prog->core_fd, ELF_C_READ, NULL);
-	if (!elf) {
-		err = drgn_error_libelf();
-		goto out_fd;
+	if (prog->core_compressed) {
+		err = elf_begin_compressed_core(prog->core_compressed, &elf,
+						&elf_buf);
+		if (err)
+			goto out_fd;
+	} else {
+		err = has_kdump_signature(path, prog->core_fd, &is_kdump);
+		if (err)
+			goto out_fd;
+		if (is_kdump) {
+			err = drgn_program_set_kdump(prog);
+			if (err)
+				goto out_fd;
+			return NULL;
+		}
+
+		elf = elf_begin(prog->core_fd, ELF_C_READ, NULL);
+		if (!elf) {
+			err = drgn_error_libelf();
+			goto out_fd;
+		}
 	}
 
 	ehdr = gelf_getehdr(elf, &ehdr_mem);
@@ -275,15 +507,25 @@ drgn_program_set_core_dump(struct drgn_program *prog, const char *path)
 				continue;
 			current_file_segment->file_offset = phdr->p_offset;
 			current_file_segment->file_size = phdr->p_filesz;
+			current_file_segment->map = NULL;
+			current_file_segment->compressed = prog->core_compressed;
 			current_file_segment->fd = prog->core_fd;
-			err = drgn_program_add_memory_segment(prog,
-							      phdr->p_vaddr,
-							      phdr->p_memsz,
-							      drgn_read_memory_file,
-							      current_file_segment,
-							      false);
-			if (err)
-				goto out_segments;
+			/*
+			 * An invalid virtual address means that the segment
+			 * only has a physical address (e.g., in a snapshot
+			 * written by drgn_write_core_dump()).
+			 */
+			if (phdr->p_vaddr !=
+			    (is_64_bit ? UINT64_MAX : UINT32_MAX)) {
+				err = drgn_program_add_memory_segment(prog,
+								      phdr->p_vaddr,
+								      phdr->p_memsz,
+								      drgn_read_memory_file,
+								      current_file_segment,
+								      false);
+				if (err)
+					goto out_segments;
+			}
 			if (have_non_zero_phys_addr &&
 			    phdr->p_paddr !=
 			    (is_64_bit ? UINT64_MAX : UINT32_MAX)) {
@@ -337,6 +579,8 @@ drgn_program_set_core_dump(struct drgn_program *prog, const char *path)
 	}
 	elf_end(elf);
 	elf = NULL;
+	free(elf_buf);
+	elf_buf = NULL;
 
 	if (have_nt_taskstruct) {
 		/*
@@ -364,10 +608,30 @@ drgn_program_set_core_dump(struct drgn_program *prog, const char *path)
 		have_vmcoreinfo = true;
 	}
 
+	/* The segments of a core dump are fixed from now on. */
+	err = drgn_memory_reader_freeze(&prog->reader);
+	if (err)
+		goto out_segments;
+
 	if (have_vmcoreinfo)
 		prog->flags |= DRGN_PROGRAM_IS_LINUX_KERNEL;
-	if (is_proc_kcore)
+	if (is_proc_kcore) {
 		prog->flags |= DRGN_PROGRAM_IS_LIVE;
+	} else {
+		if (!prog->core_compressed)
+			drgn_program_map_core_dump(prog);
+		/*
+		 * The memory of a core dump never changes, so cache it unless
+		 * it can already be copied straight out of the mapping.
+		 */
+		if (!prog->core_map) {
+			drgn_memory_reader_set_cache(&prog->reader,
+						     DRGN_MEMORY_CACHE_DEFAULT_MAX_PAGES,
+						     0);
+			drgn_memory_reader_set_readahead(&prog->reader,
+							 DRGN_MEMORY_READAHEAD_DEFAULT_MAX_PAGES);
+		}
+	}
 	drgn_program_set_platform(prog, &platform);
 	return NULL;
 
@@ -379,7 +643,10 @@ out_segments:
 	prog->num_file_segments = 0;
 out_elf:
 	elf_end(elf);
+	free(elf_buf);
 out_fd:
+	drgn_compressed_file_destroy(prog->core_compressed);
+	prog->core_compressed = NULL;
 	close(prog->core_fd);
 	prog->core_fd = -1;
 	return err;
@@ -393,6 +660,14 @@ drgn_program_set_kernel(struct drgn_program *prog)
 
 LIBDRGN_PUBLIC struct drgn_error *
 drgn_program_set_pid(struct drgn_program *prog, pid_t pid)
+{
+	return drgn_program_set_pid_with_backend(prog, pid,
+						 DRGN_PROCESS_MEMORY_AUTO);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_set_pid_with_backend(struct drgn_program *prog, pid_t pid,
+				  enum drgn_process_memory_backend backend)
 {
 	struct drgn_error *err;
 	char buf[64];
@@ -401,23 +676,36 @@ drgn_program_set_pid(struct drgn_program *prog, pid_t pid)
 	if (err)
 		return err;
 
-	sprintf(buf, "/proc/%ld/mem", (long)pid);
-	prog->core_fd = open(buf, O_RDONLY);
-	if (prog->core_fd == -1)
-		return drgn_error_create_os("open", errno, buf);
+	switch (backend) {
+	case DRGN_PROCESS_MEMORY_AUTO:
+	case DRGN_PROCESS_MEMORY_PROC_MEM:
+		sprintf(buf, "/proc/%ld/mem", (long)pid);
+		prog->core_fd = open(buf, O_RDONLY);
+		if (prog->core_fd == -1)
+			return drgn_error_create_os("open", errno, buf);
+		break;
+	case DRGN_PROCESS_MEMORY_VM_READV:
+		/* process_vm_readv() doesn't need a file, so just check the PID. */
+		if (kill(pid, 0) == -1 && errno == ESRCH)
+			return drgn_error_create_os("kill", errno, NULL);
+		break;
+	default:
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "invalid process memory backend");
+	}
 
-	prog->file_segments = malloc(sizeof(*prog->file_segments));
-	if (!prog->file_segments) {
+	prog->process = malloc(sizeof(*prog->process));
+	if (!prog->process) {
 		err = &drgn_enomem;
 		goto out_fd;
 	}
-	prog->file_segments[0].file_offset = 0;
-	prog->file_segments[0].file_size = UINT64_MAX;
-	prog->file_segments[0].fd = prog->core_fd;
-	prog->num_file_segments = 1;
+	prog->process->pid = pid;
+	prog->process->mem_fd = prog->core_fd;
+	prog->process->backend = backend;
+	memset(&prog->process->stats, 0, sizeof(prog->process->stats));
 	err = drgn_program_add_memory_segment(prog, 0, UINT64_MAX,
-					      drgn_read_memory_file,
-					      prog->file_segments, false);
+					      drgn_read_memory_process,
+					      prog->process, false);
 	if (err)
 		goto out_segments;
 
@@ -429,12 +717,86 @@ drgn_program_set_pid(struct drgn_program *prog, pid_t pid)
 out_segments:
 	drgn_memory_reader_deinit(&prog->reader);
 	drgn_memory_reader_init(&prog->reader);
-	free(prog->file_segments);
-	prog->file_segments = NULL;
-	prog->num_file_segments = 0;
+	free(prog->process);
+	prog->process = NULL;
 out_fd:
-	close(prog->core_fd);
-	prog->core_fd = -1;
+	if (prog->core_fd != -1) {
+		close(prog->core_fd);
+		prog->core_fd = -1;
+	}
+	return err;
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_set_remote(struct drgn_program *prog, const char *path)
+{
+	struct drgn_error *err;
+	struct drgn_memory_remote *remote;
+	struct drgn_platform *platform;
+
+	err = drgn_program_check_initialized(prog);
+	if (err)
+		return err;
+
+	err = drgn_memory_remote_connect(path, &remote);
+	if (err)
+		return err;
+	/* Debugging information for the kernel is opened with libelf. */
+	elf_version(EV_CURRENT);
+	err = drgn_platform_create(remote->arch, remote->platform_flags,
+				   &platform);
+	if (err)
+		goto out_remote;
+	if (remote->vmcoreinfo) {
+		err = parse_vmcoreinfo(remote->vmcoreinfo,
+				       remote->vmcoreinfo_size,
+				       &prog->vmcoreinfo);
+		if (err)
+			goto out_platform;
+	}
+
+	err = drgn_program_add_memory_segment(prog, 0, UINT64_MAX,
+					      drgn_read_memory_remote, remote,
+					      false);
+	if (err)
+		goto out_segments;
+	err = drgn_program_add_memory_segment(prog, 0, UINT64_MAX,
+					      drgn_read_memory_remote, remote,
+					      true);
+	if (err)
+		goto out_segments;
+	err = drgn_memory_reader_freeze(&prog->reader);
+	if (err)
+		goto out_segments;
+	/*
+	 * Like a core dump, the memory of a program which isn't running never
+	 * changes, so cache it. The memory of a running program must be opted
+	 * in to caching.
+	 */
+	if (!remote->is_live) {
+		drgn_memory_reader_set_cache(&prog->reader,
+					     DRGN_MEMORY_CACHE_DEFAULT_MAX_PAGES,
+					     0);
+		drgn_memory_reader_set_readahead(&prog->reader,
+						 DRGN_MEMORY_READAHEAD_DEFAULT_MAX_PAGES);
+	}
+
+	prog->remote = remote;
+	if (remote->vmcoreinfo)
+		prog->flags |= DRGN_PROGRAM_IS_LINUX_KERNEL;
+	if (remote->is_live)
+		prog->flags |= DRGN_PROGRAM_IS_LIVE;
+	drgn_program_set_platform(prog, platform);
+	drgn_platform_destroy(platform);
+	return NULL;
+
+out_segments:
+	drgn_memory_reader_deinit(&prog->reader);
+	drgn_memory_reader_init(&prog->reader);
+out_platform:
+	drgn_platform_destroy(platform);
+out_remote:
+	drgn_memory_remote_destroy(remote);
 	return err;
 }
 
@@ -516,7 +878,8 @@ struct drgn_error *drgn_program_update_dwarf_index(struct drgn_program *prog)
 		}
 		prog->_dicache = dicache;
 	}
-	err = drgn_dwarf_index_update(&prog->_dicache->dindex, prog->_dwfl);
+	err = drgn_dwarf_index_update(&prog->_dicache->dindex, prog->_dwfl,
+				      prog->debug_info_cache_dir);
 	if (err)
 		return err;
 	if (!prog->has_platform) {
@@ -553,6 +916,189 @@ out:
 	return err;
 }
 
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_set_debug_info_cache(struct drgn_program *prog, const char *path)
+{
+	char *dir;
+
+	if (path) {
+		dir = strdup(path);
+		if (!dir)
+			return &drgn_enomem;
+	} else {
+		dir = NULL;
+	}
+	free(prog->debug_info_cache_dir);
+	prog->debug_info_cache_dir = dir;
+	return NULL;
+}
+
+DEFINE_VECTOR_FUNCTIONS(dwfl_module_vector)
+
+struct undefer_arg {
+	Dwfl_Module *module;
+	struct dwfl_module_vector modules;
+};
+
+static int drgn_undefer_dwfl_module(Dwfl_Module *module, void **userdatap,
+				    const char *name, Dwarf_Addr base,
+				    void *arg_)
+{
+	struct undefer_arg *arg = arg_;
+	struct drgn_dwfl_module_userdata *userdata = *userdatap;
+
+	if ((!arg->module || module == arg->module) && userdata &&
+	    userdata->deferred) {
+		if (!dwfl_module_vector_append(&arg->modules, &module))
+			return DWARF_CB_ABORT;
+		userdata->deferred = false;
+	}
+	return DWARF_CB_OK;
+}
+
+static void drgn_set_dwfl_modules_deferred(Dwfl_Module **modules, size_t n,
+					   bool deferred)
+{
+	size_t i;
+
+	for (i = 0; i < n; i++)
+		drgn_dwfl_module_userdata(modules[i])->deferred = deferred;
+}
+
+/*
+ * Handle the result of indexing modules that were undeferred. If it failed, the
+ * modules that weren't indexed are removed. Missing debugging information is
+ * not an error here, and running out of memory leaves the modules deferred to
+ * be retried later.
+ */
+static struct drgn_error *
+drgn_program_finish_undeferred_modules(struct drgn_program *prog,
+				       struct drgn_error *err,
+				       Dwfl_Module **modules, size_t n)
+{
+	if (err == &drgn_enomem) {
+		drgn_set_dwfl_modules_deferred(modules, n, true);
+		prog->has_deferred_modules = true;
+	} else if (err) {
+		drgn_remove_unindexed_dwfl_modules(prog->_dwfl);
+		if (err->code == DRGN_ERROR_MISSING_DEBUG_INFO) {
+			drgn_error_destroy(err);
+			err = NULL;
+		}
+	}
+	return err;
+}
+
+struct drgn_error *drgn_program_index_deferred_modules(struct drgn_program *prog,
+						       Dwfl_Module *module)
+{
+	struct drgn_error *err;
+	struct undefer_arg arg = { .module = module };
+	Dwfl_Module **modules;
+	size_t n, i;
+
+	if (!prog->has_deferred_modules)
+		return NULL;
+	dwfl_module_vector_init(&arg.modules);
+	if (dwfl_getmodules(prog->_dwfl, drgn_undefer_dwfl_module, &arg, 0)) {
+		drgn_set_dwfl_modules_deferred(arg.modules.data,
+					       arg.modules.size, true);
+		err = &drgn_enomem;
+		goto out;
+	}
+	if (!module)
+		prog->has_deferred_modules = false;
+	modules = arg.modules.data;
+	n = arg.modules.size;
+	if (!n) {
+		err = NULL;
+		goto out;
+	}
+
+	err = drgn_program_update_dwarf_index(prog);
+	if (!err || err == &drgn_enomem ||
+	    err->code == DRGN_ERROR_MISSING_DEBUG_INFO || n == 1) {
+		err = drgn_program_finish_undeferred_modules(prog, err, modules,
+							     n);
+		goto out;
+	}
+
+	/*
+	 * The whole update was rolled back because of an error in one of the
+	 * modules. Index them one at a time so that only the modules that fail
+	 * are removed, and return the first error.
+	 */
+	drgn_error_destroy(err);
+	err = NULL;
+	drgn_set_dwfl_modules_deferred(modules, n, true);
+	for (i = 0; i < n; i++) {
+		struct drgn_error *err2;
+
+		drgn_dwfl_module_userdata(modules[i])->deferred = false;
+		err2 = drgn_program_update_dwarf_index(prog);
+		err2 = drgn_program_finish_undeferred_modules(prog, err2,
+							      &modules[i], 1);
+		if (err2 == &drgn_enomem) {
+			drgn_error_destroy(err);
+			err = err2;
+			break;
+		} else if (err) {
+			drgn_error_destroy(err2);
+		} else {
+			err = err2;
+		}
+	}
+out:
+	dwfl_module_vector_deinit(&arg.modules);
+	return err;
+}
+
+LIBDRGN_PUBLIC void
+drgn_program_set_lazy_module_indexing(struct drgn_program *prog, bool lazy)
+{
+	prog->lazy_module_indexing = lazy;
+}
+
+DEFINE_VECTOR(drgn_module_info_vector, struct drgn_module_info)
+
+static int drgn_append_module_info(Dwfl_Module *module, void **userdatap,
+				   const char *name, Dwarf_Addr base, void *arg)
+{
+	struct drgn_module_info_vector *infos = arg;
+	struct drgn_dwfl_module_userdata *userdata = *userdatap;
+	struct drgn_module_info *info;
+	Dwarf_Addr start, end;
+
+	info = drgn_module_info_vector_append_entry(infos);
+	if (!info)
+		return DWARF_CB_ABORT;
+	dwfl_module_info(module, NULL, &start, &end, NULL, NULL, NULL, NULL);
+	info->name = name;
+	info->start = start;
+	info->end = end;
+	info->indexed = userdata && userdata->indexed;
+	return DWARF_CB_OK;
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_modules(struct drgn_program *prog, struct drgn_module_info **ret,
+		     size_t *count_ret)
+{
+	struct drgn_module_info_vector infos;
+
+	drgn_module_info_vector_init(&infos);
+	if (prog->_dwfl &&
+	    dwfl_getmodules(prog->_dwfl, drgn_append_module_info, &infos,
+			    0)) {
+		drgn_module_info_vector_deinit(&infos);
+		return &drgn_enomem;
+	}
+	drgn_module_info_vector_shrink_to_fit(&infos);
+	*ret = infos.data;
+	*count_ret = infos.size;
+	return NULL;
+}
+
 LIBDRGN_PUBLIC struct drgn_error *
 drgn_program_load_default_debug_info(struct drgn_program *prog)
 {
@@ -561,6 +1107,10 @@ drgn_program_load_default_debug_info(struct drgn_program *prog)
 
 	if (prog->flags & DRGN_PROGRAM_IS_LINUX_KERNEL)
 		return linux_kernel_load_default_debug_info(prog);
+	if (prog->remote) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "cannot determine default debugging information of remote program");
+	}
 
 	err = drgn_program_get_dwfl(prog, &dwfl);
 	if (err)
@@ -580,16 +1130,20 @@ drgn_program_load_default_debug_info(struct drgn_program *prog)
 		}
 	} else {
 		Elf *elf;
+		char *elf_buf = NULL;
 
-		elf = elf_begin(prog->core_fd, ELF_C_READ, NULL);
-		if (elf) {
+		if (prog->core_compressed) {
+			err = elf_begin_compressed_core(prog->core_compressed,
+							&elf, &elf_buf);
+		} else {
+			elf = elf_begin(prog->core_fd, ELF_C_READ, NULL);
+			err = elf ? NULL : drgn_error_libelf();
+		}
+		if (!err) {
 			if (dwfl_core_file_report(dwfl, elf, NULL) == -1)
 				err = drgn_error_libdwfl();
-			else
-				err = NULL;
 			elf_end(elf);
-		} else {
-			err = drgn_error_libelf();
+			free(elf_buf);
 		}
 	}
 	dwfl_report_end(dwfl, NULL, NULL);
@@ -723,6 +1277,307 @@ drgn_program_read_memory(struct drgn_program *prog, void *buf, uint64_t address,
 				       physical);
 }
 
+LIBDRGN_PUBLIC const void *
+drgn_program_map_memory(struct drgn_program *prog, uint64_t address,
+			size_t count, bool physical)
+{
+	return drgn_memory_reader_map(&prog->reader, address, count, physical);
+}
+
+/*
+ * Translate a virtual address and return the number of bytes from the address
+ * to the end of the page that it is in.
+ */
+static struct drgn_error *
+drgn_program_translate_page(struct drgn_program *prog, uint64_t address,
+			    uint64_t pgd, uint64_t *phys_ret, uint64_t *size_ret)
+{
+	struct drgn_error *err;
+	struct drgn_translation_cache_entry *entry = NULL;
+	uint64_t offset = address % DRGN_TRANSLATION_CACHE_PAGE_SIZE;
+	uint64_t virtual_page = address - offset;
+	uint64_t phys, page_size;
+
+	if (!prog->has_platform) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "cannot translate address without platform");
+	}
+	if (!prog->platform.arch->pgtable_walk) {
+		return drgn_error_format(DRGN_ERROR_INVALID_ARGUMENT,
+					 "address translation is not supported for %s architecture",
+					 prog->platform.arch->name);
+	}
+
+	/* The page tables of a running program may change at any time. */
+	if (!(prog->flags & DRGN_PROGRAM_IS_LIVE)) {
+		if (!prog->translation_cache) {
+			size_t i;
+
+			prog->translation_cache =
+				malloc_array(DRGN_TRANSLATION_CACHE_SIZE,
+					     sizeof(*prog->translation_cache));
+			if (!prog->translation_cache)
+				return &drgn_enomem;
+			for (i = 0; i < DRGN_TRANSLATION_CACHE_SIZE; i++)
+				prog->translation_cache[i].virtual_address = 1;
+		}
+		entry = &prog->translation_cache[((virtual_page ^ pgd) /
+						  DRGN_TRANSLATION_CACHE_PAGE_SIZE) %
+						 DRGN_TRANSLATION_CACHE_SIZE];
+		if (entry->virtual_address == virtual_page &&
+		    entry->pgd == pgd) {
+			*phys_ret = entry->physical_address + offset;
+			*size_ret = DRGN_TRANSLATION_CACHE_PAGE_SIZE - offset;
+			return NULL;
+		}
+	}
+
+	err = prog->platform.arch->pgtable_walk(prog, pgd, address, &phys,
+						&page_size);
+	if (err)
+		return err;
+	if (entry) {
+		entry->pgd = pgd;
+		entry->virtual_address = virtual_page;
+		entry->physical_address = phys - offset;
+	}
+	*phys_ret = phys;
+	*size_ret = page_size - (address & (page_size - 1));
+	return NULL;
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_translate(struct drgn_program *prog, uint64_t address,
+		       uint64_t pgd, uint64_t *ret)
+{
+	uint64_t size;
+
+	return drgn_program_translate_page(prog, address, pgd, ret, &size);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_read_memory_pgd(struct drgn_program *prog, void *buf,
+			     uint64_t address, size_t count, uint64_t pgd)
+{
+	struct drgn_error *err;
+	char *p = buf;
+
+	while (count) {
+		uint64_t phys, size;
+		size_t n;
+
+		err = drgn_program_translate_page(prog, address, pgd, &phys,
+						  &size);
+		if (err)
+			return err;
+		n = min((uint64_t)count, size);
+		err = drgn_program_read_memory(prog, p, phys, n, true);
+		if (err)
+			return err;
+		p += n;
+		address += n;
+		count -= n;
+	}
+	return NULL;
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_read_memory_vec(struct drgn_program *prog,
+			     struct drgn_memory_read_request *reqs, size_t n,
+			     bool physical)
+{
+	return drgn_memory_reader_read_vec(&prog->reader, reqs, n, physical);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_read_memory_sparse(struct drgn_program *prog, void *buf,
+				uint64_t address, size_t count, bool physical,
+				unsigned char *valid)
+{
+	return drgn_memory_reader_read_sparse(&prog->reader, buf, address,
+					      count, physical, valid);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_set_memory_cache(struct drgn_program *prog, uint64_t size,
+			      uint64_t max_age)
+{
+	uint64_t max_pages = size / DRGN_MEMORY_CACHE_PAGE_SIZE;
+
+	if (max_pages > SIZE_MAX / sizeof(struct drgn_memory_cache_page)) {
+		return drgn_error_create(DRGN_ERROR_OVERFLOW,
+					 "memory cache size is too large");
+	}
+	drgn_memory_reader_set_cache(&prog->reader, max_pages, max_age);
+	return NULL;
+}
+
+LIBDRGN_PUBLIC void drgn_program_begin_snapshot(struct drgn_program *prog)
+{
+	/*
+	 * Walk the page tables again so that the snapshot captures the pages
+	 * needed to translate addresses.
+	 */
+	drgn_program_invalidate_translation_cache(prog);
+	drgn_memory_reader_begin_snapshot(&prog->reader);
+}
+
+LIBDRGN_PUBLIC void drgn_program_end_snapshot(struct drgn_program *prog)
+{
+	drgn_memory_reader_end_snapshot(&prog->reader);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_save_snapshot(struct drgn_program *prog, const char *path)
+{
+	struct drgn_error *err;
+	struct drgn_memory_cache_page **virtual_pages, **physical_pages;
+	size_t num_virtual_pages, num_physical_pages;
+
+	if (!prog->reader.snapshot_depth) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "no snapshot is active");
+	}
+	err = drgn_memory_reader_snapshot_pages(&prog->reader, false,
+						&virtual_pages,
+						&num_virtual_pages);
+	if (err)
+		return err;
+	err = drgn_memory_reader_snapshot_pages(&prog->reader, true,
+						&physical_pages,
+						&num_physical_pages);
+	if (err)
+		goto out_virtual;
+	err = drgn_write_core_dump(prog, path, virtual_pages,
+				   num_virtual_pages, physical_pages,
+				   num_physical_pages);
+	free(physical_pages);
+out_virtual:
+	free(virtual_pages);
+	return err;
+}
+
+LIBDRGN_PUBLIC void drgn_program_start_recording(struct drgn_program *prog)
+{
+	/*
+	 * Walk the page tables again so that the pages needed to translate
+	 * addresses are recorded.
+	 */
+	drgn_program_invalidate_translation_cache(prog);
+	drgn_memory_reader_start_recording(&prog->reader);
+	prog->recorded = true;
+}
+
+LIBDRGN_PUBLIC void drgn_program_stop_recording(struct drgn_program *prog)
+{
+	drgn_memory_reader_stop_recording(&prog->reader);
+}
+
+static void free_pages(struct drgn_memory_cache_page **pages, size_t num_pages)
+{
+	size_t i;
+
+	for (i = 0; i < num_pages; i++)
+		free(pages[i]);
+	free(pages);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_write_core(struct drgn_program *prog, const char *path)
+{
+	struct drgn_error *err;
+	struct drgn_memory_cache_page **virtual_pages, **physical_pages;
+	size_t num_virtual_pages, num_physical_pages;
+
+	if (!prog->recorded) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "recording was never started");
+	}
+	err = drgn_memory_reader_recorded_pages(&prog->reader, false,
+						&virtual_pages,
+						&num_virtual_pages);
+	if (err)
+		return err;
+	err = drgn_memory_reader_recorded_pages(&prog->reader, true,
+						&physical_pages,
+						&num_physical_pages);
+	if (err)
+		goto out_virtual;
+	err = drgn_write_core_dump(prog, path, virtual_pages,
+				   num_virtual_pages, physical_pages,
+				   num_physical_pages);
+	free_pages(physical_pages, num_physical_pages);
+out_virtual:
+	free_pages(virtual_pages, num_virtual_pages);
+	return err;
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_set_memory_readahead(struct drgn_program *prog,
+				  uint64_t max_size)
+{
+	uint64_t max_pages = max_size / DRGN_MEMORY_CACHE_PAGE_SIZE;
+
+	if (max_pages > SIZE_MAX / DRGN_MEMORY_CACHE_PAGE_SIZE) {
+		return drgn_error_create(DRGN_ERROR_OVERFLOW,
+					 "memory read-ahead size is too large");
+	}
+	drgn_memory_reader_set_readahead(&prog->reader, max_pages);
+	return NULL;
+}
+
+LIBDRGN_PUBLIC void
+drgn_program_invalidate_memory_cache(struct drgn_program *prog)
+{
+	drgn_memory_reader_invalidate_cache(&prog->reader);
+	drgn_program_invalidate_translation_cache(prog);
+}
+
+LIBDRGN_PUBLIC void drgn_program_stats(struct drgn_program *prog,
+				       struct drgn_program_stats *ret)
+{
+	ret->memory = prog->reader.stats;
+	if (prog->process) {
+		ret->process_backend = prog->process->stats;
+	} else {
+		memset(&ret->process_backend, 0,
+		       sizeof(ret->process_backend));
+	}
+	ret->type_finders = prog->tindex.stats;
+	ret->object_finders = prog->oindex.stats;
+	if (prog->_dicache) {
+		ret->dwarf = prog->_dicache->stats;
+		ret->dwarf.index_cache_hits =
+			prog->_dicache->dindex.cache_hits;
+		ret->dwarf.index_cache_misses =
+			prog->_dicache->dindex.cache_misses;
+		drgn_dwarf_index_size(&prog->_dicache->dindex,
+				      &ret->dwarf.index_dies,
+				      &ret->dwarf.index_bytes);
+	} else {
+		memset(&ret->dwarf, 0, sizeof(ret->dwarf));
+	}
+	ret->stack_traces = prog->stack_trace_stats;
+}
+
+LIBDRGN_PUBLIC void drgn_program_reset_stats(struct drgn_program *prog)
+{
+	memset(&prog->reader.stats, 0, sizeof(prog->reader.stats));
+	if (prog->process) {
+		memset(&prog->process->stats, 0,
+		       sizeof(prog->process->stats));
+	}
+	memset(&prog->tindex.stats, 0, sizeof(prog->tindex.stats));
+	memset(&prog->oindex.stats, 0, sizeof(prog->oindex.stats));
+	if (prog->_dicache) {
+		memset(&prog->_dicache->stats, 0,
+		       sizeof(prog->_dicache->stats));
+		prog->_dicache->dindex.cache_hits = 0;
+		prog->_dicache->dindex.cache_misses = 0;
+	}
+	memset(&prog->stack_trace_stats, 0, sizeof(prog->stack_trace_stats));
+}
+
 DEFINE_VECTOR(char_vector, char)
 
 LIBDRGN_PUBLIC struct drgn_error *
@@ -731,34 +1586,53 @@ drgn_program_read_c_string(struct drgn_program *prog, uint64_t address,
 {
 	struct drgn_error *err;
 	struct char_vector str;
+	char *c;
 
 	char_vector_init(&str);
-	for (;;) {
-		char *c;
+	while (str.size < max_size) {
+		size_t count, n;
+		char *nul;
 
-		c = char_vector_append_entry(&str);
-		if (!c) {
+		count = min(max_size - str.size,
+			    (size_t)DRGN_MEMORY_CACHE_PAGE_SIZE);
+		/*
+		 * Leave room for the null terminator if we don't find one, and
+		 * grow geometrically so that long strings take amortized
+		 * linear time.
+		 */
+		if (str.capacity < str.size + count + 1 &&
+		    !char_vector_reserve(&str,
+					 max(str.size + count + 1,
+					     2 * str.capacity)))
+			goto enomem;
+		err = drgn_memory_reader_read_partial(&prog->reader,
+						      str.data + str.size,
+						      address, count, physical,
+						      &n);
+		if (err) {
 			char_vector_deinit(&str);
-			return &drgn_enomem;
+			return err;
 		}
-		if (str.size <= max_size) {
-			err = drgn_memory_reader_read(&prog->reader, c, address,
-						      1, physical);
-			if (err) {
-				char_vector_deinit(&str);
-				return err;
-			}
-			if (!*c)
-				break;
-		} else {
-			*c = '\0';
-			break;
+		nul = memchr(str.data + str.size, '\0', n);
+		if (nul) {
+			str.size = nul - str.data + 1;
+			goto out;
 		}
-		address++;
+		str.size += n;
+		address += n;
 	}
+	c = char_vector_append_entry(&str);
+	if (!c)
+		goto enomem;
+	*c = '\0';
+out:
 	char_vector_shrink_to_fit(&str);
 	*ret = str.data;
 	return NULL;
+
+enomem:
+	char_vector_deinit(&str);
+	return &drgn_enomem;
 }
 
 LIBDRGN_PUBLIC struct drgn_error *
@@ -783,11 +1657,176 @@ drgn_program_find_object(struct drgn_program *prog, const char *name,
 				      ret);
 }
 
+struct drgn_type_iterator {
+	/* If false, the program doesn't have any debugging information. */
+	bool has_dwarf;
+	struct drgn_dwarf_info_iterator it;
+};
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_type_iterator_create(struct drgn_program *prog, enum drgn_type_kind kind,
+			  struct drgn_type_iterator **ret)
+{
+	struct drgn_error *err;
+	struct drgn_type_iterator *it;
+
+	switch (kind) {
+	case DRGN_TYPE_VOID:
+	case DRGN_TYPE_POINTER:
+	case DRGN_TYPE_ARRAY:
+	case DRGN_TYPE_FUNCTION:
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "only named types can be iterated over");
+	default:
+		break;
+	}
+
+	err = drgn_program_index_deferred_modules(prog, NULL);
+	if (err)
+		return err;
+	it = malloc(sizeof(*it));
+	if (!it)
+		return &drgn_enomem;
+	it->has_dwarf = prog->_dicache != NULL;
+	if (it->has_dwarf)
+		drgn_dwarf_type_iterator_init(&it->it, prog->_dicache, kind);
+	*ret = it;
+	return NULL;
+}
+
+LIBDRGN_PUBLIC void drgn_type_iterator_destroy(struct drgn_type_iterator *it)
+{
+	free(it);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_type_iterator_next(struct drgn_type_iterator *it,
+			struct drgn_qualified_type *ret)
+{
+	if (!it->has_dwarf)
+		return &drgn_stop;
+	return drgn_dwarf_type_iterator_next(&it->it, ret);
+}
+
+struct drgn_function_iterator {
+	struct drgn_program *prog;
+	/* If false, the program doesn't have any debugging information. */
+	bool has_dwarf;
+	struct drgn_dwarf_info_iterator it;
+};
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_function_iterator_create(struct drgn_program *prog,
+			      struct drgn_function_iterator **ret)
+{
+	struct drgn_error *err;
+	struct drgn_function_iterator *it;
+
+	err = drgn_program_index_deferred_modules(prog, NULL);
+	if (err)
+		return err;
+	it = malloc(sizeof(*it));
+	if (!it)
+		return &drgn_enomem;
+	it->prog = prog;
+	it->has_dwarf = prog->_dicache != NULL;
+	if (it->has_dwarf)
+		drgn_dwarf_function_iterator_init(&it->it, prog->_dicache);
+	*ret = it;
+	return NULL;
+}
+
+LIBDRGN_PUBLIC void
+drgn_function_iterator_destroy(struct drgn_function_iterator *it)
+{
+	free(it);
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_function_iterator_next(struct drgn_function_iterator *it,
+			    struct drgn_object *ret)
+{
+	if (ret->prog != it->prog) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "object is from wrong program");
+	}
+	if (!it->has_dwarf)
+		return &drgn_stop;
+	return drgn_dwarf_function_iterator_next(&it->it, ret);
+}
+
+DEFINE_VECTOR(const_char_p_vector, const char *)
+
+static struct drgn_error *drgn_append_search_result(const char *name,
+						    void *arg)
+{
+	if (!const_char_p_vector_append(arg, &name))
+		return &drgn_enomem;
+	return NULL;
+}
+
+LIBDRGN_PUBLIC struct drgn_error *
+drgn_program_search(struct drgn_program *prog, const char *pattern,
+		    enum drgn_search_kind kinds, const char ***ret,
+		    size_t *count_ret)
+{
+	/* Only the tags that drgn_type_from_dwarf() can parse. */
+	static const uint64_t type_tags[] = {
+		DW_TAG_base_type,
+		DW_TAG_enumeration_type,
+		DW_TAG_structure_type,
+		DW_TAG_typedef,
+		DW_TAG_union_type,
+	};
+	struct drgn_error *err;
+	uint64_t tags[ARRAY_SIZE(type_tags) + 3];
+	size_t num_tags = 0;
+	struct const_char_p_vector names;
+
+	if (kinds & DRGN_SEARCH_TYPE) {
+		memcpy(tags, type_tags, sizeof(type_tags));
+		num_tags += ARRAY_SIZE(type_tags);
+	}
+	if (kinds & DRGN_SEARCH_CONSTANT)
+		tags[num_tags++] = DW_TAG_enumerator;
+	if (kinds & DRGN_SEARCH_FUNCTION)
+		tags[num_tags++] = DW_TAG_subprogram;
+	if (kinds & DRGN_SEARCH_VARIABLE)
+		tags[num_tags++] = DW_TAG_variable;
+
+	const_char_p_vector_init(&names);
+	/* An empty list of tags would match any tag, so don't search at all. */
+	if (!num_tags)
+		goto out;
+	err = drgn_program_index_deferred_modules(prog, NULL);
+	if (err)
+		goto err;
+	if (prog->_dicache) {
+		err = drgn_dwarf_index_search(&prog->_dicache->dindex, pattern,
+					      tags, num_tags,
+					      drgn_append_search_result,
+					      &names);
+		if (err)
+			goto err;
+	}
+out:
+	const_char_p_vector_shrink_to_fit(&names);
+	*ret = names.data;
+	*count_ret = names.size;
+	return NULL;
+
+err:
+	const_char_p_vector_deinit(&names);
+	return err;
+}
+
 struct drgn_error *drgn_program_find_symbol_internal(struct drgn_program *prog,
 						     uint64_t address,
 						     struct drgn_symbol *sym)
 {
+	struct drgn_error *err;
 	Dwfl_Module *module;
+	struct drgn_dwfl_module_userdata *userdata;
 	const char *name;
 	GElf_Off offset;
 	GElf_Sym elf_sym;
@@ -798,6 +1837,16 @@ struct drgn_error *drgn_program_find_symbol_internal(struct drgn_program *prog,
 	module = dwfl_addrmodule(prog->_dwfl, address);
 	if (!module)
 		return &drgn_not_found;
+	userdata = drgn_dwfl_module_userdata(module);
+	if (userdata && userdata->deferred) {
+		err = drgn_program_index_deferred_modules(prog, module);
+		if (err)
+			return err;
+		/* The module is removed if it had no debugging information. */
+		module = dwfl_addrmodule(prog->_dwfl, address);
+		if (!module)
+			return &drgn_not_found;
+	}
 	name = dwfl_module_addrinfo(module, address, &offset, &elf_sym, NULL,
 				    NULL, NULL);
 	if (!name)
@@ -46,6 +46,36 @@ struct vmcoreinfo {
 	 * is enabled.
 	 */
 	uint64_t kaslr_offset;
+	/** Whether 5-level page tables are enabled. */
+	bool pgtable_l5_enabled;
+};
+
+/**
+ * Granularity of the translations in a @ref drgn_program's translation cache.
+ *
+ * This is the smallest page size of any supported architecture. Translations of
+ * addresses in larger pages are cached separately for each granule.
+ */
+#define DRGN_TRANSLATION_CACHE_PAGE_SIZE 4096
+/** Number of entries in a @ref drgn_program's translation cache. */
+#define DRGN_TRANSLATION_CACHE_SIZE 1024
+
+/**
+ * Cached virtual to physical address translation.
+ *
+ * The translation cache is direct-mapped like a hardware TLB: each page table
+ * and virtual page hash to a single entry, which is replaced on a miss.
+ */
+struct drgn_translation_cache_entry {
+	/** Physical address of the top-level page table. */
+	uint64_t pgd;
+	/**
+	 * Virtual address of the page, or 1 (which is not page-aligned) if the
+	 * entry is empty.
+	 */
+	uint64_t virtual_address;
+	/** Physical address of the page. */
+	uint64_t physical_address;
 };
 
 struct drgn_dwarf_info_cache;
@@ -58,6 +88,20 @@ struct drgn_program {
 	struct drgn_object_index oindex;
 	struct drgn_memory_file_segment *file_segments;
 	size_t num_file_segments;
+	/* Memory of a running process, or NULL if not a running process. */
+	struct drgn_memory_process *process;
+	/* Mapping of the core dump file, or NULL if it is not mapped. */
+	void *core_map;
+	size_t core_map_size;
+	/* Compressed core dump file, or NULL if it is not compressed. */
+	struct drgn_compressed_file *core_compressed;
+	/* Remote memory server, or NULL if not remote. */
+	struct drgn_memory_remote *remote;
+	/*
+	 * Cache of address translations, or NULL if nothing has been cached
+	 * since it was last invalidated. See @ref drgn_program_translate().
+	 */
+	struct drgn_translation_cache_entry *translation_cache;
 	/*
 	 * Valid iff <tt>flags & DRGN_PROGRAM_IS_LINUX_KERNEL</tt>.
 	 */
@@ -73,16 +117,29 @@ struct drgn_program {
 #endif
 	Dwfl *_dwfl;
 	struct drgn_dwarf_info_cache *_dicache;
+	/* See @ref drgn_program_set_debug_info_cache(). */
+	char *debug_info_cache_dir;
 	/* See @ref drgn_object_stack_trace_next_thread(). */
 	const struct drgn_object *stack_trace_obj;
 	/* See @ref drgn_object_stack_trace(). */
 	struct drgn_error *stack_trace_err;
+	/** Statistics about @ref drgn_object_stack_trace(). */
+	struct drgn_stack_trace_stats stack_trace_stats;
 	int core_fd;
 	enum drgn_program_flags flags;
 	struct drgn_platform platform;
 	bool has_platform;
 	bool added_vmcoreinfo_object_finder;
 	bool attached_dwfl_state;
+	/** Whether @ref drgn_program_start_recording() was ever called. */
+	bool recorded;
+	/* See @ref drgn_program_set_lazy_module_indexing(). */
+	bool lazy_module_indexing;
+	/*
+	 * Whether any modules may still be deferred. This is cleared when all
+	 * of them are indexed.
+	 */
+	bool has_deferred_modules;
 };
 
 /** Initialize a @ref drgn_program. */
@@ -142,6 +199,21 @@ struct drgn_error *drgn_program_get_dwfl(struct drgn_program *prog, Dwfl **ret);
  */
 struct drgn_error *drgn_program_update_dwarf_index(struct drgn_program *prog);
 
+/**
+ * Index modules whose indexing was deferred (see @ref
+ * drgn_program_set_lazy_module_indexing()).
+ *
+ * Missing debugging information for these modules is not an error; those
+ * modules are removed. If indexing fails for another reason, only the modules
+ * that failed are removed.
+ *
+ * @param[in] module Module to index, or @c NULL to index all deferred modules.
+ * If it is not deferred, this does nothing.
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_program_index_deferred_modules(struct drgn_program *prog,
+						       Dwfl_Module *module);
+
 /*
  * Like @ref drgn_program_find_symbol(), but @p ret is already allocated and
  * returns @ref drgn_not_found instead of a more informative message.
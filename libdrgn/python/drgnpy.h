@@ -83,6 +83,13 @@ typedef struct {
 	PyObject *cache;
 } Program;
 
+typedef struct {
+	PyObject_HEAD
+	Program *prog;
+	const void *buf;
+	Py_ssize_t len;
+} ProgramMemory;
+
 typedef struct {
 	PyObject_HEAD
 	Program *prog;
@@ -101,21 +108,45 @@ typedef struct {
 	struct drgn_symbol *sym;
 } Symbol;
 
+typedef struct {
+	PyObject_HEAD
+	Program *prog;
+	struct drgn_type_iterator *it;
+} TypeIterator;
+
+typedef struct {
+	PyObject_HEAD
+	Program *prog;
+	struct drgn_function_iterator *it;
+} FunctionIterator;
+
+typedef struct {
+	PyObject_HEAD
+	Program *prog;
+	bool active;
+} Snapshot;
+
 extern PyObject *Architecture_class;
 extern PyObject *FindObjectFlags_class;
 extern PyObject *PlatformFlags_class;
 extern PyObject *PrimitiveType_class;
+extern PyObject *ProcessMemoryBackend_class;
 extern PyObject *ProgramFlags_class;
 extern PyObject *Qualifiers_class;
+extern PyObject *SearchKind_class;
 extern PyObject *TypeKind_class;
 extern PyTypeObject DrgnObject_type;
 extern PyTypeObject DrgnType_type;
+extern PyTypeObject FunctionIterator_type;
 extern PyTypeObject ObjectIterator_type;
 extern PyTypeObject Platform_type;
 extern PyTypeObject Program_type;
+extern PyTypeObject ProgramMemory_type;
+extern PyTypeObject Snapshot_type;
 extern PyTypeObject StackFrame_type;
 extern PyTypeObject StackTrace_type;
 extern PyTypeObject Symbol_type;
+extern PyTypeObject TypeIterator_type;
 extern PyObject *FaultError;
 extern PyObject *MissingDebugInfoError;
 
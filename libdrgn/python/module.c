@@ -142,6 +142,9 @@ DRGNPY_PUBLIC PyMODINIT_FUNC PyInit__drgn(void)
 	if (PyType_Ready(&ObjectIterator_type) < 0)
 		goto err;
 
+	if (PyType_Ready(&FunctionIterator_type) < 0)
+		goto err;
+
 	if (PyType_Ready(&Platform_type) < 0)
 		goto err;
 	Py_INCREF(&Platform_type);
@@ -152,6 +155,14 @@ DRGNPY_PUBLIC PyMODINIT_FUNC PyInit__drgn(void)
 	Py_INCREF(&Program_type);
 	PyModule_AddObject(m, "Program", (PyObject *)&Program_type);
 
+	if (PyType_Ready(&ProgramMemory_type) < 0)
+		goto err;
+
+	if (PyType_Ready(&Snapshot_type) < 0)
+		goto err;
+	Py_INCREF(&Snapshot_type);
+	PyModule_AddObject(m, "Snapshot", (PyObject *)&Snapshot_type);
+
 	if (PyType_Ready(&StackFrame_type) < 0)
 		goto err;
 	Py_INCREF(&StackFrame_type);
@@ -172,6 +183,9 @@ DRGNPY_PUBLIC PyMODINIT_FUNC PyInit__drgn(void)
 	Py_INCREF(&DrgnType_type);
 	PyModule_AddObject(m, "Type", (PyObject *)&DrgnType_type);
 
+	if (PyType_Ready(&TypeIterator_type) < 0)
+		goto err;
+
 	host_platform_obj = Platform_wrap(&drgn_host_platform);
 	if (!host_platform_obj)
 		goto err;
@@ -401,15 +401,39 @@ static PyObject *Program_set_kernel(Program *self)
 
 static PyObject *Program_set_pid(Program *self, PyObject *args, PyObject *kwds)
 {
-	static char *keywords[] = {"pid", NULL};
+	static char *keywords[] = {"pid", "backend", NULL};
 	struct drgn_error *err;
 	int pid;
+	struct enum_arg backend = {
+		.type = ProcessMemoryBackend_class,
+		.value = DRGN_PROCESS_MEMORY_AUTO,
+		.allow_none = true,
+	};
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwds, "i:set_pid", keywords,
-					 &pid))
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "i|O&:set_pid", keywords,
+					 &pid, enum_converter, &backend))
 		return NULL;
 
-	err = drgn_program_set_pid(&self->prog, pid);
+	err = drgn_program_set_pid_with_backend(&self->prog, pid,
+						backend.value);
+	if (err)
+		return set_drgn_error(err);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_set_remote(Program *self, PyObject *args,
+				    PyObject *kwds)
+{
+	static char *keywords[] = {"path", NULL};
+	struct drgn_error *err;
+	struct path_arg path = {};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O&:set_remote",
+					 keywords, path_converter, &path))
+		return NULL;
+
+	err = drgn_program_set_remote(&self->prog, path.path);
+	path_cleanup(&path);
 	if (err)
 		return set_drgn_error(err);
 	Py_RETURN_NONE;
@@ -496,37 +520,672 @@ static PyObject *Program_load_default_debug_info(Program *self)
 	Py_RETURN_NONE;
 }
 
+static PyObject *Program_set_debug_info_cache(Program *self, PyObject *args,
+					      PyObject *kwds)
+{
+	static char *keywords[] = {"path", NULL};
+	struct drgn_error *err;
+	struct path_arg path = { .allow_none = true };
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O&:set_debug_info_cache",
+					 keywords, path_converter, &path))
+		return NULL;
+
+	err = drgn_program_set_debug_info_cache(&self->prog, path.path);
+	path_cleanup(&path);
+	if (err)
+		return set_drgn_error(err);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_set_lazy_module_indexing(Program *self,
+						  PyObject *args,
+						  PyObject *kwds)
+{
+	static char *keywords[] = {"lazy", NULL};
+	int lazy;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds,
+					 "p:set_lazy_module_indexing", keywords,
+					 &lazy))
+		return NULL;
+
+	drgn_program_set_lazy_module_indexing(&self->prog, lazy);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_modules(Program *self)
+{
+	struct drgn_error *err;
+	struct drgn_module_info *modules;
+	size_t count, i;
+	PyObject *ret;
+
+	err = drgn_program_modules(&self->prog, &modules, &count);
+	if (err)
+		return set_drgn_error(err);
+	ret = PyList_New(count);
+	if (!ret)
+		goto out;
+	for (i = 0; i < count; i++) {
+		PyObject *item;
+
+		item = Py_BuildValue("{sssKsKsO}", "name", modules[i].name,
+				     "start",
+				     (unsigned long long)modules[i].start,
+				     "end", (unsigned long long)modules[i].end,
+				     "indexed",
+				     modules[i].indexed ? Py_True : Py_False);
+		if (!item) {
+			Py_CLEAR(ret);
+			goto out;
+		}
+		PyList_SET_ITEM(ret, i, item);
+	}
+out:
+	free(modules);
+	return ret;
+}
+
+static PyObject *Program_search(Program *self, PyObject *args, PyObject *kwds)
+{
+	static char *keywords[] = {"pattern", "kind", NULL};
+	struct drgn_error *err;
+	const char *pattern;
+	struct enum_arg kind = {
+		.type = SearchKind_class,
+		.value = DRGN_SEARCH_ANY,
+		.allow_none = true,
+	};
+	const char **names;
+	size_t count, i;
+	PyObject *ret;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|O&:search", keywords,
+					 &pattern, enum_converter, &kind))
+		return NULL;
+
+	err = drgn_program_search(&self->prog, pattern, kind.value, &names,
+				  &count);
+	if (err)
+		return set_drgn_error(err);
+	ret = PyList_New(count);
+	if (!ret)
+		goto out;
+	for (i = 0; i < count; i++) {
+		PyObject *item;
+
+		item = PyUnicode_FromString(names[i]);
+		if (!item) {
+			Py_CLEAR(ret);
+			goto out;
+		}
+		PyList_SET_ITEM(ret, i, item);
+	}
+out:
+	free(names);
+	return ret;
+}
+
+static TypeIterator *Program_types(Program *self, PyObject *args,
+				   PyObject *kwds)
+{
+	static char *keywords[] = {"kind", NULL};
+	struct drgn_error *err;
+	struct enum_arg kind = {
+		.type = TypeKind_class,
+		.value = 0,
+		.allow_none = true,
+	};
+	TypeIterator *it;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O&:types", keywords,
+					 enum_converter, &kind))
+		return NULL;
+
+	it = (TypeIterator *)TypeIterator_type.tp_alloc(&TypeIterator_type,
+							0);
+	if (!it)
+		return NULL;
+	err = drgn_type_iterator_create(&self->prog, kind.value, &it->it);
+	if (err) {
+		Py_DECREF(it);
+		return set_drgn_error(err);
+	}
+	it->prog = self;
+	Py_INCREF(self);
+	return it;
+}
+
+static FunctionIterator *Program_functions(Program *self)
+{
+	struct drgn_error *err;
+	FunctionIterator *it;
+
+	it = (FunctionIterator *)FunctionIterator_type.tp_alloc(&FunctionIterator_type,
+								0);
+	if (!it)
+		return NULL;
+	err = drgn_function_iterator_create(&self->prog, &it->it);
+	if (err) {
+		Py_DECREF(it);
+		return set_drgn_error(err);
+	}
+	it->prog = self;
+	Py_INCREF(self);
+	return it;
+}
+
+static PyObject *Program_read_impl(Program *self, uint64_t address,
+				   Py_ssize_t size, bool physical,
+				   const uint64_t *pgd)
+{
+	struct drgn_error *err;
+	PyObject *buf;
+	bool clear;
+
+	buf = PyBytes_FromStringAndSize(NULL, size);
+	if (!buf)
+		return NULL;
+	clear = set_drgn_in_python();
+	if (pgd) {
+		err = drgn_program_read_memory_pgd(&self->prog,
+						   PyBytes_AS_STRING(buf),
+						   address, size, *pgd);
+	} else {
+		err = drgn_program_read_memory(&self->prog,
+					       PyBytes_AS_STRING(buf), address,
+					       size, physical);
+	}
+	if (clear)
+		clear_drgn_in_python();
+	if (err) {
+		Py_DECREF(buf);
+		return set_drgn_error(err);
+	}
+	return buf;
+}
+
 static PyObject *Program_read(Program *self, PyObject *args, PyObject *kwds)
+{
+	static char *keywords[] = {"address", "size", "physical", "pgd", NULL};
+	unsigned long long address;
+	Py_ssize_t size;
+	int physical = 0;
+	PyObject *pgd_obj = Py_None;
+	uint64_t pgd;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "Kn|pO:read", keywords,
+					 &address, &size, &physical, &pgd_obj))
+	    return NULL;
+
+	if (size < 0) {
+		PyErr_SetString(PyExc_ValueError, "negative size");
+		return NULL;
+	}
+	if (pgd_obj == Py_None)
+		return Program_read_impl(self, address, size, physical, NULL);
+	if (physical) {
+		PyErr_SetString(PyExc_ValueError,
+				"pgd cannot be used with physical address");
+		return NULL;
+	}
+	pgd = index_arg(pgd_obj, "pgd must be integer or None");
+	if (pgd == (unsigned long long)-1 && PyErr_Occurred())
+		return NULL;
+	return Program_read_impl(self, address, size, false, &pgd);
+}
+
+static PyObject *Program_read_into(Program *self, PyObject *args,
+				   PyObject *kwds)
+{
+	static char *keywords[] = {"buffer", "address", "physical", NULL};
+	struct drgn_error *err;
+	Py_buffer buffer;
+	unsigned long long address;
+	int physical = 0;
+	bool clear;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "w*K|p:read_into",
+					 keywords, &buffer, &address,
+					 &physical))
+	    return NULL;
+
+	clear = set_drgn_in_python();
+	err = drgn_program_read_memory(&self->prog, buffer.buf, address,
+				       buffer.len, physical);
+	if (clear)
+		clear_drgn_in_python();
+	PyBuffer_Release(&buffer);
+	if (err)
+		return set_drgn_error(err);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_read_memoryview(Program *self, PyObject *args,
+					 PyObject *kwds)
+{
+	static char *keywords[] = {"address", "size", "physical", NULL};
+	unsigned long long address;
+	Py_ssize_t size;
+	int physical = 0;
+	const void *map;
+	PyObject *obj, *ret;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "Kn|p:read_memoryview",
+					 keywords, &address, &size, &physical))
+	    return NULL;
+
+	if (size < 0) {
+		PyErr_SetString(PyExc_ValueError, "negative size");
+		return NULL;
+	}
+	map = drgn_program_map_memory(&self->prog, address, size, physical);
+	if (map) {
+		ProgramMemory *mem;
+
+		mem = (ProgramMemory *)ProgramMemory_type.tp_alloc(&ProgramMemory_type,
+								   0);
+		if (!mem)
+			return NULL;
+		Py_INCREF(self);
+		mem->prog = self;
+		mem->buf = map;
+		mem->len = size;
+		obj = (PyObject *)mem;
+	} else {
+		obj = Program_read_impl(self, address, size, physical, NULL);
+		if (!obj)
+			return NULL;
+	}
+	ret = PyMemoryView_FromObject(obj);
+	Py_DECREF(obj);
+	return ret;
+}
+
+static PyObject *Program_translate(Program *self, PyObject *args,
+				   PyObject *kwds)
+{
+	static char *keywords[] = {"address", "pgd", NULL};
+	struct drgn_error *err;
+	unsigned long long address, pgd;
+	uint64_t ret;
+	bool clear;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "KK:translate", keywords,
+					 &address, &pgd))
+	    return NULL;
+
+	clear = set_drgn_in_python();
+	err = drgn_program_translate(&self->prog, address, pgd, &ret);
+	if (clear)
+		clear_drgn_in_python();
+	if (err)
+		return set_drgn_error(err);
+	return PyLong_FromUnsignedLongLong(ret);
+}
+
+static PyObject *Program_read_sparse(Program *self, PyObject *args,
+				     PyObject *kwds)
 {
 	static char *keywords[] = {"address", "size", "physical", NULL};
 	struct drgn_error *err;
 	unsigned long long address;
 	Py_ssize_t size;
 	int physical = 0;
-	PyObject *buf;
+	uint64_t num_pages;
+	PyObject *buf, *valid, *ret;
 	bool clear;
 
-	if (!PyArg_ParseTupleAndKeywords(args, kwds, "Kn|p:read", keywords,
-					 &address, &size, &physical))
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "Kn|p:read_sparse",
+					 keywords, &address, &size, &physical))
 	    return NULL;
 
 	if (size < 0) {
 		PyErr_SetString(PyExc_ValueError, "negative size");
 		return NULL;
 	}
+	if (size) {
+		num_pages = ((address % DRGN_SPARSE_READ_PAGE_SIZE + size +
+			      DRGN_SPARSE_READ_PAGE_SIZE - 1) /
+			     DRGN_SPARSE_READ_PAGE_SIZE);
+	} else {
+		num_pages = 0;
+	}
 	buf = PyBytes_FromStringAndSize(NULL, size);
 	if (!buf)
 		return NULL;
+	valid = PyBytes_FromStringAndSize(NULL, (num_pages + 7) / 8);
+	if (!valid) {
+		Py_DECREF(buf);
+		return NULL;
+	}
 	clear = set_drgn_in_python();
-	err = drgn_program_read_memory(&self->prog, PyBytes_AS_STRING(buf),
-				       address, size, physical);
+	err = drgn_program_read_memory_sparse(&self->prog,
+					      PyBytes_AS_STRING(buf), address,
+					      size, physical,
+					      (unsigned char *)PyBytes_AS_STRING(valid));
 	if (clear)
 		clear_drgn_in_python();
 	if (err) {
+		Py_DECREF(valid);
 		Py_DECREF(buf);
 		return set_drgn_error(err);
 	}
-	return buf;
+	ret = PyTuple_Pack(2, buf, valid);
+	Py_DECREF(valid);
+	Py_DECREF(buf);
+	return ret;
+}
+
+static PyObject *Program_read_many(Program *self, PyObject *args,
+				   PyObject *kwds)
+{
+	static char *keywords[] = {"ranges", "physical", NULL};
+	struct drgn_error *err;
+	PyObject *ranges_obj, *ranges, *ret = NULL;
+	int physical = 0;
+	struct drgn_memory_read_request *reqs;
+	Py_ssize_t n, i;
+	bool clear;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|p:read_many", keywords,
+					 &ranges_obj, &physical))
+	    return NULL;
+
+	ranges = PySequence_Fast(ranges_obj, "ranges must be a sequence");
+	if (!ranges)
+		return NULL;
+	n = PySequence_Fast_GET_SIZE(ranges);
+	ret = PyList_New(n);
+	if (!ret)
+		goto out_ranges;
+	reqs = calloc(n ? n : 1, sizeof(*reqs));
+	if (!reqs) {
+		PyErr_NoMemory();
+		goto err;
+	}
+	for (i = 0; i < n; i++) {
+		PyObject *tuple, *buf;
+		unsigned long long address;
+		Py_ssize_t size;
+		int ok;
+
+		tuple = PySequence_Tuple(PySequence_Fast_GET_ITEM(ranges, i));
+		if (!tuple)
+			goto err_reqs;
+		ok = PyArg_ParseTuple(tuple, "Kn:read_many", &address, &size);
+		Py_DECREF(tuple);
+		if (!ok)
+			goto err_reqs;
+		if (size < 0) {
+			PyErr_SetString(PyExc_ValueError, "negative size");
+			goto err_reqs;
+		}
+		buf = PyBytes_FromStringAndSize(NULL, size);
+		if (!buf)
+			goto err_reqs;
+		PyList_SET_ITEM(ret, i, buf);
+		reqs[i].buf = PyBytes_AS_STRING(buf);
+		reqs[i].address = address;
+		reqs[i].count = size;
+	}
+
+	clear = set_drgn_in_python();
+	err = drgn_program_read_memory_vec(&self->prog, reqs, n, physical);
+	if (clear)
+		clear_drgn_in_python();
+	if (err) {
+		set_drgn_error(err);
+		goto err_reqs;
+	}
+
+	for (i = 0; i < n; i++) {
+		PyObject *fault;
+
+		if (!reqs[i].err)
+			continue;
+		fault = PyObject_CallFunction(FaultError, "s",
+					      reqs[i].err->message);
+		if (!fault)
+			goto err_errors;
+		drgn_error_destroy(reqs[i].err);
+		reqs[i].err = NULL;
+		Py_DECREF(PyList_GET_ITEM(ret, i));
+		PyList_SET_ITEM(ret, i, fault);
+	}
+	free(reqs);
+	goto out_ranges;
+
+err_errors:
+	for (i = 0; i < n; i++)
+		drgn_error_destroy(reqs[i].err);
+err_reqs:
+	free(reqs);
+err:
+	Py_CLEAR(ret);
+out_ranges:
+	Py_DECREF(ranges);
+	return ret;
+}
+
+static PyObject *Program_set_memory_cache(Program *self, PyObject *args,
+					  PyObject *kwds)
+{
+	static char *keywords[] = {"size", "max_age", NULL};
+	struct drgn_error *err;
+	unsigned long long size;
+	PyObject *max_age_obj = Py_None;
+	uint64_t max_age;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "K|O:set_memory_cache",
+					 keywords, &size, &max_age_obj))
+		return NULL;
+
+	if (max_age_obj == Py_None) {
+		max_age = 0;
+	} else {
+		double seconds;
+
+		seconds = PyFloat_AsDouble(max_age_obj);
+		if (seconds == -1.0 && PyErr_Occurred())
+			return NULL;
+		if (!(seconds > 0.0)) {
+			PyErr_SetString(PyExc_ValueError,
+					"max_age must be positive");
+			return NULL;
+		}
+		if (seconds >= UINT64_MAX / 1e9) {
+			PyErr_SetString(PyExc_OverflowError,
+					"max_age is too large");
+			return NULL;
+		}
+		max_age = seconds * 1e9;
+		if (!max_age)
+			max_age = 1;
+	}
+
+	err = drgn_program_set_memory_cache(&self->prog, size, max_age);
+	if (err)
+		return set_drgn_error(err);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_set_memory_readahead(Program *self, PyObject *args,
+					      PyObject *kwds)
+{
+	static char *keywords[] = {"max_size", NULL};
+	struct drgn_error *err;
+	unsigned long long max_size;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "K:set_memory_readahead",
+					 keywords, &max_size))
+		return NULL;
+
+	err = drgn_program_set_memory_readahead(&self->prog, max_size);
+	if (err)
+		return set_drgn_error(err);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_invalidate_cache(Program *self)
+{
+	drgn_program_invalidate_memory_cache(&self->prog);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_snapshot(Program *self)
+{
+	Snapshot *snapshot;
+
+	snapshot = (Snapshot *)Snapshot_type.tp_alloc(&Snapshot_type, 0);
+	if (!snapshot)
+		return NULL;
+	Py_INCREF(self);
+	snapshot->prog = self;
+	return (PyObject *)snapshot;
+}
+
+static PyObject *
+memory_read_stats_to_dict(const struct drgn_memory_read_stats *stats)
+{
+	return Py_BuildValue("{sKsKsK}",
+			     "reads", (unsigned long long)stats->reads,
+			     "bytes", (unsigned long long)stats->bytes,
+			     "ns", (unsigned long long)stats->ns);
+}
+
+static PyObject *memory_stats_to_dict(const struct drgn_memory_stats *stats)
+{
+	static const char * const kind_names[DRGN_NUM_MEMORY_SEGMENT_KINDS] = {
+		[DRGN_MEMORY_SEGMENT_FILE] = "file",
+		[DRGN_MEMORY_SEGMENT_PROCESS] = "process",
+		[DRGN_MEMORY_SEGMENT_REMOTE] = "remote",
+		[DRGN_MEMORY_SEGMENT_KDUMP] = "kdump",
+		[DRGN_MEMORY_SEGMENT_OTHER] = "other",
+	};
+	PyObject *dict, *segment_dict;
+	uint64_t lookups;
+	size_t i;
+
+	lookups = stats->cache_hits + stats->cache_misses;
+	dict = Py_BuildValue("{sKsKsd}",
+			     "cache_hits",
+			     (unsigned long long)stats->cache_hits,
+			     "cache_misses",
+			     (unsigned long long)stats->cache_misses,
+			     "cache_hit_ratio",
+			     lookups ? (double)stats->cache_hits / lookups : 0.0);
+	if (!dict)
+		return NULL;
+	for (i = 0; i < DRGN_NUM_MEMORY_SEGMENT_KINDS; i++) {
+		segment_dict = memory_read_stats_to_dict(&stats->segments[i]);
+		if (!segment_dict)
+			goto err;
+		if (PyDict_SetItemString(dict, kind_names[i],
+					 segment_dict) == -1) {
+			Py_DECREF(segment_dict);
+			goto err;
+		}
+		Py_DECREF(segment_dict);
+	}
+	return dict;
+
+err:
+	Py_DECREF(dict);
+	return NULL;
+}
+
+static PyObject *Program_stats(Program *self)
+{
+	struct drgn_program_stats stats;
+	PyObject *memory, *ret;
+
+	drgn_program_stats(&self->prog, &stats);
+	memory = memory_stats_to_dict(&stats.memory);
+	if (!memory)
+		return NULL;
+	ret = Py_BuildValue("{sOs{sKsKsKsKsK}s{sKsKsK}s{sKsKsK}s{sKsKsKsKsKsKsK}s{sKsKsK}}",
+			    "memory", memory,
+			    "process_backend",
+			    "vm_readv_reads",
+			    (unsigned long long)stats.process_backend.vm_readv_reads,
+			    "vm_readv_calls",
+			    (unsigned long long)stats.process_backend.vm_readv_calls,
+			    "vm_readv_bytes",
+			    (unsigned long long)stats.process_backend.vm_readv_bytes,
+			    "proc_mem_reads",
+			    (unsigned long long)stats.process_backend.proc_mem_reads,
+			    "proc_mem_bytes",
+			    (unsigned long long)stats.process_backend.proc_mem_bytes,
+			    "type_finders",
+			    "hits", (unsigned long long)stats.type_finders.hits,
+			    "misses",
+			    (unsigned long long)stats.type_finders.misses,
+			    "ns", (unsigned long long)stats.type_finders.ns,
+			    "object_finders",
+			    "hits", (unsigned long long)stats.object_finders.hits,
+			    "misses",
+			    (unsigned long long)stats.object_finders.misses,
+			    "ns", (unsigned long long)stats.object_finders.ns,
+			    "dwarf",
+			    "dies_parsed",
+			    (unsigned long long)stats.dwarf.dies_parsed,
+			    "cache_hits",
+			    (unsigned long long)stats.dwarf.cache_hits,
+			    "ns", (unsigned long long)stats.dwarf.ns,
+			    "index_cache_hits",
+			    (unsigned long long)stats.dwarf.index_cache_hits,
+			    "index_cache_misses",
+			    (unsigned long long)stats.dwarf.index_cache_misses,
+			    "index_dies",
+			    (unsigned long long)stats.dwarf.index_dies,
+			    "index_bytes",
+			    (unsigned long long)stats.dwarf.index_bytes,
+			    "stack_traces",
+			    "unwinds",
+			    (unsigned long long)stats.stack_traces.unwinds,
+			    "frames",
+			    (unsigned long long)stats.stack_traces.frames,
+			    "ns", (unsigned long long)stats.stack_traces.ns);
+	Py_DECREF(memory);
+	return ret;
+}
+
+static PyObject *Program_reset_stats(Program *self)
+{
+	drgn_program_reset_stats(&self->prog);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_start_recording(Program *self)
+{
+	drgn_program_start_recording(&self->prog);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_stop_recording(Program *self)
+{
+	drgn_program_stop_recording(&self->prog);
+	Py_RETURN_NONE;
+}
+
+static PyObject *Program_write_core(Program *self, PyObject *args,
+				    PyObject *kwds)
+{
+	static char *keywords[] = {"path", NULL};
+	struct drgn_error *err;
+	struct path_arg path = {};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O&:write_core", keywords,
+					 path_converter, &path))
+		return NULL;
+
+	err = drgn_program_write_core(&self->prog, path.path);
+	path_cleanup(&path);
+	if (err)
+		return set_drgn_error(err);
+	Py_RETURN_NONE;
 }
 
 static PyObject *Program_find_type(Program *self, PyObject *args, PyObject *kwds)
@@ -830,15 +1489,59 @@ static PyMethodDef Program_methods[] = {
 	 drgn_Program_set_kernel_DOC},
 	{"set_pid", (PyCFunction)Program_set_pid, METH_VARARGS | METH_KEYWORDS,
 	 drgn_Program_set_pid_DOC},
+	{"set_remote", (PyCFunction)Program_set_remote,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_set_remote_DOC},
 	{"load_debug_info", (PyCFunction)Program_load_debug_info,
 	 METH_VARARGS | METH_KEYWORDS, drgn_Program_load_debug_info_DOC},
 	{"load_default_debug_info",
 	 (PyCFunction)Program_load_default_debug_info, METH_NOARGS,
 	 drgn_Program_load_default_debug_info_DOC},
+	{"set_debug_info_cache", (PyCFunction)Program_set_debug_info_cache,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_set_debug_info_cache_DOC},
+	{"set_lazy_module_indexing",
+	 (PyCFunction)Program_set_lazy_module_indexing,
+	 METH_VARARGS | METH_KEYWORDS,
+	 drgn_Program_set_lazy_module_indexing_DOC},
+	{"modules", (PyCFunction)Program_modules, METH_NOARGS,
+	 drgn_Program_modules_DOC},
+	{"search", (PyCFunction)Program_search, METH_VARARGS | METH_KEYWORDS,
+	 drgn_Program_search_DOC},
+	{"types", (PyCFunction)Program_types, METH_VARARGS | METH_KEYWORDS,
+	 drgn_Program_types_DOC},
+	{"functions", (PyCFunction)Program_functions, METH_NOARGS,
+	 drgn_Program_functions_DOC},
 	{"__getitem__", (PyCFunction)Program_subscript, METH_O | METH_COEXIST,
 	 drgn_Program___getitem___DOC},
 	{"read", (PyCFunction)Program_read, METH_VARARGS | METH_KEYWORDS,
 	 drgn_Program_read_DOC},
+	{"read_into", (PyCFunction)Program_read_into,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_read_into_DOC},
+	{"read_memoryview", (PyCFunction)Program_read_memoryview,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_read_memoryview_DOC},
+	{"translate", (PyCFunction)Program_translate,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_translate_DOC},
+	{"read_sparse", (PyCFunction)Program_read_sparse,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_read_sparse_DOC},
+	{"read_many", (PyCFunction)Program_read_many,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_read_many_DOC},
+	{"set_memory_cache", (PyCFunction)Program_set_memory_cache,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_set_memory_cache_DOC},
+	{"set_memory_readahead", (PyCFunction)Program_set_memory_readahead,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_set_memory_readahead_DOC},
+	{"invalidate_cache", (PyCFunction)Program_invalidate_cache,
+	 METH_NOARGS, drgn_Program_invalidate_cache_DOC},
+	{"snapshot", (PyCFunction)Program_snapshot, METH_NOARGS,
+	 drgn_Program_snapshot_DOC},
+	{"stats", (PyCFunction)Program_stats, METH_NOARGS,
+	 drgn_Program_stats_DOC},
+	{"reset_stats", (PyCFunction)Program_reset_stats, METH_NOARGS,
+	 drgn_Program_reset_stats_DOC},
+	{"start_recording", (PyCFunction)Program_start_recording, METH_NOARGS,
+	 drgn_Program_start_recording_DOC},
+	{"stop_recording", (PyCFunction)Program_stop_recording, METH_NOARGS,
+	 drgn_Program_stop_recording_DOC},
+	{"write_core", (PyCFunction)Program_write_core,
+	 METH_VARARGS | METH_KEYWORDS, drgn_Program_write_core_DOC},
 	{"type", (PyCFunction)Program_find_type, METH_VARARGS | METH_KEYWORDS,
 	 drgn_Program_type_DOC},
 	{"pointer_type", (PyCFunction)Program_pointer_type,
@@ -930,6 +1633,165 @@ PyTypeObject Program_type = {
 	(newfunc)Program_new,			/* tp_new */
 };
 
+static void ProgramMemory_dealloc(ProgramMemory *self)
+{
+	Py_XDECREF(self->prog);
+	Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static int ProgramMemory_getbuffer(ProgramMemory *self, Py_buffer *view,
+				   int flags)
+{
+	return PyBuffer_FillInfo(view, (PyObject *)self, (void *)self->buf,
+				 self->len, 1, flags);
+}
+
+static PyBufferProcs ProgramMemory_as_buffer = {
+	(getbufferproc)ProgramMemory_getbuffer,	/* bf_getbuffer */
+	NULL,					/* bf_releasebuffer */
+};
+
+/*
+ * Memory of a program which is exported with the buffer protocol so that
+ * memoryviews of it keep the program alive.
+ */
+PyTypeObject ProgramMemory_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"_drgn._ProgramMemory",			/* tp_name */
+	sizeof(ProgramMemory),			/* tp_basicsize */
+	0,					/* tp_itemsize */
+	(destructor)ProgramMemory_dealloc,	/* tp_dealloc */
+	NULL,					/* tp_print */
+	NULL,					/* tp_getattr */
+	NULL,					/* tp_setattr */
+	NULL,					/* tp_as_async */
+	NULL,					/* tp_repr */
+	NULL,					/* tp_as_number */
+	NULL,					/* tp_as_sequence */
+	NULL,					/* tp_as_mapping */
+	NULL,					/* tp_hash  */
+	NULL,					/* tp_call */
+	NULL,					/* tp_str */
+	NULL,					/* tp_getattro */
+	NULL,					/* tp_setattro */
+	&ProgramMemory_as_buffer,		/* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT,			/* tp_flags */
+};
+
+static void TypeIterator_dealloc(TypeIterator *self)
+{
+	drgn_type_iterator_destroy(self->it);
+	Py_XDECREF(self->prog);
+	Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *TypeIterator_next(TypeIterator *self)
+{
+	struct drgn_error *err;
+	struct drgn_qualified_type qualified_type;
+	bool clear;
+
+	clear = set_drgn_in_python();
+	err = drgn_type_iterator_next(self->it, &qualified_type);
+	if (clear)
+		clear_drgn_in_python();
+	if (err) {
+		if (err->code == DRGN_ERROR_STOP)
+			return NULL;
+		return set_drgn_error(err);
+	}
+	return DrgnType_wrap(qualified_type, (PyObject *)self->prog);
+}
+
+PyTypeObject TypeIterator_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"_drgn._TypeIterator",			/* tp_name */
+	sizeof(TypeIterator),			/* tp_basicsize */
+	0,					/* tp_itemsize */
+	(destructor)TypeIterator_dealloc,	/* tp_dealloc */
+	NULL,					/* tp_print */
+	NULL,					/* tp_getattr */
+	NULL,					/* tp_setattr */
+	NULL,					/* tp_as_async */
+	NULL,					/* tp_repr */
+	NULL,					/* tp_as_number */
+	NULL,					/* tp_as_sequence */
+	NULL,					/* tp_as_mapping */
+	NULL,					/* tp_hash  */
+	NULL,					/* tp_call */
+	NULL,					/* tp_str */
+	NULL,					/* tp_getattro */
+	NULL,					/* tp_setattro */
+	NULL,					/* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT,			/* tp_flags */
+	NULL,					/* tp_doc */
+	NULL,					/* tp_traverse */
+	NULL,					/* tp_clear */
+	NULL,					/* tp_richcompare */
+	0,					/* tp_weaklistoffset */
+	PyObject_SelfIter,			/* tp_iter */
+	(iternextfunc)TypeIterator_next,	/* tp_iternext */
+};
+
+static void FunctionIterator_dealloc(FunctionIterator *self)
+{
+	drgn_function_iterator_destroy(self->it);
+	Py_XDECREF(self->prog);
+	Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static DrgnObject *FunctionIterator_next(FunctionIterator *self)
+{
+	struct drgn_error *err;
+	DrgnObject *ret;
+	bool clear;
+
+	ret = DrgnObject_alloc(self->prog);
+	if (!ret)
+		return NULL;
+	clear = set_drgn_in_python();
+	err = drgn_function_iterator_next(self->it, &ret->obj);
+	if (clear)
+		clear_drgn_in_python();
+	if (err) {
+		Py_DECREF(ret);
+		if (err->code == DRGN_ERROR_STOP)
+			return NULL;
+		return set_drgn_error(err);
+	}
+	return ret;
+}
+
+PyTypeObject FunctionIterator_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"_drgn._FunctionIterator",		/* tp_name */
+	sizeof(FunctionIterator),		/* tp_basicsize */
+	0,					/* tp_itemsize */
+	(destructor)FunctionIterator_dealloc,	/* tp_dealloc */
+	NULL,					/* tp_print */
+	NULL,					/* tp_getattr */
+	NULL,					/* tp_setattr */
+	NULL,					/* tp_as_async */
+	NULL,					/* tp_repr */
+	NULL,					/* tp_as_number */
+	NULL,					/* tp_as_sequence */
+	NULL,					/* tp_as_mapping */
+	NULL,					/* tp_hash  */
+	NULL,					/* tp_call */
+	NULL,					/* tp_str */
+	NULL,					/* tp_getattro */
+	NULL,					/* tp_setattro */
+	NULL,					/* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT,			/* tp_flags */
+	NULL,					/* tp_doc */
+	NULL,					/* tp_traverse */
+	NULL,					/* tp_clear */
+	NULL,					/* tp_richcompare */
+	0,					/* tp_weaklistoffset */
+	PyObject_SelfIter,			/* tp_iter */
+	(iternextfunc)FunctionIterator_next,	/* tp_iternext */
+};
+
 Program *program_from_core_dump(PyObject *self, PyObject *args, PyObject *kwds)
 {
 	static char *keywords[] = {"path", NULL};
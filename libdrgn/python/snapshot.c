@@ -0,0 +1,111 @@
+// Copyright 2019 - Omar Sandoval
+// SPDX-License-Identifier: GPL-3.0+
+
+#include "drgnpy.h"
+
+static void Snapshot_dealloc(Snapshot *self)
+{
+	if (self->active)
+		drgn_program_end_snapshot(&self->prog->prog);
+	Py_XDECREF(self->prog);
+	Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject *Snapshot_enter(Snapshot *self)
+{
+	if (!self->active) {
+		drgn_program_begin_snapshot(&self->prog->prog);
+		self->active = true;
+	}
+	Py_INCREF(self);
+	return (PyObject *)self;
+}
+
+static PyObject *Snapshot_exit(Snapshot *self, PyObject *args)
+{
+	if (self->active) {
+		drgn_program_end_snapshot(&self->prog->prog);
+		self->active = false;
+	}
+	Py_RETURN_NONE;
+}
+
+static PyObject *Snapshot_save(Snapshot *self, PyObject *args, PyObject *kwds)
+{
+	static char *keywords[] = {"path", NULL};
+	struct drgn_error *err;
+	struct path_arg path = {};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O&:save", keywords,
+					 path_converter, &path))
+		return NULL;
+
+	if (!self->active) {
+		PyErr_SetString(PyExc_ValueError, "snapshot is not active");
+		goto err;
+	}
+
+	err = drgn_program_save_snapshot(&self->prog->prog, path.path);
+	if (err) {
+		set_drgn_error(err);
+		goto err;
+	}
+	path_cleanup(&path);
+	Py_RETURN_NONE;
+
+err:
+	path_cleanup(&path);
+	return NULL;
+}
+
+static PyObject *Snapshot_get_prog(Snapshot *self, void *arg)
+{
+	Py_INCREF(self->prog);
+	return (PyObject *)self->prog;
+}
+
+static PyMethodDef Snapshot_methods[] = {
+	{"__enter__", (PyCFunction)Snapshot_enter, METH_NOARGS},
+	{"__exit__", (PyCFunction)Snapshot_exit, METH_VARARGS},
+	{"save", (PyCFunction)Snapshot_save, METH_VARARGS | METH_KEYWORDS,
+	 drgn_Snapshot_save_DOC},
+	{},
+};
+
+static PyGetSetDef Snapshot_getset[] = {
+	{"prog", (getter)Snapshot_get_prog, NULL, drgn_Snapshot_prog_DOC},
+	{},
+};
+
+PyTypeObject Snapshot_type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	"_drgn.Snapshot",			/* tp_name */
+	sizeof(Snapshot),			/* tp_basicsize */
+	0,					/* tp_itemsize */
+	(destructor)Snapshot_dealloc,		/* tp_dealloc */
+	NULL,					/* tp_print */
+	NULL,					/* tp_getattr */
+	NULL,					/* tp_setattr */
+	NULL,					/* tp_as_async */
+	NULL,					/* tp_repr */
+	NULL,					/* tp_as_number */
+	NULL,					/* tp_as_sequence */
+	NULL,					/* tp_as_mapping */
+	NULL,					/* tp_hash  */
+	NULL,					/* tp_call */
+	NULL,					/* tp_str */
+	NULL,					/* tp_getattro */
+	NULL,					/* tp_setattro */
+	NULL,					/* tp_as_buffer */
+	Py_TPFLAGS_DEFAULT,			/* tp_flags */
+	drgn_Snapshot_DOC,			/* tp_doc */
+	NULL,					/* tp_traverse */
+	NULL,					/* tp_clear */
+	NULL,					/* tp_richcompare */
+	0,					/* tp_weaklistoffset */
+	NULL,					/* tp_iter */
+	NULL,					/* tp_iternext */
+	Snapshot_methods,			/* tp_methods */
+	NULL,					/* tp_members */
+	Snapshot_getset,			/* tp_getset */
+};
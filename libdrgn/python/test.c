@@ -9,10 +9,17 @@
  * libelf/libdw helpers. These wrappers are accessed via ctypes.
  */
 
+#include <errno.h>
+#include <fcntl.h>
+#include <string.h>
+#include <unistd.h>
+
 #include "drgnpy.h"
 
+#include "../dwarf_index.h"
 #include "../internal.h"
 #include "../lexer.h"
+#include "../program.h"
 #include "../serialize.h"
 
 DRGNPY_PUBLIC void drgn_test_lexer_init(struct drgn_lexer *lexer,
@@ -91,3 +98,71 @@ DRGNPY_PUBLIC uint64_t drgn_test_deserialize_bits(const void *buf,
 {
 	return deserialize_bits(buf, bit_offset, bit_size, little_endian);
 }
+
+/*
+ * Load debugging information from a file mapped at [start, end) like the Linux
+ * kernel does, optionally deferring indexing like for a kernel module (see
+ * drgn_program_set_lazy_module_indexing()). This can only be used on a program
+ * that doesn't have any other debugging information loaded.
+ */
+DRGNPY_PUBLIC struct drgn_error *
+drgn_test_program_load_module(Program *prog, const char *path, uint64_t start,
+			      uint64_t end, bool deferred)
+{
+	struct drgn_error *err;
+	struct drgn_dwfl_module_userdata *userdata;
+	Dwfl_Module *module;
+	void **userdatap;
+
+	if (!prog->prog._dwfl) {
+		prog->prog._dwfl = dwfl_begin(&drgn_dwfl_callbacks);
+		if (!prog->prog._dwfl)
+			return drgn_error_libdwfl();
+	}
+
+	userdata = drgn_dwfl_module_userdata_create();
+	if (!userdata)
+		return &drgn_enomem;
+	userdata->path = strdup(path);
+	if (!userdata->path) {
+		err = &drgn_enomem;
+		goto err;
+	}
+	userdata->fd = open(path, O_RDONLY);
+	if (userdata->fd == -1) {
+		err = drgn_error_create_os("open", errno, path);
+		goto err;
+	}
+	userdata->elf = elf_begin(userdata->fd, ELF_C_READ_MMAP_PRIVATE, NULL);
+	if (!userdata->elf) {
+		err = drgn_error_libelf();
+		goto err;
+	}
+	userdata->deferred = deferred;
+
+	dwfl_report_begin_add(prog->prog._dwfl);
+	module = dwfl_report_module(prog->prog._dwfl, path, start, end);
+	if (!module) {
+		dwfl_report_end(prog->prog._dwfl, NULL, NULL);
+		err = drgn_error_libdwfl();
+		goto err;
+	}
+	dwfl_module_info(module, &userdatap, NULL, NULL, NULL, NULL, NULL,
+			 NULL);
+	if (*userdatap)
+		drgn_dwfl_module_userdata_destroy(userdata);
+	else
+		*userdatap = userdata;
+	dwfl_report_end(prog->prog._dwfl, NULL, NULL);
+	if (deferred)
+		prog->prog.has_deferred_modules = true;
+
+	err = drgn_program_update_dwarf_index(&prog->prog);
+	if (err)
+		drgn_remove_unindexed_dwfl_modules(prog->prog._dwfl);
+	return err;
+
+err:
+	drgn_dwfl_module_userdata_destroy(userdata);
+	return err;
+}
@@ -178,6 +178,26 @@ DEFINE_READ(16)
 DEFINE_READ(32)
 DEFINE_READ(64)
 
+/**
+ * Parse an unsigned 24-bit integer in memory into a @c size_t, checking bounds.
+ *
+ * @sa read_uN().
+ */
+static inline bool read_u24_into_size_t(const char **ptr, const char *end,
+					bool bswap, size_t *ret)
+{
+	const uint8_t *p = (const uint8_t *)*ptr;
+
+	if (!read_in_bounds(*ptr, end, 3))
+		return false;
+	if (bswap == (__BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__))
+		*ret = ((size_t)p[0] << 16) | ((size_t)p[1] << 8) | p[2];
+	else
+		*ret = p[0] | ((size_t)p[1] << 8) | ((size_t)p[2] << 16);
+	*ptr += 3;
+	return true;
+}
+
 static inline bool read_be32(const char **ptr, const char *end, uint32_t *ret)
 {
 	return read_u32(ptr, end, __BYTE_ORDER__ != __ORDER_BIG_ENDIAN__,
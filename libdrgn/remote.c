@@ -0,0 +1,276 @@
+// Copyright 2019 - Omar Sandoval
+// SPDX-License-Identifier: GPL-3.0+
+
+#include <endian.h>
+#include <errno.h>
+#include <inttypes.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+
+#include "internal.h"
+#include "remote.h"
+
+#define REMOTE_MAGIC "DRGNMEM"
+#define REMOTE_HELLO_SIZE 28
+#define REMOTE_REQUEST_SIZE 16
+#define REMOTE_RESPONSE_SIZE 8
+#define REMOTE_FLAG_IS_LIVE 0x1
+#define REMOTE_REQUEST_PHYSICAL 0x1
+#define REMOTE_STATUS_OK 0
+#define REMOTE_STATUS_FAULT 1
+/* Sanity limit on the size of the VMCOREINFO in the hello message. */
+#define REMOTE_MAX_VMCOREINFO_SIZE (1024 * 1024)
+
+static struct drgn_error *remote_send_all(struct drgn_memory_remote *remote,
+					  const void *buf, size_t count)
+{
+	const char *p = buf;
+
+	while (count) {
+		ssize_t ret;
+
+		ret = send(remote->fd, p, count, MSG_NOSIGNAL);
+		if (ret == -1) {
+			if (errno == EINTR)
+				continue;
+			remote->broken = true;
+			return drgn_error_create_os("send", errno, NULL);
+		}
+		p += ret;
+		count -= ret;
+	}
+	return NULL;
+}
+
+static struct drgn_error *remote_recv_all(struct drgn_memory_remote *remote,
+					  void *buf, size_t count)
+{
+	char *p = buf;
+
+	while (count) {
+		ssize_t ret;
+
+		ret = recv(remote->fd, p, count, 0);
+		if (ret == -1) {
+			if (errno == EINTR)
+				continue;
+			remote->broken = true;
+			return drgn_error_create_os("recv", errno, NULL);
+		} else if (ret == 0) {
+			remote->broken = true;
+			return drgn_error_create(DRGN_ERROR_OTHER,
+						 "remote memory server closed the connection");
+		}
+		p += ret;
+		count -= ret;
+	}
+	return NULL;
+}
+
+static struct drgn_error *remote_recv_hello(struct drgn_memory_remote *remote)
+{
+	struct drgn_error *err;
+	char buf[REMOTE_HELLO_SIZE];
+	uint32_t fields[5];
+
+	err = remote_recv_all(remote, buf, sizeof(buf));
+	if (err)
+		return err;
+	if (memcmp(buf, REMOTE_MAGIC, sizeof(REMOTE_MAGIC)) != 0) {
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "not a remote memory server");
+	}
+	memcpy(fields, buf + 8, sizeof(fields));
+	if (le32toh(fields[0]) != DRGN_REMOTE_VERSION) {
+		return drgn_error_format(DRGN_ERROR_OTHER,
+					 "unsupported remote memory protocol version %" PRIu32,
+					 le32toh(fields[0]));
+	}
+	if (le32toh(fields[1]) >= DRGN_NUM_ARCH ||
+	    (le32toh(fields[2]) & ~DRGN_ALL_PLATFORM_FLAGS)) {
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "remote memory server sent invalid platform");
+	}
+	remote->arch = le32toh(fields[1]);
+	remote->platform_flags = le32toh(fields[2]);
+	remote->is_live = le32toh(fields[3]) & REMOTE_FLAG_IS_LIVE;
+	remote->vmcoreinfo_size = le32toh(fields[4]);
+	if (!remote->vmcoreinfo_size)
+		return NULL;
+	if (remote->vmcoreinfo_size > REMOTE_MAX_VMCOREINFO_SIZE) {
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "remote memory server sent invalid VMCOREINFO size");
+	}
+	remote->vmcoreinfo = malloc(remote->vmcoreinfo_size);
+	if (!remote->vmcoreinfo)
+		return &drgn_enomem;
+	return remote_recv_all(remote, remote->vmcoreinfo,
+			       remote->vmcoreinfo_size);
+}
+
+struct drgn_error *drgn_memory_remote_connect(const char *path,
+					      struct drgn_memory_remote **ret)
+{
+	struct drgn_error *err;
+	struct drgn_memory_remote *remote;
+	struct sockaddr_un addr = { .sun_family = AF_UNIX };
+
+	if (strlen(path) >= sizeof(addr.sun_path)) {
+		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
+					 "socket path is too long");
+	}
+	strcpy(addr.sun_path, path);
+
+	remote = calloc(1, sizeof(*remote));
+	if (!remote)
+		return &drgn_enomem;
+	remote->fd = socket(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0);
+	if (remote->fd == -1) {
+		err = drgn_error_create_os("socket", errno, NULL);
+		goto err;
+	}
+	while (connect(remote->fd, (struct sockaddr *)&addr,
+		       sizeof(addr)) == -1) {
+		if (errno != EINTR) {
+			err = drgn_error_create_os("connect", errno, path);
+			goto err;
+		}
+	}
+	err = remote_recv_hello(remote);
+	if (err)
+		goto err;
+	*ret = remote;
+	return NULL;
+
+err:
+	drgn_memory_remote_destroy(remote);
+	return err;
+}
+
+void drgn_memory_remote_destroy(struct drgn_memory_remote *remote)
+{
+	if (remote) {
+		if (remote->fd != -1)
+			close(remote->fd);
+		free(remote->vmcoreinfo);
+		free(remote);
+	}
+}
+
+struct drgn_error *
+drgn_memory_remote_read_vec(struct drgn_memory_remote *remote,
+			    struct drgn_memory_read_request **reqs, size_t n,
+			    bool physical)
+{
+	struct drgn_error *err;
+	char requests[DRGN_REMOTE_MAX_OUTSTANDING][REMOTE_REQUEST_SIZE];
+	size_t send_i = 0, recv_i = 0, outstanding = 0;
+	size_t send_offset = 0, recv_offset = 0;
+
+	if (remote->broken) {
+		return drgn_error_create(DRGN_ERROR_OTHER,
+					 "connection to remote memory server was lost");
+	}
+
+	/*
+	 * Keep the window of outstanding requests full, and receive the answer
+	 * to the oldest request each time around.
+	 */
+	for (;;) {
+		struct drgn_memory_read_request *req;
+		size_t num_requests = 0, size;
+		char response[REMOTE_RESPONSE_SIZE];
+		uint32_t status, response_size;
+
+		while (outstanding + num_requests <
+		       DRGN_REMOTE_MAX_OUTSTANDING && send_i < n) {
+			uint64_t address;
+			uint32_t size32, flags;
+
+			req = reqs[send_i];
+			if (send_offset >= req->count) {
+				send_i++;
+				send_offset = 0;
+				continue;
+			}
+			size = min(req->count - send_offset,
+				   (size_t)DRGN_REMOTE_MAX_REQUEST_SIZE);
+			address = htole64(req->address + send_offset);
+			size32 = htole32(size);
+			flags = htole32(physical ? REMOTE_REQUEST_PHYSICAL : 0);
+			memcpy(requests[num_requests], &address, 8);
+			memcpy(requests[num_requests] + 8, &size32, 4);
+			memcpy(requests[num_requests] + 12, &flags, 4);
+			num_requests++;
+			send_offset += size;
+		}
+		if (num_requests) {
+			err = remote_send_all(remote, requests,
+					      num_requests * REMOTE_REQUEST_SIZE);
+			if (err)
+				return err;
+			outstanding += num_requests;
+		}
+		if (!outstanding)
+			return NULL;
+
+		while (recv_offset >= reqs[recv_i]->count) {
+			recv_i++;
+			recv_offset = 0;
+		}
+		req = reqs[recv_i];
+		size = min(req->count - recv_offset,
+			   (size_t)DRGN_REMOTE_MAX_REQUEST_SIZE);
+		err = remote_recv_all(remote, response, sizeof(response));
+		if (err)
+			return err;
+		memcpy(&status, response, 4);
+		memcpy(&response_size, response + 4, 4);
+		status = le32toh(status);
+		response_size = le32toh(response_size);
+		if (status == REMOTE_STATUS_OK && response_size == size) {
+			err = remote_recv_all(remote,
+					      (char *)req->buf + recv_offset,
+					      size);
+			if (err)
+				return err;
+		} else if (status == REMOTE_STATUS_FAULT &&
+			   response_size == 0) {
+			if (!req->err) {
+				req->err = drgn_error_format(DRGN_ERROR_FAULT,
+							     "could not read memory at 0x%" PRIx64,
+							     req->address +
+							     recv_offset);
+			}
+		} else {
+			remote->broken = true;
+			return drgn_error_create(DRGN_ERROR_OTHER,
+						 "invalid response from remote memory server");
+		}
+		recv_offset += size;
+		outstanding--;
+	}
+}
+
+struct drgn_error *drgn_read_memory_remote(void *buf, uint64_t address,
+					   size_t count, uint64_t offset,
+					   void *arg, bool physical)
+{
+	struct drgn_error *err;
+	struct drgn_memory_read_request req = {
+		.buf = buf,
+		.address = address,
+		.count = count,
+	};
+	struct drgn_memory_read_request *reqp = &req;
+
+	err = drgn_memory_remote_read_vec(arg, &reqp, 1, physical);
+	if (err) {
+		drgn_error_destroy(req.err);
+		return err;
+	}
+	return req.err;
+}
@@ -0,0 +1,112 @@
+// Copyright 2019 - Omar Sandoval
+// SPDX-License-Identifier: GPL-3.0+
+
+/**
+ * @file
+ *
+ * Remote memory over a Unix socket.
+ *
+ * See @ref RemoteMemory.
+ */
+
+#ifndef DRGN_REMOTE_H
+#define DRGN_REMOTE_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include "drgn.h"
+
+/**
+ * @ingroup Internals
+ *
+ * @defgroup RemoteMemory Remote memory
+ *
+ * Reading memory from a server over a Unix socket.
+ *
+ * The protocol is a stream of fixed-size little-endian messages:
+ *
+ * 1. When a client connects, the server sends a hello message: the 8-byte
+ *    magic <tt>"DRGNMEM\0"</tt>, then the protocol version (1), the @ref
+ *    drgn_architecture, the @ref drgn_platform_flags, flags (bit 0 is set if
+ *    the memory is of a running program), and the size of the Linux kernel
+ *    VMCOREINFO (zero if the memory is not of the Linux kernel), each as a
+ *    32-bit integer, followed by the VMCOREINFO itself.
+ * 2. The client sends read requests, each consisting of a 64-bit address, a
+ *    32-bit size (at most @ref DRGN_REMOTE_MAX_REQUEST_SIZE), and 32-bit flags
+ *    (bit 0 is set if the address is physical).
+ * 3. The server answers each request in order with a 32-bit status (0 if the
+ *    memory was read, 1 if any of it could not be read) and a 32-bit size,
+ *    followed by that many bytes of memory. The size is the requested size if
+ *    the status is 0 and zero otherwise.
+ *
+ * The client doesn't wait for the answer to a request before sending the next
+ * one; up to @ref DRGN_REMOTE_MAX_OUTSTANDING requests are in flight at once,
+ * so a large read or a batch of reads only takes about one round trip.
+ *
+ * @{
+ */
+
+/** Protocol version spoken by this client. */
+#define DRGN_REMOTE_VERSION 1
+/** Maximum size of a single read request. Larger reads are split. */
+#define DRGN_REMOTE_MAX_REQUEST_SIZE (64 * 1024)
+/** Maximum number of requests sent before their answers are received. */
+#define DRGN_REMOTE_MAX_OUTSTANDING 64
+
+/** Connection to a remote memory server. */
+struct drgn_memory_remote {
+	/** Socket file descriptor. */
+	int fd;
+	/**
+	 * Whether the connection is unusable because it failed partway through
+	 * a message.
+	 */
+	bool broken;
+	/** Architecture of the program. */
+	enum drgn_architecture arch;
+	/** Platform flags of the program. */
+	enum drgn_platform_flags platform_flags;
+	/** Whether the program is running. */
+	bool is_live;
+	/** VMCOREINFO of the Linux kernel, or @c NULL. */
+	char *vmcoreinfo;
+	/** Size of @ref drgn_memory_remote::vmcoreinfo. */
+	size_t vmcoreinfo_size;
+};
+
+/**
+ * Connect to a remote memory server and receive its hello message.
+ *
+ * @param[in] path Path of the server's Unix socket.
+ * @param[out] ret Returned connection. It must be freed with @ref
+ * drgn_memory_remote_destroy().
+ * @return @c NULL on success, non-@c NULL on error.
+ */
+struct drgn_error *drgn_memory_remote_connect(const char *path,
+					      struct drgn_memory_remote **ret);
+
+/** Close and free a @ref drgn_memory_remote. */
+void drgn_memory_remote_destroy(struct drgn_memory_remote *remote);
+
+/** @ref drgn_memory_read_fn which reads from a remote memory server. */
+struct drgn_error *drgn_read_memory_remote(void *buf, uint64_t address,
+					   size_t count, uint64_t offset,
+					   void *arg, bool physical);
+
+/**
+ * Read a batch of requests from a remote memory server, pipelining all of
+ * them.
+ *
+ * @return @c NULL if every request was processed, even if some of them failed
+ * with a fault, in which case their @ref drgn_memory_read_request::err is set.
+ * Non-@c NULL if the connection failed.
+ */
+struct drgn_error *
+drgn_memory_remote_read_vec(struct drgn_memory_remote *remote,
+			    struct drgn_memory_read_request **reqs, size_t n,
+			    bool physical);
+
+/** @} */
+
+#endif /* DRGN_REMOTE_H */
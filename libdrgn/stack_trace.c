@@ -236,6 +236,7 @@ struct drgn_error *drgn_object_stack_trace(const struct drgn_object *obj,
 	Dwfl *dwfl;
 	struct drgn_stack_trace_builder builder;
 	struct drgn_stack_trace *trace;
+	uint64_t start;
 
 	if (!prog->has_platform) {
 		return drgn_error_create(DRGN_ERROR_INVALID_ARGUMENT,
@@ -262,6 +263,7 @@ struct drgn_error *drgn_object_stack_trace(const struct drgn_object *obj,
 		prog->attached_dwfl_state = true;
 	}
 
+	start = monotonic_ns();
 	builder.prog = prog;
 	builder.trace = malloc(sizeof(*builder.trace) +
 			       sizeof(builder.trace->frames[0]));
@@ -274,6 +276,9 @@ struct drgn_error *drgn_object_stack_trace(const struct drgn_object *obj,
 	dwfl_getthread_frames(dwfl, STACK_TRACE_OBJ_PID,
 			      drgn_append_stack_frame, &builder);
 	prog->stack_trace_obj = NULL;
+	prog->stack_trace_stats.unwinds++;
+	prog->stack_trace_stats.frames += builder.trace->num_frames;
+	prog->stack_trace_stats.ns += monotonic_ns() - start;
 	/*
 	 * The error reporting for dwfl_getthread_frames() is not great. The
 	 * documentation says that some of its unwinder implementations always
@@ -84,6 +84,9 @@ void drgn_type_index_init(struct drgn_type_index *tindex)
 	drgn_member_map_init(&tindex->members);
 	drgn_type_set_init(&tindex->members_cached);
 	tindex->word_size = 0;
+	memset(&tindex->stats, 0, sizeof(tindex->stats));
+	tindex->miss_fn = NULL;
+	tindex->miss_arg = NULL;
 }
 
 static void free_pointer_types(struct drgn_type_index *tindex)
@@ -236,11 +239,20 @@ drgn_type_index_find_parsed_internal(struct drgn_type_index *tindex,
 {
 	struct drgn_error *err;
 	struct drgn_type_finder *finder;
+	bool retry;
 
+again:
 	finder = tindex->finders;
 	while (finder) {
+		uint64_t start = monotonic_ns();
+
 		err = finder->fn(kind, name, name_len, filename, finder->arg,
 				 ret);
+		tindex->stats.ns += monotonic_ns() - start;
+		if (err)
+			tindex->stats.misses++;
+		else
+			tindex->stats.hits++;
 		if (!err) {
 			if (drgn_type_kind(ret->type) != kind) {
 				return drgn_error_create(DRGN_ERROR_TYPE,
@@ -252,6 +264,14 @@ drgn_type_index_find_parsed_internal(struct drgn_type_index *tindex,
 			return err;
 		finder = finder->next;
 	}
+	if (tindex->miss_fn) {
+		retry = false;
+		err = tindex->miss_fn(tindex->miss_arg, &retry);
+		if (err)
+			return err;
+		if (retry)
+			goto again;
+	}
 	return &drgn_not_found;
 }
 
@@ -141,6 +141,16 @@ struct drgn_type_index {
 	 * This is zero if it has not been set yet.
 	 */
 	uint8_t word_size;
+	/** Statistics about calls to @ref drgn_type_index::finders. */
+	struct drgn_finder_stats stats;
+	/**
+	 * Callback to call when none of @ref drgn_type_index::finders find a
+	 * type, or @c NULL. If it sets @p retry_ret to @c true, the finders are
+	 * tried again.
+	 */
+	struct drgn_error *(*miss_fn)(void *arg, bool *retry_ret);
+	/** Argument to pass to @ref drgn_type_index::miss_fn. */
+	void *miss_arg;
 };
 
 /**
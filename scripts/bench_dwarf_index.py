@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+# Report how much memory the DWARF name index uses per indexed DIE.
+#
+# With no arguments, this indexes the debugging information for the running
+# kernel (which requires root). Otherwise, it indexes the given files.
+
+import argparse
+import resource
+import time
+
+from drgn import MissingDebugInfoError, Program
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='benchmark the size of the DWARF index')
+    parser.add_argument(
+        'files', metavar='FILE', nargs='*',
+        help='files to index instead of the running kernel')
+    args = parser.parse_args()
+
+    prog = Program()
+    if not args.files:
+        prog.set_kernel()
+    start = time.perf_counter()
+    try:
+        if args.files:
+            prog.load_debug_info(args.files)
+        else:
+            prog.load_default_debug_info()
+    except MissingDebugInfoError as e:
+        print(e)
+    elapsed = time.perf_counter() - start
+
+    stats = prog.stats()['dwarf']
+    dies = stats['index_dies']
+    size = stats['index_bytes']
+    # ru_maxrss is in kilobytes on Linux.
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(f'indexed {dies} DIEs in {elapsed:.3f} s')
+    print(f'index size: {size} bytes '
+          f'({size / dies if dies else 0:.1f} bytes/DIE)')
+    print(f'max RSS: {maxrss} bytes '
+          f'({maxrss / dies if dies else 0:.1f} bytes/DIE)')
+
+
+if __name__ == '__main__':
+    main()
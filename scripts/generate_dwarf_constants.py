@@ -8,10 +8,12 @@ prefixes = [
     'DW_ATE',
     'DW_CHILDREN',
     'DW_FORM',
+    'DW_LNCT',
     'DW_LNE',
     'DW_LNS',
     'DW_OP',
     'DW_TAG',
+    'DW_UT',
 ]
 
 if __name__ == '__main__':
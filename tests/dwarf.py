@@ -178,6 +178,9 @@ class DW_AT(enum.IntEnum):
     GNU_addr_base = 0x2133
     GNU_pubnames = 0x2134
     GNU_pubtypes = 0x2135
+    GNU_numerator = 0x2303
+    GNU_denominator = 0x2304
+    GNU_bias = 0x2305
     hi_user = 0x3fff
 
     @classmethod
@@ -288,6 +291,23 @@ class DW_FORM(enum.IntEnum):
             return hex(value)
 
 
+class DW_LNCT(enum.IntEnum):
+    path = 0x1
+    directory_index = 0x2
+    timestamp = 0x3
+    size = 0x4
+    MD5 = 0x5
+    lo_user = 0x2000
+    hi_user = 0x3fff
+
+    @classmethod
+    def str(cls, value: int) -> Text:
+        try:
+            return f'DW_LNCT_{cls(value).name}'
+        except ValueError:
+            return hex(value)
+
+
 class DW_LNE(enum.IntEnum):
     end_sequence = 0x1
     set_address = 0x2
@@ -605,3 +625,21 @@ class DW_TAG(enum.IntEnum):
             return f'DW_TAG_{cls(value).name}'
         except ValueError:
             return hex(value)
+
+
+class DW_UT(enum.IntEnum):
+    compile = 0x1
+    type = 0x2
+    partial = 0x3
+    skeleton = 0x4
+    split_compile = 0x5
+    split_type = 0x6
+    lo_user = 0x80
+    hi_user = 0xff
+
+    @classmethod
+    def str(cls, value: int) -> Text:
+        try:
+            return f'DW_UT_{cls(value).name}'
+        except ValueError:
+            return hex(value)
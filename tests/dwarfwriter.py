@@ -1,9 +1,11 @@
 from collections import namedtuple
 import os.path
+import struct
+import zlib
 
-from tests.elf import ET, PT, SHT
+from tests.elf import ET, PT, SHF, SHT
 from tests.elfwriter import ElfSection, create_elf_file
-from tests.dwarf import DW_AT, DW_FORM, DW_TAG
+from tests.dwarf import DW_AT, DW_FORM, DW_LNCT, DW_TAG, DW_UT
 
 
 DwarfAttrib = namedtuple('DwarfAttrib', ['name', 'form', 'value'])
@@ -55,14 +57,24 @@ def _compile_debug_abbrev(cu_die):
     return buf
 
 
-def _compile_debug_info(cu_die, little_endian, bits):
+def _compile_debug_info(cu_die, little_endian, bits, version=4,
+                        unit_type=DW_UT.compile, dwo_id=None, strings=None):
+    # Strings with DW_FORM_strx1 or DW_FORM_GNU_str_index are appended to
+    # strings.
     buf = bytearray()
     byteorder = 'little' if little_endian else 'big'
 
     buf.extend(b'\0\0\0\0')  # unit_length
-    buf.extend((4).to_bytes(2, byteorder))  # version
-    buf.extend((0).to_bytes(4, byteorder))  # debug_abbrev_offset
-    buf.append(bits // 8)  # address_size
+    buf.extend(version.to_bytes(2, byteorder))  # version
+    if version >= 5:
+        buf.append(unit_type)  # unit_type
+        buf.append(bits // 8)  # address_size
+        buf.extend((0).to_bytes(4, byteorder))  # debug_abbrev_offset
+        if unit_type in (DW_UT.skeleton, DW_UT.split_compile):
+            buf.extend(dwo_id.to_bytes(8, byteorder))  # dwo_id
+    else:
+        buf.extend((0).to_bytes(4, byteorder))  # debug_abbrev_offset
+        buf.append(bits // 8)  # address_size
 
     die_offsets = []
     relocations = []
@@ -84,6 +96,8 @@ def _compile_debug_info(cu_die, little_endian, bits):
                 buf.extend(value.to_bytes(bits // 8, byteorder))
             elif attrib.form == DW_FORM.data1:
                 buf.append(value)
+            elif attrib.form == DW_FORM.data8:
+                buf.extend(value.to_bytes(8, byteorder))
             elif attrib.form == DW_FORM.udata:
                 _append_uleb128(buf, value)
             elif attrib.form == DW_FORM.sdata:
@@ -91,11 +105,17 @@ def _compile_debug_info(cu_die, little_endian, bits):
             elif attrib.form == DW_FORM.string:
                 buf.extend(value.encode())
                 buf.append(0)
+            elif attrib.form == DW_FORM.strx1:
+                buf.append(len(strings))
+                strings.append(value)
+            elif attrib.form == DW_FORM.GNU_str_index:
+                _append_uleb128(buf, len(strings))
+                strings.append(value)
             elif attrib.form == DW_FORM.ref4:
                 relocations.append((len(buf), value))
                 buf.extend(b'\0\0\0\0')
             elif attrib.form == DW_FORM.sec_offset:
-                buf.extend(b'\0\0\0\0')
+                buf.extend(value.to_bytes(4, byteorder))
             elif attrib.form == DW_FORM.flag_present:
                 pass
             elif attrib.form == DW_FORM.exprloc:
@@ -114,15 +134,20 @@ def _compile_debug_info(cu_die, little_endian, bits):
 
     for offset, index in relocations:
         buf[offset:offset + 4] = die_offsets[index].to_bytes(4, byteorder)
-    return buf
+    return buf, die_offsets
 
 
-def _compile_debug_line(cu_die, little_endian):
+def _compile_debug_line(cu_die, little_endian, version=4,
+                        comp_dir='/usr/src'):
     buf = bytearray()
     byteorder = 'little' if little_endian else 'big'
 
     buf.extend(b'\0\0\0\0')  # unit_length
-    buf.extend((4).to_bytes(2, byteorder))  # version
+    buf.extend(version.to_bytes(2, byteorder))  # version
+    if version >= 5:
+        buf.append(8)  # address_size
+        buf.append(0)  # segment_selector_size
+    header_length_offset = len(buf)
     buf.extend(b'\0\0\0\0')  # header_length
     buf.append(1)  # minimum_instruction_length
     buf.append(1)  # maximum_operations_per_instruction
@@ -132,61 +157,206 @@ def _compile_debug_line(cu_die, little_endian):
     buf.append(1)  # opcode_base
     # Don't need standard_opcode_length
 
-    def compile_include_directories(die):
+    directories = []
+    file_names = []
+    def aux(die):
         for attrib in die.attribs:
             if attrib.name != DW_AT.decl_file:
                 continue
-            dirname = os.path.dirname(attrib.value)
+            dirname, basename = os.path.split(attrib.value)
             if dirname:
-                buf.extend(dirname.encode('ascii'))
-                buf.append(0)
+                directories.append(dirname)
+                # Before DWARF 5, the compilation directory isn't in the
+                # directory table, so the indices are the same.
+                file_names.append((basename, len(directories)))
+            else:
+                file_names.append((basename, 0))
         if die.children:
             for child in die.children:
-                compile_include_directories(child)
-    compile_include_directories(cu_die)
-    buf.append(0)
+                aux(child)
+    aux(cu_die)
 
-    decl_file = 1
-    directory = 1
-    def compile_file_names(die):
-        nonlocal decl_file, directory
-        for attrib in die.attribs:
-            if attrib.name != DW_AT.decl_file:
-                continue
-            dirname, basename = os.path.split(attrib.value)
+    if version >= 5:
+        # The compilation directory and primary source file are entry 0.
+        directories.insert(0, comp_dir)
+        file_names.insert(0, ('main.c', 0))
+        buf.append(1)  # directory_entry_format_count
+        _append_uleb128(buf, DW_LNCT.path)
+        _append_uleb128(buf, DW_FORM.string)
+        _append_uleb128(buf, len(directories))  # directories_count
+        for directory in directories:
+            buf.extend(directory.encode('ascii'))
+            buf.append(0)
+        buf.append(2)  # file_name_entry_format_count
+        _append_uleb128(buf, DW_LNCT.path)
+        _append_uleb128(buf, DW_FORM.string)
+        _append_uleb128(buf, DW_LNCT.directory_index)
+        _append_uleb128(buf, DW_FORM.udata)
+        _append_uleb128(buf, len(file_names))  # file_names_count
+        for basename, directory in file_names:
             buf.extend(basename.encode('ascii'))
             buf.append(0)
-            # directory index
-            if dirname:
-                _append_uleb128(buf, directory)
-                directory += 1
-            else:
-                _append_uleb128(buf, 0)
+            _append_uleb128(buf, directory)
+    else:
+        for directory in directories:
+            buf.extend(directory.encode('ascii'))
+            buf.append(0)
+        buf.append(0)
+        for basename, directory in file_names:
+            buf.extend(basename.encode('ascii'))
+            buf.append(0)
+            _append_uleb128(buf, directory)
             _append_uleb128(buf, 0)  # mtime
             _append_uleb128(buf, 0)  # size
-        if die.children:
-            for child in die.children:
-                compile_file_names(child)
-    compile_file_names(cu_die)
-    buf.append(0)
+        buf.append(0)
+
+    unit_length = len(buf) - 4
+    buf[:4] = unit_length.to_bytes(4, byteorder)
+    header_length = len(buf) - header_length_offset - 4
+    buf[header_length_offset:header_length_offset + 4] = (
+        header_length.to_bytes(4, byteorder))
+    return buf
+
+
+def _compile_debug_str_offsets(strings, debug_str, little_endian,
+                               version=5):
+    # Strings are appended to debug_str. Before DWARF 5, there is no header.
+    byteorder = 'little' if little_endian else 'big'
+    buf = bytearray()
+    if version >= 5:
+        unit_length = 4 + 4 * len(strings)
+        buf.extend(unit_length.to_bytes(4, byteorder))  # unit_length
+        buf.extend((5).to_bytes(2, byteorder))  # version
+        buf.extend((0).to_bytes(2, byteorder))  # padding
+    for string in strings:
+        buf.extend(len(debug_str).to_bytes(4, byteorder))
+        debug_str.extend(string.encode())
+        debug_str.append(0)
+    return buf
+
+
+def _compile_debug_names(dies, die_offsets, indexed, debug_str,
+                         little_endian):
+    # A name index covering the one CU with entries for the given top-level
+    # DIEs. An entry may also be given as a (name, tag, DIE offset) tuple.
+    # Names are appended to debug_str.
+    byteorder = 'little' if little_endian else 'big'
+    names = []
+    for i in indexed:
+        if isinstance(i, tuple):
+            names.append(i)
+            continue
+        die = dies[i]
+        name = next(attrib.value for attrib in die.attribs
+                    if attrib.name == DW_AT.name)
+        names.append((name, die.tag, die_offsets[i]))
+
+    abbrev_codes = {}
+    abbrevs = bytearray()
+    for name, tag, die_offset in names:
+        if tag not in abbrev_codes:
+            abbrev_codes[tag] = len(abbrev_codes) + 1
+            _append_uleb128(abbrevs, abbrev_codes[tag])
+            _append_uleb128(abbrevs, tag)
+            _append_uleb128(abbrevs, 3)  # DW_IDX_die_offset
+            _append_uleb128(abbrevs, DW_FORM.ref4)
+            abbrevs.extend(b'\0\0')
+    abbrevs.append(0)
+
+    str_offsets = bytearray()
+    entry_offsets = bytearray()
+    entry_pool = bytearray()
+    for name, tag, die_offset in names:
+        str_offsets.extend(len(debug_str).to_bytes(4, byteorder))
+        debug_str.extend(name.encode())
+        debug_str.append(0)
+        entry_offsets.extend(len(entry_pool).to_bytes(4, byteorder))
+        _append_uleb128(entry_pool, abbrev_codes[tag])
+        entry_pool.extend(die_offset.to_bytes(4, byteorder))
+        entry_pool.append(0)
+
+    buf = bytearray()
+    buf.extend(b'\0\0\0\0')  # unit_length
+    buf.extend((5).to_bytes(2, byteorder))  # version
+    buf.extend((0).to_bytes(2, byteorder))  # padding
+    buf.extend((1).to_bytes(4, byteorder))  # comp_unit_count
+    buf.extend((0).to_bytes(4, byteorder))  # local_type_unit_count
+    buf.extend((0).to_bytes(4, byteorder))  # foreign_type_unit_count
+    buf.extend((0).to_bytes(4, byteorder))  # bucket_count
+    buf.extend(len(names).to_bytes(4, byteorder))  # name_count
+    buf.extend(len(abbrevs).to_bytes(4, byteorder))  # abbrev_table_size
+    buf.extend((0).to_bytes(4, byteorder))  # augmentation_string_size
+    buf.extend((0).to_bytes(4, byteorder))  # CU offset
+    buf.extend(str_offsets)
+    buf.extend(entry_offsets)
+    buf.extend(abbrevs)
+    buf.extend(entry_pool)
 
     unit_length = len(buf) - 4
     buf[:4] = unit_length.to_bytes(4, byteorder)
-    header_length = unit_length - 6
-    buf[6:10] = header_length.to_bytes(4, byteorder)
     return buf
 
 
-def compile_dwarf(dies, little_endian=True, bits=64):
+def _compile_build_id_note(build_id, little_endian):
+    byteorder = 'little' if little_endian else 'big'
+    buf = bytearray()
+    buf.extend((4).to_bytes(4, byteorder))  # n_namesz
+    buf.extend(len(build_id).to_bytes(4, byteorder))  # n_descsz
+    buf.extend((3).to_bytes(4, byteorder))  # n_type = NT_GNU_BUILD_ID
+    buf.extend(b'GNU\0')
+    buf.extend(build_id)
+    buf.extend(bytes(-len(build_id) % 4))
+    return buf
+
+
+def _compress_debug_sections(sections, compress, little_endian, bits):
+    # compress is 'zlib-gabi' for SHF_COMPRESSED sections or 'zlib-gnu' for
+    # .zdebug_* sections.
+    for section in sections:
+        if section.name is None or not section.name.startswith('.debug_'):
+            continue
+        compressed = zlib.compress(bytes(section.data))
+        if compress == 'zlib-gnu':
+            section.name = '.z' + section.name[1:]
+            section.data = (b'ZLIB' + struct.pack('>Q', len(section.data)) +
+                            compressed)
+        else:
+            assert compress == 'zlib-gabi'
+            endian = '<' if little_endian else '>'
+            # Elf{32,64}_Chdr with ch_type = ELFCOMPRESS_ZLIB and
+            # ch_addralign = 1.
+            if bits == 64:
+                chdr = struct.pack(endian + 'IIQQ', 1, 0, len(section.data),
+                                   1)
+            else:
+                chdr = struct.pack(endian + 'III', 1, len(section.data), 1)
+            section.data = chdr + compressed
+            section.sh_flags |= SHF.COMPRESSED
+
+
+def compile_dwarf(dies, little_endian=True, bits=64, build_id=None,
+                  debug_names=None, version=4, compress=None):
+    # If debug_names is not None, it is a list of indices of DIEs in dies to
+    # add to a .debug_names section (see _compile_debug_names()). DWARF 5 units have a .debug_str_offsets
+    # section for DW_FORM_strx1. If compress is not None, the debugging
+    # sections are compressed (see _compress_debug_sections()).
     if isinstance(dies, DwarfDie):
         dies = (dies,)
     assert all(isinstance(die, DwarfDie) for die in dies)
-    cu_die = DwarfDie(DW_TAG.compile_unit, [
+    cu_attribs = [
         DwarfAttrib(DW_AT.comp_dir, DW_FORM.string, '/usr/src'),
         DwarfAttrib(DW_AT.stmt_list, DW_FORM.sec_offset, 0),
-    ], dies)
+    ]
+    if version >= 5:
+        cu_attribs.append(DwarfAttrib(DW_AT.str_offsets_base,
+                                      DW_FORM.sec_offset, 8))
+    cu_die = DwarfDie(DW_TAG.compile_unit, cu_attribs, dies)
 
-    return create_elf_file(ET.EXEC, [
+    strings = []
+    debug_info, die_offsets = _compile_debug_info(cu_die, little_endian, bits,
+                                                  version, strings=strings)
+    debug_str = bytearray(1)
+    sections = [
         ElfSection(
             p_type=PT.LOAD,
             vaddr=0xffff0000,
@@ -200,16 +370,129 @@ def compile_dwarf(dies, little_endian=True, bits=64):
         ElfSection(
             name='.debug_info',
             sh_type=SHT.PROGBITS,
-            data=_compile_debug_info(cu_die, little_endian, bits),
+            data=debug_info,
         ),
         ElfSection(
             name='.debug_line',
             sh_type=SHT.PROGBITS,
-            data=_compile_debug_line(cu_die, little_endian),
+            data=_compile_debug_line(cu_die, little_endian, version),
+        ),
+    ]
+    if version >= 5:
+        sections.append(ElfSection(
+            name='.debug_str_offsets',
+            sh_type=SHT.PROGBITS,
+            data=_compile_debug_str_offsets(strings, debug_str,
+                                            little_endian),
+        ))
+    if debug_names is not None:
+        sections.append(ElfSection(
+            name='.debug_names',
+            sh_type=SHT.PROGBITS,
+            data=_compile_debug_names(dies, die_offsets, debug_names,
+                                      debug_str, little_endian),
+        ))
+    sections.append(ElfSection(
+        name='.debug_str',
+        sh_type=SHT.PROGBITS,
+        data=debug_str,
+    ))
+    if build_id is not None:
+        sections.append(ElfSection(
+            name='.note.gnu.build-id',
+            sh_type=SHT.NOTE,
+            data=_compile_build_id_note(build_id, little_endian),
+        ))
+    if compress is not None:
+        _compress_debug_sections(sections, compress, little_endian, bits)
+    return create_elf_file(ET.EXEC, sections, little_endian=little_endian,
+                           bits=bits)
+
+
+def compile_split_dwarf(dies, dwo_name, comp_dir, little_endian=True, bits=64,
+                        version=5):
+    # Returns a skeleton file and the split DWARF (.dwo) file for it. Before
+    # DWARF 5, this uses the GNU extension.
+    if isinstance(dies, DwarfDie):
+        dies = (dies,)
+    assert all(isinstance(die, DwarfDie) for die in dies)
+    dwo_id = 0x0123456789abcdef
+    if version >= 5:
+        skeleton_die = DwarfDie(DW_TAG.skeleton_unit, [
+            DwarfAttrib(DW_AT.stmt_list, DW_FORM.sec_offset, 0),
+            DwarfAttrib(DW_AT.dwo_name, DW_FORM.string, dwo_name),
+            DwarfAttrib(DW_AT.comp_dir, DW_FORM.string, comp_dir),
+        ])
+        split_die = DwarfDie(DW_TAG.compile_unit, [], dies)
+    else:
+        skeleton_die = DwarfDie(DW_TAG.compile_unit, [
+            DwarfAttrib(DW_AT.stmt_list, DW_FORM.sec_offset, 0),
+            DwarfAttrib(DW_AT.GNU_dwo_name, DW_FORM.string, dwo_name),
+            DwarfAttrib(DW_AT.comp_dir, DW_FORM.string, comp_dir),
+            DwarfAttrib(DW_AT.GNU_dwo_id, DW_FORM.data8, dwo_id),
+        ])
+        split_die = DwarfDie(DW_TAG.compile_unit, [
+            DwarfAttrib(DW_AT.GNU_dwo_id, DW_FORM.data8, dwo_id),
+        ], dies)
+
+    skeleton_sections = [
+        ElfSection(
+            p_type=PT.LOAD,
+            vaddr=0xffff0000,
+            data=b'',
+        ),
+        ElfSection(
+            name='.debug_abbrev',
+            sh_type=SHT.PROGBITS,
+            data=_compile_debug_abbrev(skeleton_die),
+        ),
+        ElfSection(
+            name='.debug_info',
+            sh_type=SHT.PROGBITS,
+            data=_compile_debug_info(skeleton_die, little_endian, bits,
+                                     version, DW_UT.skeleton, dwo_id)[0],
+        ),
+        # The line number program of the split unit is in the skeleton file.
+        ElfSection(
+            name='.debug_line',
+            sh_type=SHT.PROGBITS,
+            data=_compile_debug_line(split_die, little_endian, version,
+                                     comp_dir),
         ),
         ElfSection(
             name='.debug_str',
             sh_type=SHT.PROGBITS,
-            data=b'\0',
+            data=bytearray(1),
+        ),
+    ]
+
+    strings = []
+    debug_str = bytearray(1)
+    dwo_sections = [
+        ElfSection(
+            name='.debug_abbrev.dwo',
+            sh_type=SHT.PROGBITS,
+            data=_compile_debug_abbrev(split_die),
+        ),
+        ElfSection(
+            name='.debug_info.dwo',
+            sh_type=SHT.PROGBITS,
+            data=_compile_debug_info(split_die, little_endian, bits, version,
+                                     DW_UT.split_compile, dwo_id, strings)[0],
         ),
-    ], little_endian=little_endian, bits=bits)
+    ]
+    dwo_sections.append(ElfSection(
+        name='.debug_str_offsets.dwo',
+        sh_type=SHT.PROGBITS,
+        data=_compile_debug_str_offsets(strings, debug_str, little_endian,
+                                        version),
+    ))
+    dwo_sections.append(ElfSection(
+        name='.debug_str.dwo',
+        sh_type=SHT.PROGBITS,
+        data=debug_str,
+    ))
+    return (create_elf_file(ET.EXEC, skeleton_sections,
+                            little_endian=little_endian, bits=bits),
+            create_elf_file(ET.REL, dwo_sections,
+                            little_endian=little_endian, bits=bits))
@@ -8,6 +8,7 @@ class ElfSection:
     def __init__(self, data: bytes,
                  name: Optional[str] = None,
                  sh_type: Optional[SHT] = None,
+                 sh_flags: int = 0,
                  p_type: Optional[PT] = None,
                  vaddr: int = 0,
                  paddr: int = 0,
@@ -16,6 +17,7 @@ class ElfSection:
         self.data = data
         self.name = name
         self.sh_type = sh_type
+        self.sh_flags = sh_flags
         self.p_type = p_type
         self.vaddr = vaddr
         self.paddr = paddr
@@ -103,9 +105,9 @@ def create_elf_file(type: ET, sections: Sequence[ElfSection],
         if section.name is not None:
             shdr_struct.pack_into(
                 buf, shdr_offset,
-                shstrtab.data.index(section.name.encode()),  # sh_name
+                shstrtab.data.index(section.name.encode() + b'\0'),  # sh_name
                 section.sh_type,  # sh_type
-                0,  # sh_flags
+                section.sh_flags,  # sh_flags
                 section.vaddr,  # sh_addr
                 len(buf),  # sh_offset
                 len(section.data),  # sh_size
@@ -243,3 +243,15 @@ def deserialize_bits(buf, bit_offset, bit_size, little_endian):
     c_buf = (ctypes.c_char * len(buf)).from_buffer_copy(buf)
     return _drgn_cdll.drgn_test_deserialize_bits(c_buf, bit_offset, bit_size,
                                                  little_endian)
+
+
+_drgn_pydll.drgn_test_program_load_module.restype = ctypes.POINTER(_drgn_error)
+_drgn_pydll.drgn_test_program_load_module.argtypes = [
+    ctypes.py_object, ctypes.c_char_p, ctypes.c_uint64, ctypes.c_uint64,
+    ctypes.c_bool,
+]
+
+
+def load_module(prog, path, start, end, deferred=False):
+    _check_err(_drgn_pydll.drgn_test_program_load_module(
+        prog, os.fsencode(path), start, end, deferred))
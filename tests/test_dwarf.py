@@ -7,7 +7,10 @@ from drgn import (
     Object,
     Program,
     Qualifiers,
+    SearchKind,
+    TypeKind,
     array_type,
+    bool_type,
     complex_type,
     enum_type,
     float_type,
@@ -21,7 +24,15 @@ from drgn import (
 )
 from tests import ObjectTestCase, color_type, option_type, pid_type, point_type
 from tests.dwarf import DW_AT, DW_ATE, DW_FORM, DW_TAG
-from tests.dwarfwriter import compile_dwarf, DwarfDie, DwarfAttrib
+from tests.dwarfwriter import (
+    compile_dwarf,
+    compile_split_dwarf,
+    DwarfDie,
+    DwarfAttrib,
+)
+from tests.elf import ET, PT
+from tests.elfwriter import ElfSection, create_elf_file
+from tests.libdrgn import load_module
 
 
 bool_die = DwarfDie(
@@ -972,6 +983,26 @@ class TestTypes(unittest.TestCase):
                                'DW_TAG_typedef has missing or invalid DW_AT_name',
                                self.type_from_dwarf, dies)
 
+    def test_stats(self):
+        prog = dwarf_program([
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'INT'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                ],
+            ),
+            int_die,
+        ])
+        prog.type('INT')
+        stats = prog.stats()['dwarf']
+        self.assertEqual(stats['dies_parsed'], 2)
+        self.assertEqual(stats['cache_hits'], 0)
+        prog.type('INT')
+        stats = prog.stats()['dwarf']
+        self.assertEqual(stats['dies_parsed'], 2)
+        self.assertEqual(stats['cache_hits'], 1)
+
     def test_void_typedef(self):
         dies = [
             DwarfDie(
@@ -1699,3 +1730,543 @@ class TestObjects(ObjectTestCase):
     def test_not_found(self):
         prog = dwarf_program([int_die])
         self.assertRaisesRegex(LookupError, 'could not find', prog.object, 'y')
+
+    def test_search(self):
+        dies = [
+            int_die,
+            DwarfDie(
+                DW_TAG.enumeration_type,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'color'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0),
+                    DwarfAttrib(DW_AT.byte_size, DW_FORM.data1, 4),
+                ],
+                [
+                    DwarfDie(
+                        DW_TAG.enumerator,
+                        [
+                            DwarfAttrib(DW_AT.name, DW_FORM.string, name),
+                            DwarfAttrib(DW_AT.const_value, DW_FORM.data1, i),
+                        ]
+                    )
+                    for i, name in enumerate(['RED', 'GREEN', 'BLUE'])
+                ]
+            ),
+            DwarfDie(
+                DW_TAG.variable,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'RED'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0),
+                ],
+            ),
+            DwarfDie(
+                DW_TAG.subprogram,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'abs'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0),
+                ],
+            ),
+        ]
+        prog = dwarf_program(dies)
+        self.assertEqual(prog.search('*'),
+                         ['BLUE', 'GREEN', 'RED', 'abs', 'color', 'int'])
+        self.assertEqual(prog.search('RED'), ['RED'])
+        self.assertEqual(prog.search('RE'), [])
+        self.assertEqual(prog.search('RE*'), ['RED'])
+        self.assertEqual(prog.search('*E*'), ['BLUE', 'GREEN', 'RED'])
+        self.assertEqual(prog.search('?R*'), ['GREEN'])
+        self.assertEqual(prog.search('[a-c]*'), ['abs', 'color'])
+
+        self.assertEqual(prog.search('*', SearchKind.TYPE), ['color', 'int'])
+        self.assertEqual(prog.search('*', SearchKind.CONSTANT),
+                         ['BLUE', 'GREEN', 'RED'])
+        self.assertEqual(prog.search('*', SearchKind.FUNCTION), ['abs'])
+        self.assertEqual(prog.search('*', SearchKind.VARIABLE), ['RED'])
+        self.assertEqual(
+            prog.search('*', SearchKind.FUNCTION | SearchKind.VARIABLE),
+            ['RED', 'abs'])
+        self.assertEqual(prog.search('*', SearchKind(0)), [])
+
+        # Names indexed after the first search are found, too.
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(compile_dwarf([
+                int_die,
+                DwarfDie(
+                    DW_TAG.variable,
+                    [
+                        DwarfAttrib(DW_AT.name, DW_FORM.string, 'abc'),
+                        DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0),
+                    ],
+                ),
+            ]))
+            f.flush()
+            prog.load_debug_info([f.name])
+        self.assertEqual(prog.search('ab*'), ['abc', 'abs'])
+
+        self.assertEqual(Program().search('*'), [])
+
+    def test_functions(self):
+        dies = [
+            int_die,
+            DwarfDie(
+                DW_TAG.subprogram,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'abs'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0),
+                    DwarfAttrib(DW_AT.low_pc, DW_FORM.addr, 0x7fc3eb9b1c30),
+                ],
+                [
+                    DwarfDie(
+                        DW_TAG.formal_parameter,
+                        [DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0)],
+                    ),
+                ]
+            ),
+            DwarfDie(
+                DW_TAG.subprogram,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'inlined'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0),
+                ],
+            ),
+            DwarfDie(
+                DW_TAG.variable,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'x'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 0),
+                    DwarfAttrib(DW_AT.location, DW_FORM.exprloc,
+                                b'\x03\x04\x03\x02\x01\xff\xff\xff\xff'),
+                ],
+            ),
+        ]
+        prog = dwarf_program(dies)
+        self.assertEqual(list(prog.functions()), [prog['abs']])
+        self.assertEqual(list(Program().functions()), [])
+
+
+class TestIndex(unittest.TestCase):
+    def test_debug_info_cache(self):
+        dies = [
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'INT'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                ],
+            ),
+            int_die,
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = os.path.join(tmp_dir, 'cache')
+            path = os.path.join(tmp_dir, 'debug')
+            with open(path, 'wb') as f:
+                f.write(compile_dwarf(dies, build_id=b'\x01\x23\x45\x67'))
+
+            for hits, misses in ((0, 1), (1, 0)):
+                prog = Program()
+                prog.set_debug_info_cache(cache_dir)
+                prog.load_debug_info([path])
+                stats = prog.stats()['dwarf']
+                self.assertEqual(stats['index_cache_hits'], hits)
+                self.assertEqual(stats['index_cache_misses'], misses)
+                self.assertEqual(stats['index_dies'], 2)
+                self.assertEqual(prog.search('I*'), ['INT'])
+                self.assertEqual(prog.type('INT'),
+                                 typedef_type('INT', int_type('int', 4, True)))
+            self.assertEqual(os.listdir(cache_dir), ['01234567.idx'])
+
+            # An invalid cache file is ignored and replaced.
+            with open(os.path.join(cache_dir, '01234567.idx'), 'wb') as f:
+                f.write(b'DRGNIDX\0garbage')
+            prog = Program()
+            prog.set_debug_info_cache(cache_dir)
+            prog.load_debug_info([path])
+            self.assertEqual(prog.stats()['dwarf']['index_cache_misses'], 1)
+            self.assertEqual(prog.type('INT'),
+                             typedef_type('INT', int_type('int', 4, True)))
+            self.assertGreater(
+                os.path.getsize(os.path.join(cache_dir, '01234567.idx')), 16)
+
+    def test_index_size(self):
+        dies = [
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'INT'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                ],
+            ),
+            int_die,
+        ]
+        prog = dwarf_program(dies)
+        stats = prog.stats()['dwarf']
+        self.assertEqual(stats['index_dies'], 2)
+        self.assertGreater(stats['index_bytes'], 0)
+        # The size of the index isn't a counter, so it isn't reset.
+        prog.reset_stats()
+        self.assertEqual(prog.stats()['dwarf'], stats)
+
+        self.assertEqual(Program().stats()['dwarf']['index_dies'], 0)
+
+    def test_types(self):
+        dies = [
+            DwarfDie(
+                DW_TAG.structure_type,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'point'),
+                    DwarfAttrib(DW_AT.byte_size, DW_FORM.data1, 8),
+                ],
+                [
+                    DwarfDie(
+                        DW_TAG.member,
+                        [
+                            DwarfAttrib(DW_AT.name, DW_FORM.string, name),
+                            DwarfAttrib(DW_AT.data_member_location,
+                                        DW_FORM.data1, offset),
+                            DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                        ],
+                    )
+                    for name, offset in (('x', 0), ('y', 4))
+                ],
+            ),
+            int_die,
+            bool_die,
+            double_die,
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'INT'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                ],
+            ),
+            DwarfDie(
+                DW_TAG.pointer_type,
+                [
+                    DwarfAttrib(DW_AT.byte_size, DW_FORM.data1, 8),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                ],
+            ),
+            DwarfDie(
+                DW_TAG.subprogram,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'abs'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                ],
+            ),
+        ]
+        prog = dwarf_program(dies)
+        int_type_ = int_type('int', 4, True)
+
+        def types(*args):
+            return sorted(prog.types(*args), key=str)
+
+        self.assertEqual(types(), sorted([
+            point_type,
+            int_type_,
+            bool_type('_Bool', 1),
+            float_type('double', 8),
+            typedef_type('INT', int_type_),
+        ], key=str))
+        self.assertEqual(types(TypeKind.STRUCT), [point_type])
+        self.assertEqual(types(TypeKind.INT), [int_type_])
+        self.assertEqual(types(TypeKind.BOOL), [bool_type('_Bool', 1)])
+        self.assertEqual(types(TypeKind.FLOAT), [float_type('double', 8)])
+        self.assertEqual(types(TypeKind.TYPEDEF),
+                         [typedef_type('INT', int_type_)])
+        self.assertEqual(types(TypeKind.UNION), [])
+        self.assertRaisesRegex(ValueError, 'only named types',
+                               prog.types, TypeKind.POINTER)
+
+        # Types indexed after the first iteration are found, too.
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(compile_dwarf([
+                DwarfDie(
+                    DW_TAG.structure_type,
+                    [
+                        DwarfAttrib(DW_AT.name, DW_FORM.string, 'empty'),
+                        DwarfAttrib(DW_AT.byte_size, DW_FORM.data1, 0),
+                    ],
+                ),
+            ]))
+            f.flush()
+            prog.load_debug_info([f.name])
+        self.assertEqual(types(TypeKind.STRUCT),
+                         [struct_type('empty', 0, ()), point_type])
+
+        self.assertEqual(list(Program().types()), [])
+
+    def test_debug_names(self):
+        dies = [
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'INT'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 2),
+                ],
+            ),
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'INT2'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 2),
+                ],
+            ),
+            int_die,
+            DwarfDie(
+                DW_TAG.enumeration_type,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'color'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 2),
+                    DwarfAttrib(DW_AT.byte_size, DW_FORM.data1, 4),
+                ],
+                [
+                    DwarfDie(
+                        DW_TAG.enumerator,
+                        [
+                            DwarfAttrib(DW_AT.name, DW_FORM.string, 'RED'),
+                            DwarfAttrib(DW_AT.const_value, DW_FORM.data1, 0),
+                        ]
+                    ),
+                    DwarfDie(
+                        DW_TAG.enumerator,
+                        [
+                            DwarfAttrib(DW_AT.name, DW_FORM.string, 'BLUE'),
+                            DwarfAttrib(DW_AT.const_value, DW_FORM.data1, 1),
+                        ]
+                    ),
+                ]
+            ),
+        ]
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(compile_dwarf(dies, debug_names=[0, 3]))
+            f.flush()
+            prog.load_debug_info([f.name])
+        self.assertEqual(prog.type('INT'),
+                         typedef_type('INT', int_type('int', 4, True)))
+        # INT2 is only found by scanning the CU, which the name index covers.
+        self.assertRaisesRegex(LookupError, "could not find 'typedef INT2'",
+                               prog.type, 'INT2')
+        # The enumerators are found from the indexed enumeration type.
+        self.assertEqual(prog['BLUE'].value_(), 1)
+
+        # Without a name index, the CU is scanned.
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(compile_dwarf(dies))
+            f.flush()
+            prog.load_debug_info([f.name])
+        self.assertEqual(prog.type('INT2'),
+                         typedef_type('INT2', int_type('int', 4, True)))
+
+        # If an entry is malformed, the CUs of the name index are scanned.
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(compile_dwarf(
+                dies, debug_names=[0, ('BOGUS', DW_TAG.typedef, 0xffff), 3]))
+            f.flush()
+            prog.load_debug_info([f.name])
+        self.assertEqual(prog.type('INT'),
+                         typedef_type('INT', int_type('int', 4, True)))
+        self.assertEqual(prog.type('INT2'),
+                         typedef_type('INT2', int_type('int', 4, True)))
+        self.assertEqual(prog['BLUE'].value_(), 1)
+        self.assertRaises(LookupError, prog.type, 'BOGUS')
+
+    def test_dwarf5(self):
+        dies = [
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.strx1, 'INT'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                    DwarfAttrib(DW_AT.decl_file, DW_FORM.udata,
+                                'include/foo.h'),
+                ],
+            ),
+            int_die,
+        ]
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(compile_dwarf(dies, version=5))
+            f.flush()
+            prog.load_debug_info([f.name])
+        int_typedef = typedef_type('INT', int_type('int', 4, True))
+        self.assertEqual(prog.type('INT'), int_typedef)
+        self.assertEqual(prog.type('INT', 'include/foo.h'), int_typedef)
+        self.assertRaisesRegex(LookupError, "could not find 'typedef INT'",
+                               prog.type, 'INT', 'bar.h')
+
+    def test_compressed_sections(self):
+        dies = [
+            DwarfDie(
+                DW_TAG.typedef,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'INT'),
+                    DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                    DwarfAttrib(DW_AT.decl_file, DW_FORM.udata, 'foo.h'),
+                ],
+            ),
+            int_die,
+        ]
+        int_typedef = typedef_type('INT', int_type('int', 4, True))
+        for compress in ('zlib-gabi', 'zlib-gnu'):
+            for bits in (64, 32):
+                with self.subTest(compress=compress, bits=bits):
+                    prog = Program()
+                    with tempfile.NamedTemporaryFile() as f:
+                        f.write(compile_dwarf(dies, bits=bits,
+                                              compress=compress))
+                        f.flush()
+                        prog.load_debug_info([f.name])
+                    self.assertEqual(prog.type('INT'), int_typedef)
+                    self.assertEqual(prog.type('INT', 'foo.h'), int_typedef)
+
+    def test_split_dwarf(self):
+        int_typedef = typedef_type('INT', int_type('int', 4, True))
+        for version, form in ((4, DW_FORM.GNU_str_index),
+                              (5, DW_FORM.strx1)):
+            dies = [
+                DwarfDie(
+                    DW_TAG.typedef,
+                    [
+                        DwarfAttrib(DW_AT.name, form, 'INT'),
+                        DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                        DwarfAttrib(DW_AT.decl_file, DW_FORM.udata, 'foo.h'),
+                    ],
+                ),
+                int_die,
+            ]
+            with self.subTest(version=version), \
+                    tempfile.TemporaryDirectory() as comp_dir, \
+                    tempfile.NamedTemporaryFile() as f:
+                skeleton, dwo = compile_split_dwarf(dies, 'test.dwo',
+                                                    comp_dir,
+                                                    version=version)
+                f.write(skeleton)
+                f.flush()
+
+                # The skeleton unit is skipped if the .dwo file is missing.
+                prog = Program()
+                prog.load_debug_info([f.name])
+                self.assertRaises(LookupError, prog.type, 'INT')
+
+                with open(os.path.join(comp_dir, 'test.dwo'), 'wb') as dwo_f:
+                    dwo_f.write(dwo)
+                prog = Program()
+                prog.load_debug_info([f.name])
+                self.assertEqual(prog.type('INT'), int_typedef)
+                self.assertEqual(prog.type('INT', 'foo.h'), int_typedef)
+
+    def test_debug_info_cache_no_build_id(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            prog = Program()
+            prog.set_debug_info_cache(cache_dir)
+            with tempfile.NamedTemporaryFile() as f:
+                f.write(compile_dwarf(int_die))
+                f.flush()
+                prog.load_debug_info([f.name])
+            stats = prog.stats()['dwarf']
+            self.assertEqual(stats['index_cache_hits'], 0)
+            self.assertEqual(stats['index_cache_misses'], 0)
+            self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_modules(self):
+        prog = Program()
+        self.assertEqual(prog.modules(), [])
+        prog.set_lazy_module_indexing(True)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(compile_dwarf(int_die))
+            f.flush()
+            prog.load_debug_info([f.name])
+            modules = prog.modules()
+            self.assertEqual(len(modules), 1)
+            self.assertEqual(modules[0]['name'], f.name)
+            # Lazy indexing only applies to Linux kernel modules.
+            self.assertTrue(modules[0]['indexed'])
+
+    def test_deferred_modules(self):
+        point_dies = (
+            DwarfDie(
+                DW_TAG.structure_type,
+                [
+                    DwarfAttrib(DW_AT.name, DW_FORM.string, 'point'),
+                    DwarfAttrib(DW_AT.byte_size, DW_FORM.data1, 8),
+                ],
+                [
+                    DwarfDie(
+                        DW_TAG.member,
+                        [
+                            DwarfAttrib(DW_AT.name, DW_FORM.string, name),
+                            DwarfAttrib(DW_AT.data_member_location,
+                                        DW_FORM.data1, offset),
+                            DwarfAttrib(DW_AT.type, DW_FORM.ref4, 1),
+                        ],
+                    )
+                    for name, offset in (('x', 0), ('y', 4))
+                ],
+            ),
+            int_die,
+        )
+        with tempfile.NamedTemporaryFile() as vmlinux, \
+                tempfile.NamedTemporaryFile() as module, \
+                tempfile.NamedTemporaryFile() as no_debug_info:
+            vmlinux.write(compile_dwarf(int_die))
+            vmlinux.flush()
+            module.write(compile_dwarf(point_dies))
+            module.flush()
+            no_debug_info.write(create_elf_file(ET.EXEC, [
+                ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, data=b''),
+            ]))
+            no_debug_info.flush()
+
+            def indexed(prog):
+                return {module['name']: module['indexed']
+                        for module in prog.modules()}
+
+            prog = Program()
+            # This finder is added before the DWARF finder, so it is called
+            # after it.
+            prog.add_object_finder(
+                lambda prog, name, flags, filename:
+                Object(prog, 'int', value=4096) if name == 'PAGE_SIZE'
+                else None)
+            load_module(prog, vmlinux.name, 0xffff0000, 0xffff1000)
+            load_module(prog, module.name, 0xffff1000, 0xffff2000,
+                        deferred=True)
+            load_module(prog, no_debug_info.name, 0xffff2000, 0xffff3000,
+                        deferred=True)
+            self.assertEqual(indexed(prog), {
+                vmlinux.name: True,
+                module.name: False,
+                no_debug_info.name: False,
+            })
+
+            # Lookups that are answered by any finder don't index anything.
+            self.assertEqual(prog.type('int'), int_type('int', 4, True))
+            self.assertEqual(prog['PAGE_SIZE'],
+                             Object(prog, 'int', value=4096))
+            self.assertFalse(indexed(prog)[module.name])
+
+            # A lookup that misses indexes every deferred module. The one
+            # without debugging information is dropped.
+            self.assertEqual(prog.type('struct point'), point_type)
+            self.assertEqual(indexed(prog), {
+                vmlinux.name: True,
+                module.name: True,
+            })
+            self.assertRaises(LookupError, prog.type, 'struct foo')
+
+            # A symbol lookup indexes only the module containing the address.
+            prog = Program()
+            load_module(prog, module.name, 0xffff1000, 0xffff2000,
+                        deferred=True)
+            load_module(prog, no_debug_info.name, 0xffff2000, 0xffff3000,
+                        deferred=True)
+            self.assertRaises(LookupError, prog.symbol, 0xffff1000)
+            self.assertEqual(indexed(prog), {
+                module.name: True,
+                no_debug_info.name: False,
+            })
+            self.assertRaises(LookupError, prog.symbol, 0xffff2000)
+            self.assertEqual(indexed(prog), {module.name: True})
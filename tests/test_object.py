@@ -1830,6 +1830,30 @@ class TestGenericOperators(ObjectTestCase):
         self.assertRaisesRegex(TypeError, 'must be an array or pointer',
                                Object(prog, 'int', value=1).string_)
 
+    def test_long_string(self):
+        data = b'a' * 5000
+        prog = mock_program(segments=[
+            MockMemorySegment(data[:4100], virt_addr=0xffff0ff0),
+            MockMemorySegment(data[4100:] + b'\0', virt_addr=0xffff1ff4),
+            MockMemorySegment(b'unterminated', virt_addr=0xfffff000),
+        ])
+        # The string crosses page and segment boundaries.
+        self.assertEqual(Object(prog, 'char *', value=0xffff0ff0).string_(),
+                         data)
+        self.assertEqual(
+            Object(prog, 'char [4096]', address=0xffff0ff0).string_(),
+            data[:4096])
+        self.assertRaises(FaultError,
+                          Object(prog, 'char *', value=0xfffff000).string_)
+
+    def test_very_long_string(self):
+        data = bytes(range(1, 256)) * 1024
+        prog = mock_program(segments=[
+            MockMemorySegment(data + b'\0', virt_addr=0xffff0000),
+        ])
+        self.assertEqual(Object(prog, 'char *', value=0xffff0000).string_(),
+                         data)
+
 
 class TestSpecialMethods(ObjectTestCase):
     def test_dir(self):
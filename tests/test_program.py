@@ -1,10 +1,19 @@
 import ctypes
+import functools
+import gzip
 import itertools
+import lzma
+import mmap
 import os
+import struct
+import subprocess
+import sys
 import tempfile
+import time
 import unittest
 import unittest.mock
 
+import drgn
 from drgn import (
     Architecture,
     FaultError,
@@ -12,6 +21,7 @@ from drgn import (
     Object,
     Platform,
     PlatformFlags,
+    ProcessMemoryBackend,
     Program,
     ProgramFlags,
     Qualifiers,
@@ -32,6 +42,7 @@ from tests import (
     MockObject,
     ObjectTestCase,
     color_type,
+    mock_memory_read,
     mock_program,
     option_type,
     pid_type,
@@ -61,6 +72,68 @@ class TestProgram(unittest.TestCase):
                                'program memory was already initialized',
                                prog.set_pid, os.getpid())
 
+    def test_read_sparse_process(self):
+        page_size = mmap.PAGESIZE
+        m = mmap.mmap(-1, 3 * page_size)
+        m[:] = b'a' * page_size + b'b' * page_size + b'c' * page_size
+        buf = ctypes.c_char.from_buffer(m)
+        address = ctypes.addressof(buf)
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mprotect.argtypes = [ctypes.c_void_p, ctypes.c_size_t,
+                                  ctypes.c_int]
+        # PROT_NONE
+        self.assertEqual(libc.mprotect(address + page_size, page_size, 0),
+                         0)
+        try:
+            prog = Program()
+            prog.set_pid(os.getpid())
+            self.assertRaises(FaultError, prog.read, address, 3 * page_size)
+            data, valid = prog.read_sparse(address, 3 * page_size)
+            self.assertEqual(data, b'a' * page_size + bytes(page_size) +
+                             b'c' * page_size)
+            self.assertEqual(valid, b'\x05')
+        finally:
+            libc.mprotect(address + page_size, page_size,
+                          mmap.PROT_READ | mmap.PROT_WRITE)
+            del buf
+            m.close()
+
+    def test_set_pid_backend(self):
+        data = b'hello, world!'
+        buf = ctypes.create_string_buffer(data)
+        address = ctypes.addressof(buf)
+        for backend in ProcessMemoryBackend:
+            with self.subTest(backend=backend):
+                prog = Program()
+                prog.set_pid(os.getpid(), backend)
+                self.assertEqual(prog.read(address, len(data)), data)
+                self.assertRaises(FaultError, prog.read, 0, 8)
+                stats = prog.stats()['process_backend']
+                if backend == ProcessMemoryBackend.PROC_MEM:
+                    self.assertEqual(stats['vm_readv_reads'], 0)
+                    self.assertEqual(stats['proc_mem_reads'], 2)
+                    self.assertEqual(stats['proc_mem_bytes'], len(data))
+                else:
+                    self.assertEqual(stats['vm_readv_reads'], 2)
+                    self.assertEqual(stats['vm_readv_bytes'], len(data))
+                    self.assertEqual(stats['proc_mem_reads'], 0)
+        self.assertRaises(TypeError, Program().set_pid, os.getpid(), 1)
+        self.assertEqual(
+            set(Program().stats()['process_backend'].values()), {0})
+
+    def test_set_pid_read_many(self):
+        bufs = [ctypes.create_string_buffer(b'foo%d' % i) for i in range(100)]
+        ranges = [(ctypes.addressof(buf), 4) for buf in bufs]
+        ranges.append((0, 4))
+        prog = Program()
+        prog.set_pid(os.getpid(), ProcessMemoryBackend.VM_READV)
+        results = prog.read_many(ranges)
+        self.assertEqual(results[:-1], [buf.raw[:4] for buf in bufs])
+        self.assertIsInstance(results[-1], FaultError)
+        stats = prog.stats()['process_backend']
+        self.assertEqual(stats['vm_readv_reads'], 101)
+        self.assertLess(stats['vm_readv_calls'], 101)
+
     def test_lookup_error(self):
         prog = mock_program()
         self.assertRaisesRegex(LookupError, "^could not find constant 'foo'$",
@@ -103,6 +176,49 @@ class TestProgram(unittest.TestCase):
     def test_debug_info(self):
         Program().load_debug_info([])
 
+    def test_stats(self):
+        data = b'hello, world'
+        prog = mock_program(segments=[MockMemorySegment(data, 0xffff0000)],
+                            types=[point_type], objects=[])
+        stats = prog.stats()
+        self.assertEqual(stats['memory']['other'],
+                         {'reads': 0, 'bytes': 0, 'ns': 0})
+        self.assertEqual(stats['memory']['cache_hit_ratio'], 0.0)
+
+        prog.read(0xffff0000, 5)
+        self.assertRaises(FaultError, prog.read, 0xffff0008, 8)
+        prog.type('struct point')
+        self.assertRaises(LookupError, prog.type, 'struct foo')
+        self.assertRaises(LookupError, prog.object, 'foo')
+        stats = prog.stats()
+        # The second read faults after reading the last 4 bytes.
+        self.assertEqual(stats['memory']['other']['reads'], 2)
+        self.assertEqual(stats['memory']['other']['bytes'], 9)
+        # Reads from user-defined segments aren't timed.
+        self.assertEqual(stats['memory']['other']['ns'], 0)
+        self.assertEqual(stats['memory']['file']['reads'], 0)
+        self.assertEqual(stats['type_finders']['hits'], 1)
+        self.assertEqual(stats['type_finders']['misses'], 1)
+        self.assertEqual(stats['object_finders']['hits'], 0)
+        self.assertEqual(stats['object_finders']['misses'], 1)
+        self.assertEqual(stats['stack_traces']['unwinds'], 0)
+
+        prog.add_memory_segment(0xfffe0000, 4096, zero_memory_read)
+        prog.set_memory_cache(4096 * 4)
+        prog.read(0xfffe0000, 4)
+        prog.read(0xfffe0004, 4)
+        stats = prog.stats()
+        self.assertEqual(stats['memory']['cache_misses'], 1)
+        self.assertEqual(stats['memory']['cache_hits'], 1)
+        self.assertEqual(stats['memory']['cache_hit_ratio'], 0.5)
+
+        prog.reset_stats()
+        stats = prog.stats()
+        self.assertEqual(stats['memory']['other']['reads'], 0)
+        self.assertEqual(stats['memory']['cache_hits'], 0)
+        self.assertEqual(stats['type_finders']['hits'], 0)
+        self.assertEqual(stats['object_finders']['misses'], 0)
+
 
 class TestMemory(unittest.TestCase):
     def test_simple_read(self):
@@ -258,6 +374,305 @@ class TestMemory(unittest.TestCase):
         segment1.assert_not_called()
         segment2.assert_called_once_with(0xffff0000, 128, 0, False)
 
+    def test_cache(self):
+        data = bytes(range(256)) * 32
+        read_fn = unittest.mock.Mock(
+            side_effect=functools.partial(mock_memory_read, data))
+        prog = Program()
+        prog.add_memory_segment(0xffff0000, len(data), read_fn)
+        prog.set_memory_cache(1024 * 1024)
+        self.assertEqual(prog.read(0xffff0010, 8), data[0x10:0x18])
+        self.assertEqual(prog.read(0xffff0020, 8), data[0x20:0x28])
+        read_fn.assert_called_once_with(0xffff0000, 4096, 0, False)
+
+        # Reads crossing a page boundary use both pages.
+        read_fn.reset_mock()
+        self.assertEqual(prog.read(0xffff0ffc, 8), data[0xffc:0x1004])
+        read_fn.assert_called_once_with(0xffff1000, 4096, 4096, False)
+
+        read_fn.reset_mock()
+        prog.invalidate_cache()
+        self.assertEqual(prog.read(0xffff0010, 8), data[0x10:0x18])
+        read_fn.assert_called_once_with(0xffff0000, 4096, 0, False)
+
+        # Large reads bypass the cache.
+        read_fn.reset_mock()
+        self.assertEqual(prog.read(0xffff0000, len(data)), data)
+        read_fn.assert_called_once_with(0xffff0000, len(data), 0, False)
+
+        read_fn.reset_mock()
+        prog.set_memory_cache(0)
+        self.assertEqual(prog.read(0xffff0010, 8), data[0x10:0x18])
+        read_fn.assert_called_once_with(0xffff0010, 8, 0x10, False)
+
+    def test_cache_partial_page(self):
+        data = b'hello, world!'
+        read_fn = unittest.mock.Mock(
+            side_effect=functools.partial(mock_memory_read, data))
+        prog = Program()
+        prog.add_memory_segment(0xffff0000, len(data), read_fn)
+        prog.set_memory_cache(1024 * 1024)
+        self.assertEqual(prog.read(0xffff0000, len(data)), data)
+        self.assertRaisesRegex(FaultError, 'could not find memory segment',
+                               prog.read, 0xffff0000, len(data) + 1)
+
+    def test_cache_max_age(self):
+        data = bytes(4096)
+        read_fn = unittest.mock.Mock(
+            side_effect=functools.partial(mock_memory_read, data))
+        prog = Program()
+        prog.add_memory_segment(0xffff0000, len(data), read_fn)
+        prog.set_memory_cache(1024 * 1024, max_age=0.01)
+        prog.read(0xffff0000, 8)
+        time.sleep(0.02)
+        prog.read(0xffff0000, 8)
+        self.assertEqual(read_fn.call_count, 2)
+        self.assertRaises(ValueError, prog.set_memory_cache, 4096, -1)
+
+    def test_cache_readahead(self):
+        data = bytes(range(256)) * 16 * 64
+        read_fn = unittest.mock.Mock(
+            side_effect=functools.partial(mock_memory_read, data))
+        prog = Program()
+        prog.add_memory_segment(0xffff0000, len(data), read_fn)
+        prog.set_memory_cache(1024 * 1024)
+        prog.set_memory_readahead(64 * 1024)
+
+        # A sequential walk grows the window, so most pages are read ahead.
+        for address in range(0xffff0000, 0xffff0000 + len(data), 128):
+            self.assertEqual(prog.read(address, 8),
+                             data[address - 0xffff0000:][:8])
+        self.assertLess(read_fn.call_count, 16)
+
+        # Read-ahead doesn't go past the end of the segment.
+        prog.invalidate_cache()
+        self.assertEqual(prog.read(0xffff0000 + len(data) - 8, 8),
+                         data[-8:])
+        for args in read_fn.call_args_list:
+            self.assertLessEqual(args[0][0] + args[0][1],
+                                 0xffff0000 + len(data))
+
+        # Random accesses shrink the window back down to one page.
+        prog.invalidate_cache()
+        for i in range(16):
+            address = 0xffff0000 + (i * 37 % 64) * 4096
+            read_fn.reset_mock()
+            self.assertEqual(prog.read(address, 8),
+                             data[address - 0xffff0000:][:8])
+        read_fn.assert_called_once_with(address, 4096,
+                                        address - 0xffff0000, False)
+
+        prog.set_memory_readahead(0)
+        prog.invalidate_cache()
+        read_fn.reset_mock()
+        prog.read(0xffff0000, 8)
+        prog.read(0xffff1000, 8)
+        self.assertEqual(read_fn.call_count, 2)
+
+    def test_cache_readahead_limit(self):
+        data = bytes(4096 * 8)
+
+        def cached_pages():
+            pages = []
+            for i in range(8):
+                prog = Program()
+                prog.add_memory_segment(0xffff0000, len(data),
+                                        functools.partial(mock_memory_read,
+                                                          data))
+                prog.set_memory_cache(4 * 4096)
+                prog.set_memory_readahead(2 * 4096)
+                for address in range(0xffff0000, 0xffff0000 + len(data),
+                                     4096):
+                    prog.read(address, 8)
+                misses = prog.stats()['memory']['cache_misses']
+                prog.read(0xffff0000 + i * 4096, 8)
+                if prog.stats()['memory']['cache_misses'] == misses:
+                    pages.append(i)
+            return pages
+
+        # Pages read ahead never push the cache over its limit.
+        self.assertEqual(cached_pages(), [4, 5, 6, 7])
+
+    def test_read_many(self):
+        data = bytes(range(256))
+        read_fn = unittest.mock.Mock(
+            side_effect=functools.partial(mock_memory_read, data))
+        prog = Program()
+        prog.add_memory_segment(0xffff0000, len(data), read_fn)
+        results = prog.read_many([(0xffff0010, 8), (0xffff0000, 16),
+                                  (0xffff0004, 4)])
+        self.assertEqual(results, [data[0x10:0x18], data[:16], data[4:8]])
+        # The ranges are adjacent or overlapping, so they are read together.
+        read_fn.assert_called_once_with(0xffff0000, 0x18, 0, False)
+
+        read_fn.reset_mock()
+        results = prog.read_many([(0xffff00f8, 16), (0xffff0000, 4),
+                                  (0xfffe0000, 4), (0xffff0004, 0)])
+        self.assertEqual(len(results), 4)
+        self.assertIsInstance(results[0], FaultError)
+        self.assertEqual(results[1], data[:4])
+        self.assertIsInstance(results[2], FaultError)
+        self.assertEqual(results[3], b'')
+
+        self.assertEqual(prog.read_many([]), [])
+        self.assertRaises(ValueError, prog.read_many, [(0xffff0000, -1)])
+        self.assertRaises(TypeError, prog.read_many, [0xffff0000])
+
+    def test_read_into(self):
+        data = b'hello, world'
+        prog = mock_program(segments=[MockMemorySegment(data, 0xffff0000)])
+        buf = bytearray(5)
+        self.assertIsNone(prog.read_into(buf, 0xffff0007))
+        self.assertEqual(buf, b'world')
+        buf = bytearray(len(data))
+        prog.read_into(memoryview(buf)[3:], 0xffff0000)
+        self.assertEqual(buf, b'\0\0\0' + data[:-3])
+        self.assertRaises(FaultError, prog.read_into, bytearray(4),
+                          0xffff000a)
+        self.assertRaises(TypeError, prog.read_into, b'read-only', 0xffff0000)
+
+    def test_read_memoryview(self):
+        data = b'hello, world'
+        prog = mock_program(segments=[MockMemorySegment(data, 0xffff0000)])
+        view = prog.read_memoryview(0xffff0007, 5)
+        self.assertIsInstance(view, memoryview)
+        self.assertTrue(view.readonly)
+        self.assertEqual(view, b'world')
+        self.assertRaises(FaultError, prog.read_memoryview, 0xffff000a, 4)
+        self.assertRaises(ValueError, prog.read_memoryview, 0xffff0000, -1)
+
+    def test_read_sparse(self):
+        a = bytes(range(256)) * 24
+        b = b'b' * 0x1000
+        prog = mock_program(segments=[MockMemorySegment(a, 0xffff0000),
+                                      MockMemorySegment(b, 0xffff3000)])
+        data, valid = prog.read_sparse(0xffff0800, 0x4000)
+        # The page at 0xffff1000 is only partially readable, so all of it is
+        # zeroed.
+        self.assertEqual(data,
+                         a[0x800:0x1000] + bytes(0x2000) + b + bytes(0x800))
+        # Only the pages at 0xffff0000 and 0xffff3000 are valid.
+        self.assertEqual(valid, b'\x09')
+
+        data, valid = prog.read_sparse(0xffff0000, 0x1000)
+        self.assertEqual(data, a[:0x1000])
+        self.assertEqual(valid, b'\x01')
+        data, valid = prog.read_sparse(0x10000000, 9 * 0x1000)
+        self.assertEqual(data, bytes(9 * 0x1000))
+        self.assertEqual(valid, b'\0\0')
+        self.assertEqual(prog.read_sparse(0xffff0000, 0), (b'', b''))
+        self.assertRaises(ValueError, prog.read_sparse, 0xffff0000, -1)
+
+    def test_snapshot(self):
+        data = bytearray(8192)
+        read_fn = unittest.mock.Mock(
+            side_effect=lambda *args: mock_memory_read(bytes(data), *args))
+        prog = Program()
+        prog.add_memory_segment(0xffff0000, len(data), read_fn)
+        with prog.snapshot() as snap:
+            self.assertIs(snap.prog, prog)
+            self.assertEqual(prog.read(0xffff0010, 4), bytes(4))
+            data[0x10:0x14] = b'abcd'
+            self.assertEqual(prog.read(0xffff0010, 4), bytes(4))
+            with prog.snapshot():
+                self.assertEqual(prog.read(0xffff0010, 4), bytes(4))
+            self.assertEqual(prog.read(0xffff0010, 4), bytes(4))
+            # Large reads are also served from the snapshot.
+            self.assertEqual(prog.read(0xffff0000, len(data)), bytes(8192))
+            read_fn.assert_has_calls([
+                unittest.mock.call(0xffff0000, 4096, 0, False),
+                unittest.mock.call(0xffff1000, 4096, 4096, False),
+            ])
+            self.assertEqual(read_fn.call_count, 2)
+        self.assertEqual(prog.read(0xffff0010, 4), b'abcd')
+        self.assertRaisesRegex(ValueError, 'not active', snap.save,
+                               '/dev/null')
+
+    def test_snapshot_save(self):
+        data = bytes(range(256)) * 32
+        prog = Program(MOCK_PLATFORM)
+        prog.add_memory_segment(0xffff0000, len(data),
+                                functools.partial(mock_memory_read, data))
+        prog.add_memory_segment(0x2000, len(data),
+                                functools.partial(mock_memory_read, data),
+                                physical=True)
+        with tempfile.NamedTemporaryFile() as f:
+            with prog.snapshot() as snap:
+                prog.read(0xffff0000, 4)
+                prog.read(0xffff0ffc, 8)
+                prog.read(0x2100, 4, physical=True)
+                snap.save(f.name)
+
+            prog = Program()
+            prog.set_core_dump(f.name)
+        self.assertEqual(prog.platform, MOCK_PLATFORM)
+        self.assertEqual(prog.read(0xffff0000, 8192), data)
+        self.assertEqual(prog.read(0x2000, 4096, physical=True), data[:4096])
+        self.assertRaises(FaultError, prog.read, 0xffff2000, 1)
+        self.assertRaises(FaultError, prog.read, 0x2000, 1)
+        self.assertRaises(FaultError, prog.read, 0x3000, 1, physical=True)
+
+    def test_snapshot_save_unknown_platform(self):
+        prog = Program()
+        with prog.snapshot() as snap:
+            self.assertRaisesRegex(ValueError, 'unknown platform', snap.save,
+                                   '/dev/null')
+
+    def test_write_core(self):
+        data = bytes(range(256)) * 64
+        prog = Program(MOCK_PLATFORM)
+        prog.add_memory_segment(0xffff0000, len(data),
+                                functools.partial(mock_memory_read, data))
+        prog.add_memory_segment(0x2000, len(data),
+                                functools.partial(mock_memory_read, data),
+                                physical=True)
+        prog.read(0xffff3000, 4)
+        prog.start_recording()
+        prog.read(0xffff0ffc, 8)
+        prog.read_many([(0x2000, 4), (0x4000, 4)], physical=True)
+        prog.stop_recording()
+        prog.read(0xffff3000, 4)
+        with tempfile.NamedTemporaryFile() as f:
+            prog.write_core(f.name)
+            prog = Program()
+            prog.set_core_dump(f.name)
+        self.assertEqual(prog.platform, MOCK_PLATFORM)
+        self.assertEqual(prog.read(0xffff0000, 8192), data[:8192])
+        self.assertEqual(prog.read(0x2000, 4096, physical=True), data[:4096])
+        self.assertEqual(prog.read(0x4000, 4096, physical=True),
+                         data[0x2000:0x3000])
+        self.assertRaises(FaultError, prog.read, 0xffff2000, 1)
+        self.assertRaises(FaultError, prog.read, 0xffff3000, 1)
+        self.assertRaises(FaultError, prog.read, 0x3000, 1, physical=True)
+
+    def test_write_core_partial_pages(self):
+        a = bytes(range(256)) * 24
+        b = b'b' * 0x1400
+        prog = Program(MOCK_PLATFORM)
+        # The page at 0xffff1000 is split between the end of one segment and
+        # the start of another.
+        prog.add_memory_segment(0xffff0000, len(a),
+                                functools.partial(mock_memory_read, a))
+        prog.add_memory_segment(0xffff1c00, len(b),
+                                functools.partial(mock_memory_read, b))
+        prog.start_recording()
+        prog.read(0xffff0ffc, 8)
+        prog.read(0xffff2000, 4)
+        prog.stop_recording()
+        with tempfile.NamedTemporaryFile() as f:
+            prog.write_core(f.name)
+            prog = Program()
+            prog.set_core_dump(f.name)
+        self.assertEqual(prog.read(0xffff0000, len(a)), a)
+        self.assertEqual(prog.read(0xffff1c00, len(b)), b)
+        self.assertRaises(FaultError, prog.read, 0xffff1800, 1)
+        self.assertRaises(FaultError, prog.read, 0xffff1bff, 1)
+
+    def test_write_core_not_recording(self):
+        prog = Program(MOCK_PLATFORM)
+        self.assertRaisesRegex(ValueError, 'never started', prog.write_core,
+                               '/dev/null')
+
     def test_invalid_read_fn(self):
         prog = mock_program()
 
@@ -283,6 +698,151 @@ class TestMemory(unittest.TestCase):
             prog.read, 0xffff0000, 8)
 
 
+class PageTableBuilder:
+    """Build x86-64 page tables in a buffer of physical memory at 0."""
+
+    def __init__(self, levels=4):
+        self.levels = levels
+        self.memory = bytearray(0x1000)
+        self.pgd = self._alloc_table()
+
+    def _alloc_table(self):
+        address = len(self.memory)
+        self.memory.extend(bytes(0x1000))
+        return address
+
+    def map(self, virt_addr, phys_addr, page_size=0x1000):
+        table = self.pgd
+        for level in range(self.levels, 0, -1):
+            shift = 12 + 9 * (level - 1)
+            entry_address = table + 8 * ((virt_addr >> shift) & 0x1ff)
+            if page_size == 1 << shift:
+                # Present, plus the page size bit for huge pages.
+                entry = phys_addr | 0x1 | (0x80 if level > 1 else 0)
+                struct.pack_into('<Q', self.memory, entry_address, entry)
+                return entry_address
+            entry = struct.unpack_from('<Q', self.memory, entry_address)[0]
+            if not entry & 0x1:
+                entry = self._alloc_table() | 0x3
+                struct.pack_into('<Q', self.memory, entry_address, entry)
+            table = entry & 0xffffffffff000
+        raise ValueError('invalid page size')
+
+    def program(self):
+        prog = Program(Platform(Architecture.X86_64))
+        prog.add_memory_segment(
+            0, len(self.memory),
+            functools.partial(mock_memory_read, self.memory), True)
+        return prog
+
+
+class TestTranslate(unittest.TestCase):
+    def test_pages(self):
+        builder = PageTableBuilder()
+        builder.map(0xffff888000001000, 0x7f000)
+        builder.map(0x7f0000200000, 0x40000000, 0x200000)
+        builder.map(0xffffc90000000000, 0x80000000, 0x40000000)
+        prog = builder.program()
+        self.assertEqual(prog.translate(0xffff888000001234, builder.pgd),
+                         0x7f234)
+        self.assertEqual(prog.translate(0x7f00002abcde, builder.pgd),
+                         0x400abcde)
+        self.assertEqual(prog.translate(0xffffc90012345678, builder.pgd),
+                         0x92345678)
+        # The low bits of CR3 are ignored.
+        self.assertEqual(prog.translate(0xffff888000001234,
+                                        builder.pgd | 0x18),
+                         0x7f234)
+
+    def test_not_mapped(self):
+        builder = PageTableBuilder()
+        builder.map(0xffff888000001000, 0x7f000)
+        prog = builder.program()
+        for address in (0xffff888000000000, 0xffff888000002000,
+                        0xffff888000201000, 0x1000):
+            with self.subTest(address=address):
+                self.assertRaisesRegex(FaultError, 'not mapped',
+                                       prog.translate, address, builder.pgd)
+        self.assertRaisesRegex(FaultError, 'not canonical', prog.translate,
+                               0x0000888000001000, builder.pgd)
+
+    def test_5_level(self):
+        builder = PageTableBuilder(levels=5)
+        builder.map(0xff11000000001000, 0x7f000)
+        builder.memory.extend(bytes(0x7f000 - len(builder.memory)))
+        builder.memory.extend(b'hello, world'.ljust(0x1000, b'\0'))
+        vmcoreinfo = b'OSRELEASE=5.4.0\nPAGESIZE=4096\nNUMBER(pgtable_l5_enabled)=1\n'
+        note = (struct.pack('<3I', 11, len(vmcoreinfo), 0) +
+                b'VMCOREINFO\0\0' + vmcoreinfo.ljust(
+                    (len(vmcoreinfo) + 3) & ~3, b'\0'))
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(create_elf_file(ET.CORE, [
+                ElfSection(p_type=PT.NOTE, data=note),
+                ElfSection(p_type=PT.LOAD, vaddr=0xffffffffffffffff,
+                           paddr=0x1000, data=builder.memory[0x1000:]),
+            ]))
+            f.flush()
+            prog.set_core_dump(f.name)
+        self.assertTrue(prog.flags & ProgramFlags.IS_LINUX_KERNEL)
+        self.assertEqual(prog.translate(0xff11000000001004, builder.pgd),
+                         0x7f004)
+        self.assertEqual(prog.read(0xff11000000001000, 12, pgd=builder.pgd),
+                         b'hello, world')
+
+    def test_read(self):
+        builder = PageTableBuilder()
+        # Two adjacent virtual pages in non-adjacent physical pages.
+        builder.map(0x7f0000001000, 0x6000)
+        builder.map(0x7f0000002000, 0x4000)
+        builder.memory.extend(bytes(0x7000 - len(builder.memory)))
+        builder.memory[0x6ffc:0x7000] = b'hell'
+        builder.memory[0x4000:0x4004] = b'o!!!'
+        prog = builder.program()
+        self.assertEqual(prog.read(0x7f0000001ffc, 8, pgd=builder.pgd),
+                         b'hello!!!')
+        self.assertRaises(FaultError, prog.read, 0x7f0000002ffc, 8,
+                          pgd=builder.pgd)
+        self.assertRaises(ValueError, prog.read, 0x7f0000001ffc, 8,
+                          physical=True, pgd=builder.pgd)
+
+    def test_cache(self):
+        builder = PageTableBuilder()
+        pte = builder.map(0x7f0000001000, 0x6000)
+        prog = builder.program()
+        self.assertEqual(prog.translate(0x7f0000001000, builder.pgd), 0x6000)
+        struct.pack_into('<Q', builder.memory, pte, 0x8000 | 0x1)
+        self.assertEqual(prog.translate(0x7f0000001000, builder.pgd), 0x6000)
+        prog.invalidate_cache()
+        self.assertEqual(prog.translate(0x7f0000001000, builder.pgd), 0x8000)
+
+    def test_write_core(self):
+        builder = PageTableBuilder()
+        builder.map(0x7f0000001000, 0x6000)
+        builder.memory.extend(bytes(0x7000 - len(builder.memory)))
+        builder.memory[0x6000:0x6005] = b'hello'
+        prog = builder.program()
+        # The translation is cached before recording starts, but the page
+        # tables must still be recorded.
+        self.assertEqual(prog.translate(0x7f0000001000, builder.pgd), 0x6000)
+        prog.start_recording()
+        self.assertEqual(prog.read(0x7f0000001000, 5, pgd=builder.pgd),
+                         b'hello')
+        with tempfile.NamedTemporaryFile() as f:
+            prog.write_core(f.name)
+            prog = Program()
+            prog.set_core_dump(f.name)
+        self.assertEqual(prog.read(0x7f0000001000, 5, pgd=builder.pgd),
+                         b'hello')
+
+    def test_unsupported(self):
+        prog = Program(MOCK_PLATFORM)
+        self.assertRaisesRegex(ValueError, 'not supported', prog.translate,
+                               0xffff0000, 0x1000)
+        self.assertRaisesRegex(ValueError, 'without platform',
+                               Program().translate, 0xffff0000, 0x1000)
+
+
 class TestTypes(unittest.TestCase):
     def test_invalid_finder(self):
         self.assertRaises(TypeError, mock_program().add_type_finder, 'foo')
@@ -523,6 +1083,112 @@ class TestObjects(ObjectTestCase):
         self.assertTrue('counter' in prog)
 
 
+class TestRemote(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.socket_path = os.path.join(self._tmp_dir.name, 'socket')
+
+    def serve(self, sections, live=False):
+        self.core_path = os.path.join(self._tmp_dir.name, 'core')
+        with open(self.core_path, 'wb') as f:
+            f.write(create_elf_file(ET.CORE, sections))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(drgn.__file__))
+        args = [sys.executable, '-m', 'drgn.internal.memory_server',
+                self.core_path, self.socket_path]
+        if live:
+            args.append('--live')
+        server = subprocess.Popen(args, stdout=subprocess.PIPE, env=env)
+        self.addCleanup(server.wait)
+        self.addCleanup(server.stdout.close)
+        self.addCleanup(server.kill)
+        # Wait until the server is listening.
+        server.stdout.readline()
+
+    def test_read(self):
+        data = bytes(range(256)) * 1024
+        self.serve([
+            ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, data=data),
+            ElfSection(p_type=PT.LOAD, vaddr=0xfff00000, data=b'foo',
+                       memsz=8),
+        ])
+        prog = Program()
+        prog.set_remote(self.socket_path)
+        self.assertEqual(prog.platform.arch, Architecture.X86_64)
+        self.assertFalse(prog.flags & ProgramFlags.IS_LINUX_KERNEL)
+        self.assertEqual(prog.read(0xffff0100, 16), data[0x100:0x110])
+        self.assertEqual(prog.read(0xfff00000, 8), b'foo\0\0\0\0\0')
+        # This is split into several pipelined requests.
+        self.assertEqual(prog.read(0xffff0000, len(data)), data)
+        self.assertRaises(FaultError, prog.read, 0xffff0000 + len(data) - 4,
+                          8)
+        self.assertRaises(FaultError, prog.read, 0x1000, 1, physical=True)
+
+        results = prog.read_many([(0xffff1000, 8), (0xfff00001, 2),
+                                  (0x1000, 4), (0xffff0000, len(data))])
+        self.assertEqual(results[0], data[0x1000:0x1008])
+        self.assertEqual(results[1], b'oo')
+        self.assertIsInstance(results[2], FaultError)
+        self.assertEqual(results[3], data)
+
+    def test_physical(self):
+        self.serve([
+            ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, paddr=0x1000,
+                       data=b'hello'),
+        ])
+        prog = Program()
+        prog.set_remote(self.socket_path)
+        self.assertEqual(prog.read(0x1000, 5, physical=True), b'hello')
+        self.assertEqual(prog.read(0xffff0000, 5), b'hello')
+
+    def test_linux_kernel(self):
+        vmcoreinfo = b'OSRELEASE=5.4.0\nPAGESIZE=4096\n'
+        note = (struct.pack('<3I', 11, len(vmcoreinfo), 0) +
+                b'VMCOREINFO\0\0' + vmcoreinfo)
+        self.serve([ElfSection(p_type=PT.NOTE, data=note)])
+        prog = Program()
+        prog.set_remote(self.socket_path)
+        self.assertTrue(prog.flags & ProgramFlags.IS_LINUX_KERNEL)
+
+    def update_core(self, old, new):
+        # The server maps the core dump, so it sees changes made in place.
+        with open(self.core_path, 'r+b') as f:
+            contents = f.read()
+            f.seek(contents.index(old))
+            f.write(new)
+
+    def test_cache(self):
+        for live in [False, True]:
+            with self.subTest(live=live):
+                if live:
+                    os.unlink(self.socket_path)
+                # Only whole pages are cached.
+                self.serve([
+                    ElfSection(p_type=PT.LOAD, vaddr=0xffff0000,
+                               data=b'hello'.ljust(4096, b'\0')),
+                ], live=live)
+                prog = Program()
+                prog.set_remote(self.socket_path)
+                self.assertEqual(bool(prog.flags & ProgramFlags.IS_LIVE),
+                                 live)
+                self.assertEqual(prog.read(0xffff0000, 5), b'hello')
+                self.update_core(b'hello', b'HELLO')
+                # The memory of a running program isn't cached by default.
+                self.assertEqual(prog.read(0xffff0000, 5),
+                                 b'HELLO' if live else b'hello')
+
+    def test_errors(self):
+        prog = Program()
+        self.assertRaises(FileNotFoundError, prog.set_remote,
+                          self.socket_path)
+        self.serve([])
+        prog.set_remote(self.socket_path)
+        self.assertRaisesRegex(ValueError,
+                               'program memory was already initialized',
+                               prog.set_remote, self.socket_path)
+
+
 class TestCoreDump(unittest.TestCase):
     def test_not_core_dump(self):
         prog = Program()
@@ -560,6 +1226,50 @@ class TestCoreDump(unittest.TestCase):
         self.assertEqual(prog.read(0xffff0000, len(data)), data)
         self.assertRaises(FaultError, prog.read, 0x0, len(data), physical=True)
 
+    def test_read_memoryview(self):
+        data = b'hello, world'
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(create_elf_file(ET.CORE, [
+                ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, data=data),
+            ]))
+            f.flush()
+            prog.set_core_dump(f.name)
+        view = prog.read_memoryview(0xffff0000, len(data))
+        self.assertTrue(view.readonly)
+        self.assertEqual(view, data)
+        self.assertRaises(TypeError, view.__setitem__, 0, 0)
+        # The view keeps the program and its mapping alive.
+        del prog
+        self.assertEqual(view[7:], b'world')
+        view.release()
+
+    def test_multiple_segments(self):
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(create_elf_file(ET.CORE, [
+                ElfSection(p_type=PT.LOAD, vaddr=0xffff3000, data=b'baz'),
+                ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, data=b'foo'),
+                ElfSection(p_type=PT.LOAD, vaddr=0xffff1000, data=b'bar'),
+                ElfSection(p_type=PT.LOAD, vaddr=0xffff1003, data=b'qux'),
+            ]))
+            f.flush()
+            prog.set_core_dump(f.name)
+        self.assertEqual(prog.read(0xffff1000, 6), b'barqux')
+        self.assertEqual(prog.read(0xffff0000, 3), b'foo')
+        self.assertEqual(prog.read(0xffff3000, 3), b'baz')
+        self.assertEqual(prog.read(0xffff1003, 3), b'qux')
+        for address in (0xfffeffff, 0xffff0003, 0xffff1006, 0xffff3003):
+            with self.subTest(address=address):
+                self.assertRaises(FaultError, prog.read, address, 1)
+
+        # Segments can still be added after the core dump is loaded.
+        prog.add_memory_segment(
+            0xffff2000, 3, functools.partial(mock_memory_read, b'new'))
+        self.assertEqual(prog.read(0xffff2000, 3), b'new')
+        self.assertEqual(prog.read(0xffff3000, 3), b'baz')
+        self.assertRaises(FaultError, prog.read, 0xffff2003, 1)
+
     def test_physical(self):
         data = b'hello, world'
         prog = Program()
@@ -592,3 +1302,99 @@ class TestCoreDump(unittest.TestCase):
             f.flush()
             prog.set_core_dump(f.name)
         self.assertEqual(prog.read(0xffff0000, len(data) + 4), data + bytes(4))
+
+    def test_truncated(self):
+        data = b'hello, world'
+        prog = Program()
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(create_elf_file(ET.CORE, [
+                ElfSection(
+                    p_type=PT.LOAD,
+                    vaddr=0xffff0000,
+                    data=data,
+                ),
+            ]))
+            f.flush()
+            f.truncate(f.tell() - 4)
+            prog.set_core_dump(f.name)
+        self.assertEqual(prog.read(0xffff0000, len(data) - 4), data[:-4])
+        self.assertRaisesRegex(FaultError, 'short read', prog.read,
+                               0xffff0000, len(data))
+
+    def _test_compressed(self, compress):
+        small = b'hello, world'
+        # Large enough to need more than one access point.
+        large = b''.join(b'%d\n' % i for i in range(500000))
+        core = create_elf_file(ET.CORE, [
+            ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, data=small),
+            ElfSection(p_type=PT.LOAD, vaddr=0xffff00000000, data=large,
+                       memsz=len(large) + 4096),
+        ])
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'core')
+            with open(path, 'wb') as f:
+                f.write(compress(core))
+            # The second time may use the saved index.
+            for i in range(2):
+                with self.subTest(i=i):
+                    prog = Program()
+                    prog.set_core_dump(path)
+                    self.assertEqual(prog.platform.arch, Architecture.X86_64)
+                    self.assertEqual(prog.read(0xffff00000000 + len(large) - 8,
+                                               16),
+                                     large[-8:] + bytes(8))
+                    self.assertEqual(prog.read(0xffff0000, len(small)), small)
+                    self.assertEqual(prog.read(0xffff00000000 + 2000000, 16),
+                                     large[2000000:2000016])
+                    self.assertEqual(prog.read(0xffff00000000, len(large)),
+                                     large)
+            return os.listdir(dir)
+
+    def test_gzip(self):
+        self.assertIn('core.drgnidx', self._test_compressed(
+            functools.partial(gzip.compress, compresslevel=1)))
+
+    def test_gzip_multiple_members(self):
+        self._test_compressed(
+            lambda data: gzip.compress(data[:1000000], compresslevel=1) +
+            gzip.compress(data[1000000:], compresslevel=1))
+
+    def test_gzip_stale_index(self):
+        data = create_elf_file(ET.CORE, [
+            ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, data=b'foo'),
+        ])
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'core')
+            with open(path, 'wb') as f:
+                f.write(gzip.compress(data))
+            Program().set_core_dump(path)
+            data = create_elf_file(ET.CORE, [
+                ElfSection(p_type=PT.LOAD, vaddr=0xffff0000,
+                           data=b'foobar' * 1000),
+            ])
+            with open(path, 'wb') as f:
+                f.write(gzip.compress(data))
+            prog = Program()
+            prog.set_core_dump(path)
+            self.assertEqual(prog.read(0xffff0000, 6000), b'foobar' * 1000)
+
+    def test_gzip_truncated(self):
+        data = create_elf_file(ET.CORE, [
+            ElfSection(p_type=PT.LOAD, vaddr=0xffff0000, data=b'foo'),
+        ])
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, 'core')
+            with open(path, 'wb') as f:
+                f.write(gzip.compress(data)[:-10])
+            self.assertRaisesRegex(Exception, 'truncated',
+                                   Program().set_core_dump, path)
+
+    def test_xz(self):
+        self.assertNotIn('core.drgnidx', self._test_compressed(
+            functools.partial(lzma.compress, preset=0)))
+
+    def test_xz_multiple_streams(self):
+        # Streams may be followed by padding.
+        self._test_compressed(
+            lambda data: lzma.compress(data[:1000000], preset=0) + bytes(8) +
+            lzma.compress(data[1000000:], preset=0) + bytes(4))